@@ -0,0 +1,412 @@
+# app/cluster.py
+
+# Cluster mode (--cluster-enabled yes).
+#
+# Every node owns some of the 16384 hash slots. A command whose keys hash to a slot
+# owned by another node is answered with -MOVED, and while a slot is being migrated
+# the source node answers -ASK for keys it no longer has so the client retries on the
+# target with ASKING. There is no gossip bus: the topology is given at startup with
+# --cluster-nodes and changed with CLUSTER SETSLOT on every node (the way
+# `redis-cli --cluster` drives a real cluster).
+
+import hashlib
+import socket
+import time
+
+from app.datastore import dump_key, get_data_entry, get_keys_in_slot, delete_key
+from app.datastore import _serialize_command_to_resp_array
+import app.resp as resp
+from app.slots import CLUSTER_SLOTS, SHARD_CHANNEL_COMMANDS, get_command_keys, key_hash_slot
+from app.workers import read_resp_reply
+
+CLUSTER_ENABLED = False
+
+# Known nodes: node_id -> {"id": ..., "host": ..., "port": ...}
+NODES = {}
+MYSELF = None
+
+# SLOT_OWNERS[slot] is the node_id serving that slot, or None if unassigned.
+SLOT_OWNERS = [None] * CLUSTER_SLOTS
+
+# slot -> node_id for slots being moved out of / into this node
+MIGRATING_SLOTS = {}
+IMPORTING_SLOTS = {}
+
+CROSSSLOT_ERROR = b"-CROSSSLOT Keys in request don't hash to the same slot\r\n"
+TRYAGAIN_ERROR = b"-TRYAGAIN Multiple keys request during rehashing of slot\r\n"
+CLUSTERDOWN_ERROR = b"-CLUSTERDOWN Hash slot not served\r\n"
+CLUSTER_DISABLED_ERROR = b"-ERR This instance has cluster support disabled\r\n"
+
+def _bulk(value: str | bytes) -> bytes:
+    return resp.bulk_string(value if isinstance(value, bytes) else value.encode())
+
+def _array(parts: list[bytes]) -> bytes:
+    return resp.array_header(len(parts)) + b"".join(parts)
+
+def node_id_for(host: str, port: int) -> str:
+    """
+    Node IDs are derived from the node address, so every process computes the same
+    40-character ID for a given node without exchanging any messages.
+    """
+    return hashlib.sha1(f"{host}:{port}".encode()).hexdigest()
+
+def add_node(host: str, port: int) -> dict:
+    node_id = node_id_for(host, port)
+    if node_id not in NODES:
+        NODES[node_id] = {"id": node_id, "host": host, "port": port}
+    return NODES[node_id]
+
+def parse_slot_ranges(spec: str) -> list[tuple[int, int]]:
+    """Parses '0-5460,6000,7000-7100' into inclusive (start, end) ranges."""
+    ranges = []
+    for part in spec.split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            ranges.append((int(start), int(end)))
+        else:
+            ranges.append((int(part), int(part)))
+    for start, end in ranges:
+        if not (0 <= start <= end < CLUSTER_SLOTS):
+            raise ValueError(f"invalid slot range {start}-{end}")
+    return ranges
+
+def configure(port: int, nodes_spec: str | None, myself: str | None = None):
+    """
+    Enables cluster mode for this process.
+    nodes_spec lists every node and its slots, e.g.
+    "127.0.0.1:7000:0-5460 127.0.0.1:7001:5461-10922 127.0.0.1:7002:10923-16383".
+    `myself` ("host:port", --cluster-myself) names this node's entry. Without it, the entry
+    whose port matches `port` is this node, which only works while no two nodes share a
+    port (nodes on different hosts usually do).
+    """
+    global CLUSTER_ENABLED, MYSELF
+
+    CLUSTER_ENABLED = True
+
+    nodes = []
+    for node_spec in (nodes_spec or "").split():
+        parts = node_spec.split(":")
+        if len(parts) not in (2, 3):
+            raise ValueError(f"invalid node specification '{node_spec}'")
+        node = add_node(parts[0], int(parts[1]))
+        nodes.append(node)
+        if len(parts) == 3:
+            for start, end in parse_slot_ranges(parts[2]):
+                for slot in range(start, end + 1):
+                    SLOT_OWNERS[slot] = node["id"]
+
+    if myself is not None:
+        host, _, myself_port = myself.rpartition(":")
+        if not host or not myself_port.isdigit():
+            raise ValueError(f"invalid node address '{myself}'")
+        matches = [node for node in nodes if node["host"] == host and node["port"] == int(myself_port)]
+        if not matches:
+            raise ValueError(f"'{myself}' is not one of the listed nodes")
+    else:
+        matches = [node for node in nodes if node["port"] == port]
+        if len(matches) > 1:
+            raise ValueError(f"several nodes use port {port}; name this node with --cluster-myself host:port")
+    MYSELF = matches[0] if matches else add_node("127.0.0.1", port)
+
+def _redirect(kind: bytes, slot: int, node_id: str) -> bytes:
+    node = NODES[node_id]
+    return b"-" + kind + b" " + str(slot).encode() + b" " + f"{node['host']}:{node['port']}".encode() + b"\r\n"
+
+def check_redirection(command: str, arguments: list, asking: bool) -> bytes | None:
+    """
+    Decides whether this node can serve the command (Redis's getNodeByQuery).
+    Returns None to execute it locally, or the -MOVED / -ASK / -CROSSSLOT /
+    -TRYAGAIN / -CLUSTERDOWN error to send instead.
+    """
+    keys = get_command_keys(command, arguments)
+    if not keys:
+        return None
+
+    slot = key_hash_slot(keys[0])
+    for key in keys[1:]:
+        if key_hash_slot(key) != slot:
+            return CROSSSLOT_ERROR
+
+    owner = SLOT_OWNERS[slot]
+    if owner is None:
+        return CLUSTERDOWN_ERROR
+
+    if owner == MYSELF["id"]:
+        target = MIGRATING_SLOTS.get(slot)
+        if target is None or command in SHARD_CHANNEL_COMMANDS:
+            return None
+        # Keys already moved to the target must be read there: redirect with ASK.
+        missing_keys = sum(1 for key in keys if get_data_entry(key) is None)
+        if missing_keys == 0:
+            return None
+        if missing_keys < len(keys):
+            return TRYAGAIN_ERROR
+        return _redirect(b"ASK", slot, target)
+
+    if asking and slot in IMPORTING_SLOTS:
+        return None
+
+    return _redirect(b"MOVED", slot, owner)
+
+def _slot_ranges_by_node() -> list[tuple[int, int, str]]:
+    """Collapses SLOT_OWNERS into contiguous (start, end, node_id) ranges."""
+    ranges = []
+    start = None
+    for slot in range(CLUSTER_SLOTS + 1):
+        owner = SLOT_OWNERS[slot] if slot < CLUSTER_SLOTS else None
+        if start is not None and owner != SLOT_OWNERS[start]:
+            ranges.append((start, slot - 1, SLOT_OWNERS[start]))
+            start = None
+        if start is None and owner is not None:
+            start = slot
+    return ranges
+
+def _node_description(node: dict) -> list[bytes]:
+    return [_bulk(node["host"]), resp.integer(node["port"]), _bulk(node["id"])]
+
+def cluster_slots() -> bytes:
+    parts = []
+    for start, end, node_id in _slot_ranges_by_node():
+        parts.append(_array([resp.integer(start), resp.integer(end), _array(_node_description(NODES[node_id]))]))
+    return _array(parts)
+
+def cluster_shards() -> bytes:
+    shards = []
+    ranges = _slot_ranges_by_node()
+    for node in NODES.values():
+        slot_bounds = []
+        for start, end, node_id in ranges:
+            if node_id == node["id"]:
+                slot_bounds.append(resp.integer(start))
+                slot_bounds.append(resp.integer(end))
+        node_info = _array([
+            _bulk("id"), _bulk(node["id"]),
+            _bulk("port"), resp.integer(node["port"]),
+            _bulk("ip"), _bulk(node["host"]),
+            _bulk("endpoint"), _bulk(node["host"]),
+            _bulk("role"), _bulk("master"),
+            _bulk("replication-offset"), resp.integer(0),
+            _bulk("health"), _bulk("online"),
+        ])
+        shards.append(_array([_bulk("slots"), _array(slot_bounds), _bulk("nodes"), _array([node_info])]))
+    return _array(shards)
+
+def cluster_nodes() -> bytes:
+    """CLUSTER NODES: one line per node, in the Redis text format."""
+    ranges = _slot_ranges_by_node()
+    lines = []
+    for node in NODES.values():
+        flags = "myself,master" if node is MYSELF else "master"
+        slots = []
+        for start, end, node_id in ranges:
+            if node_id == node["id"]:
+                slots.append(str(start) if start == end else f"{start}-{end}")
+        if node is MYSELF:
+            for slot, target in MIGRATING_SLOTS.items():
+                slots.append(f"[{slot}->-{target}]")
+            for slot, source in IMPORTING_SLOTS.items():
+                slots.append(f"[{slot}-<-{source}]")
+        line = f"{node['id']} {node['host']}:{node['port']}@{node['port'] + 10000} {flags} - 0 0 0 connected"
+        if slots:
+            line += " " + " ".join(slots)
+        lines.append(line)
+    return _bulk("\n".join(lines) + "\n")
+
+def cluster_info() -> bytes:
+    assigned = sum(1 for owner in SLOT_OWNERS if owner is not None)
+    state = "ok" if assigned == CLUSTER_SLOTS else "fail"
+    info = (
+        f"cluster_enabled:1\r\n"
+        f"cluster_state:{state}\r\n"
+        f"cluster_slots_assigned:{assigned}\r\n"
+        f"cluster_slots_ok:{assigned}\r\n"
+        f"cluster_known_nodes:{len(NODES)}\r\n"
+        f"cluster_size:{len(set(owner for owner in SLOT_OWNERS if owner is not None))}\r\n"
+    )
+    return _bulk(info)
+
+def _parse_slots(arguments: list) -> list[int]:
+    slots = [int(argument) for argument in arguments]
+    for slot in slots:
+        if not (0 <= slot < CLUSTER_SLOTS):
+            raise ValueError("Invalid or out of range slot")
+    return slots
+
+def _find_node(node_id: str) -> dict | None:
+    node = NODES.get(node_id)
+    if node is None and ":" in node_id:
+        # Accept host:port as well, which is handier when driving nodes by hand
+        host, port = node_id.rsplit(":", 1)
+        node = NODES.get(node_id_for(host, int(port)))
+    return node
+
+def execute_cluster_command(arguments: list) -> bytes:
+    """Implements the CLUSTER command family."""
+    if not CLUSTER_ENABLED:
+        return CLUSTER_DISABLED_ERROR
+    if not arguments:
+        return b"-ERR wrong number of arguments for 'cluster' command\r\n"
+
+    subcommand = arguments[0].upper()
+    sub_arguments = arguments[1:]
+
+    try:
+        if subcommand == b"KEYSLOT" and len(sub_arguments) == 1:
+            return resp.integer(key_hash_slot(sub_arguments[0]))
+
+        elif subcommand == b"COUNTKEYSINSLOT" and len(sub_arguments) == 1:
+            slot = _parse_slots(sub_arguments)[0]
+            return resp.integer(len(get_keys_in_slot(slot)))
+
+        elif subcommand == b"GETKEYSINSLOT" and len(sub_arguments) == 2:
+            slot = _parse_slots(sub_arguments[:1])[0]
+            count = int(sub_arguments[1])
+            if count < 0:
+                return b"-ERR Invalid number of keys\r\n"
+            return _array([_bulk(key) for key in get_keys_in_slot(slot, count)])
+
+        elif subcommand == b"SLOTS" and not sub_arguments:
+            return cluster_slots()
+
+        elif subcommand == b"SHARDS" and not sub_arguments:
+            return cluster_shards()
+
+        elif subcommand == b"NODES" and not sub_arguments:
+            return cluster_nodes()
+
+        elif subcommand == b"INFO" and not sub_arguments:
+            return cluster_info()
+
+        elif subcommand == b"MYID" and not sub_arguments:
+            return _bulk(MYSELF["id"])
+
+        elif subcommand == b"MEET" and len(sub_arguments) == 2:
+            add_node(sub_arguments[0].decode(), int(sub_arguments[1]))
+            return resp.OK
+
+        elif subcommand in (b"ADDSLOTS", b"DELSLOTS") and sub_arguments:
+            slots = _parse_slots(sub_arguments)
+            for slot in slots:
+                if subcommand == b"ADDSLOTS" and SLOT_OWNERS[slot] is not None:
+                    return f"-ERR Slot {slot} is already busy\r\n".encode()
+            for slot in slots:
+                SLOT_OWNERS[slot] = MYSELF["id"] if subcommand == b"ADDSLOTS" else None
+            return resp.OK
+
+        elif subcommand == b"ADDSLOTSRANGE" and sub_arguments and len(sub_arguments) % 2 == 0:
+            bounds = _parse_slots(sub_arguments)
+            for i in range(0, len(bounds), 2):
+                for slot in range(bounds[i], bounds[i + 1] + 1):
+                    SLOT_OWNERS[slot] = MYSELF["id"]
+            return resp.OK
+
+        elif subcommand == b"SETSLOT" and len(sub_arguments) >= 2:
+            return _set_slot(_parse_slots(sub_arguments[:1])[0], sub_arguments[1].upper(), sub_arguments[2:])
+
+    except ValueError as e:
+        return b"-ERR " + str(e).encode() + b"\r\n"
+
+    return b"-ERR unknown subcommand or wrong number of arguments for '" + subcommand + b"'\r\n"
+
+def _set_slot(slot: int, action: bytes, rest: list) -> bytes:
+    """CLUSTER SETSLOT <slot> IMPORTING|MIGRATING|NODE <node-id> / STABLE."""
+    if action == b"STABLE":
+        MIGRATING_SLOTS.pop(slot, None)
+        IMPORTING_SLOTS.pop(slot, None)
+        return resp.OK
+
+    if len(rest) != 1:
+        return b"-ERR wrong number of arguments for 'cluster setslot' command\r\n"
+    node = _find_node(rest[0].decode())
+    if node is None:
+        return b"-ERR I don't know about node " + rest[0] + b"\r\n"
+
+    if action == b"MIGRATING":
+        if SLOT_OWNERS[slot] != MYSELF["id"]:
+            return f"-ERR I'm not the owner of hash slot {slot}\r\n".encode()
+        MIGRATING_SLOTS[slot] = node["id"]
+    elif action == b"IMPORTING":
+        if SLOT_OWNERS[slot] == MYSELF["id"]:
+            return f"-ERR I'm already the owner of hash slot {slot}\r\n".encode()
+        IMPORTING_SLOTS[slot] = node["id"]
+    elif action == b"NODE":
+        SLOT_OWNERS[slot] = node["id"]
+        MIGRATING_SLOTS.pop(slot, None)
+        IMPORTING_SLOTS.pop(slot, None)
+    else:
+        return b"-ERR Invalid CLUSTER SETSLOT action or number of arguments\r\n"
+    return resp.OK
+
+def migrate(arguments: list) -> bytes:
+    """
+    MIGRATE host port key|"" destination-db timeout [COPY] [REPLACE] [KEYS key ...]
+    Each key is dumped locally, restored on the target with ASKING + RESTORE and
+    deleted here afterwards (unless COPY).
+    """
+    if len(arguments) < 5:
+        return b"-ERR wrong number of arguments for 'migrate' command\r\n"
+
+    host = arguments[0].decode()
+    try:
+        port = int(arguments[1])
+        timeout_ms = int(arguments[4])
+    except ValueError:
+        return b"-ERR value is not an integer or out of range\r\n"
+
+    copy = False
+    replace = False
+    keys = [arguments[2]] if arguments[2] else []
+    i = 5
+    while i < len(arguments):
+        option = arguments[i].upper()
+        if option == b"COPY":
+            copy = True
+        elif option == b"REPLACE":
+            replace = True
+        elif option == b"KEYS":
+            if arguments[2]:
+                return b"-ERR When using MIGRATE KEYS option, the key argument must be set to the empty string\r\n"
+            keys = arguments[i + 1:]
+            break
+        else:
+            return b"-ERR syntax error\r\n"
+        i += 1
+
+    payloads = []
+    for key in keys:
+        payload, expiry = dump_key(key)
+        if payload is not None:
+            payloads.append((key, payload, expiry))
+    if not payloads:
+        return b"+NOKEY\r\n"
+
+    try:
+        target = socket.create_connection((host, port), timeout=(timeout_ms / 1000.0) or None)
+    except OSError as e:
+        return b"-IOERR error or timeout connecting to the client: " + str(e).encode() + b"\r\n"
+
+    with target, target.makefile("rb") as reader:
+        try:
+            for key, payload, expiry in payloads:
+                ttl_ms = 0
+                if expiry is not None:
+                    ttl_ms = max(expiry - int(time.time() * 1000), 1)
+                restore_arguments = [key, str(ttl_ms), payload]
+                if replace:
+                    restore_arguments.append("REPLACE")
+
+                target.sendall(_serialize_command_to_resp_array("ASKING", []))
+                target.sendall(_serialize_command_to_resp_array("RESTORE", restore_arguments))
+                read_resp_reply(reader)  # +OK for ASKING
+                reply = read_resp_reply(reader)
+                if reply.startswith(b"-"):
+                    return b"-ERR Target instance replied with error: " + reply[1:]
+
+                if not copy:
+                    delete_key(key)
+        except (OSError, ConnectionError, ValueError) as e:
+            return b"-IOERR error or timeout reading to target instance: " + str(e).encode() + b"\r\n"
+
+    return resp.OK
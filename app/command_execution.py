@@ -4,143 +4,42 @@ import sys
 import os
 import threading
 import time
-import math
 import argparse
 from xmlrpc import client
-from app.parser import parsed_resp_array
-from app.datastore import BLOCKING_CLIENTS, BLOCKING_CLIENTS_LOCK, BLOCKING_STREAMS, BLOCKING_STREAMS_LOCK, CHANNEL_SUBSCRIBERS, DATA_LOCK, DATA_STORE, SORTED_SETS, STREAMS, WAIT_CONDITION, WAIT_LOCK, _serialize_command_to_resp_array, add_to_sorted_set, cleanup_blocked_client, enqueue_client_command, get_client_queued_commands, get_sorted_set_range, get_sorted_set_rank, get_stream_max_id, get_zscore, increment_key_value, is_client_in_multi, is_client_subscribed, load_rdb_to_datastore, lrange_rtn, num_client_subscriptions, prepend_to_list, remove_elements_from_list, remove_from_sorted_set, set_client_in_multi, size_of_list, append_to_list, existing_list, get_data_entry, set_list, set_string, subscribe, unsubscribe, xadd, xrange, xread, REPLICA_ACK_OFFSETS
+from app.parser import command_name, parsed_resp_array
+import app.workers as workers
+import app.cluster as cluster
+import app.resp as resp
+import app.tracking as tracking
+import app.pubsub as pubsub
+import app.streams as streams
+import app.geo as geo
+import app.memory as memory
+import app.notify as notify
+from app.notify import NOTIFY_STATE
+import app.scripting as scripting
+from app.slots import SHARD_CHANNEL_COMMANDS, get_command_keys
+from app.datastore import DATA_LOCK, DATA_STORE, WAIT_CONDITION, WAIT_LOCK, _serialize_command_to_resp_array, add_to_sorted_set, cleanup_blocked_client, abort_client_multi, is_client_multi_aborted, enqueue_client_command, get_client_queued_commands, get_sorted_set_range, get_sorted_set_rank, get_zscore, get_zscores, num_sorted_set_members, increment_key_value, is_client_in_multi, load_rdb_to_datastore, lrange_rtn, remove_elements_from_list, remove_from_sorted_set, set_client_in_multi, size_of_list, existing_list, get_data_entry, set_string, xadd, xrange, REPLICA_ACK_OFFSETS, delete_key, dump_key, restore_key, set_client_asking, pop_client_asking, SERVER_CONFIG, SERVER_CONFIG_RANGES, hset, hget, hmget, hgetall, hdel, hincrby, hlen, hscan, sadd, srem, smismember, scard, smembers, sinter, sintercard, sinterstore, sunion, sdiff, srandmember, spop, increment_key_by_float, mget, mset, getset, append_to_string, get_string_range, set_string_range, get_string_and_update, string_value_to_bytes, WRONGTYPE_ERROR, CLIENT_STATE, get_client_protocol, set_client_protocol, forget_client, READY_KEYS, ListWaiter, push_to_list, block_client, serve_blocked_clients, delete_keys, flush_keyspace, KEY_VERSIONS, touch_keys, watch_keys, unwatch_all_keys, watched_keys_changed, watches_keys, pop_propagated_commands, DATABASES, DATABASE_COUNT, select_database, selected_index, swap_databases, move_key, using_database
 
 # --------------------------------------------------------------------------------
 
-WRITE_COMMANDS = {"SET", "LPUSH", "RPUSH", "LPOP", "ZADD", "ZREM", "XADD", "INCR", "GEOADD"}
-
-MIN_LON = -180.0
-MAX_LON = 180.0
-MIN_LAT = -85.05112878
-MAX_LAT = 85.05112878
-
-LATITUDE_RANGE = MAX_LAT - MIN_LAT
-LONGITUDE_RANGE = MAX_LON - MIN_LON
-
-EARTH_RADIUS_M = 6372797.560856 
-
-# ... (MIN_LON, MAX_LON, MIN_LAT, MAX_LAT and coordinate helper functions remain the same)
-
-def convert_to_meters(radius: float, unit: str) -> float:
-    """Converts a radius value from a given unit to meters."""
-    unit = unit.lower()
-    if unit == 'm':
-        return radius
-    elif unit == 'km':
-        return radius * 1000.0
-    elif unit == 'mi':
-        # 1 mile = 1609.344 meters (Redis constant)
-        return radius * 1609.344
-    elif unit == 'ft':
-        # 1 foot = 0.3048 meters
-        return radius * 0.3048
-    else:
-        raise ValueError("Invalid unit specified")
-    
-def haversine_distance(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
-    """Calculates the distance between two points (lon, lat) using the Haversine formula."""
-    # Convert degrees to radians
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-
-    # Differences
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-
-    # Haversine formula calculation: a = sin²(dlat/2) + cos(lat1) * cos(lat2) * sin²(dlon/2)
-    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-    # c = 2 * atan2(sqrt(a), sqrt(1-a)) simplifies to 2 * asin(sqrt(a))
-    c = 2 * math.asin(math.sqrt(a))
-    
-    distance = EARTH_RADIUS_M * c
-    return distance
-
-def spread_int32_to_int64(v: int) -> int:
-    """Spreads bits of a 32-bit integer to occupy even positions in a 64-bit integer."""
-    v = v & 0xFFFFFFFF
-    v = (v | (v << 16)) & 0x0000FFFF0000FFFF
-    v = (v | (v << 8)) & 0x00FF00FF00FF00FF
-    v = (v | (v << 4)) & 0x0F0F0F0F0F0F0F0F
-    v = (v | (v << 2)) & 0x3333333333333333
-    v = (v | (v << 1)) & 0x5555555555555555
-    return v
-
-def interleave(x: int, y: int) -> int:
-    """Interleaves bits of two 32-bit integers to create a single 64-bit Morton code."""
-    x_spread = spread_int32_to_int64(x)
-    y_spread = spread_int32_to_int64(y)
-    y_shifted = y_spread << 1
-    return x_spread | y_shifted
-
-def encode_geohash(latitude: float, longitude: float) -> int:
-    """Encodes latitude and longitude into a single integer score using Morton encoding."""
-    # 2^26
-    power_26 = 1 << 26 
-    
-    # 1. Normalize to the range 0-2^26
-    normalized_latitude = power_26 * (latitude - MIN_LAT) / LATITUDE_RANGE
-    normalized_longitude = power_26 * (longitude - MIN_LON) / LONGITUDE_RANGE
-
-    # 2. Truncate to integers
-    lat_int = int(normalized_latitude)
-    lon_int = int(normalized_longitude)
-
-    # 3. Interleave bits
-    return interleave(lat_int, lon_int)
-
-def compact_int64_to_int32(v: int) -> int:
-    """
-    Compact a 64-bit integer with interleaved bits back to a 32-bit integer.
-    """
-    v = v & 0x5555555555555555
-    v = (v | (v >> 1)) & 0x3333333333333333
-    v = (v | (v >> 2)) & 0x0F0F0F0F0F0F0F0F
-    v = (v | (v >> 4)) & 0x00FF00FF00FF00FF
-    v = (v | (v >> 8)) & 0x0000FFFF0000FFFF
-    v = (v | (v >> 16)) & 0x00000000FFFFFFFF
-    return v
-
-def convert_grid_numbers_to_coordinates(grid_latitude_number: int, grid_longitude_number: int) -> tuple[float, float]:
-    """Converts grid numbers back to (longitude, latitude) coordinates (center of grid cell)."""
-    # 2**26
-    power_26 = 1 << 26 
-    
-    # Calculate the grid boundaries
-    grid_latitude_min = MIN_LAT + LATITUDE_RANGE * (grid_latitude_number / power_26)
-    grid_latitude_max = MIN_LAT + LATITUDE_RANGE * ((grid_latitude_number + 1) / power_26)
-    grid_longitude_min = MIN_LON + LONGITUDE_RANGE * (grid_longitude_number / power_26)
-    grid_longitude_max = MIN_LON + LONGITUDE_RANGE * ((grid_longitude_number + 1) / power_26)
-    
-    # Calculate the center point of the grid cell
-    latitude = (grid_latitude_min + grid_latitude_max) / 2
-    longitude = (grid_longitude_min + grid_longitude_max) / 2
-    
-    # GEOPOS returns Longitude then Latitude
-    return (longitude, latitude) 
-
-def decode_geohash_to_coords(geo_code: int) -> tuple[float, float]:
-    """
-    Decodes geo code (WGS84) to tuple of (longitude, latitude)
-    """
-    # Align bits of both latitude and longitude to take even-numbered position
-    y = geo_code >> 1
-    x = geo_code
-    
-    # Compact bits back to 32-bit ints
-    grid_latitude_number = compact_int64_to_int32(x)
-    grid_longitude_number = compact_int64_to_int32(y)
-
-    # normalized_longitude = grid_longitude_number + 0.5
-    # normalized_latitude = grid_latitude_number + 0.5
-    
-    return convert_grid_numbers_to_coordinates(grid_latitude_number, grid_longitude_number)
+WRITE_COMMANDS = {
+    "SET", "LPUSH", "RPUSH", "LPOP", "RPOP", "LMOVE", "ZADD", "ZREM", "XADD", "INCR", "GEOADD", "RESTORE",
+    "HSET", "HDEL", "HINCRBY",
+    "SADD", "SREM", "SINTERSTORE", "SPOP",
+    "INCRBY", "DECRBY", "DECR", "INCRBYFLOAT", "MSET", "MSETNX", "SETNX", "GETSET", "APPEND",
+    "SETRANGE", "GETEX", "GETDEL",
+    "XGROUP", "XACK", "XCLAIM", "XAUTOCLAIM",
+    "DEL", "UNLINK", "FLUSHALL", "FLUSHDB",
+    "EVAL", "EVALSHA",
+    "SWAPDB", "MOVE",
+}
+
+# Blocking pops and XREADGROUP modify their keys but are not propagated to replicas as-is:
+# what they did is (LPOP / RPOP / LMOVE of the list served, XCLAIM for stream deliveries,
+# see propagate_effect in app/datastore.py). They may block, so they run without holding
+# DATA_LOCK.
+BLOCKING_WRITE_COMMANDS = {"BLPOP", "BRPOP", "BLMOVE", "BLMPOP", "XREADGROUP"}
 
 # Default Redis config
 DIR = "."
@@ -157,6 +56,11 @@ MASTER_SOCKET = None
 
 REPLICA_SOCKETS = []
 
+# Database of the last write propagated to the replicas (-1: unknown, send a SELECT), and
+# the lock keeping the SELECT and its write together in the replication stream
+REPLICATION_DB = -1
+REPLICATION_LOCK = threading.Lock()
+
 # Define the 59-byte empty RDB file content (hexadecimal)
 # command_execution.py around line 40
 
@@ -168,7 +72,7 @@ EMPTY_RDB_HEX = (
 empty_rdb_bytes = bytes.fromhex(EMPTY_RDB_HEX) 
 # RDB_FILE_SIZE will be determined by the actual length of the new hex string.
 RDB_FILE_SIZE = len(empty_rdb_bytes)
-RDB_HEADER = b"$" + str(RDB_FILE_SIZE).encode() + b"\r\n" # Dynamically create the header bytes
+RDB_HEADER = resp.bulk_header(RDB_FILE_SIZE) # Dynamically create the header bytes
 # Note: This is equivalent to b"$102\r\n" if the hex string is 102 bytes long.
 
 # Parse args like --dir /path --dbfilename file.rdb
@@ -183,104 +87,155 @@ RDB_PATH = os.path.join(DIR, DB_FILENAME)
 
 # Only load if file exists
 if os.path.exists(RDB_PATH):
-    DATA_STORE.update(load_rdb_to_datastore(RDB_PATH))
+    for db_index, keyspace in load_rdb_to_datastore(RDB_PATH).items():
+        with using_database(db_index):
+            DATA_STORE.update(keyspace)
+    memory.account_all_keys()
 else:
     print(f"RDB file not found at {RDB_PATH}, starting with empty DATA_STORE.")
 
-def _xread_serialize_response(stream_data: dict[str, list[dict]]) -> bytes:
-    """Serializes the result of xread into a RESP array response."""
-    if not stream_data:
-        return b"*-1\r\n" 
+def _pubsub_reply(kind: bytes, channel: bytes | None, count: int, protocol: int) -> bytes:
+    """[kind, channel, count] confirmation of (UN)SUBSCRIBE; a push frame in RESP3."""
+    writer = resp.RespWriter(protocol)
+    writer.push(3)
+    writer.bulk(kind)
+    writer.bulk_or_null(channel)
+    writer.integer(count)  # Number of subscriptions
+    return writer.getvalue()
 
-    # Outer Array: Array of [key, [entry1, entry2, ...]]
-    # *N\r\n
-    outer_response_parts = []
+def _pubsub_replies(kind: bytes, channels: list, action, count, client: socket.socket, protocol: int) -> bytes:
+    """
+    Runs action(client, channel) for every channel of a (UN)SUBSCRIBE-style command and
+    writes one confirmation per channel, each with the count(client) that followed it.
+    Unsubscribing from nothing still answers once, with a null channel.
+    """
+    if not channels:
+        return _pubsub_reply(kind, None, count(client), protocol)
+    writer = resp.RespWriter(protocol)
+    for channel in channels:
+        action(client, channel)
+        writer.raw(_pubsub_reply(kind, channel, count(client), protocol))
+    return writer.getvalue()
+
+def _parse_block_timeout(value: bytes) -> tuple[float | None, bytes | None]:
+    """Blocking commands take their timeout in (fractional) seconds; 0 blocks forever."""
+    try:
+        timeout = float(value)
+    except ValueError:
+        return None, b"-ERR timeout is not a float or out of range\r\n"
+    if timeout < 0:
+        return None, b"-ERR timeout is negative\r\n"
+    return timeout, None
+
+def _parse_db_index(value: bytes, command: str) -> tuple[int | None, bytes | None]:
+    """A database index argument of SELECT, SWAPDB or MOVE."""
+    try:
+        index = int(value)
+    except ValueError:
+        return None, b"-ERR value is not an integer or out of range\r\n"
+    if not 0 <= index < DATABASE_COUNT:
+        return None, b"-ERR DB index is out of range\r\n"
+    # Keys are routed by slot alone, so only database 0 exists across nodes / workers
+    if index != 0 and (cluster.CLUSTER_ENABLED or workers.WORKER_COUNT > 1):
+        return None, b"-ERR " + command.encode() + b" is not allowed in cluster mode\r\n"
+    return index, None
+
+def _track_command(command: str, arguments: list, response, client: socket.socket):
+    """
+    Client-side caching bookkeeping for one executed command: keys it wrote are
+    invalidated for every tracking client, keys it read are remembered for the caller.
+    """
+    if not isinstance(response, bytes) or response.startswith(b"-") or command in SHARD_CHANNEL_COMMANDS:
+        return
+    keys = get_command_keys(command, arguments)
+    if not keys:
+        return
+    if command in WRITE_COMMANDS or command in BLOCKING_WRITE_COMMANDS:
+        tracking.invalidate_keys(keys, client)
+    else:
+        tracking.remember_keys(client, keys)
 
-    for key, entries in stream_data.items():
-        # Array for [key, list of entries] -> *2\r\n
-        key_resp = b"$" + str(len(key.encode())).encode() + b"\r\n" + key.encode() + b"\r\n"
-        
-        # Array for list of entries -> *M\r\n
-        entries_array_parts = []
-        for entry in entries:
-            entry_id = entry["id"]
-            fields = entry["fields"]
-
-            # Array for [id, [field1, value1, field2, value2, ...]] -> *2\r\n
-            id_resp = b"$" + str(len(entry_id.encode())).encode() + b"\r\n" + entry_id.encode() + b"\r\n"
-
-            # Array for field/value pairs -> *2K\r\n
-            fields_array_parts = []
-            for field, value in fields.items():
-                field_bytes = field.encode()
-                value_bytes = value.encode()
-                fields_array_parts.append(b"$" + str(len(field_bytes)).encode() + b"\r\n" + field_bytes + b"\r\n")
-                fields_array_parts.append(b"$" + str(len(value_bytes)).encode() + b"\r\n" + value_bytes + b"\r\n")
-            
-            fields_array_resp = b"*" + str(len(fields) * 2).encode() + b"\r\n" + b"".join(fields_array_parts)
+# Write commands that can only shrink the data set still run when memory is full
+OOM_EXEMPT_COMMANDS = {
+    "LPOP", "RPOP", "ZREM", "HDEL", "SREM", "SPOP", "GETDEL", "XACK", "XCLAIM", "XAUTOCLAIM", "XREADGROUP",
+    "DEL", "UNLINK", "FLUSHALL", "FLUSHDB", "SWAPDB", "MOVE",
+}
 
-            # Combine [id, fields_array]
-            entry_array_resp = b"*2\r\n" + id_resp + fields_array_resp
-            entries_array_parts.append(entry_array_resp)
-        
-        # Combine all entries into the inner array
-        entries_resp = b"*" + str(len(entries_array_parts)).encode() + b"\r\n" + b"".join(entries_array_parts)
-        
-        # Combine [key, entries_resp]
-        key_entries_resp = b"*2\r\n" + key_resp + entries_resp
-        outer_response_parts.append(key_entries_resp)
+def execute_single_command(command: str, arguments: list, client: socket.socket, in_transaction: bool = False) -> bytes | bool:
+    """
+    Runs one command with maxmemory applied: keys are evicted before a write command if
+    needed, and used memory is brought up to date for the keys the command wrote.
+    Keys written are also marked as modified for WATCH, and notified as keyspace events.
+    """
+    is_write_command = command in WRITE_COMMANDS or command in BLOCKING_WRITE_COMMANDS
+    if is_write_command and SERVER_CONFIG["maxmemory"] and SERVER_ROLE != "slave":
+        within_limit, evicted_keys = memory.free_memory_if_needed()
+        if evicted_keys and tracking.TRACKING_CLIENTS:
+            tracking.invalidate_keys(evicted_keys)
+        if not within_limit and command not in OOM_EXEMPT_COMMANDS:
+            return memory.OOM_ERROR
+
+    if command in WRITE_COMMANDS:
+        # The write and its WATCH version bump happen under one hold of DATA_LOCK, so no
+        # EXEC can run in between and miss it
+        with DATA_LOCK:
+            response = _execute_command(command, arguments, client, in_transaction)
+            if (KEY_VERSIONS or NOTIFY_STATE["flags"]) and isinstance(response, bytes) and not response.startswith(b"-"):
+                if KEY_VERSIONS:
+                    touch_keys(get_command_keys(command, arguments))
+                if NOTIFY_STATE["flags"] and command in notify.COMMAND_EVENTS:
+                    notify.command_executed(command, arguments, response)
+    else:
+        response = _execute_command(command, arguments, client, in_transaction)
 
-    # Final response: Array of [key, entries] arrays
-    return b"*" + str(len(outer_response_parts)).encode() + b"\r\n" + b"".join(outer_response_parts)
+    # Keys are only accounted while maxmemory is set (see app/memory.py)
+    if SERVER_CONFIG["maxmemory"] and command not in SHARD_CHANNEL_COMMANDS:
+        keys = get_command_keys(command, arguments)
+        if keys:
+            memory.after_command(keys, is_write_command or command == "MIGRATE")
+    return response
 
-def execute_single_command(command: str, arguments: list, client: socket.socket) -> bytes | bool:
+def _execute_command(command: str, arguments: list, client: socket.socket, in_transaction: bool = False) -> bytes | bool:
 
     response = None
     """
     Executes a single command and sends the response.
     Returns True if the command was processed successfully, False otherwise (e.g., unknown command).
     """
-    if is_client_subscribed(client):
-        ALLOWED_COMMANDS_WHEN_SUBSCRIBED = {"SUBSCRIBE", "UNSUBSCRIBE", "PING", "QUIT", "PSUBSCRIBE", "PUNSUBSCRIBE"}
+    # RESP version negotiated with HELLO; replies are written for it
+    protocol = get_client_protocol(client)
+
+    # RESP2 clients in subscribed mode can only manage subscriptions. RESP3 delivers
+    # messages as push frames, so a subscribed connection keeps running regular commands.
+    subscribed_resp2 = protocol == resp.RESP2 and pubsub.is_client_subscribed(client)
+    if subscribed_resp2:
+        ALLOWED_COMMANDS_WHEN_SUBSCRIBED = {"SUBSCRIBE", "UNSUBSCRIBE", "PING", "QUIT", "PSUBSCRIBE", "PUNSUBSCRIBE", "SSUBSCRIBE", "SUNSUBSCRIBE"}
         if command not in ALLOWED_COMMANDS_WHEN_SUBSCRIBED:
             response = b"-ERR Can't execute '" + command.encode() + b"' when client is subscribed\r\n"
             return response
         
 
     if command == "PING":
-        if is_client_subscribed(client):
-            response_parts = []
-            pong_bytes = "pong".encode()
-            response_parts.append(b"$" + str(len(pong_bytes)).encode() + b"\r\n" + pong_bytes + b"\r\n")
-
-            empty_bytes = "".encode()
-            response_parts.append(b"$" + str(len(empty_bytes)).encode() + b"\r\n" + empty_bytes + b"\r\n")
-
-            response = b"*" + str(len(response_parts)).encode() + b"\r\n" + b"".join(response_parts)
+        if subscribed_resp2:
+            # In subscribed mode PING answers with the ["pong", ""] push-style array
+            response = resp.bulk_array((b"pong", b""))
             # client.sendall(response
             return response
         else:
-            response = b"+PONG\r\n"
+            response = resp.PONG
             # client.sendall(response
             return response
 
     elif command == "REPLCONF": 
         # Check for REPLCONF GETACK * (Replica logic)
-        if len(arguments) == 2 and arguments[0].upper() == "GETACK" and arguments[1] == "*":
+        if len(arguments) == 2 and arguments[0].upper() == b"GETACK" and arguments[1] == b"*":
             try:
                 # REPLCONF ACK <offset> - use the replica's current offset
                 global REPLICA_REPL_OFFSET # Access the global offset
                 offset = REPLICA_REPL_OFFSET
-                offset_str = str(offset)
                 
                 # Construct the RESP Array: *3\r\n$8\r\nREPLCONF\r\n$3\r\nACK\r\n$LEN\r\n<OFFSET>\r\n
-                response = (
-                    b"*3\r\n" + # Array of 3 elements
-                    b"$8\r\nREPLCONF\r\n" +
-                    b"$3\r\nACK\r\n" +
-                    b"$" + str(len(offset_str)).encode() + b"\r\n" +
-                    offset_str.encode() + b"\r\n"
-                )
+                response = resp.bulk_array((b"REPLCONF", b"ACK", b"%d" % offset))
                 return response
             except Exception as e:
                 print(f"Error building REPLCONF ACK response: {e}")
@@ -288,7 +243,7 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
                 return b"-ERR Internal error building ACK\r\n"
         
         # ADDED: Check for REPLCONF ACK <offset> (Master receives from replica)
-        elif len(arguments) == 2 and arguments[0].upper() == "ACK":
+        elif len(arguments) == 2 and arguments[0].upper() == b"ACK":
             global REPLICA_ACK_OFFSETS
             
             try:
@@ -305,7 +260,7 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
                 return b"-ERR invalid offset value in ACK\r\n"
         
         # Handshake REPLCONF commands (listening-port <PORT> and capa psync2)
-        response = b"+OK\r\n"
+        response = resp.OK
         return response
     
     elif command == "PSYNC": 
@@ -324,33 +279,75 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
 
         # 4. Construct the RDB file bulk response header and combine with contents
         # The format is $<length>\r\n<binary_contents>
-        rdb_header = b"$" + str(rdb_file_size).encode() + b"\r\n"
+        rdb_header = resp.bulk_header(rdb_file_size)
         rdb_response_bytes = rdb_header + rdb_binary_contents
 
         global REPLICA_SOCKETS # <-- FIX 1: Use global to modify the variable
-        REPLICA_SOCKETS.append(client)
+        global REPLICATION_DB
+        with REPLICATION_LOCK:
+            REPLICA_SOCKETS.append(client)
+            REPLICATION_DB = -1  # The next propagated write starts with a SELECT
 
         # 5. Return the two parts separately as a tuple
         response = fullresync_response_bytes + rdb_response_bytes
         return response
     
+    elif command == "HELLO":
+        # HELLO [protover [AUTH username password] [SETNAME clientname]]
+        new_protocol = protocol
+        if arguments:
+            try:
+                new_protocol = int(arguments[0])
+            except ValueError:
+                return b"-ERR Protocol version is not an integer or out of range\r\n"
+            if new_protocol not in (resp.RESP2, resp.RESP3):
+                return b"-NOPROTO unsupported protocol version\r\n"
+
+        client_name = None
+        i = 1
+        while i < len(arguments):
+            option = arguments[i].upper()
+            if option == b"AUTH" and i + 2 < len(arguments):
+                # There are no ACL users: only the passwordless default user exists
+                if arguments[i + 1] != b"default":
+                    return b"-WRONGPASS invalid username-password pair or user is disabled.\r\n"
+                i += 3
+            elif option == b"SETNAME" and i + 1 < len(arguments):
+                client_name = arguments[i + 1]
+                i += 2
+            else:
+                return b"-ERR Syntax error in HELLO option '" + arguments[i] + b"'\r\n"
+
+        client_id = set_client_protocol(client, new_protocol, client_name)
+
+        # The reply is already written in the newly selected protocol
+        writer = resp.RespWriter(new_protocol)
+        writer.map(7)
+        writer.bulk(b"server")
+        writer.bulk(b"redis")
+        writer.bulk(b"version")
+        writer.bulk(b"7.2.0")
+        writer.bulk(b"proto")
+        writer.integer(new_protocol)
+        writer.bulk(b"id")
+        writer.integer(client_id)
+        writer.bulk(b"mode")
+        writer.bulk(b"cluster" if cluster.CLUSTER_ENABLED else b"standalone")
+        writer.bulk(b"role")
+        writer.bulk(b"master" if SERVER_ROLE == "master" else b"replica")
+        writer.bulk(b"modules")
+        writer.array(0)
+        return writer.getvalue()
+
     elif command == "ECHO":
         if not arguments:
             response = b"-ERR wrong number of arguments for 'echo' command\r\n"
             # client.sendall(response
             return response
         
-        # msg_str is like 'Hey' and we must convert back to RESP bulk string. 
-        msg_str = arguments[0]
-
-        # encode back to bytes
-        msg_bytes = msg_str.encode() 
-
-        # grab length of msg_bytes and construct RESP bulk string
-        length_bytes = str(len(msg_bytes)).encode()
-
-        # b"$3\r\nhey\r\n"
-        response = b"$" + length_bytes + b"\r\n" + msg_bytes + b"\r\n"
+        # msg_bytes is like b'Hey' and we must convert back to RESP bulk string: b"$3\r\nhey\r\n"
+        msg_bytes = arguments[0]
+        response = resp.bulk_string(msg_bytes)
         
         # client.sendall(response
         return response
@@ -370,7 +367,7 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         while i < len(arguments):
             option = arguments[i].upper()
             
-            if option in ("EX", "PX"):
+            if option in (b"EX", b"PX"):
                 # Check if the duration argument exists
                 if i + 1 >= len(arguments):
                     response = f"-ERR syntax error\r\n".encode()
@@ -381,9 +378,9 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
                     # Convert the duration argument (string) to an integer first
                     duration = int(arguments[i + 1])
                     
-                    if option == "EX":
+                    if option == b"EX":
                         duration_ms = duration * 1000  # Convert seconds to milliseconds
-                    elif option == "PX":
+                    elif option == b"PX":
                         duration_ms = duration
                     
                     i += 2 # Skip the option and its value
@@ -408,7 +405,7 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         # Use the data store function to set the value safely
         set_string(key, value, expiry_timestamp)
         
-        response = b"+OK\r\n"
+        response = resp.OK
         # client.sendall(response
         return response
     
@@ -424,17 +421,14 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         data_entry = get_data_entry(key)
 
         if data_entry is None:
-            response = b"$-1\r\n"  # RESP Null Bulk String
+            response = resp.null(protocol)  # RESP Null Bulk String
         else:
             # Check for correct type (important: we only support string GET for now)
             if data_entry.get("type") != "string":
-                 response = b"-WRONGTYPE Operation against a key holding the wrong kind of value\r\n"
+                 response = WRONGTYPE_ERROR
             else:
                 # Construct the Bulk String response
-                value = data_entry["value"]
-                value_bytes = value.encode()
-                length_bytes = str(len(value_bytes)).encode()
-                response = b"$" + length_bytes + b"\r\n" + value_bytes + b"\r\n"
+                response = resp.bulk_string(string_value_to_bytes(data_entry["value"]))
             
         # client.sendall(response
         return response
@@ -450,36 +444,20 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         end = int(arguments[2])
 
         list_elements = lrange_rtn(list_key, start, end)
-
-        response_parts = []
-        for element in list_elements: 
-            element_bytes = element.encode()
-            length_bytes = str(len(element_bytes)).encode()
-            response_parts.append(b"$" + length_bytes + b"\r\n" + element_bytes + b"\r\n")
-
-        response = b"*" + str(len(list_elements)).encode() + b"\r\n" + b"".join(response_parts)
+        response = resp.bulk_array(list_elements)
         # client.sendall(response
         return response
 
     elif command == "LPUSH":
-        if not arguments:
+        if len(arguments) < 2:
             response = b"-ERR wrong number of arguments for 'lpush' command\r\n"
             # client.sendall(response
             return response
         
-        list_key = arguments[0]
-        elements = arguments[1:]
-
-        size = 0
-
-        if existing_list(list_key):
-            for element in elements:
-                prepend_to_list(list_key, element)
-        else:
-            set_list(list_key, elements, None)
-
-        size = size_of_list(list_key)
-        response = b":{size}\r\n".replace(b"{size}", str(size).encode())
+        size, error = push_to_list(arguments[0], arguments[1:], left=True)
+        if error:
+            return error
+        response = resp.integer(size)
         # client.sendall(response
         return response
         
@@ -491,13 +469,13 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         
         list_key = arguments[0]
         size = size_of_list(list_key)
-        response = b":{size}\r\n".replace(b"{size}", str(size).encode())
+        response = resp.integer(size)
         # client.sendall(response
         return response
 
-    elif command == "LPOP":
+    elif command in ("LPOP", "RPOP"):
         if not arguments:
-            response = b"-ERR wrong number of arguments for 'lpop' command\r\n"
+            response = b"-ERR wrong number of arguments for '" + command.lower().encode() + b"' command\r\n"
             # client.sendall(response
             return response
         
@@ -505,213 +483,173 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         arguments = arguments[1:]
 
         if not existing_list(list_key):
-            response = b"$-1\r\n"  # RESP Null Bulk String
+            response = resp.null(protocol)  # RESP Null Bulk String
             # client.sendall(response
             return response
 
+        pop_left = command == "LPOP"
         if arguments == []:
-            list_elements = remove_elements_from_list(list_key, 1)
+            list_elements = remove_elements_from_list(list_key, 1, pop_left)
         else:
-            list_elements = remove_elements_from_list(list_key, int(arguments[0]))
+            list_elements = remove_elements_from_list(list_key, int(arguments[0]), pop_left)
         if list_elements is None:
-            response = b"$-1\r\n"  # RESP Null Bulk String
+            response = resp.null(protocol)  # RESP Null Bulk String
             # client.sendall(response
             return response
 
-        response_parts = []
-        for element in list_elements: 
-            element_bytes = element.encode()
-            length_bytes = str(len(element_bytes)).encode()
-            response_parts.append(b"$" + length_bytes + b"\r\n" + element_bytes + b"\r\n")
-
-        if len(response_parts) == 1:
-            response = b"$" + str(len(list_elements[0].encode())).encode() + b"\r\n" + list_elements[0].encode() + b"\r\n"
+        if len(list_elements) == 1:
+            response = resp.bulk_string(list_elements[0])
         else:
-            response = b"*" + str(len(list_elements)).encode() + b"\r\n" + b"".join(response_parts)
-        
+            response = resp.bulk_array(list_elements)
         
         # client.sendall(response
         return response
 
     elif command == "RPUSH":
-        # 1. Argument and Key setup
-        if not arguments:
-            # No arguments -> ignore / error (your code returns True and keeps listening)
-            return True
-        
-        list_key = arguments[0]
-        elements = arguments[1:]
-
-        # 2. Add all elements to the list (the helper functions handle DATA_LOCK internally)
-        #    - If the key already holds a list, append each pushed element.
-        #    - Otherwise create a new list key with the elements.
-        #    This models Redis: RPUSH adds elements to the tail.
-        if existing_list(list_key):
-            for element in elements:
-                append_to_list(list_key, element)
-        else:
-            set_list(list_key, elements, None)
-
-        # IMPORTANT: compute the size *after insertion* and store it.
-        # Redis's RPUSH returns the list length *after* the push operation,
-        # even if the server immediately serves a blocked client afterwards.
-        size_to_report = size_of_list(list_key)  # Size that must be returned to RPUSH caller
-
-        # 3. Check if there are blocked clients waiting on this list
-        #    We will wake up the longest-waiting client (FIFO). The structure is:
-        #      BLOCKING_CLIENTS = { 'list_key': [cond1, cond2, ...], ... }
-        #    Each entry is a threading.Condition used to notify the blocked thread.
-        blocked_client_condition = None
-
-        # Acquire the BLOCKING_CLIENTS_LOCK while we inspect / modify the shared dict.
-        # This prevents races where multiple RPUSH/BLPOP threads change the waiters concurrently.
-        with BLOCKING_CLIENTS_LOCK:
-            # If there are waiters, pop the first one (FIFO: the longest-waiting client).
-            if list_key in BLOCKING_CLIENTS and BLOCKING_CLIENTS[list_key]:
-                blocked_client_condition = BLOCKING_CLIENTS[list_key].pop(0)
-                # Note: we intentionally *don't* delete the list_key here even if empty;
-                # your code deletes the dict key later when cleaning up waiters on timeout.
-                # The critical property is FIFO ordering via pop(0).
-
-        if blocked_client_condition:
-            # 3a. When serving a blocked client, we must remove an element from the list.
-            #     remove_elements_from_list pops from the head (LPOP semantics).
-            #     This returns the element that will be sent to the blocked client.
-            popped_elements = remove_elements_from_list(list_key, 1) 
-            
-            # (You already computed size_to_report before popping; do NOT recalc it here,
-            #  since Redis returns the size *after insertion*, not after serving waiters.)
-
-            if popped_elements:
-                popped_element = popped_elements[0]
-                
-                # 3b. Build the RESP array that BLPOP expects:
-                #     *2\r\n
-                #     $<len(key)>\r\n<key>\r\n
-                #     $<len(element)>\r\n<element>\r\n
-                key_resp = b"$" + str(len(list_key.encode())).encode() + b"\r\n" + list_key.encode() + b"\r\n"
-                element_resp = b"$" + str(len(popped_element.encode())).encode() + b"\r\n" + popped_element.encode() + b"\r\n"
-                blpop_response = b"*2\r\n" + key_resp + element_resp
-
-                blocked_client_socket = blocked_client_condition.client_socket
-                
-                # Send the BLPOP response directly to the blocked client's socket.
-                # We do this *before* notify() so that when the blocked thread wakes it
-                # can safely assume the response has already been sent (avoids a race).
-                try:
-                    blocked_client_socket.sendall(blpop_response)
-                except Exception:
-                    # If the blocked client disconnected between RPUSH discovering it and us sending,
-                    # sendall will fail; we catch and ignore because we still need to notify the thread
-                    # (or let its wait time out and the cleanup code remove it).
-                    pass
-
-                # 3c. Wake up the blocked thread by notifying its Condition.
-                #      According to Condition semantics, notify() should be called while
-                #      holding the Condition's own lock, so we enter the Condition context.
-                #      The blocked thread is waiting on the same Condition and will be awakened.
-                with blocked_client_condition:
-                    blocked_client_condition.notify() 
-
-        # 4. Final step: Send the RPUSH response (always the size immediately after insertion)
-        #    This is the value clients expect (e.g., ":1\r\n")
-        response = b":{size}\r\n".replace(b"{size}", str(size_to_report).encode())
+        if len(arguments) < 2:
+            return b"-ERR wrong number of arguments for 'rpush' command\r\n"
+
+        # Pushes under a single DATA_LOCK acquisition. Redis's RPUSH returns the length
+        # *after* the push, even if blocked clients are served from it right afterwards
+        # (serve_blocked_clients() in handle_command, once the command is done).
+        size, error = push_to_list(arguments[0], arguments[1:], left=False)
+        if error:
+            return error
+        response = resp.integer(size)
         # client.sendall(response
         return response
 
-    elif command == "BLPOP":
-        # 1. Argument and Key setup
-        if len(arguments) != 2:
-            # Wrong number of args
-            return True
-        
-        list_key = arguments[0]
+    elif command in ("BLPOP", "BRPOP"):
+        # BLPOP key [key ...] timeout: pops from the first non-empty list, or blocks until
+        # an element is pushed to any of them. Waiters are served in FIFO order; inside
+        # a transaction the command never blocks (like Redis).
+        if len(arguments) < 2:
+            return b"-ERR wrong number of arguments for '" + command.lower().encode() + b"' command\r\n"
+        timeout, error = _parse_block_timeout(arguments[-1])
+        if error:
+            return error
+        waiter = ListWaiter(client, arguments[:-1], protocol, pop_left=command == "BLPOP")
+        return block_client(waiter, timeout, block=not in_transaction)
+
+    elif command == "LMOVE":
+        # LMOVE source destination LEFT|RIGHT LEFT|RIGHT: BLMOVE that never blocks
+        if len(arguments) != 4:
+            return b"-ERR wrong number of arguments for 'lmove' command\r\n"
+        where_from, where_to = arguments[2].upper(), arguments[3].upper()
+        if where_from not in (b"LEFT", b"RIGHT") or where_to not in (b"LEFT", b"RIGHT"):
+            return b"-ERR syntax error\r\n"
+        waiter = ListWaiter(client, [arguments[0]], protocol, pop_left=where_from == b"LEFT",
+                            destination=arguments[1], push_left=where_to == b"LEFT")
+        with DATA_LOCK:
+            response = waiter.try_serve()
+        return resp.null(protocol) if response is None else response
+
+    elif command == "BLMOVE":
+        # BLMOVE source destination LEFT|RIGHT LEFT|RIGHT timeout
+        if len(arguments) != 5:
+            return b"-ERR wrong number of arguments for 'blmove' command\r\n"
+        where_from, where_to = arguments[2].upper(), arguments[3].upper()
+        if where_from not in (b"LEFT", b"RIGHT") or where_to not in (b"LEFT", b"RIGHT"):
+            return b"-ERR syntax error\r\n"
+        timeout, error = _parse_block_timeout(arguments[4])
+        if error:
+            return error
+        waiter = ListWaiter(client, [arguments[0]], protocol, pop_left=where_from == b"LEFT",
+                            destination=arguments[1], push_left=where_to == b"LEFT")
+        return block_client(waiter, timeout, block=not in_transaction)
+
+    elif command == "BLMPOP":
+        # BLMPOP timeout numkeys key [key ...] LEFT|RIGHT [COUNT count]
+        if len(arguments) < 4:
+            return b"-ERR wrong number of arguments for 'blmpop' command\r\n"
+        timeout, error = _parse_block_timeout(arguments[0])
+        if error:
+            return error
         try:
-            # Redis accepts fractional seconds for the timeout (e.g., 0.4).
-            # threading.Condition.wait() accepts float seconds as well, so use float().
-            timeout = float(arguments[1]) 
+            num_keys = int(arguments[1])
         except ValueError:
-            # If parsing fails, send an error to the client (avoid silent failure).
-            response = b"-ERR timeout is not a float\r\n"
-            # client.sendall(response
-            return response
-        
-        # 2. Fast path: if the list already has elements, pop and return immediately.
-        #    This mirrors Redis: BLPOP behaves like LPOP when the list is non-empty.
-        if size_of_list(list_key) > 0:
-            list_elements = remove_elements_from_list(list_key, 1)
-            
-            if list_elements:
-                popped_element = list_elements[0]
-                
-                # Construct the RESP array [key, popped_element] and send it.
-                key_resp = b"$" + str(len(list_key.encode())).encode() + b"\r\n" + list_key.encode() + b"\r\n"
-                element_resp = b"$" + str(len(popped_element.encode())).encode() + b"\r\n" + popped_element.encode() + b"\r\n"
-                response = b"*2\r\n" + key_resp + element_resp
-
-                # client.sendall(response
-                return response
-            # If remove_elements_from_list returns None unexpectedly, fall through to blocking.
-            # (This is unlikely if size_of_list returned > 0, but handling it avoids crashes.)
-
-        # 3. Blocking logic (list empty / non-existent)
-        #    We create a Condition object that the current thread will wait on.
-        client_condition = threading.Condition()
-        # Store the client socket on the Condition so RPUSH can send the response
-        # directly to the waiting client's socket when an element arrives.
-        client_condition.client_socket = client
-
-        # Register this Condition in BLOCKING_CLIENTS under the list_key.
-        # Use BLOCKING_CLIENTS_LOCK to guard concurrent access to the shared dict.
-        with BLOCKING_CLIENTS_LOCK:
-            BLOCKING_CLIENTS.setdefault(list_key, []).append(client_condition)
-
-        # Wait for notification or timeout.
-        # Note: timeout==0 handled as "block indefinitely" (wait() without timeout).
-        with client_condition:
-            if timeout == 0:
-                # Block forever until notify()
-                notified = client_condition.wait()
-            else:
-                # Block up to `timeout` seconds; wait() returns True if notified, False if timed out
-                notified = client_condition.wait(timeout)
-
-        # 4. Post-block handling
-        if notified:
-            # If True, RPUSH already sent the BLPOP response to the socket, so there's
-            # nothing more to do here. Just return True and continue listening for commands.
-            return True 
-        else:
-            # Timeout occurred. We must remove this client from the BLOCKING_CLIENTS registry
-            # because RPUSH may never visit it (or might have visited it but failed to notify).
-            with BLOCKING_CLIENTS_LOCK:
-                # Defensive: only remove if it's still present (RPUSH could have popped it)
-                if client_condition in BLOCKING_CLIENTS.get(list_key, []):
-                    BLOCKING_CLIENTS[list_key].remove(client_condition)
-                    # If no more waiters, delete empty list to keep the dict tidy
-                    if not BLOCKING_CLIENTS[list_key]:
-                        del BLOCKING_CLIENTS[list_key]
-            
-            # Send Null Array response on timeout: Redis returns "*-1\r\n" for BLPOP timeout.
-            response = b"*-1\r\n"
-            # client.sendall(response
-            return response
+            return b"-ERR numkeys should be greater than 0\r\n"
+        if num_keys <= 0:
+            return b"-ERR numkeys should be greater than 0\r\n"
+        options = arguments[2 + num_keys:]
+        if not options or options[0].upper() not in (b"LEFT", b"RIGHT"):
+            return b"-ERR syntax error\r\n"
+        count = 1
+        if len(options) == 3 and options[1].upper() == b"COUNT":
+            try:
+                count = int(options[2])
+            except ValueError:
+                count = 0
+            if count <= 0:
+                return b"-ERR count should be greater than 0\r\n"
+        elif len(options) != 1:
+            return b"-ERR syntax error\r\n"
+        waiter = ListWaiter(client, arguments[2:2 + num_keys], protocol,
+                            pop_left=options[0].upper() == b"LEFT", count=count)
+        return block_client(waiter, timeout, block=not in_transaction)
 
     elif command == "CONFIG":
-        if len(arguments) != 2 or arguments[0].upper() != "GET":
+        if len(arguments) == 3 and arguments[0].upper() == b"SET":
+            param_name = arguments[1].lower().decode()
+            if param_name == "client-output-buffer-limit":
+                if not pubsub.set_output_buffer_limits_config(arguments[2]):
+                    return b"-ERR CONFIG SET failed (possibly related to argument 'client-output-buffer-limit') - Invalid argument\r\n"
+                return resp.OK
+            if param_name in ("maxmemory", "maxmemory-policy"):
+                if not memory.set_config(param_name, arguments[2]):
+                    return b"-ERR CONFIG SET failed (possibly related to argument '" + param_name.encode() + b"') - Invalid argument\r\n"
+                return resp.OK
+            if param_name == "notify-keyspace-events":
+                if not notify.set_config(arguments[2]):
+                    return b"-ERR CONFIG SET failed (possibly related to argument 'notify-keyspace-events') - Invalid event class character. Use 'Ag$lshzxeKEt'.\r\n"
+                return resp.OK
+
+            # yes/no options are kept as 1/0
+            if param_name.startswith("lazyfree-") and param_name in SERVER_CONFIG:
+                flag = arguments[2].lower()
+                if flag not in (b"yes", b"no"):
+                    return b"-ERR CONFIG SET failed (possibly related to argument '" + param_name.encode() + b"') - argument must be 'yes' or 'no'\r\n"
+                SERVER_CONFIG[param_name] = int(flag == b"yes")
+                return resp.OK
+
+            # Otherwise CONFIG SET only applies to the integer tunables in SERVER_CONFIG
+            if param_name not in SERVER_CONFIG:
+                return b"-ERR Unknown option or number of arguments for CONFIG SET - '" + param_name.encode() + b"'\r\n"
+            try:
+                value = int(arguments[2])
+            except ValueError:
+                return b"-ERR CONFIG SET failed (possibly related to argument '" + param_name.encode() + b"') - argument must be an integer\r\n"
+            minimum, maximum = SERVER_CONFIG_RANGES[param_name]
+            if not minimum <= value <= maximum:
+                return (b"-ERR CONFIG SET failed (possibly related to argument '" + param_name.encode()
+                        + b"') - argument must be between %d and %d inclusive\r\n" % (minimum, maximum))
+            SERVER_CONFIG[param_name] = value
+            return resp.OK
+
+        if len(arguments) != 2 or arguments[0].upper() != b"GET":
             # Handle wrong arguments or non-GET subcommands
             response = b"-ERR wrong number of arguments for 'CONFIG GET' command\r\n"
             # client.sendall(response
             return response
 
         # 1. Extract the parameter name requested by the client
-        param_name = arguments[1].lower()
+        param_name = arguments[1].lower().decode()
         value = None
 
         if param_name == "dir":
             value = DIR
         elif param_name == "dbfilename":
             value = DB_FILENAME
+        elif param_name == "client-output-buffer-limit":
+            value = pubsub.get_output_buffer_limits_config()
+        elif param_name == "maxmemory-policy":
+            value = memory.MEMORY_STATE["policy"]
+        elif param_name == "notify-keyspace-events":
+            value = notify.get_config()
+        elif param_name.startswith("lazyfree-") and param_name in SERVER_CONFIG:
+            value = "yes" if SERVER_CONFIG[param_name] else "no"
+        elif param_name in SERVER_CONFIG:
+            value = str(SERVER_CONFIG[param_name])
 
         # 2. Handle unknown parameters
         if value is None:
@@ -721,25 +659,12 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
             # We should still use the param_name for the first element
             
         
-        # --- Correct RESP Serialization ---
-        
-        # 3. Encode strings
-        param_bytes = param_name.encode('utf-8')
-        value_bytes = value.encode('utf-8')
-        
-        # 4. Construct the RESP Array: *2 [param_name] [value]
-        response = (
-            # *2 (Array of 2 elements)
-            b"*2\r\n" +
-            # $len(param_name)
-            b"$" + str(len(param_bytes)).encode('utf-8') + b"\r\n" + 
-            # param_name
-            param_bytes + b"\r\n" +
-            # $len(value)
-            b"$" + str(len(value_bytes)).encode('utf-8') + b"\r\n" +
-            # value
-            value_bytes + b"\r\n"
-        )
+        # 3. Construct the reply: *2 [param_name] [value] (a map in RESP3)
+        writer = resp.RespWriter(protocol)
+        writer.map(1)
+        writer.bulk(param_name.encode('utf-8'))
+        writer.bulk(value.encode('utf-8'))
+        response = writer.getvalue()
 
         # client.sendall(response
         return response
@@ -756,80 +681,76 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         with DATA_LOCK:
             matching_keys = []
             for key in DATA_STORE.keys():
-                if pattern == "*" or pattern == key:
+                if pattern == b"*" or pattern == key:
                     matching_keys.append(key)
 
         # Construct RESP Array response
-        response_parts = []
-        for key in matching_keys:
-            key_bytes = key.encode()
-            length_bytes = str(len(key_bytes)).encode()
-            response_parts.append(b"$" + length_bytes + b"\r\n" + key_bytes + b"\r\n")
-
-        response = b"*" + str(len(matching_keys)).encode() + b"\r\n" + b"".join(response_parts)
+        response = resp.bulk_array(matching_keys)
         # client.sendall(response
         return response
 
     elif command == "SUBSCRIBE":
-        # Construct RESP Array response
-        channel = arguments[0] if arguments else ""
-        subscribe(client, channel)
-        num_subscriptions = num_client_subscriptions(client)
-
-        response_parts = []
-        response_parts.append(b"$" + str(len("subscribe".encode())).encode() + b"\r\n" + b"subscribe" + b"\r\n")
-        response_parts.append(b"$" + str(len(channel.encode())).encode() + b"\r\n" + channel.encode() + b"\r\n")
-        response_parts.append(b":" + str(num_subscriptions).encode() + b"\r\n")  # Number of subscriptions
-
-        response = b"*" + str(len(response_parts)).encode() + b"\r\n" + b"".join(response_parts)
-        # client.sendall(response
-        return response
+        if not arguments:
+            return b"-ERR wrong number of arguments for 'subscribe' command\r\n"
+        return _pubsub_replies(b"subscribe", arguments, pubsub.CHANNELS.subscribe, pubsub.num_client_subscriptions, client, protocol)
 
     elif command == "PUBLISH":
         if len(arguments) != 2:
             response = b"-ERR wrong number of arguments for 'PUBLISH' command\r\n"
             # client.sendall(response
             return response
-        
-        channel = arguments[0]
-        message = arguments[1]
-        recipients = 0
-
-        with BLOCKING_CLIENTS_LOCK:
-            if channel in CHANNEL_SUBSCRIBERS:
-                subscribers = CHANNEL_SUBSCRIBERS[channel]
-                for subscriber in subscribers:
-                    # Construct the message RESP Array
-                    response_parts = []
-                    response_parts.append(b"$" + str(len("message".encode())).encode() + b"\r\n" + b"message" + b"\r\n")
-                    response_parts.append(b"$" + str(len(channel.encode())).encode() + b"\r\n" + channel.encode() + b"\r\n")
-                    response_parts.append(b"$" + str(len(message.encode())).encode() + b"\r\n" + message.encode() + b"\r\n")
-
-                    response = b"*" + str(len(response_parts)).encode() + b"\r\n" + b"".join(response_parts)
-                    try:
-                        subscriber.sendall(response)
-                        recipients += 1
-                    except Exception:
-                        pass  # Ignore send errors for subscribers
 
         # Send number of recipients to publisher
-        response = b":" + str(recipients).encode() + b"\r\n"
+        response = resp.integer(pubsub.publish(arguments[0], arguments[1]))
         # client.sendall(response
         return response
 
     elif command == "UNSUBSCRIBE":
-        channel = arguments[0] if arguments else ""
+        # Without arguments the client leaves every channel it subscribed to
+        channels = arguments or pubsub.CHANNELS.channels_of(client)
+        return _pubsub_replies(b"unsubscribe", channels, pubsub.CHANNELS.unsubscribe, pubsub.num_client_subscriptions, client, protocol)
 
-        unsubscribe(client, channel)
-        num_subscriptions = num_client_subscriptions(client)    
+    elif command == "PSUBSCRIBE":
+        if not arguments:
+            return b"-ERR wrong number of arguments for 'psubscribe' command\r\n"
+        return _pubsub_replies(b"psubscribe", arguments, pubsub.psubscribe, pubsub.num_client_subscriptions, client, protocol)
 
-        response_parts = []
-        response_parts.append(b"$" + str(len("unsubscribe".encode())).encode() + b"\r\n" + b"unsubscribe" + b"\r\n")
-        response_parts.append(b"$" + str(len(channel.encode())).encode() + b"\r\n" + channel.encode() + b"\r\n")
-        response_parts.append(b":" + str(num_subscriptions).encode() + b"\r\n")  # Number of subscriptions
-        response = b"*" + str(len(response_parts)).encode() + b"\r\n" + b"".join(response_parts)
-        # client.sendall(response
-        return response
+    elif command == "PUNSUBSCRIBE":
+        patterns = arguments or pubsub.get_client_patterns(client)
+        return _pubsub_replies(b"punsubscribe", patterns, pubsub.punsubscribe, pubsub.num_client_subscriptions, client, protocol)
+
+    elif command == "SSUBSCRIBE":
+        if not arguments:
+            return b"-ERR wrong number of arguments for 'ssubscribe' command\r\n"
+        return _pubsub_replies(b"ssubscribe", arguments, pubsub.SHARD_CHANNELS.subscribe, pubsub.SHARD_CHANNELS.count, client, protocol)
+
+    elif command == "SUNSUBSCRIBE":
+        channels = arguments or pubsub.SHARD_CHANNELS.channels_of(client)
+        return _pubsub_replies(b"sunsubscribe", channels, pubsub.SHARD_CHANNELS.unsubscribe, pubsub.SHARD_CHANNELS.count, client, protocol)
+
+    elif command == "SPUBLISH":
+        if len(arguments) != 2:
+            return b"-ERR wrong number of arguments for 'spublish' command\r\n"
+        return resp.integer(pubsub.spublish(arguments[0], arguments[1]))
+
+    elif command == "PUBSUB":
+        subcommand = arguments[0].upper() if arguments else b""
+        if subcommand in (b"CHANNELS", b"SHARDCHANNELS") and len(arguments) <= 2:
+            table = pubsub.CHANNELS if subcommand == b"CHANNELS" else pubsub.SHARD_CHANNELS
+            pattern = arguments[1] if len(arguments) == 2 else None
+            return resp.bulk_array(table.active_channels(pattern))
+        elif subcommand in (b"NUMSUB", b"SHARDNUMSUB"):
+            table = pubsub.CHANNELS if subcommand == b"NUMSUB" else pubsub.SHARD_CHANNELS
+            channels = arguments[1:]
+            writer = resp.RespWriter(protocol)
+            writer.array(len(channels) * 2)
+            for channel, count in zip(channels, table.numsub(channels)):
+                writer.bulk(channel)
+                writer.integer(count)
+            return writer.getvalue()
+        elif subcommand == b"NUMPAT" and len(arguments) == 1:
+            return resp.integer(pubsub.pubsub_numpat())
+        return b"-ERR unknown subcommand or wrong number of arguments for 'PUBSUB' command\r\n"
 
     elif command == "ZADD":
         if len(arguments) < 3:
@@ -848,30 +769,29 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         score_str = arguments[1]
         member = arguments[2]
 
-        try:
-            # The helper handles the addition/update and returns the count of new members (1 or 0).
-            num_new_elements = add_to_sorted_set(set_key, member, score_str)
-        except Exception:
-            # Catch exceptions from the helper (e.g., if score_str is not a number)
-            response = b"-ERR value is not a valid float\r\n"
-            # client.sendall(response
-            return response
+        # The helper handles the addition/update and returns the count of new members (1 or 0).
+        num_new_elements, error = add_to_sorted_set(set_key, member, score_str)
+        if error:
+            # Not a number, or the key holds another type
+            return error
 
         # ZADD returns the number of *newly added* elements.
         # Encode as a RESP Integer (e.g., :1\r\n)
-        response = b":" + str(num_new_elements).encode() + b"\r\n"
+        response = resp.integer(num_new_elements)
         # client.sendall(response
         return response
 
     elif command == "ZRANK":
-        set_key = arguments[0] if len(arguments) > 0 else ""
-        member = arguments[1] if len(arguments) > 1 else ""
+        set_key = arguments[0] if len(arguments) > 0 else b""
+        member = arguments[1] if len(arguments) > 1 else b""
 
-        rank = get_sorted_set_rank(set_key, member)
+        rank, error = get_sorted_set_rank(set_key, member)
+        if error:
+            return error
         if rank is None:
-            response = b"$-1\r\n"  # RESP Null Bulk String
+            response = resp.null(protocol)  # RESP Null Bulk String
         else:
-            response = b":" + str(rank).encode() + b"\r\n"
+            response = resp.integer(rank)
         
         # client.sendall(response
         return response
@@ -891,14 +811,41 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
             # client.sendall(response
             return response
 
+        with_scores = False
+        for option in arguments[3:]:
+            if option.upper() == b"WITHSCORES":
+                with_scores = True
+            else:
+                return b"-ERR syntax error\r\n"
 
-        list_of_members = get_sorted_set_range(set_key, start, end)
+        if not with_scores:
+            list_of_members, error = get_sorted_set_range(set_key, start, end)
+            if error:
+                return error
+            response = resp.bulk_array(list_of_members)
+            # client.sendall(response
+            return response
 
-        response_parts = []
-        for member in list_of_members:
-            member_bytes = member.encode() if isinstance(member, str) else bytes(member)
-            response_parts.append(b"$" + str(len(member_bytes)).encode() + b"\r\n" + member_bytes + b"\r\n")
-        response = b"*" + str(len(list_of_members)).encode() + b"\r\n" + b"".join(response_parts)
+        # WITHSCORES: a flat member/score array in RESP2, [member, double] pairs in RESP3
+        members_with_scores, error = get_sorted_set_range(set_key, start, end, with_scores=True)
+        if error:
+            return error
+        writer = resp.RespWriter(protocol)
+        if protocol == resp.RESP3:
+            writer.array(len(members_with_scores))
+            buffer = writer.buffer
+            for member, score in members_with_scores:
+                # Pair header, member and double written inline: three method calls per pair
+                # made RESP3 slower to produce than the flat RESP2 array
+                buffer += b"*2\r\n"
+                writer.bulk(member)
+                buffer += b",%s\r\n" % str(score).encode()
+        else:
+            writer.array(len(members_with_scores) * 2)
+            for member, score in members_with_scores:
+                writer.bulk(member)
+                writer.bulk(str(score).encode())
+        response = writer.getvalue()
         # client.sendall(response
         return response
 
@@ -910,13 +857,11 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         
         set_key = arguments[0]
         
-        with DATA_LOCK:
-            if set_key in SORTED_SETS:
-                cardinality = len(SORTED_SETS[set_key])
-            else:
-                cardinality = 0
+        cardinality, error = num_sorted_set_members(set_key)
+        if error:
+            return error
 
-        response = b":" + str(cardinality).encode() + b"\r\n"
+        response = resp.integer(cardinality)
         # client.sendall(response
         return response
 
@@ -929,15 +874,14 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         set_key = arguments[0]
         member = arguments[1]
 
-        score = get_zscore(set_key, member)
+        score, error = get_zscore(set_key, member)
+        if error:
+            return error
 
         if score is None:
-            response = b"$-1\r\n"  # RESP Null Bulk String
+            response = resp.null(protocol)  # RESP Null Bulk String
         else:
-            score_str = str(score)
-            score_bytes = score_str.encode()
-            length_bytes = str(len(score_bytes)).encode()
-            response = b"$" + length_bytes + b"\r\n" + score_bytes + b"\r\n"
+            response = resp.double(str(score).encode(), protocol)
 
         # client.sendall(response
         return response
@@ -951,9 +895,11 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         set_key = arguments[0]
         members = arguments[1]
 
-        removed_count = remove_from_sorted_set(set_key, members)
+        removed_count, error = remove_from_sorted_set(set_key, members)
+        if error:
+            return error
 
-        response = b":" + str(removed_count).encode() + b"\r\n"
+        response = resp.integer(removed_count)
         # client.sendall(response
         return response
     
@@ -972,9 +918,7 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         else:
             type_str = data_entry.get("type", "none")
 
-        type_bytes = type_str.encode()
-        length_bytes = str(len(type_bytes)).encode()
-        response = b"$" + length_bytes + b"\r\n" + type_bytes + b"\r\n"
+        response = resp.bulk_string(type_str.encode())
 
         # client.sendall(response
         return response
@@ -988,56 +932,25 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
             return response
         
         key = arguments[0]
-        entry_id = arguments[1]
+        # Stream IDs are protocol tokens ("1-0", "*"), the only part of XADD that is decoded
+        entry_id = arguments[1].decode()
         fields = {}
         for i in range(2, len(arguments) - 1, 2):
             fields[arguments[i]] = arguments[i + 1]
 
         new_entry_id_or_error = xadd(key, entry_id, fields)
 
-        i# Check if xadd returned an error (RESP errors start with '-')
+        # Check if xadd returned an error (RESP errors start with '-')
         if new_entry_id_or_error.startswith(b'-'):
             response = new_entry_id_or_error
             # client.sendall(response
             return response
-        else:
-            # Success: new_entry_id_or_error is the raw ID bytes (e.g. b"1-0").
-            # Format as a RESP Bulk String. Fixed the incorrect .encode() call on a bytes object.
-            raw_id_bytes = new_entry_id_or_error
-            blocked_client_condition = None
-            new_entry = None
-
-            with BLOCKING_STREAMS_LOCK:
-                if key in BLOCKING_STREAMS and BLOCKING_STREAMS[key]:
-                    blocked_client_condition = BLOCKING_STREAMS[key].pop(0)
-
-            if blocked_client_condition:
-            # Get the single new entry that was just added (it's the last one)
-                with DATA_LOCK: # Acquire lock to safely access STREAMS
-                    if key in STREAMS and STREAMS[key]:
-                        new_entry = STREAMS[key][-1]
-                
-                if new_entry:
-                    # Prepare the data structure for serialization (single entry for a single stream)
-                    stream_data_to_send = {key: [new_entry]}
-                    xread_block_response = _xread_serialize_response(stream_data_to_send)
-
-                    blocked_client_socket = blocked_client_condition.client_socket
-                    
-                    # Send the XREAD BLOCK response directly to the blocked client's socket.
-                    try:
-                        blocked_client_socket.sendall(xread_block_response)
-                    except Exception:
-                        pass # Ignore send errors
 
-                    # Wake up the blocked thread by notifying its Condition.
-                    with blocked_client_condition:
-                        blocked_client_condition.notify()
-
-            length_bytes = str(len(raw_id_bytes)).encode()
-            response = b"$" + length_bytes + b"\r\n" + raw_id_bytes + b"\r\n"
-            # client.sendall(response
-            return response
+        # Success: the raw ID bytes (e.g. b"1-0"). Blocked readers of the stream are
+        # served by serve_blocked_clients() once the command is done.
+        response = resp.bulk_string(new_entry_id_or_error)
+        # client.sendall(response
+        return response
 
     elif command == "XRANGE":
         if len(arguments) < 3:
@@ -1046,153 +959,30 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
             return response
         
         key = arguments[0]
-        start_id = arguments[1]
-        end_id = arguments[2]
-
-        entries = xrange(key, start_id, end_id)
-
-        response_parts = []
-        for entry in entries:
-            entry_id = entry["id"]
-            fields = entry["fields"]
-
-            # Construct RESP Array for each entry: [entry_id, [field1, value1, field2, value2, ...]]
-            entry_parts = []
-            entry_id_bytes = entry_id.encode()
-            entry_parts.append(b"$" + str(len(entry_id_bytes)).encode() + b"\r\n" + entry_id_bytes + b"\r\n")
-
-            # Now construct the inner array of fields and values
-            field_value_parts = []
-            for field, value in fields.items():
-                field_bytes = field.encode()
-                value_bytes = value.encode()
-                field_value_parts.append(b"$" + str(len(field_bytes)).encode() + b"\r\n" + field_bytes + b"\r\n")
-                field_value_parts.append(b"$" + str(len(value_bytes)).encode() + b"\r\n" + value_bytes + b"\r\n")
-
-            # Combine field/value parts into an array
-            field_value_array = b"*" + str(len(field_value_parts)).encode() + b"\r\n" + b"".join(field_value_parts)
-            entry_parts.append(field_value_array)
-
-            # Combine entry parts into an array
-            entry_array = b"*" + str(len(entry_parts)).encode() + b"\r\n" + b"".join(entry_parts)
-            response_parts.append(entry_array)
-        response = b"*" + str(len(response_parts)).encode() + b"\r\n" + b"".join(response_parts)
+        start_id = arguments[1].decode()
+        end_id = arguments[2].decode()
+
+        entries, error = xrange(key, start_id, end_id)
+        if error:
+            return error
+
+        # Each entry is an array: [entry_id, [field1, value1, field2, value2, ...]]
+        writer = resp.RespWriter(protocol)
+        streams.write_stream_entries(writer, entries)
+        response = writer.getvalue()
         # client.sendall(response
         return response
 
     elif command == "XREAD":
-        # Format: XREAD [BLOCK <ms>] STREAMS key1 key2 ... id1 id2 ...
-        
-        # 1. Parse optional BLOCK argument
-        arguments_start_index = 0
-        timeout_ms = None
-        
-        if len(arguments) >= 3 and arguments[0].upper() == "BLOCK":
-            try:
-                # Timeout is in milliseconds, convert to seconds for threading.wait
-                timeout_ms = int(arguments[1]) 
-                arguments_start_index = 2
-            except ValueError:
-                response = b"-ERR timeout is not an integer\r\n"
-                # client.sendall(response
-                return response
-        
-        # 2. Check for STREAMS keyword and argument count
-        if len(arguments) < arguments_start_index + 3 or arguments[arguments_start_index].upper() != "STREAMS":
-            response = b"-ERR wrong number of arguments or missing STREAMS keyword for 'XREAD' command\r\n"
-            # client.sendall(response
-            return response
-
-        # 3. Find the split point between keys and IDs
-        streams_keyword_index = arguments_start_index
-        args_after_streams = arguments[streams_keyword_index + 1:]
-        num_args_after_streams = len(args_after_streams)
-        
-        if num_args_after_streams % 2 != 0:
-            response = b"-ERR unaligned key/id pairs for 'XREAD' command\r\n"
-            # client.sendall(response
-            return response
+        # XREAD [COUNT n] [BLOCK ms] STREAMS key1 key2 ... id1 id2 ...
+        # Blocks on all the streams at once; inside a transaction it never blocks.
+        return streams.execute_xread(arguments, client, protocol, in_transaction)
 
-        num_keys = num_args_after_streams // 2
-        
-        keys_start_index = 0
-        keys = args_after_streams[keys_start_index : keys_start_index + num_keys]
-        ids_start_index = keys_start_index + num_keys
-        ids = args_after_streams[ids_start_index:]
-
-        resolved_ids = []
-        for key, last_id in zip(keys, ids):
-            if last_id == "$":
-                resolved_ids.append(get_stream_max_id(key))
-            else:
-                resolved_ids.append(last_id)
-        
-
-        # 4. Main XREAD logic loop (synchronous part - fast path)
-        stream_data = xread(keys, resolved_ids)
-        
-        if stream_data:
-            # Non-blocking path: Data is available. Serialize and send immediately.
-            response = _xread_serialize_response(stream_data)
-            # client.sendall(response
-            return response
-        
-        # 5. Blocking path
-        if timeout_ms is not None:
-            # We are blocking: list of entries is empty.
-
-            if timeout_ms == 0:
-                # BLOCK 0 means block indefinitely.
-                timeout = None
-            else:
-                # Convert ms to seconds.
-                timeout = timeout_ms / 1000.0
-            
-            # Since only one key/id pair is supported in this stage, enforce it for blocking
-            if len(keys) != 1:
-                response = b"-ERR only single key blocking supported in this stage\r\n"
-                # client.sendall(response
-                return response
-            
-            key_to_block = keys[0]
-
-            # Create and register the condition
-            client_condition = threading.Condition()
-            client_condition.client_socket = client
-            client_condition.key = key_to_block 
-
-            with BLOCKING_STREAMS_LOCK:
-                BLOCKING_STREAMS.setdefault(key_to_block, []).append(client_condition)
-
-            # Wait for notification or timeout
-            notified = False
-            with client_condition:
-                if timeout is None:
-                    notified = client_condition.wait()
-                else:
-                    notified = client_condition.wait(timeout)
-
-            # 6. Post-block handling
-            if notified:
-                # If True, XADD already sent the response.
-                return None 
-            else:
-                # Timeout occurred. Clean up the blocking registration.
-                with BLOCKING_STREAMS_LOCK:
-                    if client_condition in BLOCKING_STREAMS.get(key_to_block, []):
-                        BLOCKING_STREAMS[key_to_block].remove(client_condition)
-                        if not BLOCKING_STREAMS[key_to_block]:
-                            del BLOCKING_STREAMS[key_to_block]
-                
-                # Send Null Array response on timeout: Redis returns "*-1\r\n"
-                response = b"*-1\r\n"
-                # client.sendall(response
-                return response
+    elif command == "XREADGROUP":
+        return streams.execute_xreadgroup(arguments, client, protocol, in_transaction)
 
-        # 7. Non-blocking path (no data, no BLOCK keyword) - returns Null Array
-        response = b"*0\r\n" 
-        # client.sendall(response
-        return response
+    elif command in ("XGROUP", "XACK", "XPENDING", "XCLAIM", "XAUTOCLAIM"):
+        return streams.execute_group_command(command, arguments, protocol)
 
     elif command == "INCR":
         if len(arguments) != 1:
@@ -1211,10 +1001,512 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
             return error_message.encode()
         else:
             # Success: new_value is an integer. Return RESP Integer.
-            response = b":" + str(new_value).encode() + b"\r\n"
+            response = resp.integer(new_value)
             # client.sendall(response
             return response
 
+    elif command in ("INCRBY", "DECRBY", "DECR"):
+        expected_arguments = 1 if command == "DECR" else 2
+        if len(arguments) != expected_arguments:
+            return b"-ERR wrong number of arguments for '" + command.lower().encode() + b"' command\r\n"
+
+        if command == "DECR":
+            increment = -1
+        else:
+            try:
+                increment = int(arguments[1])
+            except ValueError:
+                return b"-ERR value is not an integer or out of range\r\n"
+            if command == "DECRBY":
+                increment = -increment
+
+        new_value, error_message = increment_key_value(arguments[0], increment)
+        if error_message:
+            return error_message.encode()
+        return resp.integer(new_value)
+
+    elif command == "INCRBYFLOAT":
+        if len(arguments) != 2:
+            return b"-ERR wrong number of arguments for 'incrbyfloat' command\r\n"
+
+        new_value, error = increment_key_by_float(arguments[0], arguments[1])
+        if error:
+            return error
+        return resp.bulk_string(new_value)
+
+    elif command == "MGET":
+        if not arguments:
+            return b"-ERR wrong number of arguments for 'mget' command\r\n"
+
+        # All keys are read under one DATA_LOCK acquisition, and the reply is
+        # written into a single buffer.
+        return resp.bulk_array(mget(arguments), protocol)
+
+    elif command in ("MSET", "MSETNX"):
+        if not arguments or len(arguments) % 2 != 0:
+            return b"-ERR wrong number of arguments for '" + command.lower().encode() + b"' command\r\n"
+
+        was_set = mset(arguments, only_if_none_exist=(command == "MSETNX"))
+        if command == "MSET":
+            return resp.OK
+        return resp.ONE if was_set else resp.ZERO
+
+    elif command == "SETNX":
+        if len(arguments) != 2:
+            return b"-ERR wrong number of arguments for 'setnx' command\r\n"
+
+        return resp.ONE if mset(arguments, only_if_none_exist=True) else resp.ZERO
+
+    elif command == "GETSET":
+        if len(arguments) != 2:
+            return b"-ERR wrong number of arguments for 'getset' command\r\n"
+
+        old_value, error = getset(arguments[0], arguments[1])
+        if error:
+            return error
+        if old_value is None:
+            return resp.null(protocol)
+        return resp.bulk_string(old_value)
+
+    elif command == "APPEND":
+        if len(arguments) != 2:
+            return b"-ERR wrong number of arguments for 'append' command\r\n"
+
+        new_length, error = append_to_string(arguments[0], arguments[1])
+        if error:
+            return error
+        return resp.integer(new_length)
+
+    elif command == "STRLEN":
+        if len(arguments) != 1:
+            return b"-ERR wrong number of arguments for 'strlen' command\r\n"
+
+        data_entry = get_data_entry(arguments[0])
+        if data_entry is None:
+            return resp.ZERO
+        if data_entry.get("type") != "string":
+            return WRONGTYPE_ERROR
+        return resp.integer(len(string_value_to_bytes(data_entry["value"])))
+
+    elif command == "GETRANGE":
+        if len(arguments) != 3:
+            return b"-ERR wrong number of arguments for 'getrange' command\r\n"
+
+        try:
+            start = int(arguments[1])
+            end = int(arguments[2])
+        except ValueError:
+            return b"-ERR value is not an integer or out of range\r\n"
+
+        value, error = get_string_range(arguments[0], start, end)
+        if error:
+            return error
+        return resp.bulk_string(value)
+
+    elif command == "SETRANGE":
+        if len(arguments) != 3:
+            return b"-ERR wrong number of arguments for 'setrange' command\r\n"
+
+        try:
+            offset = int(arguments[1])
+        except ValueError:
+            return b"-ERR value is not an integer or out of range\r\n"
+        if offset < 0:
+            return b"-ERR offset is out of range\r\n"
+        if offset + len(arguments[2]) > 512 * 1024 * 1024:
+            return b"-ERR string exceeds maximum allowed size (proto-max-bulk-len)\r\n"
+
+        new_length, error = set_string_range(arguments[0], offset, arguments[2])
+        if error:
+            return error
+        return resp.integer(new_length)
+
+    elif command in ("GETEX", "GETDEL"):
+        if not arguments or (command == "GETDEL" and len(arguments) != 1):
+            return b"-ERR wrong number of arguments for '" + command.lower().encode() + b"' command\r\n"
+
+        # GETEX key [EX seconds | PX milliseconds | EXAT unix-time | PXAT unix-time-ms | PERSIST]
+        expiry_timestamp = None
+        persist = False
+        options = arguments[1:]
+        if options:
+            option = options[0].upper()
+            if option == b"PERSIST" and len(options) == 1:
+                persist = True
+            elif option in (b"EX", b"PX", b"EXAT", b"PXAT") and len(options) == 2:
+                try:
+                    amount = int(options[1])
+                except ValueError:
+                    return b"-ERR value is not an integer or out of range\r\n"
+                if amount <= 0:
+                    return b"-ERR invalid expire time in 'getex' command\r\n"
+
+                current_time = int(time.time() * 1000)
+                if option == b"EX":
+                    expiry_timestamp = current_time + amount * 1000
+                elif option == b"PX":
+                    expiry_timestamp = current_time + amount
+                elif option == b"EXAT":
+                    expiry_timestamp = amount * 1000
+                else:
+                    expiry_timestamp = amount
+            else:
+                return b"-ERR syntax error\r\n"
+
+        value, error = get_string_and_update(
+            arguments[0],
+            delete=(command == "GETDEL"),
+            expiry_timestamp=expiry_timestamp,
+            persist=persist,
+        )
+        if error:
+            return error
+        if value is None:
+            return resp.null(protocol)
+        return resp.bulk_string(value)
+
+    elif command in ("DEL", "UNLINK"):
+        # DEL key [key ...]: frees inline unless lazyfree-lazy-user-del; UNLINK always lazily
+        if not arguments:
+            return b"-ERR wrong number of arguments for '" + command.lower().encode() + b"' command\r\n"
+        lazy = command == "UNLINK" or SERVER_CONFIG["lazyfree-lazy-user-del"]
+        deleted = delete_keys(arguments, lazy)
+        if NOTIFY_STATE["flags"]:
+            notify.keys_deleted(deleted)
+        return resp.integer(len(deleted))
+
+    elif command in ("FLUSHALL", "FLUSHDB"):
+        # FLUSHALL [ASYNC | SYNC]; without an option, lazyfree-lazy-user-flush decides
+        if len(arguments) > 1:
+            return b"-ERR wrong number of arguments for '" + command.lower().encode() + b"' command\r\n"
+        if arguments:
+            option = arguments[0].upper()
+            if option not in (b"ASYNC", b"SYNC"):
+                return b"-ERR syntax error\r\n"
+            lazy = option == b"ASYNC"
+        else:
+            lazy = bool(SERVER_CONFIG["lazyfree-lazy-user-flush"])
+        flush_keyspace(lazy, all_databases=command == "FLUSHALL")
+        return resp.OK
+
+    elif command == "SELECT":
+        if len(arguments) != 1:
+            return b"-ERR wrong number of arguments for 'select' command\r\n"
+        index, error = _parse_db_index(arguments[0], command)
+        if error:
+            return error
+        select_database(index)
+        return resp.OK
+
+    elif command == "SWAPDB":
+        if len(arguments) != 2:
+            return b"-ERR wrong number of arguments for 'swapdb' command\r\n"
+        first, error = _parse_db_index(arguments[0], command)
+        if error:
+            return error
+        second, error = _parse_db_index(arguments[1], command)
+        if error:
+            return error
+        swap_databases(first, second)
+        return resp.OK
+
+    elif command == "MOVE":
+        # MOVE key db
+        if len(arguments) != 2:
+            return b"-ERR wrong number of arguments for 'move' command\r\n"
+        key = arguments[0]
+        target, error = _parse_db_index(arguments[1], command)
+        if error:
+            return error
+        if target == selected_index():
+            return b"-ERR source and destination objects are the same\r\n"
+        if not move_key(key, target):
+            return resp.integer(0)
+        # The source database is accounted after the command, like any write
+        with using_database(target):
+            memory.account_keys([key])
+        if NOTIFY_STATE["flags"]:
+            notify.key_moved(key, target)
+        return resp.integer(1)
+
+    elif command == "DBSIZE":
+        if arguments:
+            return b"-ERR wrong number of arguments for 'dbsize' command\r\n"
+        return resp.integer(len(DATA_STORE))
+
+    elif command == "HSET":
+        # HSET key field value [field value ...]
+        if len(arguments) < 3 or len(arguments) % 2 != 1:
+            return b"-ERR wrong number of arguments for 'hset' command\r\n"
+
+        added, error = hset(arguments[0], arguments[1:])
+        if error:
+            return error
+        return resp.integer(added)
+
+    elif command == "HGET":
+        if len(arguments) != 2:
+            return b"-ERR wrong number of arguments for 'hget' command\r\n"
+
+        value, error = hget(arguments[0], arguments[1])
+        if error:
+            return error
+        if value is None:
+            return resp.null(protocol)
+        return resp.bulk_string(value)
+
+    elif command == "HMGET":
+        if len(arguments) < 2:
+            return b"-ERR wrong number of arguments for 'hmget' command\r\n"
+
+        values, error = hmget(arguments[0], arguments[1:])
+        if error:
+            return error
+        return resp.bulk_array(values, protocol)
+
+    elif command == "HGETALL":
+        if len(arguments) != 1:
+            return b"-ERR wrong number of arguments for 'hgetall' command\r\n"
+
+        items, error = hgetall(arguments[0])
+        if error:
+            return error
+
+        writer = resp.RespWriter(protocol)
+        writer.map(len(items))
+        for field, value in items:
+            writer.bulk(field)
+            writer.bulk(value)
+        return writer.getvalue()
+
+    elif command == "HDEL":
+        if len(arguments) < 2:
+            return b"-ERR wrong number of arguments for 'hdel' command\r\n"
+
+        removed, error = hdel(arguments[0], arguments[1:])
+        if error:
+            return error
+        return resp.integer(removed)
+
+    elif command == "HINCRBY":
+        if len(arguments) != 3:
+            return b"-ERR wrong number of arguments for 'hincrby' command\r\n"
+
+        try:
+            increment = int(arguments[2])
+        except ValueError:
+            return b"-ERR value is not an integer or out of range\r\n"
+
+        new_value, error = hincrby(arguments[0], arguments[1], increment)
+        if error:
+            return error
+        return resp.integer(new_value)
+
+    elif command == "HLEN":
+        if len(arguments) != 1:
+            return b"-ERR wrong number of arguments for 'hlen' command\r\n"
+
+        length, error = hlen(arguments[0])
+        if error:
+            return error
+        return resp.integer(length)
+
+    elif command == "HEXISTS":
+        if len(arguments) != 2:
+            return b"-ERR wrong number of arguments for 'hexists' command\r\n"
+
+        value, error = hget(arguments[0], arguments[1])
+        if error:
+            return error
+        return resp.ONE if value is not None else resp.ZERO
+
+    elif command == "HSCAN":
+        # HSCAN key cursor [MATCH pattern] [COUNT count]
+        if len(arguments) < 2:
+            return b"-ERR wrong number of arguments for 'hscan' command\r\n"
+
+        try:
+            cursor = int(arguments[1])
+        except ValueError:
+            return b"-ERR invalid cursor\r\n"
+
+        pattern = None
+        count = 10
+        i = 2
+        while i < len(arguments):
+            option = arguments[i].upper()
+            if option == b"MATCH" and i + 1 < len(arguments):
+                pattern = arguments[i + 1]
+            elif option == b"COUNT" and i + 1 < len(arguments):
+                try:
+                    count = int(arguments[i + 1])
+                except ValueError:
+                    return b"-ERR value is not an integer or out of range\r\n"
+                if count < 1:
+                    return b"-ERR syntax error\r\n"
+            else:
+                return b"-ERR syntax error\r\n"
+            i += 2
+
+        next_cursor, items, error = hscan(arguments[0], cursor, pattern, count)
+        if error:
+            return error
+
+        writer = resp.RespWriter(protocol)
+        writer.array(2)
+        writer.bulk(b"%d" % next_cursor)
+        writer.array(len(items) * 2)
+        for field, value in items:
+            writer.bulk(field)
+            writer.bulk(value)
+        return writer.getvalue()
+
+    elif command in ("SADD", "SREM"):
+        if len(arguments) < 2:
+            return b"-ERR wrong number of arguments for '" + command.lower().encode() + b"' command\r\n"
+
+        if command == "SADD":
+            count, error = sadd(arguments[0], arguments[1:])
+        else:
+            count, error = srem(arguments[0], arguments[1:])
+        if error:
+            return error
+        return resp.integer(count)
+
+    elif command == "SISMEMBER":
+        if len(arguments) != 2:
+            return b"-ERR wrong number of arguments for 'sismember' command\r\n"
+
+        flags, error = smismember(arguments[0], arguments[1:])
+        if error:
+            return error
+        return resp.integer(flags[0])
+
+    elif command == "SMISMEMBER":
+        if len(arguments) < 2:
+            return b"-ERR wrong number of arguments for 'smismember' command\r\n"
+
+        flags, error = smismember(arguments[0], arguments[1:])
+        if error:
+            return error
+        writer = resp.RespWriter(protocol)
+        writer.array(len(flags))
+        for flag in flags:
+            writer.integer(flag)
+        return writer.getvalue()
+
+    elif command == "SCARD":
+        if len(arguments) != 1:
+            return b"-ERR wrong number of arguments for 'scard' command\r\n"
+
+        cardinality, error = scard(arguments[0])
+        if error:
+            return error
+        return resp.integer(cardinality)
+
+    elif command in ("SMEMBERS", "SINTER", "SUNION", "SDIFF"):
+        if not arguments or (command == "SMEMBERS" and len(arguments) != 1):
+            return b"-ERR wrong number of arguments for '" + command.lower().encode() + b"' command\r\n"
+
+        if command == "SMEMBERS":
+            members, error = smembers(arguments[0])
+        elif command == "SINTER":
+            members, error = sinter(arguments)
+        elif command == "SUNION":
+            members, error = sunion(arguments)
+        else:
+            members, error = sdiff(arguments)
+        if error:
+            return error
+
+        # A set reply in RESP3, a plain array in RESP2
+        writer = resp.RespWriter(protocol)
+        writer.set(len(members))
+        writer.bulks(members)
+        return writer.getvalue()
+
+    elif command == "SINTERSTORE":
+        if len(arguments) < 2:
+            return b"-ERR wrong number of arguments for 'sinterstore' command\r\n"
+
+        cardinality, error = sinterstore(arguments[0], arguments[1:])
+        if error:
+            return error
+        return resp.integer(cardinality)
+
+    elif command == "SINTERCARD":
+        # SINTERCARD numkeys key [key ...] [LIMIT limit]
+        try:
+            num_keys = int(arguments[0]) if arguments else 0
+        except ValueError:
+            return b"-ERR numkeys should be greater than 0\r\n"
+        if num_keys <= 0:
+            return b"-ERR numkeys should be greater than 0\r\n"
+        if len(arguments) < 1 + num_keys:
+            return b"-ERR Number of keys can't be greater than number of args\r\n"
+
+        limit = 0
+        rest = arguments[1 + num_keys:]
+        if rest:
+            if len(rest) != 2 or rest[0].upper() != b"LIMIT":
+                return b"-ERR syntax error\r\n"
+            try:
+                limit = int(rest[1])
+            except ValueError:
+                return b"-ERR LIMIT can't be negative\r\n"
+            if limit < 0:
+                return b"-ERR LIMIT can't be negative\r\n"
+
+        cardinality, error = sintercard(arguments[1:1 + num_keys], limit)
+        if error:
+            return error
+        return resp.integer(cardinality)
+
+    elif command in ("SRANDMEMBER", "SPOP"):
+        if len(arguments) not in (1, 2):
+            return b"-ERR wrong number of arguments for '" + command.lower().encode() + b"' command\r\n"
+
+        count = None
+        if len(arguments) == 2:
+            try:
+                count = int(arguments[1])
+            except ValueError:
+                return b"-ERR value is not an integer or out of range\r\n"
+            if command == "SPOP" and count < 0:
+                return b"-ERR value is out of range, must be positive\r\n"
+
+        if command == "SPOP":
+            members, error = spop(arguments[0], 1 if count is None else count)
+        else:
+            members, error = srandmember(arguments[0], count)
+        if error:
+            return error
+
+        # Without a count the reply is a single bulk string (or nil)
+        if count is None:
+            if not members:
+                return resp.null(protocol)
+            return resp.bulk_string(members[0])
+        return resp.bulk_array(members)
+
+    elif command == "OBJECT":
+        # Only OBJECT ENCODING is supported; it reports the compact encodings in use.
+        if len(arguments) != 2 or arguments[0].upper() != b"ENCODING":
+            return b"-ERR unknown subcommand or wrong number of arguments for 'object' command\r\n"
+
+        data_entry = get_data_entry(arguments[1])
+        if data_entry is None:
+            return resp.null(protocol)
+
+        encoding = data_entry.get("encoding")
+        if encoding is None and data_entry.get("type") == "string":
+            # Same thresholds as Redis: ints, short strings (embedded) and the rest
+            value = data_entry["value"]
+            encoding = "int" if type(value) is int else ("embstr" if len(value) <= 44 else "raw")
+        if encoding is None:
+            encoding = {"string": "raw", "list": "quicklist", "sorted_set": "skiplist", "stream": "stream"}.get(data_entry.get("type"), "raw")
+        return resp.bulk_string(encoding.encode())
+
     elif command == "MULTI":
 
         if is_client_in_multi(client):
@@ -1225,7 +1517,7 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         # Set the client's state to "in transaction"
         set_client_in_multi(client, True)
         
-        response = b"+OK\r\n"
+        response = resp.OK
         # client.sendall(response
         return response
 
@@ -1233,52 +1525,91 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         if is_client_in_multi(client):
 
             queued_commands = get_client_queued_commands(client)
+            aborted = is_client_multi_aborted(client)
             set_client_in_multi(client, False)
+            if aborted:
+                unwatch_all_keys(client)
+                return b"-EXECABORT Transaction discarded because of previous errors.\r\n"
+
+            # The whole transaction runs under one hold of DATA_LOCK: the WATCH check and
+            # every queued command, with no other client's command in between
+            with DATA_LOCK:
+                if watched_keys_changed(client):
+                    unwatch_all_keys(client)
+                    return resp.null_array(protocol)
+                unwatch_all_keys(client)
+
+                if not queued_commands:
+                    # The required response for an empty transaction is an empty RESP Array.
+                    response = resp.EMPTY_ARRAY
+                    # client.sendall(response
+                    return response
 
-            if not queued_commands:
-                # The required response for an empty transaction is an empty RESP Array.
-                response = b"*0\r\n"
-                # client.sendall(response
-                return response
-            
-            # 4. Execute all queued commands and collect responses
-            response_parts = []
-            for cmd, args in queued_commands:
-                # Recursively call execute_single_command for each queued command
-                # The execution should not cause nested queuing, as the multi flag is now False
-                # and the recursive call won't re-trigger the main handle_command's checks.
-                try:
-                    # We pass the client socket for execution (e.g., SET/INCR needs it)
-                    cmd_response = execute_single_command(cmd, args, client)
-                    
-                    # EXEC only returns the actual response, never a connection close signal
-                    if cmd == "QUIT":
-                        cmd_response = b"+OK\r\n" # We don't actually close the connection yet
-                    
-                    # Check for blocking/transaction control commands that might return False/True signals
-                    if isinstance(cmd_response, bool):
-                        # This should not happen if the refactoring is correct, but defensively use a generic error
-                        cmd_response = b"-ERR Internal execution error\r\n" 
-
-                except Exception:
-                    # This catches errors during the execution of a queued command (e.g., wrong type)
-                    cmd_response = b"-ERR EXEC-failed during command execution\r\n" 
-                
-                response_parts.append(cmd_response)
+                # 4. Execute all queued commands and write their replies into one array
+                writer = resp.RespWriter(protocol)
+                writer.array(len(queued_commands))
+                for cmd, args in queued_commands:
+                    # Recursively call execute_single_command for each queued command
+                    # The execution should not cause nested queuing, as the multi flag is now False
+                    # and the recursive call won't re-trigger the main handle_command's checks.
+                    try:
+                        # We pass the client socket for execution (e.g., SET/INCR needs it)
+                        cmd_response = execute_single_command(cmd, args, client, in_transaction=True)
 
-            # 5. Assemble the final RESP Array
-            final_response = b"*" + str(len(response_parts)).encode() + b"\r\n" + b"".join(response_parts)
-            
-            return final_response
+                        # EXEC only returns the actual response, never a connection close signal
+                        if cmd == "QUIT":
+                            cmd_response = resp.OK # We don't actually close the connection yet
+
+                        # Check for blocking/transaction control commands that might return False/True signals
+                        if isinstance(cmd_response, bool):
+                            # This should not happen if the refactoring is correct, but defensively use a generic error
+                            cmd_response = b"-ERR Internal execution error\r\n"
+
+                    except Exception:
+                        # This catches errors during the execution of a queued command (e.g., wrong type)
+                        cmd_response = b"-ERR EXEC-failed during command execution\r\n"
+
+                    if tracking.TRACKING_CLIENTS:
+                        _track_command(cmd, args, cmd_response, client)
+
+                    writer.raw(cmd_response)
+
+            return writer.getvalue()
         else:
             response = b"-ERR EXEC without MULTI\r\n"
             # client.sendall(response
             return response
+
+    elif command in ("EVAL", "EVALSHA"):
+        # Runs with DATA_LOCK held (a write command), so the whole script is atomic
+        def run_command(name: str, args: list) -> tuple:
+            reply = execute_single_command(name, args, client, in_transaction=True)
+            if tracking.TRACKING_CLIENTS:
+                _track_command(name, args, reply, client)
+            return reply, name in WRITE_COMMANDS
+
+        return scripting.execute_eval(command, arguments, run_command, protocol)
+
+    elif command == "SCRIPT":
+        return scripting.execute_script_command(arguments)
+
+    elif command == "WATCH":
+        if not arguments:
+            return b"-ERR wrong number of arguments for 'watch' command\r\n"
+        if is_client_in_multi(client):
+            return b"-ERR WATCH inside MULTI is not allowed\r\n"
+        watch_keys(client, arguments)
+        return resp.OK
+
+    elif command == "UNWATCH":
+        unwatch_all_keys(client)
+        return resp.OK
     
     elif command == "DISCARD":
         if is_client_in_multi(client):
-            response = b"+OK\r\n"
+            response = resp.OK
             set_client_in_multi(client, False)
+            unwatch_all_keys(client)
             # client.sendall(response
             return response
         else:
@@ -1292,7 +1623,7 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
             # but for this stage, we'll only respond with the replication section if no argument is provided.
             section = "replication"
         elif len(arguments) == 1:
-            section = arguments[0].lower()
+            section = arguments[0].lower().decode()
         else:
             response = b"-ERR wrong number of arguments for 'INFO' command\r\n"
             return response
@@ -1308,23 +1639,42 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
                 info_content += f"master_replid:{MASTER_REPLID}\r\n"
                 info_content += f"master_repl_offset:{MASTER_REPL_OFFSET}\r\n"
             
-            # Encode the string as a RESP Bulk String
-            info_bytes = info_content.encode()
-            length_bytes = str(len(info_bytes)).encode()
-            
-            # Format: $length\r\ncontent\r\n
-            response = b"$" + length_bytes + b"\r\n" + info_bytes + b"\r\n"
+            # Encode the string as a RESP Bulk String. Format: $length\r\ncontent\r\n
+            response = resp.verbatim(info_content.encode(), protocol)
             
             return response
 
+        elif section == "cluster":
+            info_content = f"# Cluster\r\ncluster_enabled:{1 if cluster.CLUSTER_ENABLED else 0}\r\n"
+            response = resp.verbatim(info_content.encode(), protocol)
+            return response
+
+        elif section == "memory":
+            info_content = memory.memory_info()
+            response = resp.verbatim(info_content.encode(), protocol)
+            return response
+
+        elif section == "keyspace":
+            info_content = "# Keyspace\r\n"
+            with DATA_LOCK:
+                for index, database in enumerate(DATABASES):
+                    if database.store:
+                        info_content += (f"db{index}:keys={len(database.store)},"
+                                         f"expires={database.volatile},avg_ttl=0\r\n")
+            response = resp.verbatim(info_content.encode(), protocol)
+            return response
+
+        elif section == "stats":
+            info_content = f"# Stats\r\nevicted_keys:{memory.MEMORY_STATE['evicted_keys']}\r\n" + geo.cache_info()
+            response = resp.verbatim(info_content.encode(), protocol)
+            return response
+
         else:
             # For unsupported sections, return an empty bulk string (or whatever 
             # the specific server behavior is, but an empty one is often safe for unimplemented)
             # A simpler approach is to return a bulk string containing only the section header.
             info_content = f"#{section.capitalize()}\r\n"
-            info_bytes = info_content.encode()
-            length_bytes = str(len(info_bytes)).encode()
-            response = b"$" + length_bytes + b"\r\n" + info_bytes + b"\r\n"
+            response = resp.verbatim(info_content.encode(), protocol)
             return response
         
     elif command == "WAIT":
@@ -1345,9 +1695,10 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         start_time = time.time()
 
         # Optimization: If target is 0, required replicas is 0, or no replicas are connected, return immediately.
-        if target_offset == 0 or num_replicas_required == 0 or not REPLICA_SOCKETS:
+        # Inside EXEC it doesn't wait either, as it would hold DATA_LOCK all that time.
+        if target_offset == 0 or num_replicas_required == 0 or not REPLICA_SOCKETS or in_transaction:
             num_connected = len(REPLICA_SOCKETS)
-            return b":" + str(num_connected).encode() + b"\r\n"
+            return resp.integer(num_connected)
 
         # The master must send GETACK to all replicas to get their current offset
         getack_command = b"*3\r\n$8\r\nREPLCONF\r\n$6\r\nGETACK\r\n$1\r\n*\r\n"
@@ -1407,48 +1758,11 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
                         final_acknowledged_count += 1
                     
         # Return the final count as a RESP Integer
-        response = b":" + str(final_acknowledged_count).encode() + b"\r\n"
+        response = resp.integer(final_acknowledged_count)
         return response
     
     elif command == "GEOADD":
-        # GEOADD <key> <longitude> <latitude> <member>
-        if len(arguments) < 4:
-            response = b"-ERR wrong number of arguments for 'GEOADD' command\r\n"
-            return response
-        
-        key = arguments[0]
-        longitude_str = arguments[1]
-        latitude_str = arguments[2]
-        member = arguments[3]
-        
-        # 1. Validate coordinates
-        try:
-            longitude = float(longitude_str)
-            latitude = float(latitude_str)
-        except ValueError:
-            error_msg = b"-ERR value is not a valid float\r\n"
-            return error_msg
-
-        # 2. Check Longitude range [-180, 180]
-        if not (MIN_LON <= longitude <= MAX_LON):
-            error_msg = f"-ERR invalid longitude,latitude pair {longitude:.6f},{latitude:.6f}\r\n".encode()
-            return error_msg
-
-        # 3. Check Latitude range [-85.05112878, 85.05112878]
-        if not (MIN_LAT <= latitude <= MAX_LAT):
-            error_msg = f"-ERR invalid longitude,latitude pair {longitude:.6f},{latitude:.6f}\r\n".encode()
-            return error_msg
-            
-        # 4. Persistence: Calculate geohash score and add to sorted set
-        score = encode_geohash(latitude, longitude)
-        score_str = str(score)
-        
-        # add_to_sorted_set returns 1 if a new element was added, or 0 if an existing member was updated.
-        num_new_elements = add_to_sorted_set(key, member, score_str)
-        
-        # 5. Return the count as a RESP Integer
-        response = b":" + str(num_new_elements).encode() + b"\r\n"
-        return response
+        return geo.execute_geoadd(arguments)
    
     elif command == "GEOPOS":
         if len(arguments) < 2:
@@ -1457,14 +1771,19 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         key = arguments[0]
         members = arguments[1:]
         
-        final_response_parts = []
+        # Every member's score from one lookup of the key
+        scores, error = get_zscores(key, members)
+        if error:
+            return error
+
+        writer = resp.RespWriter(protocol)
+        writer.array(len(members))
         
-        for member in members:
-            score_float = get_zscore(key, member) 
+        for score_float in scores:
             
             if score_float is None:
                 # Member or key does not exist: Null Array (*-1\r\n)
-                final_response_parts.append(b"*-1\r\n")
+                writer.null_array()
                 continue
                 
             # Logic for FOUND member
@@ -1472,10 +1791,10 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
             
             # Returns (longitude, latitude)
             try:
-                longitude, latitude = decode_geohash_to_coords(score_int)
+                longitude, latitude = geo.decode_geohash_to_coords(score_int)
             except Exception:
                 # Internal error during decoding
-                final_response_parts.append(b"*-1\r\n")
+                writer.null_array()
                 continue
 
             # 4. Format coordinates as RESP Bulk Strings (Reverted to robust float string conversion)
@@ -1485,19 +1804,13 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
             lon_str = str(longitude)
             lat_str = str(latitude)
             
-            # Format as Bulk Strings
-            lon_bytes = lon_str.encode()
-            lat_bytes = lat_str.encode()
-            lon_resp = b"$" + str(len(lon_bytes)).encode() + b"\r\n" + lon_bytes + b"\r\n"
-            lat_resp = b"$" + str(len(lat_bytes)).encode() + b"\r\n" + lat_bytes + b"\r\n"
-            
             # Final response for an existing member: *2\r\n<lon_resp><lat_resp>
-            member_resp = b"*2\r\n" + lon_resp + lat_resp
-            final_response_parts.append(member_resp)
+            writer.array(2)
+            writer.double(lon_str.encode())
+            writer.double(lat_str.encode())
 
-        # 5. Wrap all individual responses in the final RESP array
-        response = b"*" + str(len(final_response_parts)).encode() + b"\r\n" + b"".join(final_response_parts)
-        return response
+        # 5. All individual responses were written into the final RESP array
+        return writer.getvalue()
 
     elif command == "GEODIST":
         if len(arguments) != 3:
@@ -1508,24 +1821,26 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         member2 = arguments[2]
 
         # 1. Retrieve scores
-        score1_float = get_zscore(key, member1)
-        score2_float = get_zscore(key, member2)
+        scores, error = get_zscores(key, [member1, member2])
+        if error:
+            return error
+        score1_float, score2_float = scores
 
         if score1_float is None or score2_float is None:
             # If key/member not found, return Null Bulk String
-            return b"$-1\r\n"
+            return resp.null(protocol)
 
         # 2. Decode scores to coordinates
         try:
             # decode_geohash_to_coords returns (longitude, latitude)
-            lon1, lat1 = decode_geohash_to_coords(int(score1_float))
-            lon2, lat2 = decode_geohash_to_coords(int(score2_float))
+            lon1, lat1 = geo.decode_geohash_to_coords(int(score1_float))
+            lon2, lat2 = geo.decode_geohash_to_coords(int(score2_float))
         except Exception:
             # Internal decoding error
-            return b"$-1\r\n"
+            return resp.null(protocol)
 
         # 3. Calculate distance
-        distance = haversine_distance(lon1, lat1, lon2, lat2)
+        distance = geo.haversine_distance(lon1, lat1, lon2, lat2)
 
         # 4. Format and return as RESP Bulk String (meters)
         # Use a string format for high precision (up to 4 decimal places required)
@@ -1534,121 +1849,226 @@ def execute_single_command(command: str, arguments: list, client: socket.socket)
         
         distance_bytes = distance_str.encode()
         
-        response = b"$" + str(len(distance_bytes)).encode() + b"\r\n" + distance_bytes + b"\r\n"
+        response = resp.double(distance_bytes, protocol)
         return response
 
     elif command == "GEOSEARCH":
-        # GEOSEARCH <key> FROMLONLAT <lon> <lat> BYRADIUS <radius> <unit>
-        if len(arguments) != 7:
-            return b"-ERR wrong number of arguments for 'GEOSEARCH' command\r\n"
+        return geo.execute_geosearch(arguments, protocol)
 
-        key = arguments[0]
-        from_keyword = arguments[1].upper()
-        by_keyword = arguments[4].upper()
-        
-        if from_keyword != "FROMLONLAT" or by_keyword != "BYRADIUS":
-            return b"-ERR syntax error\r\n"
+    elif command == "CLIENT":
+        return tracking.execute_client_command(client, arguments)
 
-        try:
-            center_lon = float(arguments[2])
-            center_lat = float(arguments[3])
-            radius = float(arguments[5])
-            unit = arguments[6]
-        except ValueError:
-            return b"-ERR invalid coordinates or radius\r\n"
-        
-        # 1. Convert radius to meters
-        try:
-            search_radius_m = convert_to_meters(radius, unit)
-        except ValueError:
-            return b"-ERR invalid unit specified\r\n"
+    elif command == "CLUSTER":
+        return cluster.execute_cluster_command(arguments)
 
-        # 2. Get all members in the GeoKey (Sorted Set)
-        with DATA_LOCK:
-            if key not in SORTED_SETS:
-                return b"*0\r\n"
-            members_scores = SORTED_SETS.get(key, {}).items()
+    elif command == "ASKING":
+        if not cluster.CLUSTER_ENABLED:
+            return cluster.CLUSTER_DISABLED_ERROR
+        # The flag is consumed by the next command's redirection check
+        set_client_asking(client, True)
+        return resp.OK
 
-        matching_members = []
+    elif command == "DUMP":
+        if len(arguments) != 1:
+            return b"-ERR wrong number of arguments for 'dump' command\r\n"
 
-        # 3. Iterate, decode coordinates, and check distance
-        for member_name, score_float in members_scores:
-            try:
-                # Decode score to get location coordinates: returns (longitude, latitude)
-                member_lon, member_lat = decode_geohash_to_coords(int(score_float))
-            except Exception:
-                # Skip member if decoding fails
-                continue
+        payload, _ = dump_key(arguments[0])
+        if payload is None:
+            return resp.null(protocol)
+        return resp.bulk_string(payload)
 
-            # Calculate distance between search center and member
-            distance = haversine_distance(center_lon, center_lat, member_lon, member_lat)
-            
-            # Check if the member is within the search radius (distance <= radius in meters)
-            if distance <= search_radius_m:
-                matching_members.append(member_name)
+    elif command == "RESTORE":
+        # RESTORE key ttl serialized-value [REPLACE]
+        if len(arguments) < 3:
+            return b"-ERR wrong number of arguments for 'restore' command\r\n"
 
-        # 4. Return matching members as a RESP Array (order does not matter)
-        response_parts = []
-        for member in matching_members:
-            member_bytes = member.encode()
-            response_parts.append(b"$" + str(len(member_bytes)).encode() + b"\r\n" + member_bytes + b"\r\n")
+        key = arguments[0]
+        try:
+            ttl_ms = int(arguments[1])
+        except ValueError:
+            return b"-ERR value is not an integer or out of range\r\n"
+        if ttl_ms < 0:
+            return b"-ERR Invalid TTL value, must be >= 0\r\n"
+
+        replace = False
+        for option in arguments[3:]:
+            if option.upper() == b"REPLACE":
+                replace = True
+            else:
+                return b"-ERR syntax error\r\n"
 
-        response = b"*" + str(len(matching_members)).encode() + b"\r\n" + b"".join(response_parts)
-        return response
+        expiry_timestamp = int(time.time() * 1000) + ttl_ms if ttl_ms > 0 else None
+        error = restore_key(key, arguments[2], expiry_timestamp, replace)
+        if error is not None:
+            return error
+        return resp.OK
+
+    elif command == "MIGRATE":
+        return cluster.migrate(arguments)
 
     elif command == "QUIT":
-        response = b"+OK\r\n"
+        response = resp.OK
         # client.sendall(response
         return response
 
     return b"-ERR unknown command '" + command.encode() + b"'\r\n"
 
+def _route_to_workers(command: str, arguments: list, client: socket.socket) -> bytes | None:
+    """
+    Step 0 of handle_command in workers mode. Returns the reply of a command run on other
+    workers (or on all of them), or None when it runs here.
+    """
+    protocol = get_client_protocol(client)
+    if workers.pinned_worker() is not None:
+        response = workers.route_pinned(command, arguments, protocol)
+        if response is not None:
+            return response
+
+    route = workers.route_command(command, arguments)
+    in_multi = is_client_in_multi(client)
+    if in_multi and (route is not None or command in workers.ALL_WORKERS_COMMANDS):
+        # A transaction runs on this worker: it can't reach the keys of the others
+        abort_client_multi(client)
+        return workers.MULTI_FORWARD_ERROR
+    if command in workers.ALL_WORKERS_COMMANDS:
+        return workers.execute_on_all_workers(command, arguments, protocol)
+    if route is None:
+        return None
+    if isinstance(route, bytes):
+        if command in workers.SPLIT_COMMANDS:
+            return workers.execute_split(command, arguments, protocol)
+        return route
+    if command == "WATCH":
+        if watches_keys(client):
+            return workers.CROSS_WORKER_ERROR  # Keys of this worker are watched already
+        return workers.watch_on_worker(route, arguments, protocol)
+    raw_command = _serialize_command_to_resp_array(command, arguments)
+    return workers.forward_command(route, raw_command, protocol)
+
 def handle_command(command: str, arguments: list, client: socket.socket) -> bool:
     
     client_address = client.getpeername()
 
+    # 0. WORKER ROUTING (--workers N): commands whose keys hash into another worker's
+    #    slot range are forwarded there and the owner's reply is relayed back as-is.
+    if workers.WORKER_COUNT > 1 and not workers.is_peer_connection(client):
+        response = _route_to_workers(command, arguments, client)
+        if response is not None:
+            client.sendall(response)
+            print(f"Sent: Forwarded response for command '{command}' to {client_address}.")
+            return True
+
+    # 0b. CLUSTER REDIRECTION: keys served by another node get -MOVED / -ASK instead.
+    if cluster.CLUSTER_ENABLED and command != "ASKING":
+        asking = pop_client_asking(client)
+        redirect = cluster.check_redirection(command, arguments, asking)
+        if redirect is not None:
+            client.sendall(redirect)
+            print(f"Sent: Cluster redirection for command '{command}' to {client_address}.")
+            return True
+
+    # 0c. BUSY SCRIPT: a script running past busy-reply-threshold holds DATA_LOCK, so other
+    #     clients are answered -BUSY instead of waiting for it (SCRIPT KILL still runs).
+    if scripting.SCRIPT_STATE["running"]:
+        busy = scripting.busy_error(command, arguments)
+        if busy is not None:
+            client.sendall(busy)
+            return True
+
     # 1. TRANSACTION QUEUEING CHECK
     if is_client_in_multi(client):
         # Commands that must be executed immediately, even inside MULTI: MULTI, EXEC, DISCARD
-        TRANSACTION_CONTROL_COMMANDS = {"EXEC", "MULTI", "DISCARD"} 
+        TRANSACTION_CONTROL_COMMANDS = {"EXEC", "MULTI", "DISCARD", "WATCH"}
         
         if command not in TRANSACTION_CONTROL_COMMANDS:
             # Queue the command and respond with +QUEUED\r\n
             enqueue_client_command(client, command, arguments)
-            response = b"+QUEUED\r\n"
+            response = resp.QUEUED
             client.sendall(response)
             print(f"Sent: QUEUED response for command '{command}' to {client_address}.")
             return True # Signal that the command was handled (queued)
         
     # 2. COMMAND EXECUTION
     response_or_signal = execute_single_command(command, arguments, client)
+    effects = pop_propagated_commands()
+
+    # 2a. BLOCKED CLIENTS: serve clients blocked on the lists this command pushed to,
+    #     all at once and in FIFO order, instead of every push waking a waiter itself.
+    if READY_KEYS:
+        served_waiters, served_keys = serve_blocked_clients()
+        for waiter in served_waiters:
+            try:
+                pubsub.send_to_client(waiter.client, waiter.reply)
+            except OSError:
+                pass  # Disconnected clients are cleaned up by their own connection thread
+            waiter.wake()
+        if served_keys and (SERVER_CONFIG["maxmemory"] or tracking.TRACKING_CLIENTS):
+            keys_by_database = {}
+            for db_index, key in served_keys:
+                keys_by_database.setdefault(db_index, []).append(key)
+            for db_index, keys in keys_by_database.items():
+                with using_database(db_index):
+                    memory.account_keys(keys)
+                    if tracking.TRACKING_CLIENTS:
+                        tracking.invalidate_keys(keys)
+        served_effects = pop_propagated_commands()
+    else:
+        served_effects = []
+
+    # 2b. CLIENT-SIDE CACHING: remember keys read by tracking clients, invalidate written keys
+    if tracking.TRACKING_CLIENTS:
+        _track_command(command, arguments, response_or_signal, client)
+        if not (command == "CLIENT" and arguments and arguments[0].upper() == b"CACHING"):
+            tracking.clear_caching(client)
 
     # 3. PROPAGATION LOGIC (MASTER ROLE)
     is_write_command = command in WRITE_COMMANDS
     global REPLICA_SOCKETS 
     is_master_with_replicas = SERVER_ROLE == "master" and REPLICA_SOCKETS
     
-    if is_master_with_replicas and is_write_command:
-        # Propagate only if the command executed successfully (returned bytes, not an error)
-        if isinstance(response_or_signal, bytes) and not response_or_signal.startswith(b'-'):
-            
-            # Reconstruct the raw RESP array
-            resp_array_to_send = _serialize_command_to_resp_array(command, arguments)
-            command_byte_size = len(resp_array_to_send)
+    if is_master_with_replicas:
+        # (database index, command, arguments) to send, in execution order
+        to_propagate = []
 
-            # Iterate and send to ALL replicas
-            for replica_socket in list(REPLICA_SOCKETS): 
-                try:
-                    replica_socket.sendall(resp_array_to_send)
-                    print(f"Propagation: Sent command '{command}' to replica {replica_socket.getpeername()}.") 
-                except Exception as e:
-                    print(f"Propagation Error: Could not send command to replica {replica_socket.getpeername()}: {e}. Removing dead replica.")
+        # Propagate only if the command executed successfully (returned bytes, not an error)
+        if is_write_command and isinstance(response_or_signal, bytes) and not response_or_signal.startswith(b'-'):
+            # Replicas may not have the script of an EVALSHA, so it is sent as the EVAL of its source.
+            if command == "EVALSHA":
+                to_propagate.append((selected_index(), "EVAL", [scripting.script_source(arguments[0])] + arguments[1:]))
+            else:
+                to_propagate.append((selected_index(), command, arguments))
+        elif not is_write_command:
+            # Blocking pops and XREADGROUP are replicated as their effects. A propagated
+            # write (a script, LMOVE) replays them itself.
+            to_propagate.extend(effects)
+        # Blocked clients served by this command come after it
+        to_propagate.extend(served_effects)
+
+        if to_propagate:
+            global MASTER_REPL_OFFSET, REPLICATION_DB
+            with REPLICATION_LOCK:
+                # Replicas apply the stream on one connection: a SELECT goes first whenever
+                # a write is for another database than the previous one
+                resp_array_to_send = b""
+                for db_index, propagated_command, propagated_arguments in to_propagate:
+                    if db_index != REPLICATION_DB:
+                        resp_array_to_send += _serialize_command_to_resp_array("SELECT", [str(db_index)])
+                        REPLICATION_DB = db_index
+                    resp_array_to_send += _serialize_command_to_resp_array(propagated_command, propagated_arguments)
+                command_byte_size = len(resp_array_to_send)
+
+                # Iterate and send to ALL replicas
+                for replica_socket in list(REPLICA_SOCKETS): 
                     try:
-                        REPLICA_SOCKETS.remove(replica_socket)
-                    except ValueError:
-                        pass
-            global MASTER_REPL_OFFSET
-            MASTER_REPL_OFFSET += command_byte_size
+                        replica_socket.sendall(resp_array_to_send)
+                        print(f"Propagation: Sent command '{command}' to replica {replica_socket.getpeername()}.") 
+                    except Exception as e:
+                        print(f"Propagation Error: Could not send command to replica {replica_socket.getpeername()}: {e}. Removing dead replica.")
+                        try:
+                            REPLICA_SOCKETS.remove(replica_socket)
+                        except ValueError:
+                            pass
+                MASTER_REPL_OFFSET += command_byte_size
 
     # 4. SEND THE RESPONSE (CONSOLIDATED LOGIC)
     
@@ -1668,7 +2088,7 @@ def handle_command(command: str, arguments: list, client: socket.socket) -> bool
             is_replconf_getack = (
                 command == "REPLCONF" and 
                 len(arguments) >= 2 and 
-                arguments[0].upper() == "GETACK"
+                arguments[0].upper() == b"GETACK"
             )
 
             if is_replconf_getack:
@@ -1680,7 +2100,7 @@ def handle_command(command: str, arguments: list, client: socket.socket) -> bool
 
         # --- REGULAR CLIENT RESPONSE ---
         client_address = client.getpeername()
-        client.sendall(response_or_signal)
+        pubsub.send_to_client(client, response_or_signal)
         
         # Special case handling for PSYNC response (Master role)
         if command == "PSYNC":
@@ -1697,6 +2117,8 @@ def handle_command(command: str, arguments: list, client: socket.socket) -> bool
             
     return True
 
+RECV_BUFFER_SIZE = 65536
+
 def handle_connection(client: socket.socket, client_address):
     """
     This function is called for each new client connection.
@@ -1704,28 +2126,71 @@ def handle_connection(client: socket.socket, client_address):
     """
     print(f"Connection: New connection from {client_address}")
     
+    # Bytes received but not yet parsed: a command can span several recv() calls
+    # (large values), and one recv() can carry several pipelined commands.
+    buffer = bytearray()
+
     with client: 
-        while True:
-            # The thread waits for the client to send a command. When you run {redis-cli ECHO hey}, the server receives the raw RESP bytes: data = b'*2\r\n$4\r\nECHO\r\n$3\r\nhey\r\n'
-            data = client.recv(4096) 
-            if not data:
-                print(f"Connection: Client {client_address} closed connection.")
-                cleanup_blocked_client(client)
-                break
+        try:
+            while True:
+                # The thread waits for the client to send a command. When you run {redis-cli ECHO hey}, the server receives the raw RESP bytes: data = b'*2\r\n$4\r\nECHO\r\n$3\r\nhey\r\n'
+                data = client.recv(RECV_BUFFER_SIZE)
+                if not data:
+                    print(f"Connection: Client {client_address} closed connection.")
+                    break
                 
-            print(f"Received: Raw bytes from {client_address}: {data!r}")
+                print(f"Received: {len(data)} bytes from {client_address}")
+                buffer += data
 
-            # The raw bytes are immediately sent to the parser to be translated into a usable Python list.
-            parsed_command, _ = parsed_resp_array(data)
-            
-            if not parsed_command:
-                print(f"Received: Could not parse command from {client_address}. Closing connection.")
-                break
-
-            command = parsed_command[0].upper()
-            arguments = parsed_command[1:]
-            
-            print(f"Command: Parsed command: {command}, Arguments: {arguments}")
-            
-            # Delegate command execution to the router
-            handle_command(command, arguments, client)
\ No newline at end of file
+                # The raw bytes are sent to the parser to be translated into a list of bytes arguments.
+                # Arguments stay bytes all the way to the data store; only the command name is looked up.
+                closing = False
+                while buffer:
+                    try:
+                        parsed_command, bytes_consumed = parsed_resp_array(buffer)
+                    except ValueError as e:
+                        print(f"Received: Protocol error from {client_address}: {e}. Closing connection.")
+                        try:
+                            client.sendall(b"-ERR Protocol error: " + str(e).encode() + b"\r\n")
+                        except OSError:
+                            pass
+                        closing = True
+                        break
+
+                    if not parsed_command:
+                        if bytes_consumed:
+                            # An empty array (*0 / *-1) is skipped, like Redis does
+                            del buffer[:bytes_consumed]
+                            continue
+                        if buffer[:1] != b"*":
+                            print(f"Received: Could not parse command from {client_address}. Closing connection.")
+                            closing = True
+                        # Otherwise the command is incomplete: wait for more bytes
+                        break
+                    del buffer[:bytes_consumed]
+
+                    command = command_name(parsed_command[0])
+                    arguments = parsed_command[1:]
+
+                    print(f"Command: Parsed command: {command} ({len(arguments)} arguments)")
+
+                    # Delegate command execution to the router
+                    handle_command(command, arguments, client)
+
+                    # Invalidation messages caused by the command go out after its reply
+                    if tracking.PENDING_INVALIDATIONS:
+                        tracking.flush_invalidations()
+
+                if closing:
+                    break
+        except OSError as e:
+            # Reset by the peer (or a failed write) rather than a clean close
+            print(f"Connection: Client {client_address} dropped: {e}.")
+        finally:
+            # Runs however the connection ends: clean close, protocol error, reset, or an
+            # exception raised while executing a command
+            cleanup_blocked_client(client)
+            tracking.disable_tracking(client)
+            forget_client(client)
+            pubsub.forget_subscriber(client)
+            workers.close_peer_connections()
@@ -1,22 +1,139 @@
+import bisect
+from decimal import Decimal
+import itertools
+import math
+import random
 import time
 import threading
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from app.parser import parsed_resp_array
+from app.patterns import compile_glob
+import app.lazyfree as lazyfree
+import app.resp as resp
+from app.slots import key_hash_slot
+from app.zset import SortedSet
 
 # The Lock ensures that only one thread can modify the store at a time,
 # preventing data corruption (race conditions) when multiple clients run SET simultaneously.
-DATA_LOCK = threading.Lock()
+# It is reentrant so that EXEC (and write commands, see WATCH below) can hold it across
+# whole commands that take it again inside.
+DATA_LOCK = threading.RLock()
 
 BLOCKING_CLIENTS_LOCK = threading.Lock()
+# Clients blocked on keys (BLPOP & co., XREAD/XREADGROUP BLOCK): key -> deque of
+# BlockedClient, oldest first. A waiter is queued under every key it waits for and
+# removed from all of them when served.
 BLOCKING_CLIENTS = {}
-BLOCKING_STREAMS = {}
-BLOCKING_STREAMS_LOCK = threading.Lock()
+# (database index, key) of keys that received data while clients were blocked on them
+# (dict as an ordered set). Guarded by DATA_LOCK; served once per command by
+# serve_blocked_clients().
+READY_KEYS = {}
 
-CHANNEL_SUBSCRIBERS = {}
-CLIENT_SUBSCRIPTIONS = {}
 CLIENT_STATE = {}
+_CLIENT_IDS = itertools.count(1)
 
-SORTED_SETS = {}
+# Logical databases (SELECT index). Each connection runs in its own thread, and the index
+# it selected is kept thread-locally; DATA_STORE is a view that resolves to that
+# database's keyspace on every access, so the code written for one keyspace works on all
+# of them without passing a database around. SWAPDB exchanges two Database objects in
+# DATABASES (clients keep their index), so state other modules keep per Database (used
+# memory) moves with the data.
+DATABASE_COUNT = 16
 
-STREAMS = {}
+class Database:
+    """One logical database: its keyspace (key -> entry, each entry owning its value)."""
+
+    def __init__(self):
+        self.store = {}
+        self.volatile = 0  # Keys with an expiry, kept up to date by KEYSPACE (INFO keyspace)
+
+DATABASES = [Database() for _ in range(DATABASE_COUNT)]
+
+class _SelectedDatabase(threading.local):
+    index = 0  # Connections that never ran SELECT, and background threads, use database 0
+
+_SELECTED = _SelectedDatabase()
+
+def selected_index() -> int:
+    """The index of the database the current thread (connection) has selected."""
+    return _SELECTED.index
+
+def selected_database() -> Database:
+    return DATABASES[_SELECTED.index]
+
+def select_database(index: int):
+    """SELECT: switches the current connection to another database."""
+    _SELECTED.index = index
+
+@contextmanager
+def using_database(index: int):
+    """Runs a block against another database (MOVE, eviction), then switches back."""
+    previous = _SELECTED.index
+    _SELECTED.index = index
+    try:
+        yield
+    finally:
+        _SELECTED.index = previous
+
+class _DatabaseTable:
+    """One table of the selected database, with the dict operations the code base uses."""
+    __slots__ = ("_attribute",)
+
+    def __init__(self, attribute: str):
+        self._attribute = attribute
+
+    def table(self) -> dict:
+        return getattr(DATABASES[_SELECTED.index], self._attribute)
+
+    def get(self, key, default=None):
+        return getattr(DATABASES[_SELECTED.index], self._attribute).get(key, default)
+
+    def pop(self, key, *default):
+        return getattr(DATABASES[_SELECTED.index], self._attribute).pop(key, *default)
+
+    def setdefault(self, key, default=None):
+        return getattr(DATABASES[_SELECTED.index], self._attribute).setdefault(key, default)
+
+    def __getitem__(self, key):
+        return getattr(DATABASES[_SELECTED.index], self._attribute)[key]
+
+    def __setitem__(self, key, value):
+        getattr(DATABASES[_SELECTED.index], self._attribute)[key] = value
+
+    def __delitem__(self, key):
+        del getattr(DATABASES[_SELECTED.index], self._attribute)[key]
+
+    def __contains__(self, key) -> bool:
+        return key in getattr(DATABASES[_SELECTED.index], self._attribute)
+
+    def __len__(self) -> int:
+        return len(getattr(DATABASES[_SELECTED.index], self._attribute))
+
+    def __iter__(self):
+        return iter(getattr(DATABASES[_SELECTED.index], self._attribute))
+
+    def keys(self):
+        return self.table().keys()
+
+    def values(self):
+        return self.table().values()
+
+    def items(self):
+        return self.table().items()
+
+    def update(self, *args, **kwargs):
+        self.table().update(*args, **kwargs)
+
+# WATCH: a modification version for every watched key, bumped by each write, expiry,
+# eviction and deletion of the key. EXEC compares them with the versions its client saw
+# at WATCH time. Keys nobody watches have no version. Keys are (database index, key), so
+# a write in one database never fails a WATCH in another. All guarded by DATA_LOCK.
+KEY_VERSIONS = {}
+# (db, key) -> clients watching it; client -> {(db, key): version when watched}
+WATCHING_CLIENTS = {}
+WATCHED_KEYS = {}
 
 multi_flag = False
 
@@ -26,56 +143,211 @@ WAIT_CONDITION = threading.Condition(WAIT_LOCK)
 # Maps replica socket to its last acknowledged offset (int)
 REPLICA_ACK_OFFSETS = {}
 
-# The central storage. Keys map to a dictionary containing value, type, and expiry metadata.
-# Example: {'mykey': {'type': 'string', 'value': 'myvalue', 'expiry': 1731671220000}}
-DATA_STORE = {}
+# The central storage (of the selected database). Keys map to a dictionary containing value,
+# type, and expiry metadata. Keys and values are kept as the raw bytes the client sent
+# (binary safe, never decoded). Every type's value lives in its entry: a sorted set is a
+# SortedSet (app/zset.py), a stream a Stream, so one lookup gives type, expiry and data.
+# Example: {b'mykey': {'type': 'string', 'value': b'myvalue', 'expiry': 1731671220000}}
+class _KeyspaceTable(_DatabaseTable):
+    """
+    The keyspace of the selected database. Writes keep the database's count of keys with an
+    expiry up to date, so INFO never has to walk the keys; an entry's expiry changed in place
+    goes through set_entry_expiry.
+    """
+    __slots__ = ()
+
+    def __setitem__(self, key, data_entry):
+        database = DATABASES[_SELECTED.index]
+        old_entry = database.store.get(key)
+        if old_entry is not None and old_entry["expiry"] is not None:
+            database.volatile -= 1
+        if data_entry["expiry"] is not None:
+            database.volatile += 1
+        database.store[key] = data_entry
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def pop(self, key, *default):
+        database = DATABASES[_SELECTED.index]
+        if key not in database.store:
+            return database.store.pop(key, *default)
+        data_entry = database.store.pop(key)
+        if data_entry["expiry"] is not None:
+            database.volatile -= 1
+        return data_entry
 
-def get_data_entry(key: str) -> dict | None:
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, data_entry in dict(*args, **kwargs).items():
+            self[key] = data_entry
+
+DATA_STORE = _KeyspaceTable("store")
+
+def set_entry_expiry(data_entry: dict, expiry: int | None):
+    """Changes the expiry of an entry of the selected database in place."""
+    if (data_entry["expiry"] is None) != (expiry is None):
+        DATABASES[_SELECTED.index].volatile += 1 if expiry is not None else -1
+    data_entry["expiry"] = expiry
+
+# Functions called with the key whenever a key is removed because it expired (lazy expiry).
+# Other modules hook in here instead of the data store importing them (client tracking).
+EXPIRED_KEY_CALLBACKS = []
+
+# Functions called (with DATA_LOCK held) after FLUSHALL / FLUSHDB emptied databases, with
+# the Database objects flushed and whether the flush frees lazily.
+FLUSH_CALLBACKS = []
+
+# Functions called (with DATA_LOCK held) with (event, key) for every list a blocking pop,
+# or LMOVE, changed: "lpop" / "rpop" on the source, "lpush" / "rpush" on the destination,
+# "del" when the source was emptied (keyspace notifications).
+LIST_EVENT_CALLBACKS = []
+
+# Writes made by commands that are not replicated as-is (blocking pops, XREADGROUP) are
+# recorded as the commands that replay their effect: LPOP / RPOP / LMOVE of the list a
+# waiter was served from, XCLAIM / XGROUP for stream deliveries. They are recorded by the
+# thread that made the write and sent to the replicas by handle_command.
+class _PropagatedCommands(threading.local):
+    commands = None  # (database index, command, arguments), in execution order
+
+_PROPAGATED = _PropagatedCommands()
+
+def propagate_effect(command: str, arguments: list):
+    if _PROPAGATED.commands is None:
+        _PROPAGATED.commands = []
+    _PROPAGATED.commands.append((_SELECTED.index, command, arguments))
+
+def pop_propagated_commands() -> list[tuple[int, str, list]]:
+    """Returns and forgets the effects recorded by this thread (see propagate_effect)."""
+    commands = _PROPAGATED.commands
+    _PROPAGATED.commands = None
+    return commands or []
+
+# Tunables exposed through CONFIG GET / CONFIG SET (integer values).
+SERVER_CONFIG = {
+    # Hashes with at most this many fields, each field/value at most this many
+    # bytes, are kept in the compact flat-list ("listpack") encoding.
+    "hash-max-listpack-entries": 128,
+    "hash-max-listpack-value": 64,
+    # Sets made only of integers stay a sorted array('q') up to this many members.
+    "set-max-intset-entries": 512,
+    # Keys remembered for client-side caching (CLIENT TRACKING) before the oldest ones are
+    # invalidated to make room; 0 means no limit.
+    "tracking-table-max-keys": 1000000,
+    # Memory (bytes) for cached GEOSEARCH replies; 0 disables the cache.
+    "geo-cache-max-memory": 0,
+    # Estimated memory (bytes) the keys may use before write commands evict keys by
+    # maxmemory-policy (app/memory.py); 0 means no limit.
+    "maxmemory": 0,
+    # Keys sampled per eviction round, and the LFU counter's growth and decay (minutes).
+    "maxmemory-samples": 5,
+    "lfu-log-factor": 10,
+    "lfu-decay-time": 1,
+    # 1 (yes) frees large values of expired keys, evicted keys, DEL and FLUSHALL / FLUSHDB
+    # without ASYNC|SYNC in the background thread of app/lazyfree.py, like UNLINK does.
+    "lazyfree-lazy-expire": 0,
+    "lazyfree-lazy-eviction": 0,
+    "lazyfree-lazy-user-del": 0,
+    "lazyfree-lazy-user-flush": 0,
+    # A script running longer than this (ms) makes other clients get -BUSY, and can then
+    # be stopped with SCRIPT KILL.
+    "busy-reply-threshold": 5000,
+}
+
+# Values CONFIG SET accepts for the integer tunables (inclusive), as in Redis's config.c
+_LONG_MAX = 2 ** 63 - 1
+_INT_MAX = 2 ** 31 - 1
+SERVER_CONFIG_RANGES = {
+    "hash-max-listpack-entries": (0, _LONG_MAX),
+    "hash-max-listpack-value": (0, _LONG_MAX),
+    "set-max-intset-entries": (0, _LONG_MAX),
+    "tracking-table-max-keys": (0, _LONG_MAX),
+    "geo-cache-max-memory": (0, _LONG_MAX),
+    "maxmemory-samples": (1, 64),
+    "lfu-log-factor": (0, _INT_MAX),
+    "lfu-decay-time": (0, _INT_MAX),
+    "busy-reply-threshold": (0, _LONG_MAX),
+}
+
+WRONGTYPE_ERROR = b"-WRONGTYPE Operation against a key holding the wrong kind of value\r\n"
+
+# String values that look like integers are stored as Python ints ("int" encoding).
+# Like Redis's shared integers, values 0-9999 all point at one preallocated object,
+# so ten million counters holding small values don't allocate ten million ints.
+SHARED_INTEGERS_COUNT = 10000
+SHARED_INTEGERS = tuple(range(SHARED_INTEGERS_COUNT))
+
+def shared_integer(value: int) -> int:
+    """Returns the pooled int object for small values, or the value itself."""
+    if 0 <= value < SHARED_INTEGERS_COUNT:
+        return SHARED_INTEGERS[value]
+    return value
+
+def encode_string_value(value: bytes) -> int | bytes:
     """
-    Retrieves a key, checks for expiration, and performs lazy deletion if expired.
-    Returns the valid data entry dictionary or None if the key is missing/expired.
+    Chooses the storage form of a string value: a (shared) int when the bytes are the
+    canonical decimal form of a signed 64-bit integer, otherwise the bytes themselves.
     """
-    with DATA_LOCK:
-        data_entry = DATA_STORE.get(key)
+    # 20 characters is the longest 64-bit integer ("-9223372036854775808")
+    if len(value) > 20:
+        return value
+    int_value = _intset_value(value)
+    if int_value is None:
+        return value
+    return shared_integer(int_value)
+
+def string_value_to_bytes(value: int | bytes) -> bytes:
+    """Converts a stored string value back to its bytes form (for replies and serialization)."""
+    if type(value) is int:
+        return b"%d" % value
+    return value
+
+def _get_live_entry(key: bytes) -> dict | None:
+    """
+    Same as get_data_entry, for callers that already hold DATA_LOCK.
+    """
+    data_entry = DATABASES[_SELECTED.index].store.get(key)
 
-        if data_entry is None:
-            # Key does not exist
-                return None
-        
-        expiry = data_entry.get("expiry")
-        current_time_ms = int(time.time() * 1000)
+    if data_entry is None:
+        # Key does not exist
+        return None
 
-        # Check for expiration
-        if expiry is not None and current_time_ms >= expiry:
-            # Key has expired; delete it
-            del DATA_STORE[key]
-            return None
-        
-        return data_entry
+    expiry = data_entry.get("expiry")
 
-def set_string(key: str, value: str, expiry_timestamp: int | None):
+    # Check for expiration
+    if expiry is not None and int(time.time() * 1000) >= expiry:
+        # Key has expired; delete it
+        _remove_key(key, lazy=SERVER_CONFIG["lazyfree-lazy-expire"])
+        for callback in EXPIRED_KEY_CALLBACKS:
+            callback(key)
+        return None
+
+    return data_entry
+
+def get_data_entry(key: bytes) -> dict | None:
     """
-    Sets a key to a string value with optional expiration.
+    Retrieves a key, checks for expiration, and performs lazy deletion if expired.
+    Returns the valid data entry dictionary or None if the key is missing/expired.
     """
     with DATA_LOCK:
-        DATA_STORE[key] = {
-            "type": "string",
-            "value": value,
-            "expiry": expiry_timestamp
-        }
+        return _get_live_entry(key)
 
-def set_list(key: str, elements: list[str], expiry_timestamp: int | None):
+def set_string(key: bytes, value: bytes, expiry_timestamp: int | None):
     """
-    Sets a key to a list of strings with optional expiration.
+    Sets a key to a string value with optional expiration.
     """
     with DATA_LOCK:
         DATA_STORE[key] = {
-            "type": "list",
-            "value": elements,
+            "type": "string",
+            "value": encode_string_value(value),
             "expiry": expiry_timestamp
         }
 
-def existing_list(key: str) -> bool:
+def existing_list(key: bytes) -> bool:
     """
     Checks if a list exists by key, without retrieving it.
     """
@@ -85,17 +357,7 @@ def existing_list(key: str) -> bool:
             return False
         return data_entry.get("type") == "list"
 
-def append_to_list(key: str, element: str):
-    """
-    Appends an element to an existing list at the given key.
-    Assumes the list already exists.
-    """
-    with DATA_LOCK:
-        data_entry = DATA_STORE.get(key)
-        if data_entry and data_entry.get("type") == "list":
-            data_entry["value"].append(element)
-
-def size_of_list(key: str) -> int:
+def size_of_list(key: bytes) -> int:
     """
     Returns the size of the list stored at key, or 0 if the key does not exist or is not a list.
     """
@@ -105,7 +367,7 @@ def size_of_list(key: str) -> int:
             return len(data_entry["value"])
         return 0
 
-def lrange_rtn(key: str, start: int, end: int) -> list[str]:
+def lrange_rtn(key: bytes, start: int, end: int) -> list[bytes]:
     """
     Returns a sublist from the list stored at key, from start to end indices (inclusive).
     If the key does not exist or is not a list, returns an empty list.
@@ -127,43 +389,269 @@ def lrange_rtn(key: str, start: int, end: int) -> list[str]:
             return list[start:end + 1]
         return []
 
-def prepend_to_list(key: str, element: str):
+def remove_elements_from_list(key: bytes, count: int, left: bool = True) -> list[bytes] | None: 
     """
-    Prepends an element to an existing list at the given key.
-    Assumes the list already exists.
+    Removes and returns the first (LPOP) or last (RPOP) elements from the list at the given key.
+    Returns None if the list is empty or the key does not exist/is not a list.
     """
     with DATA_LOCK:
-        data_entry = DATA_STORE.get(key)
-        if data_entry and data_entry.get("type") == "list":
-            data_entry["value"].insert(0, element)
+        data_entry = _get_live_entry(key)
+        if data_entry and data_entry.get("type") == "list" and data_entry["value"]:
+            popped = _pop_list_elements(data_entry["value"], left, count)
+            if not data_entry["value"]:
+                del DATA_STORE[key]
+            return popped
+
+    return None
+
+def _signal_key_ready(key: bytes):
+    """Marks a list or stream that just received data, if anyone is blocked on it. Caller holds DATA_LOCK."""
+    if key in BLOCKING_CLIENTS:
+        READY_KEYS[(_SELECTED.index, key)] = None
+
+def _pop_list_elements(elements: list, left: bool, count: int) -> list[bytes]:
+    """Removes up to `count` elements from the head (or tail), in the order they were popped."""
+    if left:
+        popped = elements[:count]
+        del elements[:count]
+    else:
+        popped = elements[:-count - 1:-1]
+        del elements[-count:]
+    return popped
 
-def remove_elements_from_list(key: str, count: int) -> list[str] | None: 
+def push_to_list(key: bytes, elements: list[bytes], left: bool) -> tuple[int | None, bytes | None]:
     """
-    Removes and returns the first elements from the list at the given key.
-    Returns None if the list is empty or the key does not exist/is not a list.
+    LPUSH/RPUSH: pushes the elements in a single DATA_LOCK acquisition and returns the new
+    length. Clients blocked on the key are served after the command (serve_blocked_clients).
     """
     with DATA_LOCK:
-        data_entry = DATA_STORE.get(key)
-        if data_entry and data_entry.get("type") == "list":
+        data_entry = _get_live_entry(key)
+        if data_entry is None:
+            data_entry = DATA_STORE[key] = {"type": "list", "value": [], "expiry": None}
+        elif data_entry.get("type") != "list":
+            return None, WRONGTYPE_ERROR
+
+        if left:
+            data_entry["value"][:0] = elements[::-1]
+        else:
+            data_entry["value"].extend(elements)
+        _signal_key_ready(key)
+        return len(data_entry["value"]), None
+
+class BlockedClient:
+    """
+    A client blocked on one or more keys of type `key_type`. The command that serves it
+    stores the reply, sends it to the client and then wakes the blocked thread (wake()).
+    """
+    key_type = None
+    writes = False  # Whether serving it through try_serve() modifies the key
+
+    def __init__(self, client, keys: list[bytes], protocol: int):
+        self.client = client
+        self.keys = keys
+        self.protocol = protocol
+        self.db = _SELECTED.index  # Only data in the client's database serves it
+        self.condition = threading.Condition()
+        self.reply = None
+        self.delivered = False
+
+    def try_serve(self) -> bytes | None:
+        """Returns the reply if the waiter can be served right now. Caller holds DATA_LOCK."""
+        raise NotImplementedError
+
+    def wake(self):
+        """Called by the serving thread once the reply has been sent."""
+        with self.condition:
+            self.delivered = True
+            self.condition.notify()
+
+class ListWaiter(BlockedClient):
+    """BLPOP/BRPOP (count None), BLMPOP (count set) or BLMOVE (destination set)."""
+    key_type = "list"
+
+    def __init__(self, client, keys: list[bytes], protocol: int, pop_left: bool,
+                 count: int | None = None, destination: bytes | None = None, push_left: bool = False):
+        super().__init__(client, keys, protocol)
+        self.pop_left = pop_left
+        self.count = count
+        self.destination = destination
+        self.push_left = push_left
+
+    def try_serve(self) -> bytes | None:
+        """Pops from the first non-empty list among the keys."""
+        for key in self.keys:
+            data_entry = _get_live_entry(key)
+            if data_entry is None:
+                continue
+            if data_entry.get("type") != "list":
+                return WRONGTYPE_ERROR
             if data_entry["value"]:
-                return [data_entry["value"].pop(0) for _ in range(count)]
-            
-            if not data_entry["value"]:
-                del DATA_STORE[key]
-                return None
+                return _serve_list_waiter(self, key, data_entry)
+        return None
+
+def _serve_list_waiter(waiter: ListWaiter, key: bytes, data_entry: dict) -> bytes:
+    """Pops for a waiter from the non-empty list at `key` and builds its reply. Caller holds DATA_LOCK."""
+    elements = data_entry["value"]
+    where_from = b"LEFT" if waiter.pop_left else b"RIGHT"
+    pop_command = "LPOP" if waiter.pop_left else "RPOP"
+    events = [(pop_command.lower().encode(), key)]
+
+    if waiter.destination is not None:
+        destination_entry = _get_live_entry(waiter.destination)
+        if destination_entry is None:
+            destination_entry = DATA_STORE[waiter.destination] = {"type": "list", "value": [], "expiry": None}
+        elif destination_entry.get("type") != "list":
+            return WRONGTYPE_ERROR
+        element = elements.pop(0) if waiter.pop_left else elements.pop()
+        if waiter.push_left:
+            destination_entry["value"].insert(0, element)
+        else:
+            destination_entry["value"].append(element)
+        _signal_key_ready(waiter.destination)
+        reply = resp.bulk_string(element)
+        propagate_effect("LMOVE", [key, waiter.destination, where_from, b"LEFT" if waiter.push_left else b"RIGHT"])
+        events.append((b"lpush" if waiter.push_left else b"rpush", waiter.destination))
+    elif waiter.count is not None:
+        popped = _pop_list_elements(elements, waiter.pop_left, waiter.count)
+        writer = resp.RespWriter(waiter.protocol)
+        writer.array(2)
+        writer.bulk(key)
+        writer.bulk_array(popped)
+        reply = writer.getvalue()
+        propagate_effect(pop_command, [key, b"%d" % len(popped)])
+    else:
+        element = elements.pop(0) if waiter.pop_left else elements.pop()
+        reply = resp.bulk_array((key, element))
+        propagate_effect(pop_command, [key])
+
+    if not elements:
+        del DATA_STORE[key]
+        events.append((b"del", key))
+    _touch_key(key)
+    if waiter.destination is not None:
+        _touch_key(waiter.destination)
+    for callback in LIST_EVENT_CALLBACKS:
+        for event, event_key in events:
+            callback(event, event_key)
+    return reply
+
+def _unregister_waiter(waiter: BlockedClient):
+    """Removes a waiter from the queues of all its keys. Caller holds BLOCKING_CLIENTS_LOCK."""
+    for key in dict.fromkeys(waiter.keys):
+        waiters = BLOCKING_CLIENTS.get(key)
+        if waiters is None:
+            continue
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            pass
+        if not waiters:
+            del BLOCKING_CLIENTS[key]
+
+def block_client(waiter: BlockedClient, timeout: float, block: bool = True) -> bytes | None:
+    """
+    Serves the waiter right away if it can be, or blocks until a write to one of its keys
+    serves it (timeout 0 waits forever). Returns the reply, a null array on timeout, or
+    None when the reply was sent by the command that served the waiter.
+    """
+    with DATA_LOCK:
+        reply = waiter.try_serve()
+        if reply is not None:
+            return reply
+        if not block:
+            return resp.null_array(waiter.protocol)
+
+        # Registered while still holding DATA_LOCK, so no write can slip in unnoticed
+        with BLOCKING_CLIENTS_LOCK:
+            for key in dict.fromkeys(waiter.keys):
+                BLOCKING_CLIENTS.setdefault(key, deque()).append(waiter)
+
+    with waiter.condition:
+        if waiter.condition.wait_for(lambda: waiter.delivered, timeout or None):
+            return None
 
+    with BLOCKING_CLIENTS_LOCK:
+        # The reply is set under this lock, so a waiter served right at the timeout is not lost
+        if waiter.reply is None:
+            _unregister_waiter(waiter)
+            return resp.null_array(waiter.protocol)
+
+    # Served just as the timeout expired: the reply must go out before anything else
+    with waiter.condition:
+        waiter.condition.wait_for(lambda: waiter.delivered)
     return None
 
+def serve_blocked_clients() -> tuple[list[BlockedClient], list[tuple[int, bytes]]]:
+    """
+    Serves clients blocked on the keys in READY_KEYS, oldest waiter first (like Redis's
+    handleClientsBlockedOnKeys). Called once after every command, so a push of N elements
+    serves up to N list waiters, and an XADD every stream reader, under one lock acquisition.
+    Returns the served waiters, whose replies the caller sends before calling wake(), and
+    the (database index, key) pairs modified by serving.
+    """
+    served = []
+    modified_keys = []
+    with DATA_LOCK:
+        with BLOCKING_CLIENTS_LOCK:
+            while READY_KEYS:
+                db, key = next(iter(READY_KEYS))
+                del READY_KEYS[(db, key)]
+                waiters = BLOCKING_CLIENTS.get(key)
+                if not waiters:
+                    continue
+                with using_database(db):
+                    served_keys = _serve_ready_key(key, waiters, served)
+                modified_keys.extend((db, served_key) for served_key in served_keys)
+    return served, modified_keys
+
+def _serve_ready_key(key: bytes, waiters: deque, served: list) -> list[bytes]:
+    """
+    serve_blocked_clients for one key of the selected database. Caller holds DATA_LOCK
+    and BLOCKING_CLIENTS_LOCK.
+    """
+    modified_keys = []
+    data_entry = _get_live_entry(key)
+    if data_entry is None:
+        return modified_keys
+
+    key_type = data_entry.get("type")
+    db = _SELECTED.index
+    for waiter in list(waiters):
+        if waiter.key_type != key_type or waiter.db != db:
+            continue
+        if key_type == "list":
+            if DATA_STORE.get(key) is not data_entry or not data_entry["value"]:
+                break  # Emptied (and deleted) by the waiters served so far
+            reply = _serve_list_waiter(waiter, key, data_entry)
+            modified_keys.append(key)
+            if waiter.destination is not None:
+                modified_keys.append(waiter.destination)
+        else:
+            reply = waiter.try_serve()
+            if reply is None:
+                continue
+            if waiter.writes:
+                modified_keys.append(key)
+        _unregister_waiter(waiter)
+        waiter.reply = reply
+        served.append(waiter)
+    return modified_keys
+
 def cleanup_blocked_client(client):
     with BLOCKING_CLIENTS_LOCK:
         for key, waiters in list(BLOCKING_CLIENTS.items()):
-            BLOCKING_CLIENTS[key] = [
-                cond for cond in waiters if getattr(cond, "client_socket", None) != client
-            ]
-            if not BLOCKING_CLIENTS[key]:
+            remaining = deque(waiter for waiter in waiters if waiter.client is not client)
+            if remaining:
+                BLOCKING_CLIENTS[key] = remaining
+            else:
                 del BLOCKING_CLIENTS[key]
 
-def read_string(f):
+def read_string(f) -> bytes:
+    value = read_string_value(f)
+    # Integer-encoded strings are only kept as ints for string values, not for keys/fields
+    return b"%d" % value if type(value) is int else value
+
+def read_string_value(f):
     length_or_encoding_byte = read_length(f)
     
     # Check if the length is actually an encoding byte (prefix 0b11)
@@ -171,13 +659,9 @@ def read_string(f):
         # It's an encoded string (C0-C3), delegate to read_encoded_string
         return read_encoded_string(f, length_or_encoding_byte) # <<< Pass the encoding byte
     
-    # Regular string: the result is the length
+    # Regular string: the result is the length. Kept as raw bytes, like every key and value.
     length = length_or_encoding_byte
-    data = f.read(length)
-    try:
-        return data.decode("utf-8")
-    except UnicodeDecodeError:
-        return data # Return raw bytes if not valid UTF-8
+    return f.read(length)
 
 def read_length(f):
     first_byte = f.read(1)[0]
@@ -197,10 +681,95 @@ def read_length(f):
         # special string encoding (C0–C3)
         return first_byte
 
+def read_raw_string(f) -> bytes:
+    """Reads a length-prefixed string without decoding it (used for encoded blobs like listpacks)."""
+    length = read_length(f)
+    return f.read(length)
+
+def _decode_listpack(blob: bytes) -> list[bytes]:
+    """
+    Decodes a Redis listpack blob into its elements (as bytes).
+    Layout: <total-bytes:4><num-elements:2> <entry>... <0xFF>, where every entry is
+    <encoding+data><backlen>.
+    """
+    elements = []
+    index = 6  # Skip total-bytes and num-elements header
+
+    while index < len(blob) and blob[index] != 0xFF:
+        entry_start = index
+        encoding = blob[index]
+
+        if encoding & 0x80 == 0:  # 0xxxxxxx: 7-bit unsigned int
+            element = b"%d" % (encoding & 0x7F)
+            index += 1
+        elif encoding & 0xC0 == 0x80:  # 10xxxxxx: string up to 63 bytes
+            length = encoding & 0x3F
+            element = blob[index + 1:index + 1 + length]
+            index += 1 + length
+        elif encoding & 0xE0 == 0xC0:  # 110xxxxx: 13-bit signed int
+            value = ((encoding & 0x1F) << 8) | blob[index + 1]
+            if value >= 1 << 12:
+                value -= 1 << 13
+            element = b"%d" % value
+            index += 2
+        elif encoding & 0xF0 == 0xE0:  # 1110xxxx: string up to 4095 bytes
+            length = ((encoding & 0x0F) << 8) | blob[index + 1]
+            element = blob[index + 2:index + 2 + length]
+            index += 2 + length
+        elif encoding == 0xF0:  # 32-bit string length
+            length = int.from_bytes(blob[index + 1:index + 5], "little")
+            element = blob[index + 5:index + 5 + length]
+            index += 5 + length
+        elif encoding in (0xF1, 0xF2, 0xF3, 0xF4):  # 16/24/32/64-bit signed ints
+            width = {0xF1: 2, 0xF2: 3, 0xF3: 4, 0xF4: 8}[encoding]
+            element = b"%d" % int.from_bytes(blob[index + 1:index + 1 + width], "little", signed=True)
+            index += 1 + width
+        else:
+            raise Exception(f"Unknown listpack encoding: {hex(encoding)}")
+
+        # Skip the backlen (the entry length stored in 1-5 bytes, 7 bits per byte)
+        entry_length = index - entry_start
+        if entry_length <= 127:
+            index += 1
+        elif entry_length < 16383:
+            index += 2
+        elif entry_length < 2097151:
+            index += 3
+        elif entry_length < 268435455:
+            index += 4
+        else:
+            index += 5
+
+        elements.append(element)
+
+    return elements
+
+def _decode_intset(blob: bytes) -> list[bytes]:
+    """Decodes a Redis intset blob: <encoding:4><length:4> then little-endian ints of `encoding` bytes."""
+    width = int.from_bytes(blob[0:4], "little")
+    length = int.from_bytes(blob[4:8], "little")
+    return [
+        b"%d" % int.from_bytes(blob[8 + i * width:8 + (i + 1) * width], "little", signed=True)
+        for i in range(length)
+    ]
+
 def read_value(f, value_type):
-    if value_type == b'\x00':  # string
-        return read_string(f)
-    # other types like lists/hashes could be added later
+    if value_type == b'\x00':  # string (integer-encoded ones stay ints, see encode_string_value)
+        value = read_string_value(f)
+        return shared_integer(value) if type(value) is int else encode_string_value(value)
+    if value_type == b'\x04':  # hash: <size> then field/value string pairs
+        size = read_length(f)
+        return [read_string(f) for _ in range(size * 2)]
+    if value_type == b'\x10':  # hash encoded as a listpack blob
+        return _decode_listpack(read_raw_string(f))
+    if value_type == b'\x02':  # set: <size> then member strings
+        size = read_length(f)
+        return [read_string(f) for _ in range(size)]
+    if value_type == b'\x0b':  # set encoded as an intset blob
+        return _decode_intset(read_raw_string(f))
+    if value_type == b'\x14':  # set encoded as a listpack blob
+        return _decode_listpack(read_raw_string(f))
+    # other types like lists could be added later
     return None
 
 def read_expiry(f, type_byte):
@@ -212,21 +781,19 @@ def read_expiry(f, type_byte):
 def read_encoded_string(f, first_byte):
     encoding_type = first_byte & 0x3F  # last 6 bits
     if encoding_type == 0x00:  # C0 = 8-bit int
-        val = int.from_bytes(f.read(1), "big")
-        return str(val)
+        return int.from_bytes(f.read(1), "little", signed=True)
     elif encoding_type == 0x01:  # C1 = 16-bit int
-        val = int.from_bytes(f.read(2), "little")
-        return str(val)
+        return int.from_bytes(f.read(2), "little", signed=True)
     elif encoding_type == 0x02:  # C2 = 32-bit int
-        val = int.from_bytes(f.read(4), "little")
-        return str(val)
+        return int.from_bytes(f.read(4), "little", signed=True)
     elif encoding_type == 0x03:  # C3 = LZF compressed
         raise Exception("C3 LZF compression not supported in this stage")
     else:
         raise Exception(f"Unknown string encoding: {hex(first_byte)}")
     
-def load_rdb_to_datastore(rdb_path):
-    datastore = {}
+def load_rdb_to_datastore(rdb_path) -> dict[int, dict]:
+    """Reads an RDB file. Returns {database index: {key: entry}}."""
+    databases = {}
 
     with open(rdb_path, "rb") as f:
         # 1. Read header (magic + 4-byte version). Do not consume the rest of the file.
@@ -262,6 +829,9 @@ def load_rdb_to_datastore(rdb_path):
                 break  # End of file
             if byte == b'\xFE':  # Database section
                 db_index = read_length(f)
+                if db_index >= DATABASE_COUNT:
+                    raise Exception(f"RDB file uses database {db_index}, only {DATABASE_COUNT} are supported")
+                datastore = databases.setdefault(db_index, {})
 
                 # Hash table size info (optional)
                 hash_size_marker = f.read(1)
@@ -277,6 +847,9 @@ def load_rdb_to_datastore(rdb_path):
                     type_byte = f.read(1)
                     if not type_byte or type_byte == b'\xFF':
                         break
+                    if type_byte == b'\xFE':  # The next database's section
+                        f.seek(-1, 1)
+                        break
                     if type_byte in (b'\xFC', b'\xFD'):
                         expiry = read_expiry(f, type_byte)
                         type_byte = f.read(1)
@@ -289,6 +862,10 @@ def load_rdb_to_datastore(rdb_path):
                             "value": value,
                             "expiry": expiry
                         }
+                    elif value_type in (b'\x04', b'\x10'):
+                        datastore[key] = _hash_new_entry(value, expiry)
+                    elif value_type in (b'\x02', b'\x0b', b'\x14'):
+                        datastore[key] = _set_new_entry(value, expiry)
             elif byte == b'\xFF':  # End of file section
                 # After 0xFF, 8 bytes of checksum follow. Consume them.
                 _ = f.read(8)
@@ -302,176 +879,171 @@ def load_rdb_to_datastore(rdb_path):
                 # Ignore any unknown/extra bytes after checksum
                 break
 
-    return datastore
-
-def subscribe(client, channel):
-    with BLOCKING_CLIENTS_LOCK:
-        if channel not in CHANNEL_SUBSCRIBERS:
-            CHANNEL_SUBSCRIBERS[channel] = set()
-        CHANNEL_SUBSCRIBERS[channel].add(client)
-
-        if client not in CLIENT_SUBSCRIPTIONS:
-            CLIENT_SUBSCRIPTIONS[client] = set()
-        CLIENT_SUBSCRIPTIONS[client].add(channel)
+    return databases
 
-        if client not in CLIENT_STATE:
-            CLIENT_STATE[client] = {}
-        CLIENT_STATE[client]["is_subscribed"] = True
+def _get_sorted_set(key: bytes) -> tuple[SortedSet | None, bytes | None]:
+    """Looks up a sorted set under DATA_LOCK. Returns (sorted set or None, WRONGTYPE error or None)."""
+    data_entry = _get_live_entry(key)
+    if data_entry is None:
+        return None, None
+    if data_entry["type"] != "sorted_set":
+        return None, WRONGTYPE_ERROR
+    return data_entry["value"], None
 
-def num_client_subscriptions(client) -> int:
-    """
-    Returns the number of channels the given client is subscribed to.
+def add_to_sorted_set(key: bytes, member: bytes, score_str: bytes | str) -> tuple[int | None, bytes | None]:
     """
-    count = 0
-    with BLOCKING_CLIENTS_LOCK:
-        if client in CLIENT_SUBSCRIPTIONS:
-            count = len(CLIENT_SUBSCRIPTIONS[client])
-    return count
-
-def is_client_subscribed(client) -> bool:
-    """
-    Returns whether the given client is subscribed to any channels.
+    Adds a member with a given score to a sorted set.
+    Returns (1 if a new member was added or 0 if an existing member's score was updated, error).
     """
-    with BLOCKING_CLIENTS_LOCK:
-        state = CLIENT_STATE.get(client, {})
-        return state.get("is_subscribed", False)
-    
-def unsubscribe(client, channel):
-    with BLOCKING_CLIENTS_LOCK:
-        if channel in CHANNEL_SUBSCRIBERS:
-            CHANNEL_SUBSCRIBERS[channel].discard(client)
-            if not CHANNEL_SUBSCRIBERS[channel]:
-                del CHANNEL_SUBSCRIBERS[channel]
-
-        if client in CLIENT_SUBSCRIPTIONS:
-            CLIENT_SUBSCRIPTIONS[client].discard(channel)
-            if not CLIENT_SUBSCRIPTIONS[client]:
-                del CLIENT_SUBSCRIPTIONS[client]
+    try:
+        # Convert the score to a 64-bit float
+        score = float(score_str)
+    except ValueError:
+        return None, b"-ERR value is not a valid float\r\n"
+    if math.isnan(score):
+        return None, b"-ERR value is not a valid float\r\n"  # NaN has no place in the score order
+    with DATA_LOCK:
 
-        if client in CLIENT_STATE:
-            subscriptions = CLIENT_SUBSCRIPTIONS.get(client, set())
-            CLIENT_STATE[client]["is_subscribed"] = len(subscriptions) > 0
+        return add_members_to_sorted_set(key, ((member, score),))
 
-def add_to_sorted_set(key: str, member: str, score_str: str) -> int:
+def add_members_to_sorted_set(key: bytes, members_with_scores) -> tuple[int | None, bytes | None]:
     """
-    Adds a member with a given score to a sorted set.
-    Returns 1 if a new member was added, or 0 if an existing member's score was updated.
+    Adds or updates many (member, score) pairs under a single lock acquisition.
+    Returns (number of new members, None), or (None, WRONGTYPE error).
     """
     with DATA_LOCK:
-        try:
-            # Convert the score to a 64-bit float
-            score = float(score_str)
-        except ValueError:
-            return 0 
-
-        # 1. Ensure the sorted set exists in the map
-        if key not in SORTED_SETS:
-            # Create a new sorted set (dictionary of members to scores)
-            SORTED_SETS[key] = {}
-        
-        if key not in DATA_STORE:
+        sorted_set, error = _get_sorted_set(key)
+        if error:
+            return None, error
+        if sorted_set is None:
+            sorted_set = SortedSet()
             DATA_STORE[key] = {
                 "type": "sorted_set",
-                "value": SORTED_SETS[key],
+                "value": sorted_set,
                 "expiry": None
             }
-        
-        # 2. Check if the member already exists
-        is_new_member = member not in SORTED_SETS[key]
-        
-        SORTED_SETS[key][member] = score
 
-        return 1 if is_new_member else 0
+        added = 0
+        for member, score in members_with_scores:
+            if member not in sorted_set:
+                added += 1
+            sorted_set[member] = score
+        return added, None
 
-def num_sorted_set_members(key: str) -> int:
+def num_sorted_set_members(key: bytes) -> tuple[int | None, bytes | None]:
     """
     Returns the number of elements (cardinality) in the sorted set stored at key.
     """
     with DATA_LOCK:
-        # Returns the size of the inner dictionary, or 0 if the key is missing
-        return len(SORTED_SETS.get(key, {}))
+        sorted_set, error = _get_sorted_set(key)
+        if error:
+            return None, error
+        # The size of the sorted set, or 0 if the key is missing
+        return len(sorted_set) if sorted_set is not None else 0, None
     
-def get_sorted_set_rank(key: str, member: str) -> int | None:
+def get_sorted_set_rank(key: bytes, member: bytes) -> tuple[int | None, bytes | None]:
     """
     Returns the rank (0-based index) of the member in the sorted set stored at key.
-    If the member does not exist, returns None.
+    If the member does not exist, the rank is None.
     """
     with DATA_LOCK:
-        if key not in SORTED_SETS or member not in SORTED_SETS[key]:
-            return None
-        
-        # Get all members and their scores
-        members_with_scores = SORTED_SETS[key].items()
+        sorted_set, error = _get_sorted_set(key)
+        if sorted_set is None or member not in sorted_set:
+            return None, error
         
-        # Sort members by score (ascending), then by member name (lexicographically)
-        sorted_members = sorted(members_with_scores, key=lambda item: (item[1], item[0]))
-        
-        # Find the rank of the specified member
-        for rank, (m, _) in enumerate(sorted_members):
-            if m == member:
-                return rank
-        
-        return None  # Should not reach here due to earlier checks
+        # Members are ordered by score, then by member name (lexicographically)
+        return sorted_set.index.rank((sorted_set[member], member)), None
     
-def get_sorted_set_range(key: str, start: int, end: int) -> list[str]:
+def get_sorted_set_range(key: bytes, start: int, end: int, with_scores: bool = False) -> tuple[list | None, bytes | None]:
     """
     Returns a list of members in the sorted set stored at key, from start to end indices (inclusive).
+    With `with_scores`, returns (member, score) tuples instead.
     If the key does not exist, returns an empty list.
     """
     with DATA_LOCK:
-        if key not in SORTED_SETS:
-            return []
-        
-        # Get all members and their scores
-        members_with_scores = SORTED_SETS[key].items()
-        
-        # Sort members by score (ascending), then by member name (lexicographically)
-        sorted_members = sorted(members_with_scores, key=lambda item: (item[1], item[0]))
+        sorted_set, error = _get_sorted_set(key)
+        if sorted_set is None:
+            return ([], None) if error is None else (None, error)
         
-        # Extract just the member names
-        sorted_member_names = [member for member, _ in sorted_members]
+        # Members are ordered by score, then by member name (lexicographically)
+        index = sorted_set.index
         
         # Handle negative indices
         if start < 0:
-            start = start + len(sorted_member_names)
+            start = start + len(index)
         if end < 0:
-            end = end + len(sorted_member_names)
+            end = end + len(index)
         
         # Adjust indices to be within bounds
         start = max(0, start)
-        end = min(end, len(sorted_member_names) - 1)
+        end = min(end, len(index) - 1)
         
-        if start > end or start >= len(sorted_member_names):
-            return []
+        if start > end or start >= len(index):
+            return [], None
 
-        return sorted_member_names[start:end + 1]
+        pairs = index.slice(start, end + 1)
+        if with_scores:
+            return [(member, score) for score, member in pairs], None
+        return [member for _, member in pairs], None
 
-def get_zscore(key: str, member: str) -> float | None:
+def get_zscore(key: bytes, member: bytes) -> tuple[float | None, bytes | None]:
     """
     Returns the score of the member in the sorted set stored at key.
-    If the member does not exist, returns None.
+    If the member does not exist, the score is None.
     """
     with DATA_LOCK:
-        if key not in SORTED_SETS or member not in SORTED_SETS[key]:
-            return None
-        
-        return SORTED_SETS[key][member]
+        sorted_set, error = _get_sorted_set(key)
+        if sorted_set is None:
+            return None, error
+        return sorted_set.get(member), None
 
-def remove_from_sorted_set(key: str, member: str) -> int:
+def get_zscores(key: bytes, members: list[bytes]) -> tuple[list[float | None] | None, bytes | None]:
+    """
+    Returns the scores of several members (None for missing ones) with a single key lookup
+    (GEOPOS, GEODIST).
+    """
+    with DATA_LOCK:
+        sorted_set, error = _get_sorted_set(key)
+        if error:
+            return None, error
+        if sorted_set is None:
+            return [None] * len(members), None
+        return [sorted_set.get(member) for member in members], None
+
+def remove_from_sorted_set(key: bytes, member: bytes) -> tuple[int | None, bytes | None]:
     """
     Removes a member from the sorted set stored at key.
     Returns 1 if the member was removed, or 0 if the member did not exist.
     """
     with DATA_LOCK:
-        if key not in SORTED_SETS or member not in SORTED_SETS[key]:
-            return 0
+        sorted_set, error = _get_sorted_set(key)
+        if sorted_set is None or member not in sorted_set:
+            return (0, None) if error is None else (None, error)
         
-        del SORTED_SETS[key][member]
-        if not SORTED_SETS[key]:
-            del SORTED_SETS[key]
-            if key in DATA_STORE:
-                del DATA_STORE[key]
-        return 1
+        del sorted_set[member]
+        if not sorted_set:
+            _remove_key(key)
+        return 1, None
+
+class Stream(list):
+    """
+    A stream's entries ({"id": "ms-seq", "fields": {...}} dicts, in ID order), stored as the
+    value of its key. The consumer groups (app/streams.py) belong to the same object.
+    """
+    __slots__ = ("groups",)
+
+    def __init__(self, entries=()):
+        super().__init__(entries)
+        self.groups = {}  # group name -> group
+
+def _get_stream(key: bytes) -> tuple[Stream | None, bytes | None]:
+    """Looks up a stream under DATA_LOCK. Returns (stream or None, WRONGTYPE error or None)."""
+    data_entry = _get_live_entry(key)
+    if data_entry is None:
+        return None, None
+    if data_entry["type"] != "stream":
+        return None, WRONGTYPE_ERROR
+    return data_entry["value"], None
 
 def _verify_and_parse_new_id(new_id_str: str, last_id_str: str | None) -> tuple[str | None, bytes | None]:
     """
@@ -556,7 +1128,7 @@ def _verify_and_parse_new_id(new_id_str: str, last_id_str: str | None) -> tuple[
     # Validation succeeded for explicit ID
     return new_id_str, None
 
-def xadd(key: str, id: str, fields: dict[str, str]) -> bytes:
+def xadd(key: bytes, id: str, fields: dict[bytes, bytes]) -> bytes:
     """
     Adds an entry to a stream at the given key with the specified ID and fields.
     Returns the ID string on success, or a RESP Error bytes on failure.
@@ -564,25 +1136,26 @@ def xadd(key: str, id: str, fields: dict[str, str]) -> bytes:
     with DATA_LOCK:
         
         # Get last ID (safely handle non-existent key after expiration check)
+        stream, error = _get_stream(key)
+        if error:
+            return error
         last_id_str = None
-        if key in STREAMS and STREAMS[key]:
-            last_id_str = STREAMS[key][-1]["id"]
+        if stream:
+            last_id_str = stream[-1]["id"]
 
         # validation
         final_id_str, error_response = _verify_and_parse_new_id(id, last_id_str)
-        print(f"final_id_str: {final_id_str}")
 
         if error_response is not None:
             return error_response
             
         new_entry_id = final_id_str
-        # Initialization (idempotent)
-        if key not in STREAMS:
-            STREAMS[key] = []
-        if key not in DATA_STORE:
+        # Initialization
+        if stream is None:
+            stream = Stream()
             DATA_STORE[key] = {
                 "type": "stream",
-                "value": None, # Stream data is in STREAMS, not here
+                "value": stream,
                 "expiry": None
             }
         
@@ -591,22 +1164,23 @@ def xadd(key: str, id: str, fields: dict[str, str]) -> bytes:
             "id": new_entry_id,
             "fields": fields
         }
-        STREAMS[key].append(entry)
+        stream.append(entry)
+        _signal_key_ready(key)
         
         # Success: Return the ID string for command execution to format
         return new_entry_id.encode()
 
-def xrange(key: str, start_id: str, end_id: str) -> list[dict]:
+def xrange(key: bytes, start_id: str, end_id: str) -> tuple[list[dict] | None, bytes | None]:
     """
     Returns a list of stream entries in the range [start_id, end_id] for the given key.
     Each entry is a dictionary with 'id' and 'fields'.
     If the key does not exist, returns an empty list.
     """
     with DATA_LOCK:
-        if key not in STREAMS:
-            return []
+        entries, error = _get_stream(key)
+        if entries is None:
+            return ([], None) if error is None else (None, error)
         
-        entries = STREAMS[key]
         result = []
 
         for entry in entries:
@@ -615,7 +1189,7 @@ def xrange(key: str, start_id: str, end_id: str) -> list[dict]:
                (end_id == "+" or compare_stream_ids(entry_id, end_id) <= 0):
                 result.append(entry)
 
-        return result
+        return result, None
 
 def compare_stream_ids(id1: str, id2: str) -> int:
     """
@@ -640,85 +1214,82 @@ def compare_stream_ids(id1: str, id2: str) -> int:
         else:
             return 0
 
-def xread(keys: list[str], last_ids: list[str]) -> dict[str, list[dict]]:
-    """
-    Reads entries from multiple streams starting after the given last IDs.
-    Returns a dictionary mapping each key to a list of new entries.
-    If a key does not exist, it will not be included in the result.
-    """
-    with DATA_LOCK:
-        result = {}
-
-        for key, last_id in zip(keys, last_ids):
-
-            if last_id == "$":
-                resolved_id = get_stream_max_id(key)
-            else:
-                resolved_id = last_id
-
-            if key not in STREAMS:
-                continue
-            
-            entries = STREAMS[key]
-            new_entries = []
-
-            for entry in entries:
-                entry_id = entry["id"]
-                if compare_stream_ids(entry_id, resolved_id) > 0:
-                    new_entries.append(entry)
-
-            if new_entries:
-                result[key] = new_entries
+def parse_stream_id(stream_id: str) -> tuple[int, int] | None:
+    """A "ms-seq" (or "ms") ID as a comparable (ms, seq) tuple, or None if it is malformed."""
+    ms, _, seq = stream_id.partition("-")
+    try:
+        parsed = int(ms), int(seq) if seq else 0
+    except ValueError:
+        return None
+    if parsed[0] < 0 or parsed[1] < 0:
+        return None
+    return parsed
 
-        return result
+def _entry_id_key(entry: dict) -> tuple[int, int]:
+    ms, _, seq = entry["id"].partition("-")
+    return int(ms), int(seq)
 
-def get_stream_max_id(key: str) -> str:
+def stream_entries_after(entries: list[dict], last_id: tuple[int, int], count: int | None = None) -> list[dict]:
+    """
+    The entries with an ID greater than `last_id`, at most `count` of them. Entries are
+    kept in ID order, so this is a binary search rather than a scan. Caller holds DATA_LOCK.
+    """
+    if not entries or _entry_id_key(entries[-1]) <= last_id:
+        return []  # The common case for blocked readers that are already caught up
+    start = bisect.bisect_right(entries, last_id, key=_entry_id_key)
+    end = len(entries) if count is None else start + count
+    return entries[start:end]
+
+def find_stream_entry(entries: list[dict], stream_id: tuple[int, int]) -> dict | None:
+    """The entry with exactly this ID, or None. Caller holds DATA_LOCK."""
+    index = bisect.bisect_left(entries, stream_id, key=_entry_id_key)
+    if index < len(entries) and _entry_id_key(entries[index]) == stream_id:
+        return entries[index]
+    return None
 
+def read_streams(keys: list[bytes], last_ids: list[tuple[int, int]], count: int | None = None) -> dict[bytes, list[dict]]:
     """
-    Returns the ID of the last entry in the stream.
-    Used for '$' in XREAD to mean "read from the end".
-    Returns "0-0" if the stream is empty/non-existent, which is the conceptual ID 
-    just before the first valid entry (0-1) or any other entry.
+    Reads the entries after the given last IDs from several streams (XREAD).
+    Streams with nothing new are left out of the result. Caller holds DATA_LOCK.
     """
-    with DATA_LOCK:
-        # Check if the stream key exists and has entries
-        if key in STREAMS and STREAMS[key]:
-            return STREAMS[key][-1]["id"]
-        
-        # If stream is empty, we return "0-0" so that the first valid entry (0-1, 1-0, etc.) 
-        # is correctly recognized as greater than the starting ID.
-        return "0-0"
-    
-def increment_key_value(key: str) -> tuple[int | None, str | None]:
+    result = {}
+    for key, last_id in zip(keys, last_ids):
+        entries, _ = _get_stream(key)
+        if not entries:
+            continue
+        new_entries = stream_entries_after(entries, last_id, count)
+        if new_entries:
+            result[key] = new_entries
+    return result
+
+def increment_key_value(key: bytes, increment: int = 1) -> tuple[int | None, str | None]:
     """
-    Atomically increments the integer value of a key by one.
+    Atomically increments the integer value of a key by `increment` (INCR, INCRBY, DECR, DECRBY).
     Handles non-existent key, wrong type, and non-integer value errors.
     Returns: (new_value: int | None, error_message: str | None)
     """
-    data_entry = get_data_entry(key) # This already checks for expiry
     with DATA_LOCK:
+        data_entry = _get_live_entry(key) # This already checks for expiry
 
-        print("retrieved data")
-        # 1. Key does not exist: Initialize to 0, then increment to 1.
+        # 1. Key does not exist: Initialize to 0, then increment.
         if data_entry is None:
-            # We must set the key to "1" directly, not "0" then "1"
+            # We must set the key to the increment directly, not "0" then the increment
             DATA_STORE[key] = {
                 "type": "string",
-                "value": "1",
+                "value": shared_integer(increment),
                 "expiry": None
             }
-            return 1, None
+            return increment, None
 
         # 2. Key exists but is the wrong type
         if data_entry.get("type") != "string":
             return None, "-WRONGTYPE Operation against a key holding the wrong kind of value\r\n"
 
-        current_value_str = data_entry["value"]
+        current_value = data_entry["value"]
 
-        # 3. Key exists and is a string, but not a valid integer
-        try:
-            current_value = int(current_value_str)
-        except ValueError:
+        # 3. Key exists and is a string, but not a valid integer. Counters are already
+        #    stored as ints, so the common case needs no parsing at all.
+        if type(current_value) is not int:
             return None, "-ERR value is not an integer or out of range\r\n"
 
         # 4. Perform increment and check for overflow (Redis uses signed 64-bit integers)
@@ -727,21 +1298,664 @@ def increment_key_value(key: str) -> tuple[int | None, str | None]:
         MAX_64_BIT = 9223372036854775807
         MIN_64_BIT = -9223372036854775808
 
-        if current_value >= MAX_64_BIT or current_value < MIN_64_BIT:
-            # An increment will definitely cause an overflow from MAX_64_BIT,
-            # and we should prevent modification if the value is already at a limit
-            return None, "-ERR increment or decrement would overflow\r\n"
-        
-        # Redis behavior: INCR stops at MAX_64_BIT, meaning you can't INCR 9223372036854775807
-        if current_value == MAX_64_BIT:
+        if current_value > MAX_64_BIT or current_value < MIN_64_BIT:
+            return None, "-ERR value is not an integer or out of range\r\n"
+
+        new_value = current_value + increment
+
+        # Redis behavior: the result must still fit in a signed 64-bit integer,
+        # meaning you can't INCR 9223372036854775807
+        if new_value > MAX_64_BIT or new_value < MIN_64_BIT:
             return None, "-ERR increment or decrement would overflow\r\n"
-            
-        new_value = current_value + 1
 
         # 5. Update and return
-        data_entry["value"] = str(new_value)
+        data_entry["value"] = shared_integer(new_value)
         return new_value, None
 
+def _format_float(value: float) -> str:
+    """Formats a float the way Redis replies to INCRBYFLOAT (fixed point, no trailing zeros)."""
+    text = format(Decimal(repr(value)), "f")
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+def parse_float_value(value: int | bytes) -> float | None:
+    """
+    Parses a float argument or string value the way Redis does: no surrounding whitespace,
+    no underscores and no NaN. Returns None when the value is not a valid float.
+    """
+    if isinstance(value, int):
+        return float(value)
+    if not value or value != value.strip() or b"_" in value:
+        return None
+    try:
+        parsed = float(value)
+    except ValueError:
+        return None
+    return None if math.isnan(parsed) else parsed
+
+def increment_key_by_float(key: bytes, increment: bytes) -> tuple[bytes | None, bytes | None]:
+    """INCRBYFLOAT: returns (new value as bytes, error)."""
+    increment = parse_float_value(increment)
+    if increment is None:
+        return None, b"-ERR value is not a valid float\r\n"
+
+    with DATA_LOCK:
+        data_entry = _get_live_entry(key)
+        if data_entry is not None and data_entry.get("type") != "string":
+            return None, WRONGTYPE_ERROR
+
+        current_value = parse_float_value(data_entry["value"]) if data_entry is not None else 0.0
+        if current_value is None:
+            return None, b"-ERR value is not a valid float\r\n"
+
+        new_value = current_value + increment
+        if math.isnan(new_value) or math.isinf(new_value):
+            return None, b"-ERR increment would produce NaN or Infinity\r\n"
+
+        new_value_bytes = _format_float(new_value).encode()
+        if data_entry is None:
+            DATA_STORE[key] = {"type": "string", "value": encode_string_value(new_value_bytes), "expiry": None}
+        else:
+            data_entry["value"] = encode_string_value(new_value_bytes)
+        return new_value_bytes, None
+
+def _get_string_entry(key: bytes) -> tuple[dict | None, bytes | None]:
+    """Looks up a string under DATA_LOCK. Returns (entry or None, WRONGTYPE error or None)."""
+    data_entry = _get_live_entry(key)
+    if data_entry is not None and data_entry.get("type") != "string":
+        return None, WRONGTYPE_ERROR
+    return data_entry, None
+
+def mget(keys: list[bytes]) -> list[bytes | None]:
+    """
+    Returns the values of all keys under a single DATA_LOCK acquisition.
+    Missing keys and keys holding another type yield None, like Redis.
+    """
+    values = [None] * len(keys)
+    with DATA_LOCK:
+        for i, key in enumerate(keys):
+            data_entry = _get_live_entry(key)
+            if data_entry is not None and data_entry.get("type") == "string":
+                values[i] = string_value_to_bytes(data_entry["value"])
+    return values
+
+def mset(keys_and_values: list[bytes], only_if_none_exist: bool = False) -> bool:
+    """
+    Sets several string keys atomically (MSET), or none of them if `only_if_none_exist`
+    is set and any key already exists (MSETNX). Returns whether the keys were set.
+    """
+    with DATA_LOCK:
+        if only_if_none_exist:
+            for i in range(0, len(keys_and_values), 2):
+                if _get_live_entry(keys_and_values[i]) is not None:
+                    return False
+
+        for i in range(0, len(keys_and_values), 2):
+            DATA_STORE[keys_and_values[i]] = {
+                "type": "string",
+                "value": encode_string_value(keys_and_values[i + 1]),
+                "expiry": None
+            }
+        return True
+
+def getset(key: bytes, value: bytes) -> tuple[bytes | None, bytes | None]:
+    """Sets a new value and returns the old one (GETSET), dropping any TTL like SET does."""
+    with DATA_LOCK:
+        data_entry, error = _get_string_entry(key)
+        if error:
+            return None, error
+        DATA_STORE[key] = {"type": "string", "value": encode_string_value(value), "expiry": None}
+        return (string_value_to_bytes(data_entry["value"]) if data_entry is not None else None), None
+
+def append_to_string(key: bytes, value: bytes) -> tuple[int | None, bytes | None]:
+    """APPEND: returns (length after the append, error)."""
+    with DATA_LOCK:
+        data_entry, error = _get_string_entry(key)
+        if error:
+            return None, error
+        if data_entry is None:
+            DATA_STORE[key] = {"type": "string", "value": encode_string_value(value), "expiry": None}
+            return len(value), None
+        new_value = string_value_to_bytes(data_entry["value"]) + value
+        data_entry["value"] = encode_string_value(new_value)
+        return len(new_value), None
+
+def get_string_range(key: bytes, start: int, end: int) -> tuple[bytes | None, bytes | None]:
+    """GETRANGE with inclusive, possibly negative, offsets."""
+    with DATA_LOCK:
+        data_entry, error = _get_string_entry(key)
+        if data_entry is None:
+            return (b"", None) if error is None else (None, error)
+        value = string_value_to_bytes(data_entry["value"])
+
+    length = len(value)
+    if start < 0:
+        start = max(start + length, 0)
+    if end < 0:
+        end = end + length
+    end = min(end, length - 1)
+    if start > end or length == 0:
+        return b"", None
+    return value[start:end + 1], None
+
+def set_string_range(key: bytes, offset: int, value: bytes) -> tuple[int | None, bytes | None]:
+    """SETRANGE: overwrites part of the string, zero-padding it if needed. Returns the new length."""
+    with DATA_LOCK:
+        data_entry, error = _get_string_entry(key)
+        if error:
+            return None, error
+
+        current = string_value_to_bytes(data_entry["value"]) if data_entry is not None else b""
+        if not value:
+            return len(current), None
+
+        if len(current) < offset:
+            current = current + b"\x00" * (offset - len(current))
+        new_value = current[:offset] + value + current[offset + len(value):]
+
+        if data_entry is None:
+            DATA_STORE[key] = {"type": "string", "value": encode_string_value(new_value), "expiry": None}
+        else:
+            data_entry["value"] = encode_string_value(new_value)
+        return len(new_value), None
+
+def get_string_and_update(key: bytes, delete: bool = False, expiry_timestamp: int | None = None,
+                          persist: bool = False) -> tuple[bytes | None, bytes | None]:
+    """
+    GETDEL / GETEX: returns the string value and, in the same critical section, deletes
+    the key, sets a new expiry timestamp, or removes the TTL (persist).
+    """
+    with DATA_LOCK:
+        data_entry, error = _get_string_entry(key)
+        if data_entry is None:
+            return None, error
+
+        if delete:
+            del DATA_STORE[key]
+        elif persist:
+            set_entry_expiry(data_entry, None)
+        elif expiry_timestamp is not None:
+            set_entry_expiry(data_entry, expiry_timestamp)
+        return string_value_to_bytes(data_entry["value"]), None
+
+def _hash_exceeds_listpack(fields_and_values: list) -> bool:
+    """
+    Returns True when a flat [field, value, ...] list no longer qualifies for the
+    compact encoding (too many entries or an oversized field/value).
+    """
+    if len(fields_and_values) // 2 > SERVER_CONFIG["hash-max-listpack-entries"]:
+        return True
+    max_value = SERVER_CONFIG["hash-max-listpack-value"]
+    return any(len(item) > max_value for item in fields_and_values)
+
+def _hash_new_entry(fields_and_values: list, expiry_timestamp: int | None) -> dict:
+    """
+    Builds a hash entry. Small hashes are stored as a flat [field, value, ...] list
+    (like Redis's listpack), which avoids a dict per key; larger ones use a dict.
+    """
+    if _hash_exceeds_listpack(fields_and_values):
+        value = {fields_and_values[i]: fields_and_values[i + 1] for i in range(0, len(fields_and_values), 2)}
+        encoding = "hashtable"
+    else:
+        value = fields_and_values
+        encoding = "listpack"
+    return {"type": "hash", "encoding": encoding, "value": value, "expiry": expiry_timestamp}
+
+def _hash_convert_to_hashtable(data_entry: dict):
+    flat = data_entry["value"]
+    data_entry["value"] = {flat[i]: flat[i + 1] for i in range(0, len(flat), 2)}
+    data_entry["encoding"] = "hashtable"
+
+def _hash_field_index(flat: list, field: bytes) -> int:
+    """Returns the index of `field` in a listpack-encoded hash, or -1."""
+    try:
+        return flat[0::2].index(field) * 2
+    except ValueError:
+        return -1
+
+def _hash_get(data_entry: dict, field: bytes) -> bytes | None:
+    if data_entry["encoding"] == "hashtable":
+        return data_entry["value"].get(field)
+    flat = data_entry["value"]
+    index = _hash_field_index(flat, field)
+    return flat[index + 1] if index != -1 else None
+
+def _hash_set(data_entry: dict, field: bytes, value: bytes) -> int:
+    """Sets one field, converting to a dict when the listpack limits are crossed. Returns 1 if new."""
+    if data_entry["encoding"] == "listpack":
+        max_value = SERVER_CONFIG["hash-max-listpack-value"]
+        if len(field) > max_value or len(value) > max_value:
+            _hash_convert_to_hashtable(data_entry)
+        else:
+            flat = data_entry["value"]
+            index = _hash_field_index(flat, field)
+            if index != -1:
+                flat[index + 1] = value
+                return 0
+            flat.append(field)
+            flat.append(value)
+            if len(flat) // 2 > SERVER_CONFIG["hash-max-listpack-entries"]:
+                _hash_convert_to_hashtable(data_entry)
+            return 1
+
+    table = data_entry["value"]
+    is_new_field = field not in table
+    table[field] = value
+    if is_new_field:
+        data_entry.pop("scan_fields", None)  # HSCAN's field order changed
+    return 1 if is_new_field else 0
+
+def _hash_items(data_entry: dict) -> list[tuple[bytes, bytes]]:
+    if data_entry["encoding"] == "hashtable":
+        return list(data_entry["value"].items())
+    flat = data_entry["value"]
+    return list(zip(flat[0::2], flat[1::2]))
+
+def _hash_len(data_entry: dict) -> int:
+    if data_entry["encoding"] == "hashtable":
+        return len(data_entry["value"])
+    return len(data_entry["value"]) // 2
+
+def _get_hash_entry(key: bytes) -> tuple[dict | None, bytes | None]:
+    """Looks up a hash under DATA_LOCK. Returns (entry or None, WRONGTYPE error or None)."""
+    data_entry = _get_live_entry(key)
+    if data_entry is not None and data_entry.get("type") != "hash":
+        return None, WRONGTYPE_ERROR
+    return data_entry, None
+
+def hset(key: bytes, fields_and_values: list[bytes]) -> tuple[int | None, bytes | None]:
+    """
+    Sets field/value pairs in the hash at key, creating it if needed.
+    Returns (number of new fields, error).
+    """
+    with DATA_LOCK:
+        data_entry, error = _get_hash_entry(key)
+        if error:
+            return None, error
+
+        if data_entry is None:
+            # Deduplicate fields (last write wins) before choosing the encoding
+            unique = {}
+            for i in range(0, len(fields_and_values), 2):
+                unique[fields_and_values[i]] = fields_and_values[i + 1]
+            flat = [item for pair in unique.items() for item in pair]
+            DATA_STORE[key] = _hash_new_entry(flat, None)
+            return len(unique), None
+
+        added = 0
+        for i in range(0, len(fields_and_values), 2):
+            added += _hash_set(data_entry, fields_and_values[i], fields_and_values[i + 1])
+        return added, None
+
+def hget(key: bytes, field: bytes) -> tuple[bytes | None, bytes | None]:
+    with DATA_LOCK:
+        data_entry, error = _get_hash_entry(key)
+        if data_entry is None:
+            return None, error
+        return _hash_get(data_entry, field), None
+
+def hmget(key: bytes, fields: list[bytes]) -> tuple[list[bytes | None] | None, bytes | None]:
+    with DATA_LOCK:
+        data_entry, error = _get_hash_entry(key)
+        if error:
+            return None, error
+        if data_entry is None:
+            return [None] * len(fields), None
+        return [_hash_get(data_entry, field) for field in fields], None
+
+def hgetall(key: bytes) -> tuple[list[tuple[bytes, bytes]] | None, bytes | None]:
+    with DATA_LOCK:
+        data_entry, error = _get_hash_entry(key)
+        if data_entry is None:
+            return ([], None) if error is None else (None, error)
+        return _hash_items(data_entry), None
+
+def hdel(key: bytes, fields: list[bytes]) -> tuple[int | None, bytes | None]:
+    """
+    Removes fields from the hash, deleting the key once it is empty.
+    Returns (number of removed fields, error).
+    """
+    with DATA_LOCK:
+        data_entry, error = _get_hash_entry(key)
+        if data_entry is None:
+            return (0, None) if error is None else (None, error)
+
+        removed = 0
+        for field in fields:
+            if data_entry["encoding"] == "hashtable":
+                if data_entry["value"].pop(field, None) is not None:
+                    data_entry.pop("scan_fields", None)  # HSCAN's field order changed
+                    removed += 1
+            else:
+                flat = data_entry["value"]
+                index = _hash_field_index(flat, field)
+                if index != -1:
+                    del flat[index:index + 2]
+                    removed += 1
+
+        if _hash_len(data_entry) == 0:
+            del DATA_STORE[key]
+        return removed, None
+
+def hincrby(key: bytes, field: bytes, increment: int) -> tuple[int | None, bytes | None]:
+    with DATA_LOCK:
+        data_entry, error = _get_hash_entry(key)
+        if error:
+            return None, error
+        if data_entry is None:
+            data_entry = DATA_STORE[key] = _hash_new_entry([], None)
+
+        current = _hash_get(data_entry, field)
+        # Only the canonical decimal form counts, as for int-encoded strings (no " 1", "+1", "1_0")
+        current_value = _intset_value(current) if current is not None else 0
+        if current_value is None:
+            return None, b"-ERR hash value is not an integer\r\n"
+
+        new_value = current_value + increment
+        if not (-9223372036854775808 <= new_value <= 9223372036854775807):
+            return None, b"-ERR increment or decrement would overflow\r\n"
+
+        _hash_set(data_entry, field, b"%d" % new_value)
+        return new_value, None
+
+def hlen(key: bytes) -> tuple[int | None, bytes | None]:
+    with DATA_LOCK:
+        data_entry, error = _get_hash_entry(key)
+        if data_entry is None:
+            return (0, None) if error is None else (None, error)
+        return _hash_len(data_entry), None
+
+def hscan(key: bytes, cursor: int, pattern: bytes | None, count: int) -> tuple[int, list[tuple[bytes, bytes]] | None, bytes | None]:
+    """
+    Incrementally iterates a hash. The cursor is a position in the field order;
+    listpack-encoded hashes are small and are always returned in one call (cursor 0).
+    Returns (next_cursor, matching (field, value) pairs, error).
+    """
+    with DATA_LOCK:
+        data_entry, error = _get_hash_entry(key)
+        if data_entry is None:
+            return 0, ([] if error is None else None), error
+
+        table = data_entry["value"]
+        if data_entry["encoding"] == "listpack":
+            batch = list(zip(table[0::2], table[1::2]))
+            next_cursor = 0
+        else:
+            # A dict has no positional access, so the field order is listed once and kept
+            # in the entry until a field is added or removed (or the scan ends): each step
+            # slices `count` fields from it instead of walking the dict up to the cursor
+            fields = data_entry.get("scan_fields")
+            if fields is None:
+                fields = data_entry["scan_fields"] = list(table)
+            batch = [(field, table[field]) for field in fields[cursor:cursor + count]]
+            next_cursor = cursor + count if cursor + count < len(fields) else 0
+            if next_cursor == 0:
+                del data_entry["scan_fields"]
+
+    if pattern is not None:
+        match = compile_glob(pattern).match
+        batch = [(field, value) for field, value in batch if match(field)]
+    return next_cursor, batch, None
+
+def _intset_value(member: bytes) -> int | None:
+    """
+    Returns the member as an int if it can live in the compact intset encoding,
+    i.e. it is the canonical decimal form of a signed 64-bit integer.
+    """
+    try:
+        value = int(member)
+    except ValueError:
+        return None
+    if b"%d" % value != member or not (-9223372036854775808 <= value <= 9223372036854775807):
+        return None
+    return value
+
+def _set_new_entry(members: list[bytes], expiry_timestamp: int | None) -> dict:
+    """
+    Builds a set entry. Sets of integers are kept as a sorted array('q') ("intset",
+    8 bytes per member, binary searched); anything else uses a Python set.
+    """
+    int_values = []
+    for member in members:
+        value = _intset_value(member)
+        if value is None:
+            break
+        int_values.append(value)
+    else:
+        unique_values = sorted(set(int_values))
+        if len(unique_values) <= SERVER_CONFIG["set-max-intset-entries"]:
+            return {"type": "set", "encoding": "intset", "value": array("q", unique_values), "expiry": expiry_timestamp}
+    return {"type": "set", "encoding": "hashtable", "value": set(members), "expiry": expiry_timestamp}
+
+def _set_convert_to_hashtable(data_entry: dict):
+    data_entry["value"] = {b"%d" % value for value in data_entry["value"]}
+    data_entry["encoding"] = "hashtable"
+
+def _set_contains(data_entry: dict, member: bytes) -> bool:
+    if data_entry["encoding"] == "hashtable":
+        return member in data_entry["value"]
+    value = _intset_value(member)
+    if value is None:
+        return False
+    intset = data_entry["value"]
+    index = bisect.bisect_left(intset, value)
+    return index < len(intset) and intset[index] == value
+
+def _set_add(data_entry: dict, member: bytes) -> int:
+    """Adds one member, upgrading an intset when needed. Returns 1 if it was new."""
+    if data_entry["encoding"] == "intset":
+        value = _intset_value(member)
+        if value is None:
+            _set_convert_to_hashtable(data_entry)
+        else:
+            intset = data_entry["value"]
+            index = bisect.bisect_left(intset, value)
+            if index < len(intset) and intset[index] == value:
+                return 0
+            intset.insert(index, value)
+            if len(intset) > SERVER_CONFIG["set-max-intset-entries"]:
+                _set_convert_to_hashtable(data_entry)
+            return 1
+
+    members = data_entry["value"]
+    if member in members:
+        return 0
+    members.add(member)
+    return 1
+
+def _set_remove(data_entry: dict, member: bytes) -> int:
+    if data_entry["encoding"] == "hashtable":
+        if member in data_entry["value"]:
+            data_entry["value"].discard(member)
+            return 1
+        return 0
+    value = _intset_value(member)
+    if value is None:
+        return 0
+    intset = data_entry["value"]
+    index = bisect.bisect_left(intset, value)
+    if index < len(intset) and intset[index] == value:
+        del intset[index]
+        return 1
+    return 0
+
+def _set_members(data_entry: dict) -> list[bytes]:
+    if data_entry["encoding"] == "intset":
+        return [b"%d" % value for value in data_entry["value"]]
+    return list(data_entry["value"])
+
+def _get_set_entry(key: bytes) -> tuple[dict | None, bytes | None]:
+    """Looks up a set under DATA_LOCK. Returns (entry or None, WRONGTYPE error or None)."""
+    data_entry = _get_live_entry(key)
+    if data_entry is not None and data_entry.get("type") != "set":
+        return None, WRONGTYPE_ERROR
+    return data_entry, None
+
+def _get_set_entries(keys: list[bytes]) -> tuple[list[dict | None] | None, bytes | None]:
+    entries = []
+    for key in keys:
+        data_entry, error = _get_set_entry(key)
+        if error:
+            return None, error
+        entries.append(data_entry)
+    return entries, None
+
+def sadd(key: bytes, members: list[bytes]) -> tuple[int | None, bytes | None]:
+    with DATA_LOCK:
+        data_entry, error = _get_set_entry(key)
+        if error:
+            return None, error
+        if data_entry is None:
+            data_entry = DATA_STORE[key] = _set_new_entry(members, None)
+            return len(data_entry["value"]), None
+        return sum(_set_add(data_entry, member) for member in members), None
+
+def srem(key: bytes, members: list[bytes]) -> tuple[int | None, bytes | None]:
+    with DATA_LOCK:
+        data_entry, error = _get_set_entry(key)
+        if data_entry is None:
+            return (0, None) if error is None else (None, error)
+        removed = sum(_set_remove(data_entry, member) for member in members)
+        if not data_entry["value"]:
+            del DATA_STORE[key]
+        return removed, None
+
+def smismember(key: bytes, members: list[bytes]) -> tuple[list[int] | None, bytes | None]:
+    with DATA_LOCK:
+        data_entry, error = _get_set_entry(key)
+        if error:
+            return None, error
+        if data_entry is None:
+            return [0] * len(members), None
+        return [1 if _set_contains(data_entry, member) else 0 for member in members], None
+
+def scard(key: bytes) -> tuple[int | None, bytes | None]:
+    with DATA_LOCK:
+        data_entry, error = _get_set_entry(key)
+        if data_entry is None:
+            return (0, None) if error is None else (None, error)
+        return len(data_entry["value"]), None
+
+def smembers(key: bytes) -> tuple[list[bytes] | None, bytes | None]:
+    with DATA_LOCK:
+        data_entry, error = _get_set_entry(key)
+        if data_entry is None:
+            return ([], None) if error is None else (None, error)
+        return _set_members(data_entry), None
+
+def _set_intersection(entries: list[dict | None], limit: int = 0) -> list[bytes]:
+    """
+    Intersects sets the way Redis's sinterGenericCommand does: walk the smallest set
+    and probe the others from smallest to largest, so most candidates are rejected
+    by the cheapest check. Stops early once `limit` members were found (0 = no limit).
+    """
+    if not entries or any(entry is None for entry in entries):
+        return []
+
+    ordered = sorted(entries, key=lambda entry: len(entry["value"]))
+    smallest, others = ordered[0], ordered[1:]
+
+    if all(entry["encoding"] == "intset" for entry in ordered):
+        # Integers only: intersect the int values in C, without formatting each member of
+        # the smallest set and parsing it back for every probe
+        common = set(smallest["value"])
+        for entry in others:
+            common.intersection_update(entry["value"])
+        values = [value for value in smallest["value"] if value in common]
+        return [b"%d" % value for value in (values[:limit] if limit else values)]
+
+    result = []
+    for member in _set_members(smallest):
+        for entry in others:
+            if not _set_contains(entry, member):
+                break
+        else:
+            result.append(member)
+            if limit and len(result) >= limit:
+                break
+    return result
+
+def sinter(keys: list[bytes]) -> tuple[list[bytes] | None, bytes | None]:
+    with DATA_LOCK:
+        entries, error = _get_set_entries(keys)
+        if error:
+            return None, error
+        return _set_intersection(entries), None
+
+def sintercard(keys: list[bytes], limit: int) -> tuple[int | None, bytes | None]:
+    with DATA_LOCK:
+        entries, error = _get_set_entries(keys)
+        if error:
+            return None, error
+        return len(_set_intersection(entries, limit)), None
+
+def sinterstore(destination: bytes, keys: list[bytes]) -> tuple[int | None, bytes | None]:
+    with DATA_LOCK:
+        entries, error = _get_set_entries(keys)
+        if error:
+            return None, error
+        members = _set_intersection(entries)
+
+        DATA_STORE.pop(destination, None)
+        if members:
+            DATA_STORE[destination] = _set_new_entry(members, None)
+        return len(members), None
+
+def sunion(keys: list[bytes]) -> tuple[list[bytes] | None, bytes | None]:
+    with DATA_LOCK:
+        entries, error = _get_set_entries(keys)
+        if error:
+            return None, error
+        union = set()
+        for entry in entries:
+            if entry is not None:
+                union.update(_set_members(entry))
+        return list(union), None
+
+def sdiff(keys: list[bytes]) -> tuple[list[bytes] | None, bytes | None]:
+    with DATA_LOCK:
+        entries, error = _get_set_entries(keys)
+        if error:
+            return None, error
+        first, others = entries[0], [entry for entry in entries[1:] if entry is not None]
+        if first is None:
+            return [], None
+        return [member for member in _set_members(first)
+                if not any(_set_contains(entry, member) for entry in others)], None
+
+def srandmember(key: bytes, count: int | None) -> tuple[list[bytes] | None, bytes | None]:
+    """
+    Returns random members without removing them. A positive count returns distinct
+    members, a negative count may repeat members (Redis semantics).
+    """
+    with DATA_LOCK:
+        data_entry, error = _get_set_entry(key)
+        if data_entry is None:
+            return ([], None) if error is None else (None, error)
+        members = _set_members(data_entry)
+
+    if count is None:
+        return [random.choice(members)], None
+    if count >= 0:
+        return random.sample(members, min(count, len(members))), None
+    return [random.choice(members) for _ in range(-count)], None
+
+def spop(key: bytes, count: int) -> tuple[list[bytes] | None, bytes | None]:
+    """Removes and returns up to `count` random members."""
+    with DATA_LOCK:
+        data_entry, error = _get_set_entry(key)
+        if data_entry is None:
+            return ([], None) if error is None else (None, error)
+
+        members = _set_members(data_entry)
+        popped = random.sample(members, min(count, len(members)))
+        for member in popped:
+            _set_remove(data_entry, member)
+        if not data_entry["value"]:
+            del DATA_STORE[key]
+        return popped, None
+
 def is_client_in_multi(client) -> bool:
     """
     Returns whether the given client has an active transaction (is in MULTI mode).
@@ -768,6 +1982,20 @@ def set_client_in_multi(client, state: bool):
         else:
             # End of transaction (EXEC/DISCARD): clear the queue
             CLIENT_STATE[client]["queue"] = []
+        # A command rejected while queueing makes EXEC abort the whole transaction
+        CLIENT_STATE[client]["multi_aborted"] = False
+
+def abort_client_multi(client):
+    """
+    Flags the client's transaction as failed: a command could not be queued, so EXEC
+    replies -EXECABORT instead of running part of the transaction.
+    """
+    with BLOCKING_CLIENTS_LOCK:
+        CLIENT_STATE.setdefault(client, {})["multi_aborted"] = True
+
+def is_client_multi_aborted(client) -> bool:
+    with BLOCKING_CLIENTS_LOCK:
+        return CLIENT_STATE.get(client, {}).get("multi_aborted", False)
 
 def get_client_queued_commands(client) -> list:
     """
@@ -790,22 +2018,356 @@ def enqueue_client_command(client, command: str, arguments: list):
         # Store the command as a tuple: (COMMAND, [arg1, arg2, ...])
         state["queue"].append((command, arguments))
 
+def set_client_asking(client, state: bool):
+    """
+    Sets the one-shot ASKING flag used by cluster mode while a slot is being imported.
+    """
+    with BLOCKING_CLIENTS_LOCK:
+        if client not in CLIENT_STATE:
+            CLIENT_STATE[client] = {}
+        CLIENT_STATE[client]["asking"] = state
+
+def pop_client_asking(client) -> bool:
+    """
+    Returns whether the client sent ASKING right before this command, and clears the flag
+    (ASKING only applies to the next command, like in Redis).
+    """
+    with BLOCKING_CLIENTS_LOCK:
+        state = CLIENT_STATE.get(client)
+        if not state:
+            return False
+        return state.pop("asking", False)
+
+def get_client_protocol(client) -> int:
+    """Returns the RESP version negotiated by the client with HELLO (2 until then)."""
+    with BLOCKING_CLIENTS_LOCK:
+        return CLIENT_STATE.get(client, {}).get("protocol", 2)
+
+def set_client_protocol(client, protocol: int, name: bytes | None = None) -> int:
+    """
+    Records the RESP version (and optional SETNAME) sent with HELLO.
+    Returns the client's connection ID, assigned the first time it is needed.
+    """
+    with BLOCKING_CLIENTS_LOCK:
+        if client not in CLIENT_STATE:
+            CLIENT_STATE[client] = {}
+        state = CLIENT_STATE[client]
+        state["protocol"] = protocol
+        if name is not None:
+            state["name"] = name
+        if "id" not in state:
+            state["id"] = next(_CLIENT_IDS)
+        return state["id"]
+
+def get_client_id(client) -> int:
+    """Returns the client's connection ID (CLIENT ID), assigning one on first use."""
+    with BLOCKING_CLIENTS_LOCK:
+        if client not in CLIENT_STATE:
+            CLIENT_STATE[client] = {}
+        state = CLIENT_STATE[client]
+        if "id" not in state:
+            state["id"] = next(_CLIENT_IDS)
+        return state["id"]
+
+def _touch_key(key: bytes):
+    """Marks a key of the selected database as modified for WATCH. Caller holds DATA_LOCK."""
+    watched_key = (_SELECTED.index, key)
+    if watched_key in KEY_VERSIONS:
+        KEY_VERSIONS[watched_key] += 1
+
+def touch_keys(keys: list[bytes]):
+    """Marks keys written by a command as modified for WATCH. Caller holds DATA_LOCK."""
+    index = _SELECTED.index
+    for key in keys:
+        watched_key = (index, key)
+        if watched_key in KEY_VERSIONS:
+            KEY_VERSIONS[watched_key] += 1
+
+def _touch_database_keys(index: int, *stores: dict):
+    """
+    Marks the watched keys of database `index` found in any of `stores` (its contents
+    before and after a FLUSHDB or SWAPDB) as modified. Caller holds DATA_LOCK.
+    """
+    for watched_key in KEY_VERSIONS:
+        db, key = watched_key
+        if db == index and any(key in store for store in stores):
+            KEY_VERSIONS[watched_key] += 1
+
+def watch_keys(client, keys: list[bytes]):
+    """WATCH: remembers the current version of each key (keys already watched keep theirs)."""
+    with DATA_LOCK:
+        watched = WATCHED_KEYS.setdefault(client, {})
+        index = _SELECTED.index
+        for key in keys:
+            watched_key = (index, key)
+            if watched_key in watched:
+                continue
+            _get_live_entry(key)  # An already expired key is watched as missing
+            watched[watched_key] = KEY_VERSIONS.setdefault(watched_key, 0)
+            WATCHING_CLIENTS.setdefault(watched_key, set()).add(client)
+
+def watches_keys(client) -> bool:
+    """Whether the client has WATCHed keys (and not yet run EXEC, DISCARD or UNWATCH)."""
+    return bool(WATCHED_KEYS.get(client))
+
+def unwatch_all_keys(client):
+    """UNWATCH, and the end of every EXEC / DISCARD."""
+    with DATA_LOCK:
+        for watched_key in WATCHED_KEYS.pop(client, ()):
+            clients = WATCHING_CLIENTS[watched_key]
+            clients.discard(client)
+            if not clients:
+                del WATCHING_CLIENTS[watched_key]
+                del KEY_VERSIONS[watched_key]
+
+def watched_keys_changed(client) -> bool:
+    """
+    Returns whether a key watched by the client was modified (or expired) since WATCH.
+    Caller holds DATA_LOCK.
+    """
+    watched = WATCHED_KEYS.get(client)
+    if not watched:
+        return False
+    for (index, key), version in watched.items():
+        with using_database(index):
+            _get_live_entry(key)  # Expires the key now if its time has come
+        if KEY_VERSIONS[(index, key)] != version:
+            return True
+    return False
+
+def forget_client(client):
+    """Drops the per-connection state of a client that disconnected."""
+    unwatch_all_keys(client)
+    with BLOCKING_CLIENTS_LOCK:
+        CLIENT_STATE.pop(client, None)
+
+def find_client_by_id(client_id: int):
+    """Returns the socket of the connection with the given ID, or None."""
+    with BLOCKING_CLIENTS_LOCK:
+        for client, state in CLIENT_STATE.items():
+            if state.get("id") == client_id:
+                return client
+    return None
+
+def delete_key(key: bytes) -> bool:
+    """
+    Removes a key of any type.
+    Returns True if the key existed.
+    """
+    with DATA_LOCK:
+        return _remove_key(key)
+
+def _remove_key(key: bytes, lazy: bool = False) -> bool:
+    """
+    Same as delete_key, for callers that already hold DATA_LOCK. With `lazy`, a large
+    value is only detached here and freed by the lazyfree thread.
+    """
+    data_entry = DATA_STORE.pop(key, None)
+    if data_entry is None:
+        return False
+    _touch_key(key)
+    lazyfree.free_object(data_entry["value"], lazy)
+    return True
+
+def delete_keys(keys: list[bytes], lazy: bool) -> list[bytes]:
+    """DEL / UNLINK: removes the keys that exist (and haven't expired). Returns those keys."""
+    deleted = []
+    with DATA_LOCK:
+        for key in keys:
+            if _get_live_entry(key) is not None and _remove_key(key, lazy):
+                deleted.append(key)
+    return deleted
+
+def flush_keyspace(lazy: bool, all_databases: bool = True):
+    """
+    FLUSHALL, or FLUSHDB (only the selected database). Each keyspace is swapped for an
+    empty dict in O(1); with `lazy`, the lazyfree thread frees the old one instead of it
+    being freed here.
+    """
+    with DATA_LOCK:
+        indices = range(DATABASE_COUNT) if all_databases else [_SELECTED.index]
+        databases = [DATABASES[index] for index in indices]
+        for index, database in zip(indices, databases):
+            old_store, database.store = database.store, {}
+            database.volatile = 0
+            if KEY_VERSIONS:
+                _touch_database_keys(index, old_store)
+            if lazy and old_store:
+                lazyfree.free_keyspace(old_store)
+        for callback in FLUSH_CALLBACKS:
+            callback(databases, lazy)
+
+def swap_databases(first: int, second: int):
+    """
+    SWAPDB: exchanges the contents of two databases in O(1) by swapping their Database
+    objects. Clients blocked in either database are checked again after the command.
+    """
+    with DATA_LOCK:
+        DATABASES[first], DATABASES[second] = DATABASES[second], DATABASES[first]
+        # A watched key of either database changed if it exists on either side
+        if KEY_VERSIONS:
+            stores = DATABASES[first].store, DATABASES[second].store
+            _touch_database_keys(first, *stores)
+            _touch_database_keys(second, *stores)
+        for key in BLOCKING_CLIENTS:
+            READY_KEYS[(first, key)] = None
+            READY_KEYS[(second, key)] = None
+
+def move_key(key: bytes, target: int) -> bool:
+    """
+    MOVE: moves a key of the selected database into database `target`, unless it is missing
+    or the target already has the key. Returns whether it was moved.
+    """
+    with DATA_LOCK:
+        data_entry = _get_live_entry(key)
+        if data_entry is None:
+            return False
+        source = DATABASES[_SELECTED.index]
+        with using_database(target):
+            if _get_live_entry(key) is not None:
+                return False
+        with using_database(target):
+            DATA_STORE[key] = source.store.pop(key)
+        if data_entry["expiry"] is not None:
+            source.volatile -= 1
+        _touch_key(key)
+        with using_database(target):
+            _touch_key(key)
+        return True
+
+def get_keys_in_slot(slot: int, count: int | None = None) -> list[bytes]:
+    """
+    Returns the (non-expired) keys hashing to the given cluster slot, up to `count` keys.
+    """
+    current_time_ms = int(time.time() * 1000)
+    matching_keys = []
+    with DATA_LOCK:
+        for key, data_entry in DATA_STORE.items():
+            if count is not None and len(matching_keys) >= count:
+                break
+            expiry = data_entry.get("expiry")
+            if expiry is not None and current_time_ms >= expiry:
+                continue
+            if key_hash_slot(key) == slot:
+                matching_keys.append(key)
+    return matching_keys
+
+def dump_key(key: bytes) -> tuple[bytes | None, int | None]:
+    """
+    Serializes a key's value for DUMP / MIGRATE.
+    The payload is a RESP array of bulk strings whose first element is the type, e.g.
+    ["string", value], ["list", e1, e2, ...], ["hash", f1, v1, ...], ["set", m1, ...], ["sorted_set", m1, s1, ...] or
+    ["stream", id1, n1, f1, v1, ..., id2, n2, ...].
+    Returns (payload, expiry_timestamp), or (None, None) if the key does not exist.
+    """
+    data_entry = get_data_entry(key)
+    if data_entry is None:
+        return None, None
+
+    with DATA_LOCK:
+        value_type = data_entry.get("type")
+        if value_type == "string":
+            items = [string_value_to_bytes(data_entry["value"])]
+        elif value_type == "list":
+            items = list(data_entry["value"])
+        elif value_type == "sorted_set":
+            items = []
+            for member, score in data_entry["value"].items():
+                items.append(member)
+                items.append(repr(score))
+        elif value_type == "hash":
+            items = [item for pair in _hash_items(data_entry) for item in pair]
+        elif value_type == "set":
+            items = _set_members(data_entry)
+        elif value_type == "stream":
+            items = []
+            for entry in data_entry["value"]:
+                items.append(entry["id"])
+                items.append(str(len(entry["fields"])))
+                for field, value in entry["fields"].items():
+                    items.append(field)
+                    items.append(value)
+        else:
+            return None, None
+        expiry = data_entry.get("expiry")
+
+    return _serialize_command_to_resp_array(value_type, items), expiry
+
+def restore_key(key: bytes, payload: bytes, expiry_timestamp: int | None, replace: bool) -> bytes | None:
+    """
+    Recreates a key from a dump_key payload.
+    Returns None on success, or a RESP error (BUSYKEY, bad payload).
+    """
+    try:
+        parsed_payload, _ = parsed_resp_array(payload)
+    except ValueError:
+        parsed_payload = None
+    if not parsed_payload:
+        return b"-ERR DUMP payload version or checksum are wrong\r\n"
+
+    value_type = parsed_payload[0].decode("utf-8", "replace")
+    items = parsed_payload[1:]
+
+    if not replace and get_data_entry(key) is not None:
+        return b"-BUSYKEY Target key name already exists.\r\n"
+
+    try:
+        if value_type == "sorted_set":
+            members = {items[i]: float(items[i + 1]) for i in range(0, len(items), 2)}
+        elif value_type == "stream":
+            entries = []
+            i = 0
+            while i < len(items):
+                entry_id = items[i].decode()
+                num_fields = int(items[i + 1])
+                fields_start = i + 2
+                fields = {}
+                for j in range(fields_start, fields_start + num_fields * 2, 2):
+                    fields[items[j]] = items[j + 1]
+                entries.append({"id": entry_id, "fields": fields})
+                i = fields_start + num_fields * 2
+        elif value_type not in ("string", "list", "hash", "set"):
+            return b"-ERR DUMP payload version or checksum are wrong\r\n"
+    except (IndexError, ValueError):  # UnicodeDecodeError is a ValueError
+        return b"-ERR DUMP payload version or checksum are wrong\r\n"
+
+    with DATA_LOCK:
+        DATA_STORE.pop(key, None)
+
+        if value_type == "hash":
+            DATA_STORE[key] = _hash_new_entry(items, expiry_timestamp)
+            return None
+        if value_type == "set":
+            DATA_STORE[key] = _set_new_entry(items, expiry_timestamp)
+            return None
+
+        if value_type == "string":
+            value = encode_string_value(items[0])
+        elif value_type == "list":
+            value = items
+        elif value_type == "sorted_set":
+            value = SortedSet(members)
+        else:
+            value = Stream(entries)
+
+        DATA_STORE[key] = {
+            "type": value_type,
+            "value": value,
+            "expiry": expiry_timestamp
+        }
+    return None
+
 def _serialize_command_to_resp_array(command: str, arguments: list) -> bytes:
     """
     Converts a command and its arguments into a raw RESP array byte string.
-    Example: ('SET', ['foo', 'bar']) -> b'*3\r\n$3\r\nSET\r\n$3\r\nfoo\r\n$3\r\nbar\r\n'
+    Arguments are normally bytes; str elements (names, IDs, numbers) are encoded.
+    Example: ('SET', [b'foo', b'bar']) -> b'*3\r\n$3\r\nSET\r\n$3\r\nfoo\r\n$3\r\nbar\r\n'
     """
     elements = [command] + arguments
-    
-    # Start with the array header: *<count>\r\n
-    resp_array_parts = [b"*" + str(len(elements)).encode() + b"\r\n"]
-    
+
+    # Array header (*<count>\r\n) followed by one bulk string per element
+    writer = resp.RespWriter()
+    writer.array(len(elements))
     for element in elements:
-        # Each element is a bulk string: $<length>\r\n<content>\r\n
-        element_bytes = element.encode()
-        length_bytes = str(len(element_bytes)).encode()
-        
-        resp_array_parts.append(b"$" + length_bytes + b"\r\n")
-        resp_array_parts.append(element_bytes + b"\r\n")
-        
-    return b"".join(resp_array_parts)
\ No newline at end of file
+        writer.bulk(element if isinstance(element, bytes) else element.encode())
+    return writer.getvalue()
@@ -0,0 +1,643 @@
+# app/geo.py
+
+# Geospatial helpers (GEOADD, GEOPOS, GEODIST) and GEOSEARCH.
+#
+# A location is stored in a sorted set with its 52-bit geohash as the score: latitude and
+# longitude are each cut into 2^26 steps and their bits interleaved, so points in the same
+# geohash cell of any coarser step share a score prefix and sit in one contiguous score
+# range. GEOSEARCH picks the step whose cells are about as large as the search area (as
+# Redis's geohashGetAreasByRadius does), looks up the center cell and its 8 neighbours as
+# score ranges on the sorted set's index, and measures exact distances only for the
+# members found there.
+#
+# NumPy is optional. When it is installed, a GEOADD with many members encodes all their
+# geohashes in one array operation, and GEOSEARCH decodes and measures its candidates the
+# same way. The array kernels repeat the scalar helpers' arithmetic step for step, so both
+# paths give the same scores and coordinates.
+#
+# With geo-cache-max-memory set, GEOSEARCH replies are cached per key and normalized query
+# in an LRU bounded by memory. An entry stores the version of the sorted set it was
+# computed from; any GEOADD/ZADD/ZREM gives the set a new version, so a stale entry is
+# simply never hit again and is dropped when it is found or ages out.
+
+from collections import OrderedDict
+import math
+import threading
+
+from app.datastore import DATA_LOCK, SERVER_CONFIG, _get_sorted_set, add_members_to_sorted_set
+import app.resp as resp
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Below this many points the per-call overhead of NumPy outweighs the loop it saves
+VECTORIZE_MIN_POINTS = 32
+
+# (key, query) -> (sorted set version, reply, size), least recently used first
+GEO_CACHE = OrderedDict()
+GEO_CACHE_LOCK = threading.Lock()
+GEO_CACHE_STATS = {"hits": 0, "misses": 0, "memory": 0}
+
+# Rough cost of an entry beyond its key and reply bytes (dict slot, tuples, object headers)
+CACHE_ENTRY_OVERHEAD = 200
+
+MIN_LON = -180.0
+MAX_LON = 180.0
+MIN_LAT = -85.05112878
+MAX_LAT = 85.05112878
+
+LATITUDE_RANGE = MAX_LAT - MIN_LAT
+LONGITUDE_RANGE = MAX_LON - MIN_LON
+
+EARTH_RADIUS_M = 6372797.560856 
+
+def convert_to_meters(radius: float, unit: str) -> float:
+    """Converts a radius value from a given unit to meters."""
+    unit = unit.lower()
+    if unit == 'm':
+        return radius
+    elif unit == 'km':
+        return radius * 1000.0
+    elif unit == 'mi':
+        # 1 mile = 1609.344 meters (Redis constant)
+        return radius * 1609.344
+    elif unit == 'ft':
+        # 1 foot = 0.3048 meters
+        return radius * 0.3048
+    else:
+        raise ValueError("Invalid unit specified")
+    
+def haversine_distance(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    """Calculates the distance between two points (lon, lat) using the Haversine formula."""
+    # Convert degrees to radians
+    lat1_rad = math.radians(lat1)
+    lon1_rad = math.radians(lon1)
+    lat2_rad = math.radians(lat2)
+    lon2_rad = math.radians(lon2)
+
+    # Differences
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+
+    # Haversine formula calculation: a = sin²(dlat/2) + cos(lat1) * cos(lat2) * sin²(dlon/2)
+    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
+    # c = 2 * atan2(sqrt(a), sqrt(1-a)) simplifies to 2 * asin(sqrt(a))
+    c = 2 * math.asin(math.sqrt(a))
+    
+    distance = EARTH_RADIUS_M * c
+    return distance
+
+def spread_int32_to_int64(v: int) -> int:
+    """Spreads bits of a 32-bit integer to occupy even positions in a 64-bit integer."""
+    v = v & 0xFFFFFFFF
+    v = (v | (v << 16)) & 0x0000FFFF0000FFFF
+    v = (v | (v << 8)) & 0x00FF00FF00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F0F0F0F0F
+    v = (v | (v << 2)) & 0x3333333333333333
+    v = (v | (v << 1)) & 0x5555555555555555
+    return v
+
+def interleave(x: int, y: int) -> int:
+    """Interleaves bits of two 32-bit integers to create a single 64-bit Morton code."""
+    x_spread = spread_int32_to_int64(x)
+    y_spread = spread_int32_to_int64(y)
+    y_shifted = y_spread << 1
+    return x_spread | y_shifted
+
+def encode_geohash(latitude: float, longitude: float) -> int:
+    """Encodes latitude and longitude into a single integer score using Morton encoding."""
+    # 2^26
+    power_26 = 1 << 26 
+    
+    # 1. Normalize to the range 0-2^26
+    normalized_latitude = power_26 * (latitude - MIN_LAT) / LATITUDE_RANGE
+    normalized_longitude = power_26 * (longitude - MIN_LON) / LONGITUDE_RANGE
+
+    # 2. Truncate to integers
+    lat_int = int(normalized_latitude)
+    lon_int = int(normalized_longitude)
+
+    # 3. Interleave bits
+    return interleave(lat_int, lon_int)
+
+def compact_int64_to_int32(v: int) -> int:
+    """
+    Compact a 64-bit integer with interleaved bits back to a 32-bit integer.
+    """
+    v = v & 0x5555555555555555
+    v = (v | (v >> 1)) & 0x3333333333333333
+    v = (v | (v >> 2)) & 0x0F0F0F0F0F0F0F0F
+    v = (v | (v >> 4)) & 0x00FF00FF00FF00FF
+    v = (v | (v >> 8)) & 0x0000FFFF0000FFFF
+    v = (v | (v >> 16)) & 0x00000000FFFFFFFF
+    return v
+
+def convert_grid_numbers_to_coordinates(grid_latitude_number: int, grid_longitude_number: int) -> tuple[float, float]:
+    """Converts grid numbers back to (longitude, latitude) coordinates (center of grid cell)."""
+    # 2**26
+    power_26 = 1 << 26 
+    
+    # Calculate the grid boundaries
+    grid_latitude_min = MIN_LAT + LATITUDE_RANGE * (grid_latitude_number / power_26)
+    grid_latitude_max = MIN_LAT + LATITUDE_RANGE * ((grid_latitude_number + 1) / power_26)
+    grid_longitude_min = MIN_LON + LONGITUDE_RANGE * (grid_longitude_number / power_26)
+    grid_longitude_max = MIN_LON + LONGITUDE_RANGE * ((grid_longitude_number + 1) / power_26)
+    
+    # Calculate the center point of the grid cell
+    latitude = (grid_latitude_min + grid_latitude_max) / 2
+    longitude = (grid_longitude_min + grid_longitude_max) / 2
+    
+    # GEOPOS returns Longitude then Latitude
+    return (longitude, latitude) 
+
+def decode_geohash_to_coords(geo_code: int) -> tuple[float, float]:
+    """
+    Decodes geo code (WGS84) to tuple of (longitude, latitude)
+    """
+    # Align bits of both latitude and longitude to take even-numbered position
+    y = geo_code >> 1
+    x = geo_code
+    
+    # Compact bits back to 32-bit ints
+    grid_latitude_number = compact_int64_to_int32(x)
+    grid_longitude_number = compact_int64_to_int32(y)
+
+    # normalized_longitude = grid_longitude_number + 0.5
+    # normalized_latitude = grid_latitude_number + 0.5
+    
+    return convert_grid_numbers_to_coordinates(grid_latitude_number, grid_longitude_number)
+
+def _spread_array(v):
+    """spread_int32_to_int64 over a uint64 array."""
+    v = v & np.uint64(0xFFFFFFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x3333333333333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return v
+
+def _compact_array(v):
+    """compact_int64_to_int32 over a uint64 array."""
+    v = v & np.uint64(0x5555555555555555)
+    v = (v | (v >> np.uint64(1))) & np.uint64(0x3333333333333333)
+    v = (v | (v >> np.uint64(2))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v >> np.uint64(4))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v >> np.uint64(8))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v >> np.uint64(16))) & np.uint64(0x00000000FFFFFFFF)
+    return v
+
+def encode_geohashes(latitudes: list[float], longitudes: list[float]) -> list[int]:
+    """encode_geohash for many points at once."""
+    if np is None or len(latitudes) < VECTORIZE_MIN_POINTS:
+        return [encode_geohash(latitude, longitude) for latitude, longitude in zip(latitudes, longitudes)]
+
+    power_26 = 1 << 26
+    lat_int = (power_26 * (np.array(latitudes, dtype=np.float64) - MIN_LAT) / LATITUDE_RANGE).astype(np.uint64)
+    lon_int = (power_26 * (np.array(longitudes, dtype=np.float64) - MIN_LON) / LONGITUDE_RANGE).astype(np.uint64)
+    return (_spread_array(lat_int) | (_spread_array(lon_int) << np.uint64(1))).tolist()
+
+def _decode_geohashes(scores):
+    """decode_geohash_to_coords over a uint64 array: (longitudes, latitudes) arrays of cell centers."""
+    power_26 = 1 << 26
+    grid_latitude_number = _compact_array(scores)
+    grid_longitude_number = _compact_array(scores >> np.uint64(1))
+    latitude_min = MIN_LAT + LATITUDE_RANGE * (grid_latitude_number / power_26)
+    latitude_max = MIN_LAT + LATITUDE_RANGE * ((grid_latitude_number + np.uint64(1)) / power_26)
+    longitude_min = MIN_LON + LONGITUDE_RANGE * (grid_longitude_number / power_26)
+    longitude_max = MIN_LON + LONGITUDE_RANGE * ((grid_longitude_number + np.uint64(1)) / power_26)
+    return (longitude_min + longitude_max) / 2, (latitude_min + latitude_max) / 2
+
+def _haversine_distances(lon1: float, lat1: float, lon2, lat2):
+    """haversine_distance from one point to arrays of points (lon2 and lat2 may also be arrays)."""
+    lat1_rad = np.radians(lat1)
+    lat2_rad = np.radians(lat2)
+    dlat = lat2_rad - lat1_rad
+    dlon = np.radians(lon2) - np.radians(lon1)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_M * 2 * np.arcsin(np.sqrt(a))
+
+GEO_STEP_MAX = 26
+MERCATOR_MAX = 20037726.37
+
+SYNTAX_ERROR = b"-ERR syntax error\r\n"
+NOT_FLOAT_ERROR = b"-ERR value is not a valid float\r\n"
+UNIT_ERROR = b"-ERR unsupported unit provided. please use M, KM, FT, MI\r\n"
+
+def estimate_steps_by_radius(radius_m: float, latitude: float) -> int:
+    """The geohash step whose cells are at least as large as the search radius."""
+    if radius_m == 0:
+        return GEO_STEP_MAX
+    step = 1
+    while radius_m < MERCATOR_MAX:
+        radius_m *= 2
+        step += 1
+    step -= 2  # Make sure the radius is included in most of the base cases
+    # Cells shrink towards the poles
+    if latitude > 66 or latitude < -66:
+        step -= 1
+        if latitude > 80 or latitude < -80:
+            step -= 1
+    return max(1, min(step, GEO_STEP_MAX))
+
+def bounding_box(longitude: float, latitude: float, half_width_m: float, half_height_m: float) -> tuple[float, float, float, float]:
+    """(min_lon, min_lat, max_lon, max_lat) of the area around a point."""
+    latitude_rad = math.radians(latitude)
+    lat_delta = math.degrees(half_height_m / EARTH_RADIUS_M)
+    lon_delta_top = math.degrees(half_width_m / EARTH_RADIUS_M / math.cos(latitude_rad + half_height_m / EARTH_RADIUS_M))
+    lon_delta_bottom = math.degrees(half_width_m / EARTH_RADIUS_M / math.cos(latitude_rad - half_height_m / EARTH_RADIUS_M))
+    # The edge closer to the equator is the wider one
+    lon_delta = lon_delta_bottom if latitude < 0 else lon_delta_top
+    if abs(latitude) + lat_delta >= 90:
+        lon_delta = 180.0  # The area reaches over the pole: every longitude is in it
+    return (longitude - lon_delta, latitude - lat_delta, longitude + lon_delta, latitude + lat_delta)
+
+def _cell_numbers(longitude: float, latitude: float, step: int) -> tuple[int, int]:
+    """(latitude, longitude) grid numbers of the cell holding a point at the given step."""
+    cells = 1 << step
+    lat_number = int(cells * (latitude - MIN_LAT) / LATITUDE_RANGE)
+    lon_number = int(cells * (longitude - MIN_LON) / LONGITUDE_RANGE)
+    return min(lat_number, cells - 1), min(lon_number, cells - 1)
+
+def covering_score_ranges(longitude: float, latitude: float, half_width_m: float, half_height_m: float, radius_m: float) -> list[tuple[int, int]]:
+    """
+    Score ranges [min, max) of the (at most 9) geohash cells covering the search area
+    around a point, merged where they touch.
+    """
+    min_lon, min_lat, max_lon, max_lat = bounding_box(longitude, latitude, half_width_m, half_height_m)
+    step = estimate_steps_by_radius(radius_m, latitude)
+    lat_number, lon_number = _cell_numbers(longitude, latitude, step)
+
+    # The area may still stick out of the 3x3 cells around the center: one step less doubles them
+    lat_cell = LATITUDE_RANGE / (1 << step)
+    lon_cell = LONGITUDE_RANGE / (1 << step)
+    if step > 1 and (MIN_LAT + (lat_number + 2) * lat_cell < max_lat or MIN_LAT + (lat_number - 1) * lat_cell > min_lat
+                     or MIN_LON + (lon_number + 2) * lon_cell < max_lon or MIN_LON + (lon_number - 1) * lon_cell > min_lon):
+        step -= 1
+        lat_number, lon_number = _cell_numbers(longitude, latitude, step)
+        lat_cell *= 2
+        lon_cell *= 2
+
+    # Neighbour rows and columns the area does not reach are skipped
+    lat_offsets = [0]
+    if MIN_LAT + lat_number * lat_cell > min_lat:
+        lat_offsets.append(-1)
+    if MIN_LAT + (lat_number + 1) * lat_cell < max_lat:
+        lat_offsets.append(1)
+    lon_offsets = [0]
+    if MIN_LON + lon_number * lon_cell > min_lon:
+        lon_offsets.append(-1)
+    if MIN_LON + (lon_number + 1) * lon_cell < max_lon:
+        lon_offsets.append(1)
+
+    cells = 1 << step
+    shift = 2 * (GEO_STEP_MAX - step)
+    hashes = set()
+    for lat_offset in lat_offsets:
+        neighbour_lat = lat_number + lat_offset
+        if not 0 <= neighbour_lat < cells:
+            continue  # Nothing beyond the poles
+        for lon_offset in lon_offsets:
+            # Longitude wraps around at the antimeridian
+            hashes.add(interleave(neighbour_lat, (lon_number + lon_offset) % cells))
+
+    ranges = []
+    for cell_hash in sorted(hashes):
+        low, high = cell_hash << shift, (cell_hash + 1) << shift
+        if ranges and ranges[-1][1] == low:
+            ranges[-1] = (ranges[-1][0], high)
+        else:
+            ranges.append((low, high))
+    return ranges
+
+def _parse_unit(unit: bytes) -> float | None:
+    """Meters per unit, or None for an unknown unit."""
+    try:
+        return convert_to_meters(1.0, unit.decode("utf-8", "replace"))
+    except ValueError:
+        return None
+
+def _parse_float(value: bytes) -> float | None:
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return None if math.isnan(number) else number
+
+def _invalid_lonlat_error(longitude: float, latitude: float) -> bytes:
+    return f"-ERR invalid longitude,latitude pair {longitude:.6f},{latitude:.6f}\r\n".encode()
+
+def execute_geoadd(arguments: list) -> bytes:
+    """GEOADD key longitude latitude member [longitude latitude member ...]"""
+    if len(arguments) < 4:
+        return b"-ERR wrong number of arguments for 'GEOADD' command\r\n"
+    if (len(arguments) - 1) % 3:
+        return SYNTAX_ERROR
+
+    # Every coordinate is validated before anything is added
+    longitudes = []
+    latitudes = []
+    for i in range(1, len(arguments), 3):
+        try:
+            longitude = float(arguments[i])
+            latitude = float(arguments[i + 1])
+        except ValueError:
+            return NOT_FLOAT_ERROR
+        if not (MIN_LON <= longitude <= MAX_LON and MIN_LAT <= latitude <= MAX_LAT):
+            return _invalid_lonlat_error(longitude, latitude)
+        longitudes.append(longitude)
+        latitudes.append(latitude)
+
+    # The geohash is the member's score
+    scores = [float(score) for score in encode_geohashes(latitudes, longitudes)]
+    added, error = add_members_to_sorted_set(arguments[0], zip(arguments[3::3], scores))
+    if error:
+        return error
+    return resp.integer(added)
+
+def _parse_geosearch_options(arguments: list) -> tuple[dict | None, bytes | None]:
+    """
+    FROMMEMBER member | FROMLONLAT lon lat, BYRADIUS radius unit | BYBOX width height unit,
+    [ASC|DESC] [COUNT count [ANY]] [WITHCOORD] [WITHDIST] [WITHHASH]
+    """
+    options = {"member": None, "center": None, "radius": None, "box": None, "conversion": 1.0,
+               "sort": None, "count": 0, "any": False, "withdist": False, "withhash": False, "withcoord": False}
+    i = 0
+    while i < len(arguments):
+        option = arguments[i].upper()
+        remaining = len(arguments) - i - 1
+        if option == b"FROMMEMBER" and remaining >= 1:
+            if options["center"] is not None:
+                return None, b"-ERR exactly one of FROMMEMBER or FROMLONLAT can be specified for GEOSEARCH\r\n"
+            options["member"] = arguments[i + 1]
+            i += 2
+        elif option == b"FROMLONLAT" and remaining >= 2:
+            if options["member"] is not None:
+                return None, b"-ERR exactly one of FROMMEMBER or FROMLONLAT can be specified for GEOSEARCH\r\n"
+            longitude = _parse_float(arguments[i + 1])
+            latitude = _parse_float(arguments[i + 2])
+            if longitude is None or latitude is None:
+                return None, NOT_FLOAT_ERROR
+            if not (MIN_LON <= longitude <= MAX_LON and MIN_LAT <= latitude <= MAX_LAT):
+                return None, _invalid_lonlat_error(longitude, latitude)
+            options["center"] = (longitude, latitude)
+            i += 3
+        elif option == b"BYRADIUS" and remaining >= 2:
+            if options["box"] is not None:
+                return None, b"-ERR exactly one of BYRADIUS and BYBOX can be specified for GEOSEARCH\r\n"
+            radius = _parse_float(arguments[i + 1])
+            if radius is None:
+                return None, b"-ERR need numeric radius\r\n"
+            if radius < 0:
+                return None, b"-ERR radius cannot be negative\r\n"
+            conversion = _parse_unit(arguments[i + 2])
+            if conversion is None:
+                return None, UNIT_ERROR
+            options["radius"] = radius * conversion
+            options["conversion"] = conversion
+            i += 3
+        elif option == b"BYBOX" and remaining >= 3:
+            if options["radius"] is not None:
+                return None, b"-ERR exactly one of BYRADIUS and BYBOX can be specified for GEOSEARCH\r\n"
+            width = _parse_float(arguments[i + 1])
+            height = _parse_float(arguments[i + 2])
+            if width is None or height is None:
+                return None, b"-ERR need numeric width and height\r\n"
+            if width < 0 or height < 0:
+                return None, b"-ERR height or width cannot be negative\r\n"
+            conversion = _parse_unit(arguments[i + 3])
+            if conversion is None:
+                return None, UNIT_ERROR
+            options["box"] = (width * conversion, height * conversion)
+            options["conversion"] = conversion
+            i += 4
+        elif option in (b"ASC", b"DESC"):
+            options["sort"] = option
+            i += 1
+        elif option == b"COUNT" and remaining >= 1:
+            try:
+                count = int(arguments[i + 1])
+            except ValueError:
+                return None, b"-ERR value is not an integer or out of range\r\n"
+            if count <= 0:
+                return None, b"-ERR COUNT must be > 0\r\n"
+            options["count"] = count
+            i += 2
+        elif option == b"ANY":
+            options["any"] = True
+            i += 1
+        elif option == b"WITHDIST":
+            options["withdist"] = True
+            i += 1
+        elif option == b"WITHHASH":
+            options["withhash"] = True
+            i += 1
+        elif option == b"WITHCOORD":
+            options["withcoord"] = True
+            i += 1
+        else:
+            return None, SYNTAX_ERROR
+
+    if options["member"] is None and options["center"] is None:
+        return None, b"-ERR exactly one of FROMMEMBER or FROMLONLAT can be specified for GEOSEARCH\r\n"
+    if options["radius"] is None and options["box"] is None:
+        return None, b"-ERR exactly one of BYRADIUS and BYBOX can be specified for GEOSEARCH\r\n"
+    if options["any"] and not options["count"]:
+        return None, b"-ERR the ANY argument requires COUNT argument\r\n"
+    return options, None
+
+def _distance_if_in_shape(options: dict, center_lon: float, center_lat: float, lon: float, lat: float) -> float | None:
+    """Distance in meters from the center, or None when the point is outside the search shape."""
+    if options["radius"] is not None:
+        distance = haversine_distance(center_lon, center_lat, lon, lat)
+        return distance if distance <= options["radius"] else None
+
+    width_m, height_m = options["box"]
+    # The latitude distance is cheaper to compute, so it is checked first
+    if EARTH_RADIUS_M * abs(math.radians(lat) - math.radians(center_lat)) > height_m / 2:
+        return None
+    if haversine_distance(lon, lat, center_lon, lat) > width_m / 2:
+        return None
+    return haversine_distance(center_lon, center_lat, lon, lat)
+
+def _find_matches(options: dict, center_lon: float, center_lat: float, candidates: list, limit: int) -> list[tuple]:
+    """
+    (distance, member, score, lon, lat) of the candidates inside the search shape, in
+    candidate order, stopping after `limit` matches when it is not 0.
+    """
+    if np is not None and len(candidates) >= VECTORIZE_MIN_POINTS:
+        return _find_matches_vectorized(options, center_lon, center_lat, candidates, limit)
+
+    matches = []
+    for score, member in candidates:
+        lon, lat = decode_geohash_to_coords(int(score))
+        distance = _distance_if_in_shape(options, center_lon, center_lat, lon, lat)
+        if distance is None:
+            continue
+        matches.append((distance, member, score, lon, lat))
+        if len(matches) == limit:
+            break
+    return matches
+
+def _find_matches_vectorized(options: dict, center_lon: float, center_lat: float, candidates: list, limit: int) -> list[tuple]:
+    """_find_matches with the decoding and the shape test done as array operations."""
+    scores = np.array([score for score, _ in candidates], dtype=np.float64)
+    lons, lats = _decode_geohashes(scores.astype(np.uint64))
+
+    if options["radius"] is not None:
+        distances = _haversine_distances(center_lon, center_lat, lons, lats)
+        inside = distances <= options["radius"]
+    else:
+        width_m, height_m = options["box"]
+        inside = EARTH_RADIUS_M * np.abs(np.radians(lats) - math.radians(center_lat)) <= height_m / 2
+        inside &= _haversine_distances(center_lon, lats, lons, lats) <= width_m / 2
+        distances = None
+
+    positions = np.flatnonzero(inside)
+    if limit:
+        positions = positions[:limit]
+    lons = lons[positions]
+    lats = lats[positions]
+    if distances is None:
+        distances = _haversine_distances(center_lon, center_lat, lons, lats)
+    else:
+        distances = distances[positions]
+
+    return [
+        (distance, candidates[position][1], candidates[position][0], lon, lat)
+        for position, distance, lon, lat in zip(positions.tolist(), distances.tolist(), lons.tolist(), lats.tolist())
+    ]
+
+def _cache_lookup(cache_key: tuple, version: int) -> bytes | None:
+    """The cached reply for a query, if it was computed from this version of the set."""
+    if not SERVER_CONFIG["geo-cache-max-memory"]:
+        if GEO_CACHE:
+            # Disabled with CONFIG SET: release what it held
+            with GEO_CACHE_LOCK:
+                GEO_CACHE.clear()
+                GEO_CACHE_STATS["memory"] = 0
+        return None
+
+    with GEO_CACHE_LOCK:
+        cached = GEO_CACHE.get(cache_key)
+        if cached is not None and cached[0] == version:
+            GEO_CACHE.move_to_end(cache_key)
+            GEO_CACHE_STATS["hits"] += 1
+            return cached[1]
+
+        if cached is not None:
+            # The set changed since: the entry can never be hit again
+            del GEO_CACHE[cache_key]
+            GEO_CACHE_STATS["memory"] -= cached[2]
+        GEO_CACHE_STATS["misses"] += 1
+        return None
+
+def _cache_store(cache_key: tuple, version: int, reply: bytes):
+    """Caches a reply, evicting the least recently used entries to stay within the limit."""
+    max_memory = SERVER_CONFIG["geo-cache-max-memory"]
+    size = len(cache_key[0]) + len(cache_key[1][0] or b"") + len(reply) + CACHE_ENTRY_OVERHEAD
+    if size > max_memory:
+        return
+
+    with GEO_CACHE_LOCK:
+        previous = GEO_CACHE.pop(cache_key, None)
+        if previous is not None:
+            GEO_CACHE_STATS["memory"] -= previous[2]
+        GEO_CACHE[cache_key] = (version, reply, size)
+        GEO_CACHE_STATS["memory"] += size
+        while GEO_CACHE_STATS["memory"] > max_memory:
+            _, evicted = GEO_CACHE.popitem(last=False)
+            GEO_CACHE_STATS["memory"] -= evicted[2]
+
+def cache_info() -> str:
+    """GEOSEARCH cache lines for INFO."""
+    with GEO_CACHE_LOCK:
+        return (f"geo_cache_hits:{GEO_CACHE_STATS['hits']}\r\n"
+                f"geo_cache_misses:{GEO_CACHE_STATS['misses']}\r\n"
+                f"geo_cache_entries:{len(GEO_CACHE)}\r\n"
+                f"geo_cache_memory:{GEO_CACHE_STATS['memory']}\r\n")
+
+def execute_geosearch(arguments: list, protocol: int) -> bytes:
+    """GEOSEARCH key FROMMEMBER|FROMLONLAT ... BYRADIUS|BYBOX ... [options]"""
+    if len(arguments) < 1:
+        return b"-ERR wrong number of arguments for 'geosearch' command\r\n"
+
+    key = arguments[0]
+    options, error = _parse_geosearch_options(arguments[1:])
+    if error:
+        return error
+
+    if options["radius"] is not None:
+        half_width_m = half_height_m = radius_m = options["radius"]
+    else:
+        half_width_m, half_height_m = options["box"][0] / 2, options["box"][1] / 2
+        radius_m = math.hypot(half_width_m, half_height_m)
+
+    # A plain COUNT returns the closest matches
+    count = options["count"]
+    sort = options["sort"]
+    if count and sort is None and not options["any"]:
+        sort = b"ASC"
+
+    # Queries that give the same reply share a cache entry: the unit only matters for WITHDIST
+    cache_key = (key, (options["member"], options["center"], options["radius"], options["box"],
+                       options["conversion"] if options["withdist"] else None, sort, count, options["any"],
+                       options["withdist"], options["withhash"], options["withcoord"], protocol))
+
+    with DATA_LOCK:
+        sorted_set, error = _get_sorted_set(key)
+        if sorted_set is None:
+            return error or resp.EMPTY_ARRAY
+
+        version = sorted_set.version
+        cached_reply = _cache_lookup(cache_key, version)
+        if cached_reply is not None:
+            return cached_reply
+
+        if options["member"] is not None:
+            score = sorted_set.get(options["member"])
+            if score is None:
+                return b"-ERR could not decode requested zset member\r\n"
+            center_lon, center_lat = decode_geohash_to_coords(int(score))
+        else:
+            center_lon, center_lat = options["center"]
+
+        candidates = []
+        for min_score, max_score in covering_score_ranges(center_lon, center_lat, half_width_m, half_height_m, radius_m):
+            candidates.extend(sorted_set.index.score_range(min_score, max_score))
+
+    # Exact distances, outside the lock, only for members of the covering cells
+    matches = _find_matches(options, center_lon, center_lat, candidates, count if options["any"] else 0)
+
+    if sort is not None:
+        matches.sort(key=lambda match: match[0], reverse=sort == b"DESC")
+    if count:
+        del matches[count:]
+
+    reply = _geosearch_reply(options, matches, protocol)
+    if SERVER_CONFIG["geo-cache-max-memory"]:
+        _cache_store(cache_key, version, reply)
+    return reply
+
+def _geosearch_reply(options: dict, matches: list[tuple], protocol: int) -> bytes:
+    if not (options["withdist"] or options["withhash"] or options["withcoord"]):
+        return resp.bulk_array([match[1] for match in matches])
+
+    # Each match is [member, distance?, hash?, [lon, lat]?]
+    fields = 1 + options["withdist"] + options["withhash"] + options["withcoord"]
+    writer = resp.RespWriter(protocol)
+    writer.array(len(matches))
+    for distance, member, score, lon, lat in matches:
+        writer.array(fields)
+        writer.bulk(member)
+        if options["withdist"]:
+            writer.double(b"%.4f" % (distance / options["conversion"]))
+        if options["withhash"]:
+            writer.integer(int(score))
+        if options["withcoord"]:
+            writer.array(2)
+            writer.double(str(lon).encode())
+            writer.double(str(lat).encode())
+    return writer.getvalue()
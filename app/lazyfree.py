@@ -0,0 +1,104 @@
+# app/lazyfree.py
+
+# Lazy freeing (UNLINK, FLUSHALL ASYNC, lazyfree-lazy-* options).
+#
+# Dropping the last reference to a value with millions of elements frees all of them in
+# one go, and since that happens inside a single bytecode the interpreter can't switch to
+# another thread until it is done: with DATA_LOCK held, every client stalls for as long.
+# Instead, large values are detached from the keyspace (a few dict pops) and handed to a
+# background thread, which empties them a chunk at a time and yields the interpreter
+# after each chunk (time.sleep(0)), so client threads never wait behind it for long.
+# Small values are still freed on the spot, where that is cheaper than queueing them.
+
+from collections import deque
+import threading
+import time
+
+# Values with more elements than this are freed in the background (LAZYFREE_THRESHOLD
+# in Redis)
+LAZYFREE_THRESHOLD = 64
+
+# Elements released per step by the background thread
+FREE_CHUNK = 1024
+
+_FREE_QUEUE = deque()
+_FREE_CONDITION = threading.Condition()
+_FREE_THREAD = None  # Started by the first queued value
+
+LAZYFREE_STATE = {"pending": 0, "freed": 0}
+
+def free_effort(value) -> int:
+    """Roughly how many allocations freeing `value` releases (1 for strings and ints)."""
+    if isinstance(value, (bytes, int, float)) or value is None:
+        return 1
+    index = getattr(value, "index", None)  # A sorted set's score index doubles the work
+    return len(value) * (2 if index is not None else 1)
+
+def _queue(release, value):
+    global _FREE_THREAD
+    with _FREE_CONDITION:
+        if _FREE_THREAD is None:
+            _FREE_THREAD = threading.Thread(target=_free_loop, name="lazyfree", daemon=True)
+            _FREE_THREAD.start()
+        _FREE_QUEUE.append((release, value))
+        LAZYFREE_STATE["pending"] += 1
+        _FREE_CONDITION.notify()
+
+def free_object(value, lazy: bool = True):
+    """
+    Drops the caller's reference to `value`; with `lazy`, a large value is queued for
+    the background thread instead of being freed by the caller.
+    """
+    if lazy and free_effort(value) > LAZYFREE_THRESHOLD:
+        _queue(_release, value)
+
+def free_keyspace(store: dict):
+    """Queues a whole key -> entry dict (FLUSHALL ASYNC) for the background thread."""
+    _queue(_release_keyspace, store)
+
+def _release(value):
+    """Empties a container FREE_CHUNK elements at a time, yielding to other threads in between."""
+    if isinstance(value, list):
+        while value:
+            del value[-FREE_CHUNK:]
+            time.sleep(0)
+    elif isinstance(value, dict):
+        index = getattr(value, "index", None)
+        if index is not None:
+            # Sorted set: the chunks of the score index, then the dict
+            chunks = index._chunks
+            while chunks:
+                chunks.pop()
+        popitem = dict.popitem  # Skips SortedSet.__delitem__, the index is gone already
+        while value:
+            for _ in range(min(FREE_CHUNK, len(value))):
+                popitem(value)
+            time.sleep(0)
+    elif isinstance(value, set):
+        while value:
+            for _ in range(min(FREE_CHUNK, len(value))):
+                value.pop()
+            time.sleep(0)
+
+def _release_keyspace(store: dict):
+    """Empties a flushed keyspace, releasing its large values piecewise like _release."""
+    while store:
+        for _ in range(min(FREE_CHUNK, len(store))):
+            _, entry = store.popitem()
+            value = entry["value"]
+            if free_effort(value) > LAZYFREE_THRESHOLD:
+                _release(value)
+        time.sleep(0)
+
+def _free_loop():
+    while True:
+        with _FREE_CONDITION:
+            while not _FREE_QUEUE:
+                _FREE_CONDITION.wait()
+            release, value = _FREE_QUEUE.popleft()
+        release(value)
+        del value
+        with _FREE_CONDITION:
+            LAZYFREE_STATE["pending"] -= 1
+            LAZYFREE_STATE["freed"] += 1
+
@@ -5,6 +5,11 @@ import sys
 # but for a flat directory, the import might need adjustment.
 from app.command_execution import handle_connection
 import app.command_execution as ce
+import app.workers as workers
+import app.cluster as cluster
+from app.datastore import DATA_LOCK, DATA_STORE
+from app.parser import command_name
+import app.resp as resp
 
 PING_COMMAND_RESP = b"*1\r\n$4\r\nPING\r\n"
 REPLCONF_CAPA_PSYNC2 = b"*3\r\n$8\r\nREPLCONF\r\n$4\r\ncapa\r\n$6\r\npsync2\r\n"
@@ -13,56 +18,65 @@ PSYNC_COMMAND_RESP = b"*3\r\n$5\r\nPSYNC\r\n$1\r\n?\r\n$2\r\n-1\r\n"
 # In main.py, define this new function after connect_to_master or at the top level
 def replica_command_listener(master_socket: socket.socket):
     """Listens on the master-replica connection for propagated commands."""
+    # Unparsed bytes from the master; a propagated command (or the RDB payload) may
+    # arrive split over several recv() calls.
+    buffer = bytearray()
     while True:
         try:
             # Propagated commands are RESP arrays.
             # We pass the master_socket as the 'client' to handle_command.
-            data = master_socket.recv(4096)
+            data = master_socket.recv(ce.RECV_BUFFER_SIZE)
             if not data:
                 print("Replication: Master closed connection.")
                 break
 
-            print(f"Replica: Received propagated data from master: {data!r}")
-            
-            # Use a buffer to handle concatenated commands
-            buffer = data
+            print(f"Replica: Received {len(data)} bytes of propagated data from master.")
+            buffer += data
+
+            # Handle concatenated commands
             while buffer:
+                # Case 1: The handshake response (+FULLRESYNC ...) and the RDB payload ($<len>\r\n<bytes>,
+                # without a trailing CRLF). Both are discarded once they have fully arrived.
+                if buffer[:1] == b"+":
+                    line_end = buffer.find(b"\r\n")
+                    if line_end == -1:
+                        break
+                    print(f"Replica: Ignoring master handshake response {bytes(buffer[:line_end])!r}.")
+                    del buffer[:line_end + 2]
+                    continue
+                if buffer[:1] == b"$":
+                    line_end = buffer.find(b"\r\n")
+                    if line_end == -1:
+                        break
+                    payload_end = line_end + 2 + int(buffer[1:line_end])
+                    if len(buffer) < payload_end:
+                        break
+                    print(f"Replica: Ignoring RDB payload ({payload_end - line_end - 2} bytes).")
+                    del buffer[:payload_end]
+                    continue
+
                 # Use the updated parser which returns (parsed_command, bytes_consumed)
                 parsed_command, bytes_consumed = ce.parsed_resp_array(buffer)
-                
+
                 if not parsed_command:
-                    # Case 1: The RDB response. The command parser (for '*') will fail here.
-                    # If data is not an array, it's the RDB payload (+FULLRESYNC, $LENGTH).
-                    if buffer.startswith(b'+') or buffer.startswith(b'$'):
-                        next_command_start = buffer.find(b'*')
-
-                        if next_command_start != -1:
-                            print(f"Replica: Ignoring master handshake response/RDB payload ({next_command_start} bytes).")
-                            # Discard the handshake response/RDB content, keep the rest of the buffer
-                            buffer = buffer[next_command_start:]
-                            continue # Re-start the loop to parse the newly trimmed buffer
-                        else:
-                            # If no command is found, the rest is just RDB payload or incomplete data.
-                            print("Replica: Ignoring remaining master handshake response/RDB payload.")
-                            buffer = b'' # Consume and discard the remaining buffer
-                            break # Exit inner while loop       
-                    
-                    # Case 2: Incomplete command or other error.
-                    print(f"Replica: Could not parse propagated command. Skipping remaining buffer: {buffer!r}")
-                    break 
-
-                command = parsed_command[0].upper()
+                    if bytes_consumed:
+                        # An empty array: nothing to apply, but it counts toward the offset
+                        del buffer[:bytes_consumed]
+                        ce.REPLICA_REPL_OFFSET += bytes_consumed
+                        continue
+                    # Case 2: Incomplete command, wait for the rest of it
+                    break
+                del buffer[:bytes_consumed]
+
+                command = command_name(parsed_command[0])
                 arguments = parsed_command[1:]
                 
-                print(f"Command: Parsed command: {command}, Arguments: {arguments}")
+                print(f"Command: Parsed command: {command} ({len(arguments)} arguments)")
                 
                 # Delegate to handle_command. The logic inside handle_command must suppress the response.
                 ce.handle_command(command, arguments, master_socket)
                 ce.REPLICA_REPL_OFFSET += bytes_consumed
 
-                # Move to the next command in the buffer
-                buffer = buffer[bytes_consumed:]
-
         except Exception as e:
             print(f"Replication Listener Error: {e}")
             break
@@ -109,7 +123,7 @@ def connect_to_master(listening_port: int) -> socket.socket | None:
         # Handshake Step 1: PING
         # ----------------------------------------------------
         master_socket.sendall(PING_COMMAND_RESP)
-        if not read_simple_string_response(master_socket, b"+PONG\r\n"): # PING expects +PONG
+        if not read_simple_string_response(master_socket, resp.PONG): # PING expects +PONG
             return
         
         # ----------------------------------------------------
@@ -117,23 +131,17 @@ def connect_to_master(listening_port: int) -> socket.socket | None:
         # ----------------------------------------------------
         port_str = str(listening_port)
         # *3\r\n$8\r\nREPLCONF\r\n$14\r\nlistening-port\r\n$LEN\r\n<PORT>\r\n
-        replconf_listening_port = (
-            b"*3\r\n" +
-            b"$8\r\nREPLCONF\r\n" +
-            b"$14\r\nlistening-port\r\n" +
-            b"$" + str(len(port_str)).encode() + b"\r\n" +
-            port_str.encode() + b"\r\n"
-        )
+        replconf_listening_port = resp.bulk_array((b"REPLCONF", b"listening-port", port_str.encode()))
 
         master_socket.sendall(replconf_listening_port)
-        if not read_simple_string_response(master_socket, b"+OK\r\n"): # REPLCONF expects +OK
+        if not read_simple_string_response(master_socket, resp.OK): # REPLCONF expects +OK
             return
 
         # ----------------------------------------------------
         # Handshake Step 3 (2nd REPLCONF): capa psync2
         # ----------------------------------------------------
         master_socket.sendall(REPLCONF_CAPA_PSYNC2)
-        if not read_simple_string_response(master_socket, b"+OK\r\n"): # REPLCONF expects +OK
+        if not read_simple_string_response(master_socket, resp.OK): # REPLCONF expects +OK
             return
 
         # ----------------------------------------------------
@@ -165,6 +173,10 @@ def main():
     is_replica = False
     master_host = None
     master_port = None
+    worker_count = 1
+    cluster_enabled = False
+    cluster_nodes = None
+    cluster_myself = None
     
     # Simple argument parsing loop
     i = 0
@@ -207,6 +219,32 @@ def main():
                 return
             # --- END CORRECTION ---
             
+        elif arg == "--workers":
+            if i + 1 >= len(args):
+                print("Server Error: Missing worker count after --workers.")
+                return
+            try:
+                worker_count = int(args[i + 1])
+            except ValueError:
+                print("Server Error: Worker count is not an integer.")
+                return
+            if worker_count < 1:
+                print("Server Error: Worker count must be at least 1.")
+                return
+            i += 2
+
+        elif arg == "--cluster-enabled" or arg == "--cluster-nodes" or arg == "--cluster-myself":
+            if i + 1 >= len(args):
+                print(f"Server Error: Missing value for {arg}.")
+                return
+            if arg == "--cluster-enabled":
+                cluster_enabled = args[i + 1].lower() == "yes"
+            elif arg == "--cluster-myself":
+                cluster_myself = args[i + 1]
+            else:
+                cluster_nodes = args[i + 1]
+            i += 2
+
         elif arg == "--dir" or arg == "--dbfilename":
             # Consuming other flags
             if i + 1 >= len(args):
@@ -216,6 +254,24 @@ def main():
             
         else:
             i += 1
+    if cluster_enabled:
+        if worker_count > 1 or is_replica:
+            print("Server Error: cluster mode cannot be combined with --workers or --replicaof.")
+            return
+        try:
+            cluster.configure(port, cluster_nodes, cluster_myself)
+        except ValueError as e:
+            print(f"Server Error: Invalid cluster configuration: {e}")
+            return
+
+    if worker_count > 1:
+        if is_replica:
+            print("Server Error: --workers cannot be combined with --replicaof.")
+            return
+        # Shared-nothing mode: fork the workers; each one runs serve() on the same port.
+        workers.run_workers(port, worker_count, serve, DATA_STORE, DATA_LOCK, handle_connection)
+        return
+
     master_socket = None
     if is_replica:
         ce.SERVER_ROLE = "slave"
@@ -230,10 +286,14 @@ def main():
         threading.Thread(target=replica_command_listener, args=(master_socket,), daemon=True).start()
     # ----------------------------------------
 
+    serve(port)
+
+def serve(port: int):
+    """Binds the listening socket and runs the accept loop, one thread per client."""
     try:
         # This tells the operating system to create a listening point at $\texttt{localhost}$ (your computer) on port $\texttt{6379}$ (the standard Redis port).
 
-        
+        # reuse_port=True lets several --workers processes bind the same port (SO_REUSEPORT).
         server_socket = socket.create_server(("localhost", port), reuse_port=True)
         print(f"Server: Starting server on localhost:{port}...")
         print("Server: Listening for connections...")
@@ -246,6 +306,9 @@ def main():
         try:
             # When you run $\texttt{redis-cli}$, the server blocks here until that client connects. Once connected, it gets a new, dedicated connection socket {connection} and the client's address (client address}.
             connection, client_address = server_socket.accept()
+            # Replies are small writes: without TCP_NODELAY, Nagle holds each one back until the
+            # previous is acknowledged, which stalls pipelined replies on delayed ACKs
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
             # To handle multiple clients simultaneously, the server hands the connection off to a new thread
             threading.Thread(target=handle_connection, args=(connection, client_address)).start()
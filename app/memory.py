@@ -0,0 +1,402 @@
+# app/memory.py
+
+# maxmemory and key eviction.
+#
+# used_memory is an estimate kept up to date one key at a time: after a command writes a
+# key, that key's size is estimated again (collections from a few sampled elements, like
+# Redis's MEMORY USAGE) and only the difference is added, so the keyspace is never walked.
+# Keys are only accounted while maxmemory is set: setting it walks the keyspace once, and
+# without a limit INFO estimates used_memory from a few sampled keys instead.
+#
+# Before a write command runs, keys are evicted while used_memory is over maxmemory, as
+# chosen by maxmemory-policy; when nothing can be evicted the command fails with -OOM.
+# LRU and LFU are approximate, as in Redis: each command stamps the keys it touches with an
+# access clock (LRU) or a logarithmic access counter that decays over time (LFU). Eviction
+# samples maxmemory-samples random keys, keeps the best candidates seen so far in a small
+# pool, and evicts the best of the pool.
+#
+# All of the state below is guarded by DATA_LOCK.
+
+from bisect import insort
+import itertools
+import random
+import sys
+import time
+
+from app.datastore import DATABASES, DATA_LOCK, DATA_STORE, EXPIRED_KEY_CALLBACKS, FLUSH_CALLBACKS, SERVER_CONFIG, _remove_key, selected_database, using_database
+import app.lazyfree as lazyfree
+from app.notify import NOTIFY_EVICTED, NOTIFY_STATE, notify_keyspace_event
+
+OOM_ERROR = b"-OOM command not allowed when used memory > 'maxmemory'.\r\n"
+
+POLICIES = ("noeviction", "allkeys-lru", "allkeys-lfu", "allkeys-random",
+            "volatile-lru", "volatile-lfu", "volatile-random", "volatile-ttl")
+
+MEMORY_STATE = {"policy": "noeviction", "used": 0, "evicted_keys": 0}
+
+# Elements looked at to estimate the size of a collection
+MEMORY_SAMPLES = 5
+
+# A key's slot in DATA_STORE plus its entry dict
+KEY_OVERHEAD = sys.getsizeof({"type": None, "value": None, "expiry": None}) + 24
+# A sorted set member is also in the score index, as a (score, member) tuple
+ZSET_MEMBER_OVERHEAD = sys.getsizeof((0.0, b"")) + sys.getsizeof(0.0) + 8
+
+EVICTION_POOL_SIZE = 16
+
+# New keys start with a small LFU count, so they are not the first to go
+LFU_INIT_VAL = 5
+
+class KeySample:
+    """A set of keys that can also hand out random keys in O(1)."""
+
+    def __init__(self):
+        self._keys = []
+        self._positions = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._positions
+
+    def add(self, key: bytes):
+        if key not in self._positions:
+            self._positions[key] = len(self._keys)
+            self._keys.append(key)
+
+    def discard(self, key: bytes):
+        position = self._positions.pop(key, None)
+        if position is None:
+            return
+        # Move the last key into the hole
+        last_key = self._keys.pop()
+        if position < len(self._keys):
+            self._keys[position] = last_key
+            self._positions[last_key] = position
+
+    def sample(self, count: int) -> list[bytes]:
+        keys = self._keys
+        size = len(keys)
+        return [keys[int(random.random() * size)] for _ in range(count)] if size else []
+
+    def clear(self):
+        self._keys.clear()
+        self._positions.clear()
+
+class KeyTables:
+    """The accounted keys of one database."""
+
+    def __init__(self):
+        self.sizes = {}  # key -> estimated size, as last accounted
+        self.used = 0    # Sum of sizes
+        self.all_keys = KeySample()
+        self.volatile_keys = KeySample()  # Keys with an expiry
+
+# Database -> its KeyTables; keyed by the object, so they follow it through SWAPDB
+KEY_TABLES = {database: KeyTables() for database in DATABASES}
+
+# (score, sequence, key, database) of the best eviction candidates seen, the best one last.
+# The sequence number breaks ties, so keys and databases are never compared.
+EVICTION_POOL = []
+EVICTION_POOL_KEYS = set()  # (database, key)
+_POOL_SEQUENCE = itertools.count()
+
+def _average_size(items) -> float:
+    sizes = [sys.getsizeof(item) for item in items]
+    return sum(sizes) / len(sizes) if sizes else 0
+
+def _stream_entry_size(entry: dict) -> int:
+    fields = entry["fields"]
+    return (sys.getsizeof(entry) + sys.getsizeof(entry["id"]) + sys.getsizeof(fields)
+            + sum(sys.getsizeof(field) + sys.getsizeof(value) for field, value in fields.items()))
+
+def estimate_size(key: bytes, data_entry: dict) -> int:
+    """Approximate bytes used by a key and its value."""
+    value = data_entry["value"]
+    value_type = data_entry["type"]
+    if value_type == "string":
+        size = sys.getsizeof(value)
+    elif value_type == "list":
+        size = sys.getsizeof(value) + len(value) * _average_size(value[:MEMORY_SAMPLES])
+    elif value_type == "hash":
+        if isinstance(value, list):  # listpack: a flat [field, value, ...] list
+            size = sys.getsizeof(value) + len(value) * _average_size(value[:MEMORY_SAMPLES * 2])
+        else:
+            sample = itertools.chain.from_iterable(itertools.islice(value.items(), MEMORY_SAMPLES))
+            size = sys.getsizeof(value) + 2 * len(value) * _average_size(sample)
+    elif value_type == "set":
+        size = sys.getsizeof(value)  # An intset's array includes its buffer
+        if data_entry.get("encoding") != "intset":
+            size += len(value) * _average_size(itertools.islice(value, MEMORY_SAMPLES))
+    elif value_type == "sorted_set":
+        member_size = _average_size(itertools.islice(value, MEMORY_SAMPLES)) + ZSET_MEMBER_OVERHEAD
+        size = sys.getsizeof(value) + len(value) * member_size
+    elif value_type == "stream":
+        size = sys.getsizeof(value)
+        if value:
+            sample = value[-MEMORY_SAMPLES:]
+            size += len(value) * sum(_stream_entry_size(entry) for entry in sample) / len(sample)
+    else:
+        size = 0
+    return KEY_OVERHEAD + sys.getsizeof(key) + int(size)
+
+def _account_key(key: bytes):
+    """Re-estimates one key after it was written (or deleted). Caller holds DATA_LOCK."""
+    database = selected_database()
+    data_entry = database.store.get(key)
+    if data_entry is None:
+        _forget_key(key)
+        return
+
+    tables = KEY_TABLES[database]
+    size = estimate_size(key, data_entry)
+    difference = size - tables.sizes.get(key, 0)
+    tables.used += difference
+    MEMORY_STATE["used"] += difference
+    tables.sizes[key] = size
+    tables.all_keys.add(key)
+    if data_entry.get("expiry") is not None:
+        tables.volatile_keys.add(key)
+    else:
+        tables.volatile_keys.discard(key)
+
+def _forget_key(key: bytes):
+    """Releases the memory accounted to a key that is gone. Caller holds DATA_LOCK."""
+    tables = KEY_TABLES[selected_database()]
+    size = tables.sizes.pop(key, None)
+    if size is not None:
+        tables.used -= size
+        MEMORY_STATE["used"] -= size
+        tables.all_keys.discard(key)
+        tables.volatile_keys.discard(key)
+
+# Lazy expiration runs with DATA_LOCK held
+EXPIRED_KEY_CALLBACKS.append(_forget_key)
+
+def _forget_all_keys(databases: list, lazy: bool):
+    """After FLUSHALL / FLUSHDB: new empty tables, the old ones freed like the keyspace."""
+    for database in databases:
+        tables = KEY_TABLES[database]
+        for table in (tables.sizes, tables.all_keys._keys, tables.all_keys._positions,
+                      tables.volatile_keys._keys, tables.volatile_keys._positions):
+            lazyfree.free_object(table, lazy)
+        KEY_TABLES[database] = KeyTables()
+        MEMORY_STATE["used"] -= tables.used
+    flushed = set(databases)
+    EVICTION_POOL[:] = [candidate for candidate in EVICTION_POOL if candidate[3] not in flushed]
+    EVICTION_POOL_KEYS.difference_update([key for key in EVICTION_POOL_KEYS if key[0] in flushed])
+
+FLUSH_CALLBACKS.append(_forget_all_keys)
+
+def account_keys(keys: list[bytes]):
+    """Brings used_memory up to date after `keys` were written."""
+    if not SERVER_CONFIG["maxmemory"]:
+        return
+    with DATA_LOCK:
+        for key in keys:
+            _account_key(key)
+
+def account_all_keys():
+    """
+    Accounts every database from scratch (after loading an RDB file, or when maxmemory is
+    set). Without maxmemory the tables are only emptied.
+    """
+    with DATA_LOCK:
+        MEMORY_STATE["used"] = 0
+        EVICTION_POOL.clear()
+        EVICTION_POOL_KEYS.clear()
+        for index, database in enumerate(DATABASES):
+            KEY_TABLES[database] = KeyTables()
+            if SERVER_CONFIG["maxmemory"]:
+                with using_database(index):
+                    for key in list(DATA_STORE):
+                        _account_key(key)
+
+def _sampled_used_memory() -> int:
+    """used_memory while keys are not accounted: each database's size from a few of its keys."""
+    used = 0
+    with DATA_LOCK:
+        for database in DATABASES:
+            store = database.store
+            sample = list(itertools.islice(store.items(), MEMORY_SAMPLES))
+            if sample:
+                used += len(store) * sum(estimate_size(key, data_entry) for key, data_entry in sample) // len(sample)
+    return used
+
+def _lfu_minutes() -> int:
+    return int(time.monotonic() // 60) & 0xFFFF
+
+def _lfu_counter(lfu: int | None) -> int:
+    """The access counter, decreased by one per lfu-decay-time minutes since the last access."""
+    if lfu is None:
+        return LFU_INIT_VAL
+    counter = lfu & 0xFF
+    decay_time = SERVER_CONFIG["lfu-decay-time"]
+    if decay_time > 0:
+        elapsed = (_lfu_minutes() - (lfu >> 8)) & 0xFFFF
+        counter = max(0, counter - elapsed // decay_time)
+    return counter
+
+def _lfu_access(lfu: int | None) -> int:
+    """
+    Counts one access: the counter grows with probability 1 / ((counter - LFU_INIT_VAL) *
+    lfu-log-factor + 1), so it stays within 8 bits for millions of accesses.
+    Returns (last access minute << 8) | counter.
+    """
+    counter = _lfu_counter(lfu)
+    if counter < 255:
+        base = max(0, counter - LFU_INIT_VAL)
+        if random.random() < 1.0 / (base * SERVER_CONFIG["lfu-log-factor"] + 1):
+            counter += 1
+    return (_lfu_minutes() << 8) | counter
+
+def touch_keys(keys: list[bytes]):
+    """Records an access to each key, for the LRU or LFU policies."""
+    if "lfu" in MEMORY_STATE["policy"]:
+        for key in keys:
+            data_entry = DATA_STORE.get(key)
+            if data_entry is not None:
+                data_entry["lfu"] = _lfu_access(data_entry.get("lfu"))
+    else:
+        now_ms = int(time.monotonic() * 1000)
+        for key in keys:
+            data_entry = DATA_STORE.get(key)
+            if data_entry is not None:
+                data_entry["lru"] = now_ms
+
+def after_command(keys: list[bytes], wrote: bool):
+    """Memory bookkeeping for the keys of a command that just ran, while maxmemory is set."""
+    if wrote:
+        account_keys(keys)
+    touch_keys(keys)
+
+def _eviction_score(data_entry: dict, policy: str, now_ms: int) -> float | None:
+    """Higher is evicted first; None if the entry can't be evicted by this policy."""
+    if policy.endswith("lru"):
+        return now_ms - data_entry.get("lru", 0)  # Idle time
+    if policy.endswith("lfu"):
+        return 255 - _lfu_counter(data_entry.get("lfu"))
+    # volatile-ttl: the sooner the key expires, the better
+    expiry = data_entry.get("expiry")
+    return None if expiry is None else -expiry
+
+def _evictable_keys(tables: KeyTables, policy: str) -> KeySample:
+    return tables.all_keys if policy.startswith("allkeys") else tables.volatile_keys
+
+def _evict_one(policy: str) -> bytes | None:
+    """Picks and removes one key, from any database. Caller holds DATA_LOCK."""
+    candidates = [(database, tables) for database, tables in KEY_TABLES.items() if _evictable_keys(tables, policy)]
+    if not candidates:
+        return None
+
+    if policy.endswith("random"):
+        database, tables = random.choice(candidates)
+        key = _evictable_keys(tables, policy).sample(1)[0]
+    else:
+        # Like Redis, every database is sampled into the one pool
+        now_ms = int(time.monotonic() * 1000)
+        for database, tables in candidates:
+            store = database.store
+            for key in _evictable_keys(tables, policy).sample(SERVER_CONFIG["maxmemory-samples"]):
+                data_entry = store.get(key)
+                if data_entry is None:
+                    continue
+                score = _eviction_score(data_entry, policy, now_ms)
+                if score is None or (database, key) in EVICTION_POOL_KEYS:
+                    continue
+                if len(EVICTION_POOL) >= EVICTION_POOL_SIZE and score <= EVICTION_POOL[0][0]:
+                    continue
+                insort(EVICTION_POOL, (score, next(_POOL_SEQUENCE), key, database))
+                EVICTION_POOL_KEYS.add((database, key))
+                if len(EVICTION_POOL) > EVICTION_POOL_SIZE:
+                    _, _, dropped_key, dropped_database = EVICTION_POOL.pop(0)
+                    EVICTION_POOL_KEYS.discard((dropped_database, dropped_key))
+
+        # Pool entries may have been deleted since they were sampled
+        key = None
+        while EVICTION_POOL:
+            _, _, candidate, database = EVICTION_POOL.pop()
+            EVICTION_POOL_KEYS.discard((database, candidate))
+            if candidate in _evictable_keys(KEY_TABLES[database], policy):
+                key = candidate
+                break
+        if key is None:
+            return None
+
+    with using_database(DATABASES.index(database)):
+        _remove_key(key, lazy=SERVER_CONFIG["lazyfree-lazy-eviction"])
+        _forget_key(key)
+        if NOTIFY_STATE["flags"] & NOTIFY_EVICTED:
+            notify_keyspace_event(NOTIFY_EVICTED, b"evicted", key)
+    MEMORY_STATE["evicted_keys"] += 1
+    return key
+
+def free_memory_if_needed() -> tuple[bool, list[bytes]]:
+    """
+    Evicts keys while used memory is over maxmemory.
+    Returns (whether memory is now within the limit, evicted keys).
+    """
+    maxmemory = SERVER_CONFIG["maxmemory"]
+    if not maxmemory or MEMORY_STATE["used"] <= maxmemory:
+        return True, []
+
+    evicted_keys = []
+    policy = MEMORY_STATE["policy"]
+    if policy != "noeviction":
+        with DATA_LOCK:
+            while MEMORY_STATE["used"] > maxmemory:
+                key = _evict_one(policy)
+                if key is None:
+                    break
+                evicted_keys.append(key)
+    return MEMORY_STATE["used"] <= maxmemory, evicted_keys
+
+def _parse_memory(value: bytes) -> int | None:
+    """1000, 100kb, 1mb, 2gb (case-insensitive) -> bytes."""
+    value = value.lower()
+    for suffix, multiplier in ((b"kb", 1024), (b"mb", 1024 ** 2), (b"gb", 1024 ** 3), (b"k", 1000), (b"m", 1000 ** 2), (b"g", 1000 ** 3)):
+        if value.endswith(suffix):
+            value = value[:-len(suffix)]
+            break
+    else:
+        multiplier = 1
+    try:
+        number = int(value)
+    except ValueError:
+        return None
+    return number * multiplier if number >= 0 else None
+
+def set_config(name: str, value: bytes) -> bool:
+    """CONFIG SET maxmemory / maxmemory-policy. Returns False for an invalid value."""
+    if name == "maxmemory":
+        maxmemory = _parse_memory(value)
+        if maxmemory is None:
+            return False
+        with DATA_LOCK:
+            accounted = bool(SERVER_CONFIG["maxmemory"])
+            SERVER_CONFIG["maxmemory"] = maxmemory
+            if accounted != bool(maxmemory):
+                account_all_keys()
+        return True
+
+    policy = value.lower().decode("utf-8", "replace")
+    if policy not in POLICIES:
+        return False
+    with DATA_LOCK:
+        MEMORY_STATE["policy"] = policy
+        # Scores from another policy don't compare
+        EVICTION_POOL.clear()
+        EVICTION_POOL_KEYS.clear()
+    return True
+
+def memory_info() -> str:
+    """The INFO memory section."""
+    used = MEMORY_STATE["used"] if SERVER_CONFIG["maxmemory"] else _sampled_used_memory()
+    return (f"# Memory\r\n"
+            f"used_memory:{used}\r\n"
+            f"used_memory_human:{used / (1024 * 1024):.2f}M\r\n"
+            f"maxmemory:{SERVER_CONFIG['maxmemory']}\r\n"
+            f"maxmemory_policy:{MEMORY_STATE['policy']}\r\n"
+            f"lazyfree_pending_objects:{lazyfree.LAZYFREE_STATE['pending']}\r\n"
+            f"lazyfreed_objects:{lazyfree.LAZYFREE_STATE['freed']}\r\n")
@@ -0,0 +1,199 @@
+# app/notify.py
+
+# Keyspace notifications (notify-keyspace-events).
+#
+# Every key modified by a write command, expired or evicted can be published as two pub/sub
+# messages: "__keyspace@<db>__:<key>" with the event name, and "__keyevent@<db>__:<event>"
+# with the key, <db> being the index of the key's database. The configured event classes
+# are kept as a bitmask, so each site pays one integer test when the feature is off, and
+# nothing is formatted or looked up until at least one client is subscribed to a channel
+# or pattern.
+#
+#   CONFIG SET notify-keyspace-events KEA     every event, on both channels
+#   CONFIG SET notify-keyspace-events Ex      expired events, on __keyevent@0__:expired
+#
+# Write commands map to their event in COMMAND_EVENTS and are notified once they succeed
+# (app/command_execution.py); replies that mean nothing changed (nil, :0 for SREM and the
+# like) are skipped. A key left empty by the command (e.g. its last element popped)
+# also gets a "del" event.
+#
+# Blocking pops (and LMOVE) are notified by the code that serves them instead, whether they
+# pop right away or a later push serves them: "lpop" / "rpop" on the source list,
+# "lpush" / "rpush" on a BLMOVE destination (LIST_EVENT_CALLBACKS in app/datastore.py).
+
+from app.datastore import DATABASE_COUNT, DATA_STORE, EXPIRED_KEY_CALLBACKS, LIST_EVENT_CALLBACKS, selected_index, using_database
+import app.pubsub as pubsub
+from app.slots import get_command_keys
+
+NOTIFY_KEYSPACE = 1 << 0  # K
+NOTIFY_KEYEVENT = 1 << 1  # E
+NOTIFY_GENERIC = 1 << 2   # g: del, expire, restore, ...
+NOTIFY_STRING = 1 << 3    # $
+NOTIFY_LIST = 1 << 4      # l
+NOTIFY_SET = 1 << 5       # s
+NOTIFY_HASH = 1 << 6      # h
+NOTIFY_ZSET = 1 << 7      # z
+NOTIFY_EXPIRED = 1 << 8   # x
+NOTIFY_EVICTED = 1 << 9   # e
+NOTIFY_STREAM = 1 << 10   # t
+NOTIFY_ALL = (NOTIFY_GENERIC | NOTIFY_STRING | NOTIFY_LIST | NOTIFY_SET | NOTIFY_HASH
+              | NOTIFY_ZSET | NOTIFY_EXPIRED | NOTIFY_EVICTED | NOTIFY_STREAM)  # A
+
+_CLASS_CHARACTERS = (
+    ("g", NOTIFY_GENERIC), ("$", NOTIFY_STRING), ("l", NOTIFY_LIST), ("s", NOTIFY_SET),
+    ("h", NOTIFY_HASH), ("z", NOTIFY_ZSET), ("x", NOTIFY_EXPIRED), ("e", NOTIFY_EVICTED),
+    ("t", NOTIFY_STREAM),
+)
+
+# 0 when disabled, so call sites can test NOTIFY_STATE["flags"] & <class> and move on
+NOTIFY_STATE = {"flags": 0}
+
+# Channel name prefixes of each database
+_KEYSPACE_PREFIXES = tuple(b"__keyspace@%d__:" % index for index in range(DATABASE_COUNT))
+_KEYEVENT_PREFIXES = tuple(b"__keyevent@%d__:" % index for index in range(DATABASE_COUNT))
+
+# Write command -> (event class, event name)
+COMMAND_EVENTS = {
+    "SET": (NOTIFY_STRING, b"set"),
+    "SETNX": (NOTIFY_STRING, b"set"),
+    "MSET": (NOTIFY_STRING, b"set"),
+    "MSETNX": (NOTIFY_STRING, b"set"),
+    "GETSET": (NOTIFY_STRING, b"set"),
+    "APPEND": (NOTIFY_STRING, b"append"),
+    "SETRANGE": (NOTIFY_STRING, b"setrange"),
+    "INCR": (NOTIFY_STRING, b"incrby"),
+    "DECR": (NOTIFY_STRING, b"incrby"),
+    "INCRBY": (NOTIFY_STRING, b"incrby"),
+    "DECRBY": (NOTIFY_STRING, b"incrby"),
+    "INCRBYFLOAT": (NOTIFY_STRING, b"incrbyfloat"),
+    "GETEX": (NOTIFY_GENERIC, b"expire"),
+    "GETDEL": (NOTIFY_GENERIC, b"del"),
+    "LPUSH": (NOTIFY_LIST, b"lpush"),
+    "RPUSH": (NOTIFY_LIST, b"rpush"),
+    "LPOP": (NOTIFY_LIST, b"lpop"),
+    "RPOP": (NOTIFY_LIST, b"rpop"),
+    "HSET": (NOTIFY_HASH, b"hset"),
+    "HDEL": (NOTIFY_HASH, b"hdel"),
+    "HINCRBY": (NOTIFY_HASH, b"hincrby"),
+    "SADD": (NOTIFY_SET, b"sadd"),
+    "SREM": (NOTIFY_SET, b"srem"),
+    "SPOP": (NOTIFY_SET, b"spop"),
+    "SINTERSTORE": (NOTIFY_SET, b"sinterstore"),
+    "ZADD": (NOTIFY_ZSET, b"zadd"),
+    "ZREM": (NOTIFY_ZSET, b"zrem"),
+    "GEOADD": (NOTIFY_ZSET, b"zadd"),
+    "XADD": (NOTIFY_STREAM, b"xadd"),
+    "XGROUP": (NOTIFY_STREAM, b"xgroup"),
+    "XCLAIM": (NOTIFY_STREAM, b"xclaim"),
+    "XAUTOCLAIM": (NOTIFY_STREAM, b"xautoclaim"),
+    "RESTORE": (NOTIFY_GENERIC, b"restore"),
+}
+
+# Replies meaning the command changed nothing
+_NO_CHANGE_REPLIES = {b"$-1\r\n", b"_\r\n", b"*-1\r\n", b"*0\r\n"}
+_ZERO_MEANS_NO_CHANGE = {"SETNX", "MSETNX", "HDEL", "SADD", "SREM", "ZREM"}
+
+def parse_flags(value: bytes) -> int | None:
+    """'KEA', 'Ex', ... -> bitmask (None for unknown characters). Without K or E nothing is sent."""
+    flags = 0
+    for character in value.decode("latin-1"):
+        if character == "A":
+            flags |= NOTIFY_ALL
+        elif character == "K":
+            flags |= NOTIFY_KEYSPACE
+        elif character == "E":
+            flags |= NOTIFY_KEYEVENT
+        else:
+            for class_character, flag in _CLASS_CHARACTERS:
+                if character == class_character:
+                    flags |= flag
+                    break
+            else:
+                return None
+    if not flags & (NOTIFY_KEYSPACE | NOTIFY_KEYEVENT) or not flags & NOTIFY_ALL:
+        return 0
+    return flags
+
+def get_config() -> str:
+    """The notify-keyspace-events value, as CONFIG GET shows it."""
+    flags = NOTIFY_STATE["flags"]
+    if flags & NOTIFY_ALL == NOTIFY_ALL:
+        text = "A"
+    else:
+        text = "".join(character for character, flag in _CLASS_CHARACTERS if flags & flag)
+    if flags & NOTIFY_KEYSPACE:
+        text += "K"
+    if flags & NOTIFY_KEYEVENT:
+        text += "E"
+    return text if flags else ""
+
+def set_config(value: bytes) -> bool:
+    flags = parse_flags(value)
+    if flags is None:
+        return False
+    NOTIFY_STATE["flags"] = flags
+    return True
+
+def _has_subscribers() -> bool:
+    return bool(pubsub.CHANNELS.subscribers or pubsub.PATTERN_SUBSCRIBERS)
+
+def notify_keyspace_event(event_class: int, event: bytes, key: bytes):
+    """Publishes one event for a key, if its class is enabled and anyone may be listening."""
+    flags = NOTIFY_STATE["flags"]
+    if not flags & event_class or not _has_subscribers():
+        return
+    index = selected_index()
+    if flags & NOTIFY_KEYSPACE:
+        pubsub.publish(_KEYSPACE_PREFIXES[index] + key, event)
+    if flags & NOTIFY_KEYEVENT:
+        pubsub.publish(_KEYEVENT_PREFIXES[index] + event, key)
+
+def command_executed(command: str, arguments: list, reply: bytes):
+    """Notifies the keys of a write command that succeeded. Caller holds DATA_LOCK."""
+    event_class, event = COMMAND_EVENTS[command]
+    if not NOTIFY_STATE["flags"] & (event_class | NOTIFY_GENERIC) or not _has_subscribers():
+        return
+    if reply in _NO_CHANGE_REPLIES or (reply == b":0\r\n" and command in _ZERO_MEANS_NO_CHANGE):
+        return
+
+    keys = get_command_keys(command, arguments)
+    if command == "SINTERSTORE":
+        keys = keys[:1]  # The destination; the sources are only read
+        if reply == b":0\r\n":
+            event_class, event = NOTIFY_GENERIC, b"del"
+    elif command == "XGROUP":
+        event = b"xgroup-" + arguments[0].lower()
+    elif command == "GETEX":
+        if len(arguments) == 1:
+            return  # Plain GET
+        if arguments[1].upper() == b"PERSIST":
+            event = b"persist"
+
+    for key in keys:
+        notify_keyspace_event(event_class, event, key)
+        if event != b"del" and key not in DATA_STORE:
+            notify_keyspace_event(NOTIFY_GENERIC, b"del", key)
+
+def keys_deleted(keys: list[bytes]):
+    """DEL / UNLINK: one "del" event per key removed."""
+    for key in keys:
+        notify_keyspace_event(NOTIFY_GENERIC, b"del", key)
+
+def key_moved(key: bytes, target: int):
+    """MOVE: "move_from" in the selected database, "move_to" in the target one."""
+    notify_keyspace_event(NOTIFY_GENERIC, b"move_from", key)
+    with using_database(target):
+        notify_keyspace_event(NOTIFY_GENERIC, b"move_to", key)
+
+def _key_expired(key: bytes):
+    if NOTIFY_STATE["flags"] & NOTIFY_EXPIRED:
+        notify_keyspace_event(NOTIFY_EXPIRED, b"expired", key)
+
+EXPIRED_KEY_CALLBACKS.append(_key_expired)
+
+def _list_event(event: bytes, key: bytes):
+    """Blocking pops and LMOVE: their events come from the code that serves them."""
+    if NOTIFY_STATE["flags"]:
+        notify_keyspace_event(NOTIFY_GENERIC if event == b"del" else NOTIFY_LIST, event, key)
+
+LIST_EVENT_CALLBACKS.append(_list_event)
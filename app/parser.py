@@ -1,77 +1,100 @@
 # app/parser.py
 
-# The parser code remains exactly as optimized earlier.
+# Arguments are returned as raw bytes: keys and values are binary safe and are never
+# decoded, so a value travels from the socket to the data store and back without
+# being transcoded. The buffer is sliced through a memoryview, so only the argument
+# bytes themselves are copied, once.
+
+# Command names are matched as bytes: the first time a spelling ("get", "GET", "Get")
+# is seen it is upper-cased and decoded once, and every later lookup is a dict hit.
+_COMMAND_NAMES: dict[bytes, str] = {}
+_COMMAND_NAMES_MAX = 1024  # Don't let a client fill the table with junk command names
+
+# Redis's limits on a request: elements per array, bytes per bulk string
+MAX_ARRAY_LENGTH = 1024 * 1024
+MAX_BULK_LENGTH = 512 * 1024 * 1024
+
+def command_name(raw_name: bytes) -> str:
+    """Returns the canonical (upper-case str) name of a command sent as bytes."""
+    name = _COMMAND_NAMES.get(raw_name)
+    if name is None:
+        name = raw_name.upper().decode("utf-8", "replace")
+        if len(_COMMAND_NAMES) < _COMMAND_NAMES_MAX:
+            _COMMAND_NAMES[bytes(raw_name)] = name
+    return name
 
 # Example Input: data = b'*2\r\n$4\r\nECHO\r\n$3\r\nhey\r\n'
-def parsed_resp_array(data: bytes) -> tuple[list[str], int]: # CHANGE: Return tuple (list, bytes_consumed)
-    if not data or not data.startswith(b"*"):
+def parsed_resp_array(data: bytes | bytearray) -> tuple[list[bytes], int]:
+    """
+    Parses one RESP array of bulk strings from the start of `data`.
+    Returns (elements, bytes consumed). When `data` does not start with an array or
+    the array is not complete yet, returns ([], 0) so the caller can read more. An empty
+    or null array (*0, *-1) is returned as ([], its size): consumed, with nothing to run.
+    Raises ValueError on a malformed or out of range length.
+    """
+    if not data or data[:1] != b"*":
         # If data is empty or not an array, return empty list and 0 consumed bytes
-        return [], 0 # CHANGE
-    
-    try:
-        # Find the first CRLF to get the number of elements
-        crlf_index = data.find(b"\r\n")
-        if crlf_index == -1:
-            return [], 0 # CHANGE
-        
-        # count_bytes is bytes between * and \r\n (b'2' for example)
-        count_bytes = data[1:crlf_index]
-        if not count_bytes:
-             print("Parser Error: No element count found.")
-             return [], 0 # CHANGE
-
-        # decode to string and convert to int so now it is 2 for example
-        num_elements_str = count_bytes.decode()
-        num_elements = int(num_elements_str)
+        return [], 0
+
+    # Find the first CRLF to get the number of elements
+    crlf_index = data.find(b"\r\n")
+    if crlf_index == -1:
+        return [], 0
 
+    # count_bytes is bytes between * and \r\n (b'2' for example). int() takes bytes directly.
+    count_bytes = data[1:crlf_index]
+    try:
+        num_elements = int(count_bytes)
     except ValueError:
-        print(f"Parser Error: Invalid element count value: {data[1:crlf_index]}")
-        return [], 0 # CHANGE
-    
+        raise ValueError(f"invalid multibulk length: {bytes(count_bytes)!r}")
+    if num_elements <= 0:
+        return [], crlf_index + 2
+    if num_elements > MAX_ARRAY_LENGTH:
+        raise ValueError(f"invalid multibulk length: {num_elements}")
 
+    view = memoryview(data)
     parsed_elements = []
     # Move index to the start of the first element (past the initial CRLF (\r\n))
     index = crlf_index + 2
-    
-    print(f"Parser: Expecting {num_elements} elements.")
-    
+
     for i in range(num_elements):
 
         # Confirms data at index is b"$" (Bulk String marker)
-        if index >= len(data) or data[index: index + 1] != b"$":
-            print(f"Parser Error: Element {i} not starting with $ at index {index}.")
-            return [], 0 # CHANGE
-        
+        if index >= len(data):
+            return [], 0
+        if data[index] != 0x24:  # '$'
+            raise ValueError(f"element {i} not starting with $ at index {index}")
+
         index += 1 # Skip $
 
         # Find next \r\n to get length of string. Find takes index as second arg to start searching from there. Returns index of \r\n
         crlf_index = data.find(b"\r\n", index)
         if crlf_index == -1:
-            print(f"Parser Error: Element {i} missing length CRLF.")
-            return [], 0 # CHANGE
+            return [], 0
 
         # length_bytes is bytes between $ and \r\n. This is '`4` for example'
         try:
-            length_bytes = data[index:crlf_index]
-            str_length = int(length_bytes.decode())
-            print(f"Parser: Element {i} length is {str_length}.")
+            str_length = int(data[index:crlf_index])
         except ValueError:
-            print(f"Parser Error: Element {i} invalid length value: {length_bytes}")
-            return [], 0 # CHANGE
-        
+            raise ValueError(f"element {i} invalid bulk length: {bytes(data[index:crlf_index])!r}")
+        if not 0 <= str_length <= MAX_BULK_LENGTH:
+            # A null bulk string ($-1) is a reply, never a request argument
+            raise ValueError(f"element {i} invalid bulk length: {str_length}")
+
         index = crlf_index + 2 # Skip length and \r\n
 
         # Extract value. This is b'ECHO' for example
         value_end_index = index + str_length
         if value_end_index + 2 > len(data): # +2 for trailing \r\n
-            print(f"Parser Error: Element {i} incomplete data or missing trailing CRLF.")
-            return [], 0 # CHANGE
-        
-        # Decode and append value
-        value = data[index:value_end_index].decode()
-        parsed_elements.append(value)
-        print(f"Parser: Element {i} value: '{value}'")
-        
+            # The rest of the value has not arrived yet
+            return [], 0
+
+        if data[value_end_index:value_end_index + 2] != b"\r\n":
+            raise ValueError(f"element {i} is not terminated by CRLF")
+
+        # A single copy out of the receive buffer; the value is kept as bytes from here on
+        parsed_elements.append(bytes(view[index:value_end_index]))
+
         index = value_end_index + 2  # Skip value and \r\n
-        
-    return parsed_elements, index # CHANGE: Return the final index (bytes consumed)
\ No newline at end of file
+
+    return parsed_elements, index
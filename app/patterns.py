@@ -0,0 +1,154 @@
+# app/patterns.py
+
+# Glob-style patterns (PSUBSCRIBE, PUBSUB CHANNELS), with Redis's matching rules:
+# `*` and `?` wildcards, `[abc]` / `[^abc]` / `[a-z]` classes and `\` to escape the
+# next character. Each pattern is translated to a compiled regex once.
+#
+# PatternIndex keeps many patterns indexed by their literal prefix (the part before the
+# first wildcard) in a byte trie. Matching a channel walks the trie along the channel's
+# bytes, so only patterns whose prefix the channel actually starts with are evaluated,
+# instead of every registered pattern.
+
+import re
+
+_WILDCARDS = b"*?[\\"
+
+def compile_glob(pattern: bytes) -> re.Pattern:
+    """Translates a glob pattern into an anchored bytes regex."""
+    parts = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        char = pattern[i:i + 1]
+        i += 1
+        if char == b"*":
+            parts.append(b".*")
+        elif char == b"?":
+            parts.append(b".")
+        elif char == b"\\" and i < n:
+            parts.append(re.escape(pattern[i:i + 1]))
+            i += 1
+        elif char == b"[":
+            end = i
+            if end < n and pattern[end:end + 1] == b"^":
+                end += 1
+            if end < n and pattern[end:end + 1] == b"]":
+                end += 1
+            while end < n and pattern[end:end + 1] != b"]":
+                end += 2 if pattern[end:end + 1] == b"\\" else 1
+            if end >= n:
+                # No closing bracket: the rest is taken literally
+                parts.append(re.escape(pattern[i - 1:]))
+                break
+            parts.append(_translate_class(pattern[i:end]))
+            i = end + 1
+        else:
+            parts.append(re.escape(char))
+    return re.compile(b"".join(parts) + b"\\Z", re.DOTALL)
+
+def _translate_class(body: bytes) -> bytes:
+    """The inside of a [...] class (without brackets) as a regex class."""
+    negate = body[:1] == b"^"
+    if negate:
+        body = body[1:]
+    items = []
+    i = 0
+    while i < len(body):
+        char = body[i:i + 1]
+        if char == b"\\" and i + 1 < len(body):
+            char = body[i + 1:i + 2]
+            i += 1
+        if body[i + 1:i + 2] == b"-" and i + 2 < len(body):
+            low, high = char, body[i + 2:i + 3]
+            if low > high:
+                low, high = high, low
+            items.append(re.escape(low) + b"-" + re.escape(high))
+            i += 3
+        else:
+            items.append(re.escape(char))
+            i += 1
+    if not items:
+        return b"[^\\s\\S]" if not negate else b"."
+    return b"[" + (b"^" if negate else b"") + b"".join(items) + b"]"
+
+def literal_prefix(pattern: bytes) -> bytes:
+    """The leading part of a pattern that contains no wildcard."""
+    for i, byte in enumerate(pattern):
+        if byte in _WILDCARDS:
+            return pattern[:i]
+    return pattern
+
+class _TrieNode:
+    __slots__ = ("children", "patterns")
+
+    def __init__(self):
+        self.children = {}
+        self.patterns = {}  # pattern -> compiled regex, for patterns whose prefix ends here
+
+class PatternIndex:
+    """A set of glob patterns that can quickly report which of them match a string."""
+
+    def __init__(self):
+        self.root = _TrieNode()
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, pattern: bytes) -> bool:
+        node = self._find(literal_prefix(pattern))
+        return node is not None and pattern in node.patterns
+
+    def _find(self, prefix: bytes) -> _TrieNode | None:
+        node = self.root
+        for byte in prefix:
+            node = node.children.get(byte)
+            if node is None:
+                return None
+        return node
+
+    def add(self, pattern: bytes):
+        node = self.root
+        for byte in literal_prefix(pattern):
+            child = node.children.get(byte)
+            if child is None:
+                child = node.children[byte] = _TrieNode()
+            node = child
+        if pattern not in node.patterns:
+            node.patterns[pattern] = compile_glob(pattern)
+            self.count += 1
+
+    def remove(self, pattern: bytes):
+        path = [self.root]
+        for byte in literal_prefix(pattern):
+            node = path[-1].children.get(byte)
+            if node is None:
+                return
+            path.append(node)
+        if path[-1].patterns.pop(pattern, None) is None:
+            return
+        self.count -= 1
+        # Prune the branch nodes that no longer lead to any pattern
+        prefix = literal_prefix(pattern)
+        for depth in range(len(prefix), 0, -1):
+            node = path[depth]
+            if node.patterns or node.children:
+                break
+            del path[depth - 1].children[prefix[depth - 1]]
+
+    def match(self, subject: bytes) -> list[bytes]:
+        """Returns the patterns that match `subject`."""
+        matched = []
+        node = self.root
+        depth = 0
+        while True:
+            for pattern, regex in node.patterns.items():
+                if regex.match(subject):
+                    matched.append(pattern)
+            if depth == len(subject):
+                break
+            node = node.children.get(subject[depth])
+            if node is None:
+                break
+            depth += 1
+        return matched
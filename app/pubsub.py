@@ -0,0 +1,412 @@
+# app/pubsub.py
+
+# Publish/subscribe: channel, pattern and shard channel subscriptions, and the output
+# buffers messages are delivered through.
+#
+# Pub/sub has its own locks instead of sharing BLOCKING_CLIENTS_LOCK with BLPOP waiters
+# and MULTI state. Channel subscriber sets are guarded by striped locks (a channel always
+# maps to the same one of CHANNEL_LOCK_STRIPES locks), so publishes and subscriptions on
+# different channels rarely wait on each other; patterns share one lock because they
+# live in a single prefix trie. The client -> channels maps are only ever changed by the
+# client's own connection thread and need no lock.
+#
+# Shard channels (SSUBSCRIBE / SPUBLISH) are hashed to slots like keys, so in cluster
+# mode a shard channel is served by the node owning its slot, and are kept apart from
+# regular channels: PUBLISH and patterns never reach them.
+#
+# PUBLISH used to write every message straight to each subscriber's socket, so a single
+# subscriber that stopped reading blocked the publisher (and everyone waiting on the lock
+# it held). Now a message is written without blocking, and what a full socket does not
+# accept is kept in the subscriber's output buffer and flushed asynchronously by a single
+# flusher thread that waits for the socket to become writable.
+# Buffers are bounded by `client-output-buffer-limit pubsub <hard> <soft> <seconds>`:
+# a subscriber whose backlog passes the hard limit, or stays above the soft limit for
+# <seconds>, is disconnected, like in Redis.
+
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+from app.datastore import CLIENT_STATE
+from app.patterns import PatternIndex, compile_glob
+import app.resp as resp
+
+CHANNEL_LOCK_STRIPES = 64
+_CHANNEL_LOCKS = tuple(threading.Lock() for _ in range(CHANNEL_LOCK_STRIPES))
+
+def _channel_lock(channel: bytes) -> threading.Lock:
+    return _CHANNEL_LOCKS[hash(channel) % CHANNEL_LOCK_STRIPES]
+
+class ChannelTable:
+    """
+    channel -> subscribers and client -> channels, for one kind of channel (regular or
+    shard). Each subscriber set is read and changed under its channel's striped lock;
+    the outer dicts are only changed by single dict operations.
+    """
+
+    def __init__(self):
+        self.subscribers = {}
+        self.client_channels = {}
+
+    def subscribe(self, client, channel: bytes):
+        with _channel_lock(channel):
+            subscribers = self.subscribers.get(channel)
+            if subscribers is None:
+                subscribers = self.subscribers[channel] = set()
+            subscribers.add(client)
+        self.client_channels.setdefault(client, set()).add(channel)
+
+    def unsubscribe(self, client, channel: bytes):
+        with _channel_lock(channel):
+            subscribers = self.subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self.subscribers[channel]
+        channels = self.client_channels.get(client)
+        if channels is not None:
+            channels.discard(channel)
+            if not channels:
+                del self.client_channels[client]
+
+    def subscribers_of(self, channel: bytes) -> list:
+        with _channel_lock(channel):
+            return list(self.subscribers.get(channel, ()))
+
+    def channels_of(self, client) -> list[bytes]:
+        return list(self.client_channels.get(client, ()))
+
+    def count(self, client) -> int:
+        return len(self.client_channels.get(client, ()))
+
+    def active_channels(self, pattern: bytes | None) -> list[bytes]:
+        """Channels with at least one subscriber, optionally filtered by a glob pattern."""
+        regex = compile_glob(pattern) if pattern is not None else None
+        return [channel for channel in list(self.subscribers) if regex is None or regex.match(channel)]
+
+    def numsub(self, channels: list[bytes]) -> list[int]:
+        counts = []
+        for channel in channels:
+            with _channel_lock(channel):
+                counts.append(len(self.subscribers.get(channel, ())))
+        return counts
+
+    def forget(self, client):
+        for channel in self.channels_of(client):
+            self.unsubscribe(client, channel)
+
+CHANNELS = ChannelTable()
+SHARD_CHANNELS = ChannelTable()
+
+# PSUBSCRIBE: pattern -> clients, client -> patterns, and the patterns indexed by literal
+# prefix so PUBLISH only evaluates the ones that can match the channel.
+PATTERNS_LOCK = threading.Lock()
+PATTERN_SUBSCRIBERS = {}
+CLIENT_PATTERNS = {}
+PATTERN_INDEX = PatternIndex()
+
+def psubscribe(client, pattern: bytes):
+    with PATTERNS_LOCK:
+        if pattern not in PATTERN_SUBSCRIBERS:
+            PATTERN_SUBSCRIBERS[pattern] = set()
+            PATTERN_INDEX.add(pattern)
+        PATTERN_SUBSCRIBERS[pattern].add(client)
+    CLIENT_PATTERNS.setdefault(client, set()).add(pattern)
+
+def punsubscribe(client, pattern: bytes):
+    with PATTERNS_LOCK:
+        subscribers = PATTERN_SUBSCRIBERS.get(pattern)
+        if subscribers is not None:
+            subscribers.discard(client)
+            if not subscribers:
+                del PATTERN_SUBSCRIBERS[pattern]
+                PATTERN_INDEX.remove(pattern)
+    patterns = CLIENT_PATTERNS.get(client)
+    if patterns is not None:
+        patterns.discard(pattern)
+        if not patterns:
+            del CLIENT_PATTERNS[client]
+
+def get_client_patterns(client) -> list[bytes]:
+    return list(CLIENT_PATTERNS.get(client, ()))
+
+def num_client_subscriptions(client) -> int:
+    """Channels plus patterns the client is subscribed to (shard channels are counted apart)."""
+    return CHANNELS.count(client) + len(CLIENT_PATTERNS.get(client, ()))
+
+def is_client_subscribed(client) -> bool:
+    """Whether the client is in subscribed mode (any channel, pattern or shard channel)."""
+    return client in CHANNELS.client_channels or client in CLIENT_PATTERNS or client in SHARD_CHANNELS.client_channels
+
+def pubsub_numpat() -> int:
+    """Number of distinct patterns subscribed to by any client (PUBSUB NUMPAT)."""
+    with PATTERNS_LOCK:
+        return len(PATTERN_SUBSCRIBERS)
+
+def forget_subscriber(client):
+    """Removes every subscription of a client that disconnected, and its output buffer."""
+    CHANNELS.forget(client)
+    SHARD_CHANNELS.forget(client)
+    for pattern in get_client_patterns(client):
+        punsubscribe(client, pattern)
+    release_output_buffer(client)
+
+def _fanout(subscribers, header_count: int, body: bytes):
+    """
+    Delivers one message to every subscriber. The elements are encoded once (`body`);
+    RESP2 and RESP3 subscribers only differ in the header (*N array vs >N push).
+    """
+    messages = {}
+    for subscriber in subscribers:
+        # A plain dict read: the protocol is only changed by the subscriber's own HELLO
+        protocol = CLIENT_STATE.get(subscriber, {}).get("protocol", resp.RESP2)
+        message = messages.get(protocol)
+        if message is None:
+            writer = resp.RespWriter(protocol)
+            writer.push(header_count)
+            writer.raw(body)
+            message = messages[protocol] = writer.getvalue()
+        deliver(subscriber, message)
+
+def _encode(*elements: bytes) -> bytes:
+    writer = resp.RespWriter()
+    writer.bulks(elements)
+    return writer.getvalue()
+
+def publish(channel: bytes, message: bytes) -> int:
+    """PUBLISH: sends to the channel's subscribers and matching patterns; returns the receiver count."""
+    subscribers = CHANNELS.subscribers_of(channel)
+
+    # The index only evaluates patterns whose literal prefix the channel starts with
+    matches = []
+    if PATTERN_SUBSCRIBERS:
+        with PATTERNS_LOCK:
+            for pattern in PATTERN_INDEX.match(channel):
+                matches.append((pattern, list(PATTERN_SUBSCRIBERS[pattern])))
+
+    if subscribers:
+        _fanout(subscribers, 3, _encode(b"message", channel, message))
+    receivers = len(subscribers)
+    for pattern, pattern_subscribers in matches:
+        _fanout(pattern_subscribers, 4, _encode(b"pmessage", pattern, channel, message))
+        receivers += len(pattern_subscribers)
+    return receivers
+
+def spublish(channel: bytes, message: bytes) -> int:
+    """SPUBLISH: sends to the shard channel's subscribers only."""
+    subscribers = SHARD_CHANNELS.subscribers_of(channel)
+    if subscribers:
+        _fanout(subscribers, 3, _encode(b"smessage", channel, message))
+    return len(subscribers)
+
+# client-output-buffer-limit, per client class: [hard bytes, soft bytes, soft seconds].
+# 0 disables a limit. Only pub/sub connections have output buffers in this server, the
+# other classes are kept so CONFIG GET / CONFIG SET round-trip like Redis.
+OUTPUT_BUFFER_LIMITS = {
+    "normal": [0, 0, 0],
+    "replica": [256 * 1024 * 1024, 64 * 1024 * 1024, 60],
+    "pubsub": [32 * 1024 * 1024, 8 * 1024 * 1024, 60],
+}
+
+_MEMORY_UNITS = {b"b": 1, b"k": 1000, b"kb": 1024, b"m": 1000 ** 2, b"mb": 1024 ** 2, b"g": 1000 ** 3, b"gb": 1024 ** 3}
+
+class OutputBuffer:
+    """
+    Bytes waiting to be written to one subscriber. Writes are attempted right away without
+    blocking (MSG_DONTWAIT); whatever the socket does not accept is queued here and sent by
+    the flusher thread once the socket is writable again.
+    """
+
+    def __init__(self, client: socket.socket):
+        self.client = client
+        self.queue = deque()
+        self.pending_bytes = 0
+        self.soft_limit_since = None  # When the backlog went over the soft limit
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def write(self, data: bytes) -> bool:
+        """Sends or queues `data`; returns False if the client was disconnected for lagging behind."""
+        with self.lock:
+            if self.closed:
+                return False
+            if not self.queue:
+                try:
+                    sent = self.client.send(data, socket.MSG_DONTWAIT)
+                except BlockingIOError:
+                    sent = 0
+                except OSError:
+                    self.closed = True
+                    return False
+                if sent == len(data):
+                    return True
+                data = data[sent:]
+                _FLUSHER.watch(self)
+
+            self.queue.append(data)
+            self.pending_bytes += len(data)
+            return not self._check_limits()
+
+    def _check_limits(self) -> bool:
+        """Disconnects the client if its backlog is over the pubsub limits. Caller holds the lock."""
+        hard_limit, soft_limit, soft_seconds = OUTPUT_BUFFER_LIMITS["pubsub"]
+        over_limit = hard_limit and self.pending_bytes > hard_limit
+        if soft_limit and self.pending_bytes > soft_limit:
+            now = time.monotonic()
+            if self.soft_limit_since is None:
+                self.soft_limit_since = now
+            elif now - self.soft_limit_since >= soft_seconds:
+                over_limit = True
+        else:
+            self.soft_limit_since = None
+
+        if over_limit:
+            print(f"Pub/Sub: Disconnecting subscriber over client-output-buffer-limit ({self.pending_bytes} bytes pending).")
+            self.close()
+            try:
+                # The connection thread's recv() then returns and cleans up the client
+                self.client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        return over_limit
+
+    def close(self):
+        self.closed = True
+        self.queue.clear()
+        self.pending_bytes = 0
+
+    def flush(self) -> bool:
+        """Sends as much of the backlog as the socket takes; True once nothing is left."""
+        with self.lock:
+            while self.queue and not self.closed:
+                data = self.queue[0]
+                try:
+                    sent = self.client.send(data, socket.MSG_DONTWAIT)
+                except BlockingIOError:
+                    return False
+                except OSError:
+                    self.close()
+                    break
+                self.pending_bytes -= sent
+                if sent < len(data):
+                    self.queue[0] = data[sent:]
+                    return False
+                self.queue.popleft()
+            self.soft_limit_since = None
+            return True
+
+class _Flusher:
+    """One thread that waits for subscribers with a backlog to become writable again."""
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.wakeup_reader, self.wakeup_writer = socket.socketpair()
+        self.wakeup_reader.setblocking(False)
+        self.selector.register(self.wakeup_reader, selectors.EVENT_READ)
+        self.new_buffers = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def watch(self, buffer: OutputBuffer):
+        with self.lock:
+            self.new_buffers.append(buffer)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        try:
+            self.wakeup_writer.send(b"x", socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            pass  # A wakeup is already pending
+
+    def _run(self):
+        while True:
+            for key, _ in self.selector.select():
+                if key.fileobj is self.wakeup_reader:
+                    try:
+                        while self.wakeup_reader.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    with self.lock:
+                        new_buffers, self.new_buffers = self.new_buffers, []
+                    for buffer in new_buffers:
+                        try:
+                            self.selector.register(buffer.client, selectors.EVENT_WRITE, buffer)
+                        except (KeyError, ValueError, OSError):
+                            pass  # Already watched, or the socket is closed
+                elif key.data.flush():
+                    self.selector.unregister(key.fileobj)
+
+_FLUSHER = _Flusher()
+
+OUTPUT_BUFFERS_LOCK = threading.Lock()
+OUTPUT_BUFFERS = {}
+
+def deliver(client: socket.socket, message: bytes) -> bool:
+    """Queues a pub/sub message for a subscriber, creating its output buffer on first use."""
+    buffer = OUTPUT_BUFFERS.get(client)
+    if buffer is None:
+        with OUTPUT_BUFFERS_LOCK:
+            buffer = OUTPUT_BUFFERS.get(client)
+            if buffer is None:
+                buffer = OUTPUT_BUFFERS[client] = OutputBuffer(client)
+    return buffer.write(message)
+
+def send_to_client(client: socket.socket, data: bytes):
+    """
+    Sends a reply to a client. Connections that receive pub/sub messages write through
+    their output buffer too, so replies and messages never interleave on the socket.
+    """
+    buffer = OUTPUT_BUFFERS.get(client)
+    if buffer is None:
+        client.sendall(data)
+    else:
+        buffer.write(data)
+
+def release_output_buffer(client: socket.socket):
+    """Drops the backlog of a client that disconnected."""
+    with OUTPUT_BUFFERS_LOCK:
+        buffer = OUTPUT_BUFFERS.pop(client, None)
+    if buffer is not None:
+        with buffer.lock:
+            buffer.close()
+
+def _parse_memory(value: bytes) -> int:
+    """'32mb' -> 33554432 (Redis memory units); raises ValueError."""
+    value = value.lower()
+    for unit in (b"kb", b"mb", b"gb", b"k", b"m", b"g", b"b"):
+        if value.endswith(unit):
+            return int(value[:-len(unit)]) * _MEMORY_UNITS[unit]
+    return int(value)
+
+def get_output_buffer_limits_config() -> str:
+    """CONFIG GET client-output-buffer-limit"""
+    return " ".join(
+        f"{client_class} {hard} {soft} {seconds}"
+        for client_class, (hard, soft, seconds) in OUTPUT_BUFFER_LIMITS.items()
+    )
+
+def set_output_buffer_limits_config(value: bytes) -> bool:
+    """CONFIG SET client-output-buffer-limit "<class> <hard> <soft> <seconds> ..."; False if invalid."""
+    fields = value.split()
+    if not fields or len(fields) % 4 != 0:
+        return False
+    limits = {}
+    for i in range(0, len(fields), 4):
+        client_class = fields[i].lower().decode()
+        if client_class == "slave":
+            client_class = "replica"
+        if client_class not in OUTPUT_BUFFER_LIMITS:
+            return False
+        try:
+            hard, soft = _parse_memory(fields[i + 1]), _parse_memory(fields[i + 2])
+            seconds = int(fields[i + 3])
+        except ValueError:
+            return False
+        if hard < 0 or soft < 0 or seconds < 0:
+            return False
+        limits[client_class] = [hard, soft, seconds]
+    OUTPUT_BUFFER_LIMITS.update(limits)
+    return True
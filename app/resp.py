@@ -0,0 +1,177 @@
+# app/resp.py
+
+# RESP reply serialization shared by every command.
+# Replies are appended into a single bytearray instead of concatenating immutable bytes
+# objects, so building a reply of N elements is linear in its size. Headers for small
+# counts/lengths (*N\r\n, $N\r\n) and the most common replies are built once at import.
+#
+# Every connection speaks RESP2 until it sends HELLO 3. The writer then emits the RESP3
+# types (map, set, double, null, push, verbatim string); in RESP2 each of them falls back
+# to the closest RESP2 type (flat array, bulk string, $-1 / *-1).
+
+RESP2 = 2
+RESP3 = 3
+
+CRLF = b"\r\n"
+
+# Constant replies
+OK = b"+OK\r\n"
+PONG = b"+PONG\r\n"
+QUEUED = b"+QUEUED\r\n"
+NULL_BULK = b"$-1\r\n"
+NULL_ARRAY = b"*-1\r\n"
+EMPTY_ARRAY = b"*0\r\n"
+EMPTY_BULK = b"$0\r\n\r\n"
+ZERO = b":0\r\n"
+ONE = b":1\r\n"
+NULL = b"_\r\n"  # RESP3 null, replaces both null replies of RESP2
+
+# Headers for arrays/bulk strings up to this size are taken from a table
+SHARED_HEADERS_COUNT = 1024
+ARRAY_HEADERS = tuple(b"*%d\r\n" % i for i in range(SHARED_HEADERS_COUNT))
+BULK_HEADERS = tuple(b"$%d\r\n" % i for i in range(SHARED_HEADERS_COUNT))
+
+# Preencoded integer replies for the shared integers (0-9999, the same range as the
+# shared integer pool in the data store), so counters answer without formatting a number.
+SHARED_INTEGER_REPLIES_COUNT = 10000
+SHARED_INTEGER_REPLIES = tuple(b":%d\r\n" % i for i in range(SHARED_INTEGER_REPLIES_COUNT))
+
+def array_header(count: int) -> bytes:
+    if 0 <= count < SHARED_HEADERS_COUNT:
+        return ARRAY_HEADERS[count]
+    return b"*%d\r\n" % count
+
+def bulk_header(length: int) -> bytes:
+    if length < SHARED_HEADERS_COUNT:
+        return BULK_HEADERS[length]
+    return b"$%d\r\n" % length
+
+def integer(value: int) -> bytes:
+    if 0 <= value < SHARED_INTEGER_REPLIES_COUNT:
+        return SHARED_INTEGER_REPLIES[value]
+    return b":%d\r\n" % value
+
+def null(protocol: int = RESP2) -> bytes:
+    return NULL if protocol == RESP3 else NULL_BULK
+
+def null_array(protocol: int = RESP2) -> bytes:
+    return NULL if protocol == RESP3 else NULL_ARRAY
+
+def bulk_string(value: bytes | None, protocol: int = RESP2) -> bytes:
+    """A single bulk string reply; None is the null bulk string."""
+    if value is None:
+        return null(protocol)
+    return bulk_header(len(value)) + value + CRLF
+
+def double(text: bytes, protocol: int = RESP2) -> bytes:
+    """A floating point reply, already formatted (b"1.5", b"inf"); a bulk string in RESP2."""
+    if protocol == RESP3:
+        return b"," + text + CRLF
+    return bulk_string(text)
+
+def verbatim(text: bytes, protocol: int = RESP2, format: bytes = b"txt") -> bytes:
+    """Free-form text such as INFO output; RESP3 tags it with its format."""
+    if protocol == RESP3:
+        return b"=%d\r\n" % (len(text) + 4) + format + b":" + text + CRLF
+    return bulk_string(text)
+
+def simple_string(text: str) -> bytes:
+    return b"+" + text.encode() + CRLF
+
+def error(message: str) -> bytes:
+    """An error reply; `message` starts with the error code, e.g. 'ERR syntax error'."""
+    return b"-" + message.encode() + CRLF
+
+def bulk_array(values, protocol: int = RESP2) -> bytes:
+    """An array of bulk strings (None elements become null bulk strings)."""
+    writer = RespWriter(protocol)
+    writer.bulk_array(values)
+    return writer.getvalue()
+
+class RespWriter:
+    """
+    Builds one RESP reply (or several pipelined replies) in a single buffer.
+    Nested replies are written by emitting the array header first and then the
+    elements, exactly as they appear on the wire. `protocol` selects how the RESP3-only
+    types are written.
+    """
+    __slots__ = ("buffer", "protocol")
+
+    def __init__(self, protocol: int = RESP2):
+        self.buffer = bytearray()
+        self.protocol = protocol
+
+    def array(self, count: int) -> None:
+        self.buffer += array_header(count)
+
+    def map(self, count: int) -> None:
+        """Header of a map of `count` key/value pairs (a flat array of 2*count in RESP2)."""
+        if self.protocol == RESP3:
+            self.buffer += b"%%%d\r\n" % count
+        else:
+            self.buffer += array_header(count * 2)
+
+    def set(self, count: int) -> None:
+        if self.protocol == RESP3:
+            self.buffer += b"~%d\r\n" % count
+        else:
+            self.buffer += array_header(count)
+
+    def push(self, count: int) -> None:
+        """Header of an out-of-band message (pub/sub); a plain array in RESP2."""
+        if self.protocol == RESP3:
+            self.buffer += b">%d\r\n" % count
+        else:
+            self.buffer += array_header(count)
+
+    def bulk(self, value: bytes) -> None:
+        buffer = self.buffer
+        length = len(value)
+        buffer += BULK_HEADERS[length] if length < SHARED_HEADERS_COUNT else b"$%d\r\n" % length
+        buffer += value
+        buffer += CRLF
+
+    def bulk_or_null(self, value: bytes | None) -> None:
+        if value is None:
+            self.null()
+        else:
+            self.bulk(value)
+
+    def bulks(self, values) -> None:
+        """Appends every value as a bulk string, without an array header."""
+        buffer = self.buffer
+        for value in values:
+            length = len(value)
+            buffer += BULK_HEADERS[length] if length < SHARED_HEADERS_COUNT else b"$%d\r\n" % length
+            buffer += value
+            buffer += CRLF
+
+    def bulk_array(self, values) -> None:
+        """An array header followed by its bulk strings; None elements are null bulk strings."""
+        if not isinstance(values, (list, tuple)):
+            values = list(values)
+        self.array(len(values))
+        if None in values:
+            for value in values:
+                self.bulk_or_null(value)
+        else:
+            self.bulks(values)
+
+    def integer(self, value: int) -> None:
+        self.buffer += integer(value)
+
+    def double(self, text: bytes) -> None:
+        self.buffer += double(text, self.protocol)
+
+    def null(self) -> None:
+        self.buffer += null(self.protocol)
+
+    def null_array(self) -> None:
+        self.buffer += null_array(self.protocol)
+
+    def raw(self, data: bytes) -> None:
+        """Appends an already serialized reply (e.g. a nested command reply in EXEC)."""
+        self.buffer += data
+
+    def getvalue(self) -> bytes:
+        return bytes(self.buffer)
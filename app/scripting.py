@@ -0,0 +1,512 @@
+# app/scripting.py
+
+# Server-side scripts: EVAL, EVALSHA and SCRIPT LOAD/EXISTS/FLUSH/KILL.
+#
+# Scripts are written in a small subset of Python instead of Lua: assignments, if/for/while,
+# comprehensions, arithmetic, comparisons, calls and a whitelist of builtins and methods.
+# The source is checked node by node with `ast` (no imports, function or class definitions,
+# names or attributes starting with "_", ...), compiled once into a function of (KEYS, ARGV)
+# and cached under the SHA1 of its source, so EVALSHA and repeated EVALs skip parsing.
+#
+#   EVAL "n = int(redis.call('INCR', KEYS[0])); return [n, redis.call('GET', KEYS[1])]" 2 c v
+#
+# redis.call() runs a command through execute_single_command, like a queued command of EXEC,
+# without going through RESP on the way in, and converts its reply with the rules Redis uses
+# for Lua: bulk strings -> bytes, integers -> int, arrays -> list, nil -> None,
+# status -> {"ok": "OK"}, errors -> raised (redis.pcall returns {"err": "..."} instead).
+# Values returned by the script go the other way; floats are truncated to integers and
+# False becomes nil, as in Redis.
+#
+# A script runs while holding DATA_LOCK (EVAL is a write command), so it is atomic. Once a
+# script has run longer than busy-reply-threshold ms, other clients get -BUSY and may stop
+# it with SCRIPT KILL, unless it already wrote something. Every loop iteration checks for
+# the kill request (a call inserted into loop bodies at compile time).
+#
+# Work done inside a single C call can't be interrupted that way, so operators and methods
+# that can build huge values in one step (**, *, <<, %, replace(), join(), extend()) are
+# compiled into checked helpers: results are capped like client requests (MAX_BULK_LENGTH
+# bytes, MAX_ARRAY_LENGTH elements, _MAX_INT_BITS bits), % doesn't format strings, and
+# f-string format specs are constants with small widths. A huge range() checks for the
+# kill request while it is consumed.
+
+import ast
+import copy
+import hashlib
+import re
+import time
+
+from app.datastore import SERVER_CONFIG
+from app.parser import MAX_ARRAY_LENGTH, MAX_BULK_LENGTH
+import app.resp as resp
+
+# sha1 hex (bytes) -> (source, compiled function)
+SCRIPT_CACHE = {}
+
+# The script being run: only one can run at a time, since it holds DATA_LOCK
+SCRIPT_STATE = {"running": False, "started": 0.0, "kill": False, "wrote": False}
+
+NOSCRIPT_ERROR = b"-NOSCRIPT No matching script. Please use EVAL.\r\n"
+BUSY_ERROR = b"-BUSY Redis is busy running a script. You can only call SCRIPT KILL or SHUTDOWN NOSAVE.\r\n"
+NOTBUSY_ERROR = b"-NOTBUSY No scripts in execution right now.\r\n"
+UNKILLABLE_ERROR = (b"-UNKILLABLE Sorry the script already executed write commands against the dataset. "
+                    b"You can either wait the script termination or kill the server in a hard way using the SHUTDOWN NOSAVE command.\r\n")
+
+# Commands a script can't run: they would block, nest, or act on the connection
+SCRIPT_DENIED_COMMANDS = {
+    "EVAL", "EVALSHA", "SCRIPT", "MULTI", "EXEC", "DISCARD", "WATCH", "UNWATCH",
+    "SUBSCRIBE", "UNSUBSCRIBE", "PSUBSCRIBE", "PUNSUBSCRIBE", "SSUBSCRIBE", "SUNSUBSCRIBE",
+    "WAIT", "PSYNC", "REPLCONF", "MIGRATE", "HELLO", "CLIENT", "QUIT", "ASKING", "SELECT",
+}
+
+_ALLOWED_NODES = (
+    ast.Module, ast.Expr, ast.Assign, ast.AugAssign, ast.If, ast.For, ast.While, ast.Break,
+    ast.Continue, ast.Return, ast.Pass, ast.Name, ast.Load, ast.Store, ast.Constant,
+    ast.List, ast.Tuple, ast.Dict, ast.Subscript, ast.Slice, ast.BinOp, ast.UnaryOp,
+    ast.BoolOp, ast.Compare, ast.IfExp, ast.Call, ast.keyword, ast.Attribute, ast.ListComp,
+    ast.DictComp, ast.comprehension, ast.JoinedStr, ast.FormattedValue,
+    ast.operator, ast.unaryop, ast.boolop, ast.cmpop,
+)
+
+# Methods scripts may call (on redis, strings, lists and dicts)
+_ALLOWED_ATTRIBUTES = {
+    "call", "pcall", "error_reply", "status_reply", "sha1hex",
+    "decode", "encode", "split", "join", "startswith", "endswith", "upper", "lower",
+    "strip", "replace", "find", "isdigit",
+    "append", "extend", "pop", "insert", "index", "count", "sort", "reverse",
+    "keys", "values", "items", "get",
+}
+
+# Largest integer a script operator may produce, and width or precision in a format spec
+_MAX_INT_BITS = 64 * 1024
+_MAX_FORMAT_WIDTH = 1024
+
+class ScriptError(Exception):
+    """An error reply raised out of a script (redis.call errors, compile errors)."""
+
+class ScriptKilled(Exception):
+    pass
+
+def _check_tree(tree: ast.AST):
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ScriptError(f"ERR Error compiling script: {type(node).__name__} is not allowed in scripts")
+        if isinstance(node, ast.Name) and node.id.startswith("_"):
+            raise ScriptError(f"ERR Error compiling script: name '{node.id}' is not allowed in scripts")
+        if isinstance(node, ast.Attribute) and node.attr not in _ALLOWED_ATTRIBUTES:
+            raise ScriptError(f"ERR Error compiling script: attribute '{node.attr}' is not allowed in scripts")
+        if isinstance(node, ast.FormattedValue) and node.format_spec is not None:
+            _check_format_spec(node.format_spec)
+        if (isinstance(node, ast.AugAssign) and type(node.op) in _CHECKED_OPERATORS
+                and not _is_simple_target(node.target)):
+            raise ScriptError("ERR Error compiling script: augmented **, *, << and % only apply to names "
+                              "and name[name or constant] in scripts")
+
+def _is_simple_target(target: ast.expr) -> bool:
+    """x or x[k] / x[1]: a target that can be read back without side effects."""
+    if isinstance(target, ast.Subscript):
+        return isinstance(target.value, ast.Name) and isinstance(target.slice, (ast.Name, ast.Constant))
+    return isinstance(target, ast.Name)
+
+def _check_format_spec(spec: ast.JoinedStr):
+    """f"{x:>10.2f}": the spec must be a constant, with widths and precisions of at most 1024."""
+    if not all(isinstance(part, ast.Constant) for part in spec.values):
+        raise ScriptError("ERR Error compiling script: format specs must be constants in scripts")
+    text = "".join(part.value for part in spec.values)
+    if any(int(digits) > _MAX_FORMAT_WIDTH for digits in re.findall(r"\d+", text)):
+        raise ScriptError(f"ERR Error compiling script: format widths are limited to {_MAX_FORMAT_WIDTH} in scripts")
+
+def _value_too_large() -> ScriptError:
+    return ScriptError("ERR Error running script: value too large")
+
+def _check_sequence_length(value, length: int):
+    """Refuses a str/bytes (list/tuple) of `length` over MAX_BULK_LENGTH (MAX_ARRAY_LENGTH)."""
+    limit = MAX_BULK_LENGTH if isinstance(value, (str, bytes)) else MAX_ARRAY_LENGTH
+    if length > limit:
+        raise _value_too_large()
+
+def _checked_pow(base, exponent):
+    if (isinstance(base, int) and isinstance(exponent, int) and abs(base) > 1 and exponent > 0
+            and base.bit_length() * exponent > _MAX_INT_BITS):
+        raise _value_too_large()
+    return base ** exponent
+
+def _checked_mul(left, right):
+    for sequence, times in ((left, right), (right, left)):
+        if isinstance(sequence, (str, bytes, list, tuple)) and isinstance(times, int):
+            _check_sequence_length(sequence, len(sequence) * times)
+            return left * right
+    if isinstance(left, int) and isinstance(right, int) and left.bit_length() + right.bit_length() > _MAX_INT_BITS:
+        raise _value_too_large()
+    return left * right
+
+def _checked_lshift(value, shift):
+    if isinstance(value, int) and isinstance(shift, int) and value.bit_length() + shift > _MAX_INT_BITS:
+        raise _value_too_large()
+    return value << shift
+
+def _checked_mod(left, right):
+    if isinstance(left, (str, bytes)):
+        raise ScriptError("ERR Error running script: % string formatting is not allowed in scripts, use f-strings")
+    return left % right
+
+# Operator -> name of the checked helper it compiles into
+_CHECKED_OPERATORS = {ast.Pow: "_checked_pow", ast.Mult: "_checked_mul", ast.LShift: "_checked_lshift",
+                      ast.Mod: "_checked_mod"}
+
+def _checked_method(value, name: str, *arguments, **keywords):
+    """value.replace(...) / .join(...) / .extend(...), refused before building a value over the caps."""
+    if name == "replace" and isinstance(value, (str, bytes)) and len(arguments) >= 2:
+        old, new = arguments[0], arguments[1]
+        if isinstance(old, type(value)) and isinstance(new, type(value)) and len(new) > len(old):
+            occurrences = value.count(old) if old else len(value) + 1
+            if len(arguments) > 2 and isinstance(arguments[2], int) and arguments[2] >= 0:
+                occurrences = min(occurrences, arguments[2])
+            _check_sequence_length(value, len(value) + occurrences * (len(new) - len(old)))
+    elif name == "join" and isinstance(value, (str, bytes)) and len(arguments) == 1:
+        parts = list(arguments[0])
+        lengths = [len(part) for part in parts if isinstance(part, (str, bytes))]
+        _check_sequence_length(value, sum(lengths) + len(value) * max(len(parts) - 1, 0))
+        arguments = (parts,)
+    elif name == "extend" and isinstance(value, list) and len(arguments) == 1:
+        elements = list(arguments[0])
+        _check_sequence_length(value, len(value) + len(elements))
+        arguments = (elements,)
+    return getattr(value, name)(*arguments, **keywords)
+
+# Methods compiled into _checked_method
+_CHECKED_METHODS = {"replace", "join", "extend"}
+
+class _CheckOperators(ast.NodeTransformer):
+    """
+    Rewrites a ** b (and *, <<, %) into _checked_pow(a, b), x **= b into
+    x = _checked_pow(x, b), and s.replace(a, b) into _checked_method(s, "replace", a, b).
+    """
+
+    def _call(self, operator: ast.operator, left: ast.expr, right: ast.expr) -> ast.expr | None:
+        helper = _CHECKED_OPERATORS.get(type(operator))
+        if helper is None:
+            return None
+        return ast.Call(func=ast.Name(id=helper, ctx=ast.Load()), args=[left, right], keywords=[])
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        return self._call(node.op, node.left, node.right) or node
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        if isinstance(node.func, ast.Attribute) and node.func.attr in _CHECKED_METHODS:
+            return ast.Call(func=ast.Name(id="_checked_method", ctx=ast.Load()),
+                            args=[node.func.value, ast.Constant(value=node.func.attr)] + node.args,
+                            keywords=node.keywords)
+        return node
+
+    def visit_AugAssign(self, node):
+        self.generic_visit(node)
+        if type(node.op) not in _CHECKED_OPERATORS:
+            return node
+        # _check_tree only allows targets that can be read back here
+        current = copy.deepcopy(node.target)
+        for target_node in ast.walk(current):
+            if hasattr(target_node, "ctx"):
+                target_node.ctx = ast.Load()
+        return ast.Assign(targets=[node.target], value=self._call(node.op, current, node.value))
+
+class _InsertTicks(ast.NodeTransformer):
+    """Makes every loop iteration (including comprehensions) call _tick()."""
+
+    def _tick_call(self) -> ast.Call:
+        return ast.Call(func=ast.Name(id="_tick", ctx=ast.Load()), args=[], keywords=[])
+
+    def visit_For(self, node):
+        self.generic_visit(node)
+        node.body.insert(0, ast.Expr(value=self._tick_call()))
+        return node
+
+    visit_While = visit_For
+
+    def visit_comprehension(self, node):
+        self.generic_visit(node)
+        node.ifs.insert(0, self._tick_call())  # _tick() returns True
+        return node
+
+def compile_script(source: bytes):
+    """Checks and compiles a script into a function of (KEYS, ARGV). Raises ScriptError."""
+    try:
+        tree = ast.parse(source.decode("utf-8"), "@user_script")
+    except (SyntaxError, UnicodeDecodeError, ValueError) as e:
+        raise ScriptError(f"ERR Error compiling script: {e}")
+    _check_tree(tree)
+    _CheckOperators().visit(tree)
+    _InsertTicks().visit(tree)
+
+    # The script body becomes the body of `def script(KEYS, ARGV)`, so it can return
+    arguments = ast.arguments(posonlyargs=[], args=[ast.arg(arg="KEYS"), ast.arg(arg="ARGV")],
+                              kwonlyargs=[], kw_defaults=[], defaults=[])
+    function = ast.FunctionDef(name="script", args=arguments, body=tree.body or [ast.Pass()],
+                               decorator_list=[], returns=None, type_comment=None)
+    module = ast.fix_missing_locations(ast.Module(body=[function], type_ignores=[]))
+    namespace = {"__builtins__": _SCRIPT_BUILTINS}
+    exec(compile(module, "@user_script", "exec"), namespace)
+    return namespace["script"]
+
+def _tick() -> bool:
+    if SCRIPT_STATE["kill"]:
+        raise ScriptKilled()
+    return True
+
+def _ticking(values):
+    for position, value in enumerate(values):
+        if not position & 0xFFFF:
+            _tick()
+        yield value
+
+def _range(*arguments):
+    """range(), checking for SCRIPT KILL while a huge one is consumed (by sum(), list(), ...)."""
+    values = range(*arguments)
+    try:
+        return values if len(values) <= MAX_ARRAY_LENGTH else _ticking(values)
+    except OverflowError:  # Longer than sys.maxsize
+        return _ticking(values)
+
+def _to_argument(value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode()
+    if isinstance(value, int) and not isinstance(value, bool):
+        return b"%d" % value
+    if isinstance(value, float):
+        return repr(value).encode()
+    raise ScriptError("ERR Command arguments must be strings or integers")
+
+def _read_reply(data: bytes, index: int = 0):
+    """Decodes one RESP2/RESP3 reply starting at `index`. Returns (value, next index)."""
+    end = data.index(b"\r\n", index)
+    kind, line = data[index:index + 1], data[index + 1:end]
+    index = end + 2
+    if kind == b"+":
+        return {"ok": line.decode()}, index
+    if kind == b"-":
+        return {"err": line.decode()}, index
+    if kind in (b":", b"("):
+        return int(line), index
+    if kind in (b"$", b"="):
+        length = int(line)
+        if length < 0:
+            return None, index
+        value = data[index:index + length]
+        if kind == b"=":
+            value = value[4:]  # Verbatim strings start with their format, e.g. "txt:"
+        return value, index + length + 2
+    if kind in (b"*", b"~", b">", b"%"):
+        count = int(line)
+        if count < 0:
+            return None, index
+        if kind == b"%":
+            count *= 2  # A map is read as a flat list, like RESP2
+        values = []
+        for _ in range(count):
+            value, index = _read_reply(data, index)
+            values.append(value)
+        return values, index
+    if kind == b"_":
+        return None, index
+    if kind == b"#":
+        return 1 if line == b"t" else None, index
+    if kind == b",":
+        return line, index  # Doubles reach Lua scripts as strings too
+    raise ScriptError("ERR Unexpected reply from command")
+
+class _Redis:
+    """The `redis` object scripts use."""
+
+    def __init__(self, run_command, sha: bytes):
+        self._run_command = run_command
+        self._sha = sha
+
+    def _execute(self, command, arguments):
+        _tick()
+        name = _to_argument(command).upper().decode("utf-8", "replace")
+        if name in SCRIPT_DENIED_COMMANDS:
+            return {"err": "ERR This Redis command is not allowed from script"}
+        reply, wrote = self._run_command(name, [_to_argument(argument) for argument in arguments])
+        if wrote:
+            SCRIPT_STATE["wrote"] = True
+        if not isinstance(reply, bytes):
+            return None
+        return _read_reply(reply)[0]
+
+    def call(self, command, *arguments):
+        value = self._execute(command, arguments)
+        if isinstance(value, dict) and "err" in value:
+            raise ScriptError(value["err"])
+        return value
+
+    def pcall(self, command, *arguments):
+        return self._execute(command, arguments)
+
+    @staticmethod
+    def error_reply(message):
+        return {"err": message}
+
+    @staticmethod
+    def status_reply(message):
+        return {"ok": message}
+
+    @staticmethod
+    def sha1hex(text):
+        return hashlib.sha1(_to_argument(text)).hexdigest()
+
+_SCRIPT_BUILTINS = {
+    "len": len, "int": int, "float": float, "str": str, "bytes": bytes, "bool": bool,
+    "range": _range, "min": min, "max": max, "abs": abs, "sum": sum, "round": round,
+    "sorted": sorted, "list": list, "dict": dict, "tuple": tuple, "enumerate": enumerate,
+    "zip": zip, "isinstance": isinstance, "_tick": _tick,
+    "_checked_pow": _checked_pow, "_checked_mul": _checked_mul, "_checked_lshift": _checked_lshift,
+    "_checked_mod": _checked_mod, "_checked_method": _checked_method,
+}
+
+def _write_value(writer: resp.RespWriter, value):
+    """Converts a script's return value into its reply."""
+    if value is None or value is False:
+        writer.null()
+    elif value is True:
+        writer.integer(1)
+    elif isinstance(value, (int, float)):
+        writer.integer(int(value))
+    elif isinstance(value, str):
+        writer.bulk(value.encode())
+    elif isinstance(value, bytes):
+        writer.bulk(value)
+    elif isinstance(value, (list, tuple)):
+        writer.array(len(value))
+        for element in value:
+            _write_value(writer, element)
+    elif isinstance(value, dict) and "err" in value:
+        writer.raw(resp.error(str(value["err"])))
+    elif isinstance(value, dict) and "ok" in value:
+        writer.raw(resp.simple_string(str(value["ok"])))
+    elif isinstance(value, dict):
+        writer.map(len(value))
+        for key, element in value.items():
+            _write_value(writer, key)
+            _write_value(writer, element)
+    else:
+        raise TypeError(f"unsupported return type '{type(value).__name__}'")
+
+def sha1_hex(source: bytes) -> bytes:
+    return hashlib.sha1(source).hexdigest().encode()
+
+def _cached_script(source: bytes) -> tuple[bytes, object]:
+    """Compiles (or finds) a script. Returns (sha1, function). Raises ScriptError."""
+    sha = sha1_hex(source)
+    cached = SCRIPT_CACHE.get(sha)
+    if cached is None:
+        cached = SCRIPT_CACHE[sha] = (source, compile_script(source))
+    return sha, cached[1]
+
+def _run(sha: bytes, function, arguments: list, run_command, protocol: int) -> bytes:
+    """Runs a compiled script with EVAL's `numkeys key ... arg ...` arguments."""
+    try:
+        num_keys = int(arguments[0])
+    except ValueError:
+        return b"-ERR value is not an integer or out of range\r\n"
+    if num_keys < 0:
+        return b"-ERR Number of keys can't be negative\r\n"
+    if num_keys > len(arguments) - 1:
+        return b"-ERR Number of keys can't be greater than number of args\r\n"
+    keys = arguments[1:1 + num_keys]
+    argv = arguments[1 + num_keys:]
+
+    function.__globals__["redis"] = _Redis(run_command, sha)
+    SCRIPT_STATE.update(running=True, started=time.monotonic(), kill=False, wrote=False)
+    try:
+        value = function(keys, argv)
+    except ScriptKilled:
+        return b"-ERR Script killed by user with SCRIPT KILL...\r\n"
+    except ScriptError as e:
+        return resp.error(str(e))
+    except Exception as e:
+        return resp.error(f"ERR Error running script (call to f_{sha.decode()}): {type(e).__name__}: {e}")
+    finally:
+        SCRIPT_STATE["running"] = False
+
+    writer = resp.RespWriter(protocol)
+    try:
+        _write_value(writer, value)
+    except (OverflowError, ValueError, RecursionError, TypeError) as e:
+        return resp.error(f"ERR Error running script (call to f_{sha.decode()}): can't convert the result: {e}")
+    return writer.getvalue()
+
+def execute_eval(command: str, arguments: list, run_command, protocol: int) -> bytes:
+    """
+    EVAL script numkeys [key ...] [arg ...] / EVALSHA sha1 numkeys ...
+    `run_command(name, arguments)` executes a command for the script and returns
+    (reply, whether it was a write command). Caller holds DATA_LOCK.
+    """
+    if len(arguments) < 2:
+        return b"-ERR wrong number of arguments for '" + command.lower().encode() + b"' command\r\n"
+
+    if command == "EVALSHA":
+        sha = arguments[0].lower()
+        cached = SCRIPT_CACHE.get(sha)
+        if cached is None:
+            return NOSCRIPT_ERROR
+        function = cached[1]
+    else:
+        try:
+            sha, function = _cached_script(arguments[0])
+        except ScriptError as e:
+            return resp.error(str(e))
+    return _run(sha, function, arguments[1:], run_command, protocol)
+
+def script_source(sha: bytes) -> bytes | None:
+    """The source of a cached script (EVALSHA is propagated to replicas as EVAL)."""
+    cached = SCRIPT_CACHE.get(sha.lower())
+    return cached[0] if cached is not None else None
+
+def busy_error(command: str, arguments: list) -> bytes | None:
+    """-BUSY for commands sent while a script runs past busy-reply-threshold, else None."""
+    if not SCRIPT_STATE["running"]:
+        return None
+    if (time.monotonic() - SCRIPT_STATE["started"]) * 1000 < SERVER_CONFIG["busy-reply-threshold"]:
+        return None
+    if command == "SCRIPT" and arguments and arguments[0].upper() == b"KILL":
+        return None
+    return BUSY_ERROR
+
+def execute_script_command(arguments: list) -> bytes:
+    """SCRIPT LOAD script | EXISTS sha1 [sha1 ...] | FLUSH [ASYNC|SYNC] | KILL"""
+    if not arguments:
+        return b"-ERR wrong number of arguments for 'script' command\r\n"
+    subcommand = arguments[0].upper()
+
+    if subcommand == b"LOAD" and len(arguments) == 2:
+        try:
+            sha, _ = _cached_script(arguments[1])
+        except ScriptError as e:
+            return resp.error(str(e))
+        return resp.bulk_string(sha)
+
+    if subcommand == b"EXISTS" and len(arguments) > 1:
+        writer = resp.RespWriter()
+        writer.array(len(arguments) - 1)
+        for sha in arguments[1:]:
+            writer.integer(1 if sha.lower() in SCRIPT_CACHE else 0)
+        return writer.getvalue()
+
+    if subcommand == b"FLUSH" and len(arguments) <= 2:
+        if len(arguments) == 2 and arguments[1].upper() not in (b"ASYNC", b"SYNC"):
+            return b"-ERR syntax error\r\n"
+        SCRIPT_CACHE.clear()
+        return resp.OK
+
+    if subcommand == b"KILL" and len(arguments) == 1:
+        if not SCRIPT_STATE["running"]:
+            return NOTBUSY_ERROR
+        if SCRIPT_STATE["wrote"]:
+            return UNKILLABLE_ERROR
+        SCRIPT_STATE["kill"] = True
+        return resp.OK
+
+    return b"-ERR unknown subcommand or wrong number of arguments for '" + arguments[0] + b"'\r\n"
@@ -0,0 +1,198 @@
+# app/slots.py
+
+# Hash-slot helpers shared by every mode that partitions the keyspace.
+# Keys are mapped to one of 16384 slots with CRC16 (XMODEM), exactly like Redis Cluster,
+# so a key always lands in the same partition no matter how many partitions exist.
+
+CLUSTER_SLOTS = 16384
+
+# Precomputed CRC16 (XMODEM, polynomial 0x1021) table, one entry per byte value.
+def _build_crc16_table() -> list[int]:
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+        table.append(crc)
+    return table
+
+CRC16_TABLE = _build_crc16_table()
+
+def crc16(data: bytes) -> int:
+    """Computes the CRC16 (XMODEM) checksum used by Redis Cluster for key hashing."""
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ CRC16_TABLE[((crc >> 8) ^ byte) & 0xFF]
+    return crc
+
+def key_hash_slot(key: str | bytes) -> int:
+    """
+    Returns the hash slot (0-16383) of a key.
+    If the key contains a non-empty {hashtag}, only the hashtag is hashed, so that
+    related keys like 'user:{42}:name' and 'user:{42}:email' share a slot.
+    """
+    key_bytes = key.encode() if isinstance(key, str) else bytes(key)
+
+    start = key_bytes.find(b"{")
+    if start != -1:
+        end = key_bytes.find(b"}", start + 1)
+        # Only hash the tag when there is at least one character between the braces
+        if end != -1 and end != start + 1:
+            key_bytes = key_bytes[start + 1:end]
+
+    return crc16(key_bytes) & (CLUSTER_SLOTS - 1)
+
+# Key-position metadata, in the spirit of the Redis command table.
+# Each entry is (first_key, last_key, step) as indexes into the *arguments* list
+# (the command name is not included). A negative last_key counts from the end,
+# e.g. -1 is the last argument and -2 skips a trailing timeout.
+COMMAND_KEY_SPECS = {
+    "GET": (0, 0, 1),
+    "SET": (0, 0, 1),
+    "INCR": (0, 0, 1),
+    "TYPE": (0, 0, 1),
+    "LPUSH": (0, 0, 1),
+    "RPUSH": (0, 0, 1),
+    "LPOP": (0, 0, 1),
+    "RPOP": (0, 0, 1),
+    "LMOVE": (0, 1, 1),
+    "LLEN": (0, 0, 1),
+    "LRANGE": (0, 0, 1),
+    "BLPOP": (0, -2, 1),
+    "BRPOP": (0, -2, 1),
+    "BLMOVE": (0, 1, 1),
+    "ZADD": (0, 0, 1),
+    "ZRANK": (0, 0, 1),
+    "ZRANGE": (0, 0, 1),
+    "ZCARD": (0, 0, 1),
+    "ZSCORE": (0, 0, 1),
+    "ZREM": (0, 0, 1),
+    "XADD": (0, 0, 1),
+    "XRANGE": (0, 0, 1),
+    "XGROUP": (1, 1, 1),
+    "XACK": (0, 0, 1),
+    "XPENDING": (0, 0, 1),
+    "XCLAIM": (0, 0, 1),
+    "XAUTOCLAIM": (0, 0, 1),
+    "GEOADD": (0, 0, 1),
+    "GEOPOS": (0, 0, 1),
+    "GEODIST": (0, 0, 1),
+    "GEOSEARCH": (0, 0, 1),
+    "DUMP": (0, 0, 1),
+    "RESTORE": (0, 0, 1),
+    "HSET": (0, 0, 1),
+    "HGET": (0, 0, 1),
+    "HMGET": (0, 0, 1),
+    "HGETALL": (0, 0, 1),
+    "HDEL": (0, 0, 1),
+    "HINCRBY": (0, 0, 1),
+    "HLEN": (0, 0, 1),
+    "HEXISTS": (0, 0, 1),
+    "HSCAN": (0, 0, 1),
+    "OBJECT": (1, 1, 1),
+    "SADD": (0, 0, 1),
+    "SREM": (0, 0, 1),
+    "SISMEMBER": (0, 0, 1),
+    "SMISMEMBER": (0, 0, 1),
+    "SCARD": (0, 0, 1),
+    "SMEMBERS": (0, 0, 1),
+    "SRANDMEMBER": (0, 0, 1),
+    "SPOP": (0, 0, 1),
+    "SINTER": (0, -1, 1),
+    "SUNION": (0, -1, 1),
+    "SDIFF": (0, -1, 1),
+    "SINTERSTORE": (0, -1, 1),
+    "MGET": (0, -1, 1),
+    "MSET": (0, -1, 2),
+    "MSETNX": (0, -1, 2),
+    "SETNX": (0, 0, 1),
+    "GETSET": (0, 0, 1),
+    "APPEND": (0, 0, 1),
+    "INCRBY": (0, 0, 1),
+    "DECRBY": (0, 0, 1),
+    "DECR": (0, 0, 1),
+    "INCRBYFLOAT": (0, 0, 1),
+    "GETRANGE": (0, 0, 1),
+    "SETRANGE": (0, 0, 1),
+    "STRLEN": (0, 0, 1),
+    "GETEX": (0, 0, 1),
+    "GETDEL": (0, 0, 1),
+    "DEL": (0, -1, 1),
+    "UNLINK": (0, -1, 1),
+    "MOVE": (0, 0, 1),
+    "WATCH": (0, -1, 1),
+    # Shard channels hash to slots exactly like keys
+    "SSUBSCRIBE": (0, -1, 1),
+    "SUNSUBSCRIBE": (0, -1, 1),
+    "SPUBLISH": (0, 0, 1),
+}
+
+# Commands whose "keys" are shard channels rather than data store keys.
+SHARD_CHANNEL_COMMANDS = {"SSUBSCRIBE", "SUNSUBSCRIBE", "SPUBLISH"}
+
+def _xread_keys(arguments: list) -> list:
+    """XREAD/XREADGROUP ... STREAMS key1 key2 ... id1 id2 ... -> the keys between STREAMS and the IDs."""
+    for i, argument in enumerate(arguments):
+        if argument.upper() == b"STREAMS":
+            after_streams = arguments[i + 1:]
+            return after_streams[:len(after_streams) // 2]
+    return []
+
+def _migrate_keys(arguments: list) -> list:
+    """MIGRATE host port key|"" db timeout [COPY] [REPLACE] [KEYS key ...]"""
+    if len(arguments) > 2 and arguments[2]:
+        return [arguments[2]]
+    for i in range(5, len(arguments)):
+        if arguments[i].upper() == b"KEYS":
+            return arguments[i + 1:]
+    return []
+
+def _blmpop_keys(arguments: list) -> list:
+    """BLMPOP timeout numkeys key [key ...] ...: the keys follow the timeout."""
+    return _numkeys_keys(arguments[1:])
+
+def _numkeys_keys(arguments: list) -> list:
+    """<numkeys> key [key ...] ... -> the `numkeys` keys following the count (SINTERCARD)."""
+    try:
+        num_keys = int(arguments[0])
+    except (IndexError, ValueError):
+        return []
+    return arguments[1:1 + num_keys]
+
+def _eval_keys(arguments: list) -> list:
+    """EVAL script numkeys key [key ...] arg [arg ...] (EVALSHA sha1 ...)."""
+    return _numkeys_keys(arguments[1:])
+
+# Commands whose key positions depend on keywords rather than fixed indexes.
+COMMAND_KEY_EXTRACTORS = {
+    "SINTERCARD": _numkeys_keys,
+    "BLMPOP": _blmpop_keys,
+    "XREAD": _xread_keys,
+    "XREADGROUP": _xread_keys,
+    "MIGRATE": _migrate_keys,
+    "EVAL": _eval_keys,
+    "EVALSHA": _eval_keys,
+}
+
+def get_command_keys(command: str, arguments: list) -> list:
+    """
+    Returns the keys a command operates on, using the key-position metadata above.
+    Commands without keys (PING, ECHO, PUBLISH, ...) return an empty list.
+    """
+    extractor = COMMAND_KEY_EXTRACTORS.get(command)
+    if extractor is not None:
+        return extractor(arguments)
+
+    spec = COMMAND_KEY_SPECS.get(command)
+    if spec is None or not arguments:
+        return []
+
+    first_key, last_key, step = spec
+    if last_key < 0:
+        last_key = len(arguments) + last_key
+    last_key = min(last_key, len(arguments) - 1)
+
+    return arguments[first_key:last_key + 1:step]
@@ -0,0 +1,637 @@
+# app/streams.py
+
+# Stream readers (XREAD) and consumer groups (XGROUP, XREADGROUP, XACK, XPENDING, XCLAIM,
+# XAUTOCLAIM), on top of the Stream values kept in the keyspace.
+#
+# A consumer group remembers the last ID it delivered, so every new entry goes to exactly
+# one of its consumers (XREADGROUP ... >). Delivered entries stay in the group's pending
+# entries list (PEL) until they are acknowledged with XACK. The PEL is indexed both by ID
+# (a dict, plus a sorted list of IDs for range scans) and by consumer, so XPENDING, XCLAIM
+# and XAUTOCLAIM never scan the stream itself.
+#
+# Blocked readers (XREAD / XREADGROUP BLOCK) are BlockedClient waiters, served by
+# serve_blocked_clients() right after the XADD that gives them something to read.
+#
+# XREADGROUP writes to its group, but replaying it on a replica could deliver other entries,
+# so (like Redis) each delivery is replicated as its effect instead: an XCLAIM ... FORCE
+# per entry, or an XGROUP SETID under NOACK, recorded with propagate_effect (app/datastore.py).
+
+import bisect
+import time
+
+from app.datastore import DATA_LOCK, DATA_STORE, WRONGTYPE_ERROR, BlockedClient, Stream, _get_stream, _touch_key, block_client, find_stream_entry, parse_stream_id, propagate_effect, read_streams, stream_entries_after
+import app.notify as notify
+import app.resp as resp
+
+INVALID_ID_ERROR = b"-ERR Invalid stream ID specified as stream command argument\r\n"
+SYNTAX_ERROR = b"-ERR syntax error\r\n"
+NOT_INTEGER_ERROR = b"-ERR value is not an integer or out of range\r\n"
+
+MAX_STREAM_ID = (2 ** 64 - 1, 2 ** 64 - 1)
+
+def format_stream_id(stream_id: tuple[int, int]) -> bytes:
+    return b"%d-%d" % stream_id
+
+def write_stream_entries(writer: resp.RespWriter, entries: list[dict]) -> None:
+    """Writes stream entries as an array of [id, [field1, value1, field2, value2, ...]]."""
+    writer.array(len(entries))
+    for entry in entries:
+        fields = entry["fields"]
+        writer.array(2)
+        writer.bulk(entry["id"].encode())
+        writer.array(len(fields) * 2)
+        for field, value in fields.items():
+            writer.bulk(field)
+            writer.bulk(value)
+
+def serialize_stream_reply(stream_data: dict[bytes, list[dict]], protocol: int = resp.RESP2) -> bytes:
+    """Serializes the entries read per stream (XREAD/XREADGROUP): a map keyed by stream in RESP3."""
+    if not stream_data:
+        return resp.null_array(protocol)
+
+    writer = resp.RespWriter(protocol)
+    if protocol == resp.RESP3:
+        # Map of key -> [entry1, entry2, ...]
+        writer.map(len(stream_data))
+        for key, entries in stream_data.items():
+            writer.bulk(key)
+            write_stream_entries(writer, entries)
+        return writer.getvalue()
+
+    # Array of [key, [entry1, entry2, ...]]
+    writer.array(len(stream_data))
+    for key, entries in stream_data.items():
+        writer.array(2)
+        writer.bulk(key)
+        write_stream_entries(writer, entries)
+    return writer.getvalue()
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+def _nogroup_error(key: bytes, group_name: bytes) -> bytes:
+    return b"-NOGROUP No such key '" + key + b"' or consumer group '" + group_name + b"'\r\n"
+
+def _get_group(key: bytes, group_name: bytes) -> tuple[Stream | None, dict | None, bytes | None]:
+    """Looks up a consumer group and its stream. Caller holds DATA_LOCK."""
+    stream, error = _get_stream(key)
+    if error:
+        return None, None, error
+    group = stream.groups.get(group_name) if stream is not None else None
+    if group is None:
+        return None, None, _nogroup_error(key, group_name)
+    return stream, group, None
+
+def _get_consumer(group: dict, name: bytes) -> dict:
+    """Returns a consumer, creating it on first use (like Redis)."""
+    consumer = group["consumers"].get(name)
+    if consumer is None:
+        consumer = group["consumers"][name] = {"pending": {}, "seen_time": _now_ms()}
+    return consumer
+
+def _add_pending(group: dict, stream_id: tuple[int, int], consumer_name: bytes, delivery_time: int, delivery_count: int):
+    pending_ids = group["pending_ids"]
+    if not pending_ids or pending_ids[-1] < stream_id:
+        pending_ids.append(stream_id)  # New deliveries always come after every pending ID
+    else:
+        bisect.insort(pending_ids, stream_id)
+    group["pending"][stream_id] = {"consumer": consumer_name, "delivery_time": delivery_time, "delivery_count": delivery_count}
+    group["consumers"][consumer_name]["pending"][stream_id] = None
+
+def _remove_pending(group: dict, stream_id: tuple[int, int]) -> bool:
+    pending_entry = group["pending"].pop(stream_id, None)
+    if pending_entry is None:
+        return False
+    pending_ids = group["pending_ids"]
+    del pending_ids[bisect.bisect_left(pending_ids, stream_id)]
+    consumer = group["consumers"].get(pending_entry["consumer"])
+    if consumer is not None:
+        consumer["pending"].pop(stream_id, None)
+    return True
+
+def _reader_consumer(key: bytes, group: dict, group_name: bytes, consumer_name: bytes) -> dict:
+    """The XREADGROUP consumer; creating it is a write, notified and replicated as such."""
+    consumer = group["consumers"].get(consumer_name)
+    if consumer is None:
+        consumer = _get_consumer(group, consumer_name)
+        _touch_key(key)
+        notify.notify_keyspace_event(notify.NOTIFY_STREAM, b"xgroup-createconsumer", key)
+        propagate_effect("XGROUP", [b"CREATECONSUMER", key, group_name, consumer_name])
+    return consumer
+
+def _deliver_new_entries(key: bytes, stream: Stream, group: dict, group_name: bytes, consumer_name: bytes,
+                         count: int | None, noack: bool) -> list[dict]:
+    """XREADGROUP ... >: entries after the group's last delivered ID. Caller holds DATA_LOCK."""
+    consumer = _reader_consumer(key, group, group_name, consumer_name)
+    now = _now_ms()
+    consumer["seen_time"] = now
+    entries = stream_entries_after(stream, group["last_id"], count)
+    if entries:
+        group["last_id"] = parse_stream_id(entries[-1]["id"])
+        last_id = entries[-1]["id"].encode()
+        if noack:
+            propagate_effect("XGROUP", [b"SETID", key, group_name, last_id])
+        else:
+            for entry in entries:
+                _add_pending(group, parse_stream_id(entry["id"]), consumer_name, now, 1)
+                propagate_effect("XCLAIM", [key, group_name, consumer_name, b"0", entry["id"].encode(), b"TIME", b"%d" % now,
+                                      b"RETRYCOUNT", b"1", b"FORCE", b"JUSTID", b"LASTID", last_id])
+        _touch_key(key)
+    return entries
+
+def _consumer_history(key: bytes, stream: Stream, group: dict, group_name: bytes, consumer_name: bytes,
+                      after_id: tuple[int, int], count: int | None) -> list[dict]:
+    """XREADGROUP with an explicit ID: the consumer's own pending entries after it."""
+    consumer = _reader_consumer(key, group, group_name, consumer_name)
+    consumer["seen_time"] = _now_ms()
+    pending_ids = sorted(consumer["pending"])
+    start = bisect.bisect_right(pending_ids, after_id)
+    end = len(pending_ids) if count is None else start + count
+    return [find_stream_entry(stream, stream_id) for stream_id in pending_ids[start:end]]
+
+class StreamWaiter(BlockedClient):
+    """A client blocked in XREAD (group None) or XREADGROUP ... > on several streams."""
+    key_type = "stream"
+
+    def __init__(self, client, keys: list[bytes], protocol: int, last_ids: list[tuple[int, int]] | None = None,
+                 count: int | None = None, group: bytes | None = None, consumer: bytes | None = None, noack: bool = False):
+        super().__init__(client, keys, protocol)
+        self.last_ids = last_ids
+        self.count = count
+        self.group = group
+        self.consumer = consumer
+        self.noack = noack
+        self.writes = group is not None  # Deliveries to a group modify the stream key
+
+    def try_serve(self) -> bytes | None:
+        if self.group is None:
+            stream_data = read_streams(self.keys, self.last_ids, self.count)
+        else:
+            stream_data = {}
+            for key in self.keys:
+                stream, group, error = _get_group(key, self.group)
+                if error:
+                    return error
+                entries = _deliver_new_entries(key, stream, group, self.group, self.consumer, self.count, self.noack)
+                if entries:
+                    stream_data[key] = entries
+        if not stream_data:
+            return None
+        return serialize_stream_reply(stream_data, self.protocol)
+
+def _parse_read_options(arguments: list, allowed: tuple) -> tuple[dict | None, int, bytes | None]:
+    """
+    [COUNT n] [BLOCK ms] [NOACK] ... STREAMS: returns the options, the index of the first
+    argument after STREAMS, and an error.
+    """
+    options = {"count": None, "block": None, "noack": False}
+    i = 0
+    while i < len(arguments):
+        option = arguments[i].upper()
+        if option == b"STREAMS":
+            return options, i + 1, None
+        if option not in allowed:
+            return None, 0, SYNTAX_ERROR
+        if option == b"NOACK":
+            options["noack"] = True
+            i += 1
+            continue
+        if i + 1 >= len(arguments):
+            return None, 0, SYNTAX_ERROR
+        try:
+            value = int(arguments[i + 1])
+        except ValueError:
+            if option == b"BLOCK":
+                return None, 0, b"-ERR timeout is not an integer or out of range\r\n"
+            return None, 0, NOT_INTEGER_ERROR
+        if option == b"BLOCK":
+            if value < 0:
+                return None, 0, b"-ERR timeout is negative\r\n"
+            options["block"] = value / 1000.0
+        else:
+            options["count"] = value if value > 0 else None
+        i += 2
+    return None, 0, SYNTAX_ERROR
+
+def _split_streams(arguments: list, command: bytes) -> tuple[list | None, list | None, bytes | None]:
+    if not arguments or len(arguments) % 2 != 0:
+        return None, None, b"-ERR Unbalanced '" + command + b"' list of streams: for each stream key an ID or '$' must be specified.\r\n"
+    half = len(arguments) // 2
+    return arguments[:half], arguments[half:], None
+
+def execute_xread(arguments: list, client, protocol: int, in_transaction: bool) -> bytes | None:
+    """XREAD [COUNT count] [BLOCK milliseconds] STREAMS key [key ...] id [id ...]"""
+    options, streams_index, error = _parse_read_options(arguments, (b"COUNT", b"BLOCK"))
+    if error:
+        return error
+    keys, ids, error = _split_streams(arguments[streams_index:], b"xread")
+    if error:
+        return error
+
+    last_ids = []
+    with DATA_LOCK:
+        for key, stream_id in zip(keys, ids):
+            if stream_id == b"$":
+                # "$" means "only entries added from now on"
+                entries, _ = _get_stream(key)
+                last_ids.append(parse_stream_id(entries[-1]["id"]) if entries else (0, 0))
+                continue
+            last_id = parse_stream_id(stream_id.decode(errors="replace"))
+            if last_id is None:
+                return INVALID_ID_ERROR
+            last_ids.append(last_id)
+
+    waiter = StreamWaiter(client, keys, protocol, last_ids=last_ids, count=options["count"])
+    return block_client(waiter, options["block"], block=options["block"] is not None and not in_transaction)
+
+def execute_xreadgroup(arguments: list, client, protocol: int, in_transaction: bool) -> bytes | None:
+    """XREADGROUP GROUP group consumer [COUNT count] [BLOCK milliseconds] [NOACK] STREAMS key [key ...] id [id ...]"""
+    if len(arguments) < 6 or arguments[0].upper() != b"GROUP":
+        return b"-ERR wrong number of arguments for 'xreadgroup' command\r\n"
+    group_name, consumer_name = arguments[1], arguments[2]
+    options, streams_index, error = _parse_read_options(arguments[3:], (b"COUNT", b"BLOCK", b"NOACK"))
+    if error:
+        return error
+    keys, ids, error = _split_streams(arguments[3 + streams_index:], b"xreadgroup")
+    if error:
+        return error
+
+    if all(stream_id == b">" for stream_id in ids):
+        # Only new entries were asked for: this is what may block
+        waiter = StreamWaiter(client, keys, protocol, count=options["count"], group=group_name,
+                              consumer=consumer_name, noack=options["noack"])
+        return block_client(waiter, options["block"], block=options["block"] is not None and not in_transaction)
+
+    with DATA_LOCK:
+        stream_data = {}
+        for key, stream_id in zip(keys, ids):
+            stream, group, error = _get_group(key, group_name)
+            if error:
+                return error
+            if stream_id == b">":
+                entries = _deliver_new_entries(key, stream, group, group_name, consumer_name, options["count"], options["noack"])
+                if entries:
+                    stream_data[key] = entries
+                continue
+            after_id = parse_stream_id(stream_id.decode(errors="replace"))
+            if after_id is None:
+                return INVALID_ID_ERROR
+            # History is replied even when empty, so the consumer knows it caught up
+            stream_data[key] = _consumer_history(key, stream, group, group_name, consumer_name, after_id, options["count"])
+    return serialize_stream_reply(stream_data, protocol)
+
+def _xgroup(arguments: list) -> bytes:
+    """XGROUP CREATE|SETID|DESTROY|CREATECONSUMER|DELCONSUMER key group ..."""
+    if len(arguments) < 3:
+        return b"-ERR wrong number of arguments for 'xgroup' command\r\n"
+    subcommand = arguments[0].upper()
+    key, group_name = arguments[1], arguments[2]
+
+    with DATA_LOCK:
+        entries, error = _get_stream(key)
+        if error:
+            return error
+
+        if subcommand == b"CREATE" and len(arguments) in (4, 5):
+            if len(arguments) == 5 and arguments[4].upper() != b"MKSTREAM":
+                return SYNTAX_ERROR
+            if entries is None:
+                if len(arguments) != 5:
+                    return b"-ERR The XGROUP subcommand requires the key to exist. Note that for CREATE you may want to use the MKSTREAM option to create an empty stream automatically.\r\n"
+                entries = Stream()
+                DATA_STORE[key] = {"type": "stream", "value": entries, "expiry": None}
+            groups = entries.groups
+            if group_name in groups:
+                return b"-BUSYGROUP Consumer Group name already exists\r\n"
+            last_id = _group_start_id(arguments[3], entries)
+            if last_id is None:
+                return INVALID_ID_ERROR
+            groups[group_name] = {"last_id": last_id, "pending": {}, "pending_ids": [], "consumers": {}}
+            return resp.OK
+
+        if entries is None:
+            return b"-ERR The XGROUP subcommand requires the key to exist. Note that for CREATE you may want to use the MKSTREAM option to create an empty stream automatically.\r\n"
+        groups = entries.groups
+
+        if subcommand == b"DESTROY" and len(arguments) == 3:
+            return resp.integer(1 if groups.pop(group_name, None) is not None else 0)
+
+        group = groups.get(group_name)
+        if group is None:
+            return b"-NOGROUP No such consumer group '" + group_name + b"' for key name '" + key + b"'\r\n"
+
+        if subcommand == b"SETID" and len(arguments) == 4:
+            last_id = _group_start_id(arguments[3], entries)
+            if last_id is None:
+                return INVALID_ID_ERROR
+            group["last_id"] = last_id
+            return resp.OK
+        if subcommand == b"CREATECONSUMER" and len(arguments) == 4:
+            if arguments[3] in group["consumers"]:
+                return resp.integer(0)
+            _get_consumer(group, arguments[3])
+            return resp.integer(1)
+        if subcommand == b"DELCONSUMER" and len(arguments) == 4:
+            consumer = group["consumers"].pop(arguments[3], None)
+            if consumer is None:
+                return resp.integer(0)
+            # Its pending entries are forgotten along with it
+            for stream_id in consumer["pending"]:
+                group["pending"].pop(stream_id, None)
+                del group["pending_ids"][bisect.bisect_left(group["pending_ids"], stream_id)]
+            return resp.integer(len(consumer["pending"]))
+
+    return b"-ERR unknown subcommand or wrong number of arguments for '" + arguments[0] + b"'\r\n"
+
+def _group_start_id(value: bytes, entries: list[dict]) -> tuple[int, int] | None:
+    """The last delivered ID for XGROUP CREATE/SETID: an ID, or "$" for the stream's last entry."""
+    if value == b"$":
+        return parse_stream_id(entries[-1]["id"]) if entries else (0, 0)
+    return parse_stream_id(value.decode(errors="replace"))
+
+def _xack(arguments: list) -> bytes:
+    """XACK key group id [id ...]"""
+    if len(arguments) < 3:
+        return b"-ERR wrong number of arguments for 'xack' command\r\n"
+    stream_ids = [parse_stream_id(value.decode(errors="replace")) for value in arguments[2:]]
+    if None in stream_ids:
+        return INVALID_ID_ERROR
+    with DATA_LOCK:
+        _, group, error = _get_group(arguments[0], arguments[1])
+        if error:
+            # Like Redis, acknowledging for a missing key or group is not an error
+            return error if error is WRONGTYPE_ERROR else resp.integer(0)
+        return resp.integer(sum(_remove_pending(group, stream_id) for stream_id in stream_ids))
+
+def _parse_range_bound(value: bytes, is_start: bool) -> tuple[int, int] | None:
+    """XPENDING/XAUTOCLAIM bounds: "-", "+", an ID, or "(" + ID for an exclusive bound."""
+    if value == b"-":
+        return (0, 0)
+    if value == b"+":
+        return MAX_STREAM_ID
+    exclusive = value.startswith(b"(")
+    stream_id = parse_stream_id(value[exclusive:].decode(errors="replace"))
+    if stream_id is None or not exclusive:
+        return stream_id
+    ms, seq = stream_id
+    if is_start:
+        return (ms, seq + 1) if seq < MAX_STREAM_ID[1] else (ms + 1, 0)
+    return (ms, seq - 1) if seq > 0 else (ms - 1, MAX_STREAM_ID[1])
+
+def _xpending(arguments: list, protocol: int) -> bytes:
+    """XPENDING key group [[IDLE min-idle-time] start end count [consumer]]"""
+    if len(arguments) < 2:
+        return b"-ERR wrong number of arguments for 'xpending' command\r\n"
+    key, group_name = arguments[0], arguments[1]
+    writer = resp.RespWriter(protocol)
+
+    if len(arguments) == 2:
+        with DATA_LOCK:
+            _, group, error = _get_group(key, group_name)
+            if error:
+                return error
+            pending_ids = group["pending_ids"]
+            writer.array(4)
+            writer.integer(len(pending_ids))
+            if not pending_ids:
+                writer.null()
+                writer.null()
+                writer.null_array()
+                return writer.getvalue()
+            writer.bulk(format_stream_id(pending_ids[0]))
+            writer.bulk(format_stream_id(pending_ids[-1]))
+            counts = [(name, len(consumer["pending"])) for name, consumer in group["consumers"].items() if consumer["pending"]]
+            writer.array(len(counts))
+            for name, count in counts:
+                writer.array(2)
+                writer.bulk(name)
+                writer.bulk(b"%d" % count)
+            return writer.getvalue()
+
+    # Extended form
+    options = arguments[2:]
+    min_idle = 0
+    if options[0].upper() == b"IDLE":
+        if len(options) < 2:
+            return SYNTAX_ERROR
+        try:
+            min_idle = int(options[1])
+        except ValueError:
+            return NOT_INTEGER_ERROR
+        options = options[2:]
+    if len(options) not in (3, 4):
+        return SYNTAX_ERROR
+    start = _parse_range_bound(options[0], True)
+    end = _parse_range_bound(options[1], False)
+    if start is None or end is None:
+        return INVALID_ID_ERROR
+    try:
+        count = int(options[2])
+    except ValueError:
+        return NOT_INTEGER_ERROR
+    consumer_filter = options[3] if len(options) == 4 else None
+
+    with DATA_LOCK:
+        _, group, error = _get_group(key, group_name)
+        if error:
+            return error
+        now = _now_ms()
+        rows = []
+        pending_ids = group["pending_ids"]
+        index = bisect.bisect_left(pending_ids, start)
+        while index < len(pending_ids) and len(rows) < count and pending_ids[index] <= end:
+            stream_id = pending_ids[index]
+            index += 1
+            pending_entry = group["pending"][stream_id]
+            if consumer_filter is not None and pending_entry["consumer"] != consumer_filter:
+                continue
+            idle = now - pending_entry["delivery_time"]
+            if idle < min_idle:
+                continue
+            rows.append((stream_id, pending_entry["consumer"], idle, pending_entry["delivery_count"]))
+
+    writer.array(len(rows))
+    for stream_id, consumer_name, idle, delivery_count in rows:
+        writer.array(4)
+        writer.bulk(format_stream_id(stream_id))
+        writer.bulk(consumer_name)
+        writer.integer(idle)
+        writer.integer(delivery_count)
+    return writer.getvalue()
+
+def _claim(group: dict, stream_id: tuple[int, int], consumer_name: bytes, delivery_time: int, retry_count: int | None, justid: bool):
+    """Hands a pending entry over to another consumer. Caller holds DATA_LOCK."""
+    pending_entry = group["pending"][stream_id]
+    previous = group["consumers"].get(pending_entry["consumer"])
+    if previous is not None:
+        previous["pending"].pop(stream_id, None)
+    pending_entry["consumer"] = consumer_name
+    pending_entry["delivery_time"] = delivery_time
+    if retry_count is not None:
+        pending_entry["delivery_count"] = retry_count
+    elif not justid:
+        pending_entry["delivery_count"] += 1
+    _get_consumer(group, consumer_name)["pending"][stream_id] = None
+
+def _write_claimed(writer: resp.RespWriter, claimed: list, justid: bool):
+    if justid:
+        writer.bulk_array([format_stream_id(stream_id) for stream_id, _ in claimed])
+    else:
+        write_stream_entries(writer, [entry for _, entry in claimed])
+
+def _xclaim(arguments: list, protocol: int) -> bytes:
+    """XCLAIM key group consumer min-idle-time id [id ...] [IDLE ms] [TIME unix-time-ms] [RETRYCOUNT count] [FORCE] [JUSTID] [LASTID id]"""
+    if len(arguments) < 5:
+        return b"-ERR wrong number of arguments for 'xclaim' command\r\n"
+    key, group_name, consumer_name = arguments[0], arguments[1], arguments[2]
+    try:
+        min_idle = int(arguments[3])
+    except ValueError:
+        return b"-ERR Invalid min-idle-time argument for XCLAIM\r\n"
+
+    stream_ids = []
+    i = 4
+    while i < len(arguments) and arguments[i].upper() not in (b"IDLE", b"TIME", b"RETRYCOUNT", b"FORCE", b"JUSTID", b"LASTID"):
+        stream_id = parse_stream_id(arguments[i].decode(errors="replace"))
+        if stream_id is None:
+            return INVALID_ID_ERROR
+        stream_ids.append(stream_id)
+        i += 1
+
+    now = _now_ms()
+    delivery_time = now
+    retry_count = None
+    force = justid = False
+    last_id = None
+    while i < len(arguments):
+        option = arguments[i].upper()
+        if option in (b"FORCE", b"JUSTID"):
+            force = force or option == b"FORCE"
+            justid = justid or option == b"JUSTID"
+            i += 1
+            continue
+        if i + 1 >= len(arguments):
+            return SYNTAX_ERROR
+        value = arguments[i + 1]
+        if option == b"LASTID":
+            last_id = parse_stream_id(value.decode(errors="replace"))
+            if last_id is None:
+                return INVALID_ID_ERROR
+        else:
+            try:
+                number = int(value)
+            except ValueError:
+                return NOT_INTEGER_ERROR
+            if option == b"IDLE":
+                delivery_time = now - number
+            elif option == b"TIME":
+                delivery_time = number
+            elif option == b"RETRYCOUNT":
+                retry_count = number
+            else:
+                return SYNTAX_ERROR
+        i += 2
+
+    with DATA_LOCK:
+        entries, group, error = _get_group(key, group_name)
+        if error:
+            return error
+        if last_id is not None and last_id > group["last_id"]:
+            group["last_id"] = last_id
+        claimed = []
+        for stream_id in stream_ids:
+            entry = find_stream_entry(entries, stream_id)
+            pending_entry = group["pending"].get(stream_id)
+            if pending_entry is None:
+                # FORCE creates the pending entry, as long as the stream still has it
+                if not force or entry is None:
+                    continue
+                _get_consumer(group, consumer_name)
+                _add_pending(group, stream_id, consumer_name, delivery_time, 0)
+            elif now - pending_entry["delivery_time"] < min_idle:
+                continue
+            _claim(group, stream_id, consumer_name, delivery_time, retry_count, justid)
+            claimed.append((stream_id, entry))
+
+    writer = resp.RespWriter(protocol)
+    _write_claimed(writer, claimed, justid)
+    return writer.getvalue()
+
+def _xautoclaim(arguments: list, protocol: int) -> bytes:
+    """XAUTOCLAIM key group consumer min-idle-time start [COUNT count] [JUSTID]"""
+    if len(arguments) < 5:
+        return b"-ERR wrong number of arguments for 'xautoclaim' command\r\n"
+    key, group_name, consumer_name = arguments[0], arguments[1], arguments[2]
+    try:
+        min_idle = int(arguments[3])
+    except ValueError:
+        return b"-ERR Invalid min-idle-time argument for XAUTOCLAIM\r\n"
+    start = _parse_range_bound(arguments[4], True)
+    if start is None:
+        return INVALID_ID_ERROR
+
+    count = 100
+    justid = False
+    i = 5
+    while i < len(arguments):
+        option = arguments[i].upper()
+        if option == b"JUSTID":
+            justid = True
+            i += 1
+        elif option == b"COUNT" and i + 1 < len(arguments):
+            try:
+                count = int(arguments[i + 1])
+            except ValueError:
+                return NOT_INTEGER_ERROR
+            if count < 1:
+                return b"-ERR COUNT must be > 0\r\n"
+            i += 2
+        else:
+            return SYNTAX_ERROR
+
+    with DATA_LOCK:
+        entries, group, error = _get_group(key, group_name)
+        if error:
+            return error
+        now = _now_ms()
+        pending_ids = group["pending_ids"]
+        index = bisect.bisect_left(pending_ids, start)
+        # Like Redis, look at no more than count * 10 pending entries per call
+        attempts = count * 10
+        claimed = []
+        deleted = []
+        while index < len(pending_ids) and len(claimed) < count and attempts:
+            stream_id = pending_ids[index]
+            attempts -= 1
+            if now - group["pending"][stream_id]["delivery_time"] < min_idle:
+                index += 1
+                continue
+            entry = find_stream_entry(entries, stream_id)
+            if entry is None:
+                # The entry is gone from the stream: drop it from the PEL
+                _remove_pending(group, stream_id)
+                deleted.append(stream_id)
+                continue
+            _claim(group, stream_id, consumer_name, now, None, justid)
+            claimed.append((stream_id, entry))
+            index += 1
+        next_start = pending_ids[index] if index < len(pending_ids) else (0, 0)
+
+    writer = resp.RespWriter(protocol)
+    writer.array(3)
+    writer.bulk(format_stream_id(next_start))
+    _write_claimed(writer, claimed, justid)
+    writer.bulk_array([format_stream_id(stream_id) for stream_id in deleted])
+    return writer.getvalue()
+
+def execute_group_command(command: str, arguments: list, protocol: int) -> bytes:
+    """Implements the consumer group commands other than XREADGROUP."""
+    if command == "XGROUP":
+        return _xgroup(arguments)
+    if command == "XACK":
+        return _xack(arguments)
+    if command == "XPENDING":
+        return _xpending(arguments, protocol)
+    if command == "XCLAIM":
+        return _xclaim(arguments, protocol)
+    return _xautoclaim(arguments, protocol)
@@ -0,0 +1,281 @@
+# app/tracking.py
+
+# Client-side caching (CLIENT TRACKING).
+#
+# In the default mode the server remembers which keys every tracking client read, in a
+# table of key -> clients. When one of those keys is written or expires, each client that
+# read it gets a single "invalidate" message and the key is forgotten until it is read
+# again. In BCAST mode nothing is remembered: clients register key prefixes instead and are
+# told about every written key that starts with one of them.
+#
+# Invalidations are collected while a command runs and sent once its reply has gone out
+# (flush_invalidations), so no socket is written while the data store lock is held.
+# They are delivered as a RESP3 push, or with REDIRECT to another connection, as a
+# message on the __redis__:invalidate channel when that connection speaks RESP2.
+
+import threading
+
+from app.datastore import EXPIRED_KEY_CALLBACKS, FLUSH_CALLBACKS, SERVER_CONFIG, find_client_by_id, get_client_id, get_client_protocol
+import app.pubsub as pubsub
+import app.resp as resp
+
+INVALIDATE_CHANNEL = b"__redis__:invalidate"
+
+TRACKING_LOCK = threading.Lock()
+
+# client -> {"bcast", "prefixes", "optin", "optout", "noloop", "redirect", "caching"}
+TRACKING_CLIENTS = {}
+
+# key -> set of clients that read it. Insertion ordered, so the oldest key is evicted first.
+TRACKING_TABLE = {}
+
+# BCAST mode: prefix -> set of clients (b"" matches every key)
+PREFIX_TABLE = {}
+
+# client -> keys to invalidate, sent by the next flush_invalidations()
+PENDING_INVALIDATIONS = {}
+
+def _queue_invalidation(client, key: bytes):
+    """Adds `key` to the keys the client will be told about. Caller holds TRACKING_LOCK."""
+    keys = PENDING_INVALIDATIONS.get(client)
+    if keys is None:
+        PENDING_INVALIDATIONS[client] = {key: None}  # dict as an ordered set
+    else:
+        keys[key] = None
+
+def invalidate_keys(keys: list[bytes], writer=None):
+    """
+    Queues invalidation messages for keys that were modified by `writer` (None for
+    expired keys). Clients tracking with NOLOOP are not told about their own writes.
+    """
+    with TRACKING_LOCK:
+        for key in keys:
+            clients = TRACKING_TABLE.pop(key, None)
+            if clients:
+                for client in clients:
+                    options = TRACKING_CLIENTS.get(client)
+                    if options is None or (client is writer and options["noloop"]):
+                        continue
+                    _queue_invalidation(client, key)
+
+            for prefix, clients in PREFIX_TABLE.items():
+                if key.startswith(prefix):
+                    for client in clients:
+                        if client is writer and TRACKING_CLIENTS[client]["noloop"]:
+                            continue
+                        _queue_invalidation(client, key)
+
+def _key_expired(key: bytes):
+    if TRACKING_TABLE or PREFIX_TABLE:
+        invalidate_keys([key])
+
+EXPIRED_KEY_CALLBACKS.append(_key_expired)
+
+def _keyspace_flushed(databases: list, lazy: bool):
+    """FLUSHALL / FLUSHDB: every remembered key is invalidated (tracking ignores databases)."""
+    if TRACKING_TABLE:
+        invalidate_keys(list(TRACKING_TABLE))
+
+FLUSH_CALLBACKS.append(_keyspace_flushed)
+
+def remember_keys(client, keys: list[bytes]):
+    """
+    Records that a tracking client read `keys`. With OPTIN only reads right after
+    CLIENT CACHING YES are remembered; with OPTOUT, all but those after CLIENT CACHING NO.
+    """
+    with TRACKING_LOCK:
+        options = TRACKING_CLIENTS.get(client)
+        if options is None or options["bcast"]:
+            return
+        if options["optin"] and options["caching"] is not True:
+            return
+        if options["optout"] and options["caching"] is False:
+            return
+
+        for key in keys:
+            clients = TRACKING_TABLE.get(key)
+            if clients is None:
+                TRACKING_TABLE[key] = {client}
+            else:
+                clients.add(client)
+
+        # Over the limit: forget the oldest keys, telling their readers to drop them too
+        max_keys = SERVER_CONFIG["tracking-table-max-keys"]
+        while max_keys and len(TRACKING_TABLE) > max_keys:
+            oldest_key = next(iter(TRACKING_TABLE))
+            for reader in TRACKING_TABLE.pop(oldest_key):
+                if reader in TRACKING_CLIENTS:
+                    _queue_invalidation(reader, oldest_key)
+
+def clear_caching(client):
+    """CLIENT CACHING only applies to the command that follows it."""
+    options = TRACKING_CLIENTS.get(client)
+    if options is not None:
+        options["caching"] = None
+
+def _invalidation_message(keys: list[bytes], protocol: int) -> bytes:
+    """["invalidate", [keys]] push in RESP3, ["message", "__redis__:invalidate", [keys]] otherwise."""
+    writer = resp.RespWriter(protocol)
+    if protocol == resp.RESP3:
+        writer.push(2)
+        writer.bulk(b"invalidate")
+    else:
+        writer.array(3)
+        writer.bulks((b"message", INVALIDATE_CHANNEL))
+    writer.bulk_array(keys)
+    return writer.getvalue()
+
+def flush_invalidations():
+    """Sends the queued invalidation messages, one per tracking client."""
+    with TRACKING_LOCK:
+        pending = [
+            (client, TRACKING_CLIENTS[client]["redirect"], list(keys))
+            for client, keys in PENDING_INVALIDATIONS.items() if client in TRACKING_CLIENTS
+        ]
+        PENDING_INVALIDATIONS.clear()
+
+    for client, redirect, keys in pending:
+        target = client
+        if redirect:
+            target = find_client_by_id(redirect)
+            if target is None:
+                # The redirect connection went away: tell the client its cache is stale
+                if get_client_protocol(client) == resp.RESP3:
+                    writer = resp.RespWriter(resp.RESP3)
+                    writer.push(2)
+                    writer.bulk(b"tracking-redir-broken")
+                    writer.integer(redirect)
+                    _send(client, writer.getvalue())
+                continue
+
+        protocol = get_client_protocol(target)
+        # A RESP2 connection can only receive the message while in subscribed mode,
+        # so without REDIRECT a RESP2 client gets nothing (like Redis).
+        if protocol == resp.RESP2 and (target is client or not pubsub.is_client_subscribed(target)):
+            continue
+        _send(target, _invalidation_message(keys, protocol))
+
+def _send(client, message: bytes):
+    try:
+        pubsub.send_to_client(client, message)
+    except Exception:
+        pass  # Disconnected clients are cleaned up by their own connection thread
+
+def disable_tracking(client):
+    """CLIENT TRACKING OFF, also used when the connection closes."""
+    with TRACKING_LOCK:
+        options = TRACKING_CLIENTS.pop(client, None)
+        PENDING_INVALIDATIONS.pop(client, None)
+        if options is None:
+            return
+        # Keys it read stay in TRACKING_TABLE and are skipped when invalidated
+        for prefix in options["prefixes"]:
+            clients = PREFIX_TABLE.get(prefix)
+            if clients is not None:
+                clients.discard(client)
+                if not clients:
+                    del PREFIX_TABLE[prefix]
+
+def _client_tracking(client, arguments: list) -> bytes:
+    """CLIENT TRACKING ON|OFF [REDIRECT id] [PREFIX prefix ...] [BCAST] [OPTIN] [OPTOUT] [NOLOOP]"""
+    if not arguments:
+        return b"-ERR wrong number of arguments for 'client|tracking' command\r\n"
+
+    switch = arguments[0].upper()
+    if switch == b"OFF":
+        disable_tracking(client)
+        return resp.OK
+    if switch != b"ON":
+        return b"-ERR syntax error\r\n"
+
+    options = {"bcast": False, "prefixes": [], "optin": False, "optout": False,
+               "noloop": False, "redirect": 0, "caching": None}
+    i = 1
+    while i < len(arguments):
+        option = arguments[i].upper()
+        if option == b"REDIRECT" and i + 1 < len(arguments):
+            try:
+                options["redirect"] = int(arguments[i + 1])
+            except ValueError:
+                return b"-ERR value is not an integer or out of range\r\n"
+            if find_client_by_id(options["redirect"]) is None:
+                return b"-ERR The client ID you want redirect to does not exist\r\n"
+            i += 2
+        elif option == b"PREFIX" and i + 1 < len(arguments):
+            options["prefixes"].append(arguments[i + 1])
+            i += 2
+        elif option == b"BCAST":
+            options["bcast"] = True
+            i += 1
+        elif option == b"OPTIN":
+            options["optin"] = True
+            i += 1
+        elif option == b"OPTOUT":
+            options["optout"] = True
+            i += 1
+        elif option == b"NOLOOP":
+            options["noloop"] = True
+            i += 1
+        else:
+            return b"-ERR syntax error\r\n"
+
+    if options["prefixes"] and not options["bcast"]:
+        return b"-ERR PREFIX option requires BCAST mode to be enabled\r\n"
+    if options["optin"] and options["optout"]:
+        return b"-ERR You can't use OPTIN and OPTOUT at the same time\r\n"
+    if options["bcast"] and (options["optin"] or options["optout"]):
+        return b"-ERR OPTIN and OPTOUT are not compatible with BCAST\r\n"
+    if options["bcast"] and not options["prefixes"]:
+        options["prefixes"].append(b"")
+
+    current = TRACKING_CLIENTS.get(client)
+    if current is not None and current["bcast"] != options["bcast"]:
+        return b"-ERR You can't switch BCAST mode on/off before disabling tracking for this client, and then re-enabling it with a different mode.\r\n"
+
+    # Turning tracking on again replaces the options (prefixes accumulate, like Redis)
+    if current is not None:
+        options["prefixes"] = list(dict.fromkeys(current["prefixes"] + options["prefixes"]))
+    with TRACKING_LOCK:
+        TRACKING_CLIENTS[client] = options
+        for prefix in options["prefixes"]:
+            PREFIX_TABLE.setdefault(prefix, set()).add(client)
+    return resp.OK
+
+def _client_caching(client, arguments: list) -> bytes:
+    """CLIENT CACHING YES|NO: opts the next command in (OPTIN) or out (OPTOUT) of tracking."""
+    if len(arguments) != 1:
+        return b"-ERR wrong number of arguments for 'client|caching' command\r\n"
+    options = TRACKING_CLIENTS.get(client)
+    if options is None or not (options["optin"] or options["optout"]):
+        return b"-ERR CLIENT CACHING can be called only when the client is in tracking mode with OPTIN or OPTOUT mode enabled\r\n"
+
+    value = arguments[0].upper()
+    if value == b"YES" and options["optin"]:
+        options["caching"] = True
+    elif value == b"NO" and options["optout"]:
+        options["caching"] = False
+    elif value in (b"YES", b"NO"):
+        return b"-ERR CLIENT CACHING " + value + b" is only valid when tracking is enabled in " + (b"OPTIN" if value == b"YES" else b"OPTOUT") + b" mode.\r\n"
+    else:
+        return b"-ERR syntax error\r\n"
+    return resp.OK
+
+def execute_client_command(client, arguments: list) -> bytes:
+    """Implements the CLIENT subcommands (connection ID and client-side caching)."""
+    if not arguments:
+        return b"-ERR wrong number of arguments for 'client' command\r\n"
+
+    subcommand = arguments[0].upper()
+    sub_arguments = arguments[1:]
+
+    if subcommand == b"ID" and not sub_arguments:
+        return resp.integer(get_client_id(client))
+    elif subcommand == b"TRACKING":
+        return _client_tracking(client, sub_arguments)
+    elif subcommand == b"CACHING":
+        return _client_caching(client, sub_arguments)
+    elif subcommand == b"GETREDIR" and not sub_arguments:
+        # -1 when tracking is off, 0 when it is on without REDIRECT
+        options = TRACKING_CLIENTS.get(client)
+        return resp.integer(-1 if options is None else options["redirect"])
+    return b"-ERR unknown subcommand or wrong number of arguments for '" + arguments[0] + b"'\r\n"
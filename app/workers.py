@@ -0,0 +1,333 @@
+# app/workers.py
+
+# Multi-process, shared-nothing mode (--workers N).
+#
+# The parent process forks N workers. Every worker binds the same TCP port with
+# SO_REUSEPORT (the kernel spreads incoming connections across them) and owns a
+# contiguous range of the 16384 hash slots. A command whose keys live in another
+# worker's range is forwarded, as raw RESP, over that worker's Unix socket and the
+# owner's reply is relayed back unchanged. Each worker runs its own interpreter,
+# so throughput is no longer capped by a single GIL.
+#
+# Commands that cover the whole keyspace (FLUSHALL, KEYS, DBSIZE, PUBLISH, ...) run on
+# every worker and their replies are merged; MGET, MSET, DEL and UNLINK are split into
+# one command per owning worker. Other commands whose keys live on several workers get
+# -CROSSSLOT, and a MULTI can only use the keys of one worker.
+#
+# A WATCH of another worker's keys pins the client's transaction to that worker: WATCH,
+# MULTI, the queued commands and EXEC all run on its peer connection, where the owner
+# keeps the watched versions.
+
+import io
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+
+import app.resp as resp
+from app.slots import CLUSTER_SLOTS, SHARD_CHANNEL_COMMANDS, get_command_keys, key_hash_slot
+
+WORKER_COUNT = 1   # 1 means the classic single-process server
+WORKER_INDEX = 0   # Index of the current process among the workers
+WORKER_SOCKET_PATHS = []
+
+# Each client thread keeps its own connections to peer workers, so forwarded
+# request/reply pairs from different clients can never interleave on one socket.
+_PEER_CONNECTIONS = threading.local()
+
+CROSS_WORKER_ERROR = b"-CROSSSLOT Keys in request don't hash to the same worker\r\n"
+MULTI_FORWARD_ERROR = b"-ERR keys owned by another worker cannot be used inside MULTI\r\n"
+EXECABORT_ERROR = b"-EXECABORT Transaction discarded because of previous errors.\r\n"
+
+# Keyless commands that act on the keyspace (or subscribers) of every worker
+ALL_WORKERS_COMMANDS = {"FLUSHALL", "FLUSHDB", "KEYS", "DBSIZE", "PUBLISH", "SPUBLISH"}
+
+# Multi-key commands that are split into one command per owning worker (MSETNX is not:
+# it must check every key before setting any)
+SPLIT_COMMANDS = {"MGET", "MSET", "DEL", "UNLINK"}
+
+def worker_socket_path(port: int, index: int) -> str:
+    """Returns the Unix socket path worker `index` listens on for forwarded commands."""
+    return os.path.join(tempfile.gettempdir(), f"redis-py-{port}-worker-{index}.sock")
+
+def worker_for_slot(slot: int) -> int:
+    """Maps a hash slot to the worker owning it (contiguous, equally sized slot ranges)."""
+    return slot * WORKER_COUNT // CLUSTER_SLOTS
+
+def worker_for_key(key) -> int:
+    return worker_for_slot(key_hash_slot(key))
+
+def is_peer_connection(client: socket.socket) -> bool:
+    """Forwarded commands arrive on Unix sockets; they are always executed locally."""
+    return client.family == socket.AF_UNIX
+
+def route_command(command: str, arguments: list) -> int | bytes | None:
+    """
+    Decides where a command must run.
+    Returns None to execute locally, the index of the owning worker to forward to,
+    or a RESP error when the keys are spread over several workers.
+    """
+    # Pub/sub state lives in each process: subscribing through a peer connection would
+    # deliver the messages to that connection instead of the client.
+    if command in SHARD_CHANNEL_COMMANDS or command in ALL_WORKERS_COMMANDS:
+        return None
+
+    keys = get_command_keys(command, arguments)
+    if not keys:
+        return None
+
+    owner = worker_for_key(keys[0])
+    for key in keys[1:]:
+        if worker_for_key(key) != owner:
+            return CROSS_WORKER_ERROR
+
+    if owner == WORKER_INDEX:
+        return None
+    return owner
+
+def read_resp_reply(reader) -> bytes:
+    """
+    Reads exactly one RESP reply from a buffered reader and returns its raw bytes.
+    Used to relay a peer worker's reply without re-encoding it.
+    """
+    line = reader.readline()
+    if not line:
+        raise ConnectionError("peer worker closed the connection")
+
+    prefix = line[:1]
+    if prefix in (b"$", b"=", b"!"):
+        # Bulk string, and the RESP3 verbatim string / blob error
+        length = int(line[1:-2])
+        if length < 0:
+            return line
+        return line + reader.read(length + 2)
+
+    if prefix in (b"*", b"~", b">", b"%", b"|"):
+        # Array, and the RESP3 set / push / map / attribute (maps hold 2 replies per entry)
+        count = int(line[1:-2])
+        if prefix in (b"%", b"|"):
+            count *= 2
+        parts = [line]
+        for _ in range(max(count, 0)):
+            parts.append(read_resp_reply(reader))
+        if prefix == b"|":
+            # An attribute is followed by the reply it describes
+            parts.append(read_resp_reply(reader))
+        return b"".join(parts)
+
+    # Simple strings, errors, integers and the RESP3 null/double/boolean/big number are a single line
+    return line
+
+def _peer_connection(worker: int):
+    connections = getattr(_PEER_CONNECTIONS, "connections", None)
+    if connections is None:
+        connections = _PEER_CONNECTIONS.connections = {}
+
+    if worker not in connections:
+        peer = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        peer.connect(WORKER_SOCKET_PATHS[worker])
+        # [socket, reader, RESP version negotiated on this peer connection]
+        connections[worker] = [peer, peer.makefile("rb"), 2]
+    return connections[worker]
+
+def forward_command(worker: int, raw_command: bytes, protocol: int = 2) -> bytes:
+    """
+    Sends a RESP-encoded command to the owning worker and returns its raw reply.
+    The peer connection is switched (HELLO) to the client's RESP version first, so
+    the relayed reply is already in the client's protocol.
+    """
+    try:
+        connection = _peer_connection(worker)
+        peer, reader, peer_protocol = connection
+        if peer_protocol != protocol:
+            peer.sendall(resp.bulk_array((b"HELLO", b"%d" % protocol)))
+            read_resp_reply(reader)
+            connection[2] = protocol
+        peer.sendall(raw_command)
+        return read_resp_reply(reader)
+    except (OSError, ConnectionError, ValueError) as e:
+        print(f"Workers: Forwarding to worker {worker} failed: {e}")
+        # Drop the broken connection so the next command reconnects
+        connections = getattr(_PEER_CONNECTIONS, "connections", {})
+        peer_entry = connections.pop(worker, None)
+        if peer_entry:
+            peer_entry[0].close()
+        return b"-ERR worker " + str(worker).encode() + b" unavailable\r\n"
+
+def _split_array(reply: bytes) -> list[bytes]:
+    """The raw elements of an array reply."""
+    reader = io.BytesIO(reply)
+    count = int(reader.readline()[1:-2])
+    return [read_resp_reply(reader) for _ in range(max(count, 0))]
+
+def _is_error(reply: bytes) -> bool:
+    return reply[:1] in (b"-", b"!")
+
+def execute_on_all_workers(command: str, arguments: list, protocol: int) -> bytes:
+    """Runs one of ALL_WORKERS_COMMANDS on every worker (this one included) and merges the replies."""
+    raw_command = resp.bulk_array([command.encode()] + arguments)
+    replies = [forward_command(worker, raw_command, protocol) for worker in range(WORKER_COUNT)]
+    for reply in replies:
+        if _is_error(reply):
+            return reply
+    if command == "KEYS":
+        keys = [key for reply in replies for key in _split_array(reply)]
+        return resp.array_header(len(keys)) + b"".join(keys)
+    if command in ("DBSIZE", "PUBLISH", "SPUBLISH"):
+        return resp.integer(sum(int(reply[1:-2]) for reply in replies))
+    return replies[0]  # FLUSHALL / FLUSHDB: +OK everywhere
+
+def execute_split(command: str, arguments: list, protocol: int) -> bytes:
+    """Runs one of SPLIT_COMMANDS as one command per worker owning some of its keys."""
+    step = 2 if command == "MSET" else 1
+    if not arguments or len(arguments) % step:
+        return b"-ERR wrong number of arguments for '" + command.lower().encode() + b"' command\r\n"
+
+    # worker -> (positions of its keys, its arguments)
+    parts = {}
+    for position in range(0, len(arguments), step):
+        positions, part = parts.setdefault(worker_for_key(arguments[position]), ([], []))
+        positions.append(position // step)
+        part.extend(arguments[position:position + step])
+
+    replies = {}
+    for worker, (_, part) in parts.items():
+        reply = forward_command(worker, resp.bulk_array([command.encode()] + part), protocol)
+        if _is_error(reply):
+            return reply
+        replies[worker] = reply
+
+    if command == "MGET":
+        values = [None] * len(arguments)
+        for worker, (positions, _) in parts.items():
+            for position, value in zip(positions, _split_array(replies[worker])):
+                values[position] = value
+        return resp.array_header(len(values)) + b"".join(values)
+    if command == "MSET":
+        return resp.OK
+    return resp.integer(sum(int(reply[1:-2]) for reply in replies.values()))  # DEL / UNLINK
+
+def pinned_worker() -> int | None:
+    """The worker the calling client's transaction is pinned to by WATCH, if any."""
+    pin = getattr(_PEER_CONNECTIONS, "pin", None)
+    return None if pin is None else pin["worker"]
+
+def watch_on_worker(worker: int, arguments: list, protocol: int) -> bytes:
+    """WATCH of keys owned by `worker`: pins the client's transaction there."""
+    reply = forward_command(worker, resp.bulk_array([b"WATCH"] + arguments), protocol)
+    if not _is_error(reply):
+        _PEER_CONNECTIONS.pin = {"worker": worker, "multi": False, "aborted": False}
+    return reply
+
+def route_pinned(command: str, arguments: list, protocol: int) -> bytes | None:
+    """
+    Runs a command of a client whose transaction is pinned to another worker. Returns the
+    reply, or None when the command is routed as usual: outside MULTI, everything but
+    WATCH, MULTI, EXEC, DISCARD and UNWATCH is.
+    """
+    pin = _PEER_CONNECTIONS.pin
+    worker = pin["worker"]
+    route = route_command(command, arguments)
+
+    if command == "WATCH" and route != worker:
+        return CROSS_WORKER_ERROR
+    if command in ("EXEC", "DISCARD") or (command == "UNWATCH" and not pin["multi"]):
+        _PEER_CONNECTIONS.pin = None
+        if command == "EXEC" and pin["aborted"]:
+            forward_command(worker, resp.bulk_array([b"DISCARD"]), protocol)
+            return EXECABORT_ERROR
+    elif pin["multi"]:
+        # Queued on the pinned worker: only its keys are there
+        keys = get_command_keys(command, arguments)
+        if command in ALL_WORKERS_COMMANDS or (keys and route != worker):
+            pin["aborted"] = True
+            return MULTI_FORWARD_ERROR
+    elif command not in ("WATCH", "MULTI"):
+        return None
+
+    reply = forward_command(worker, resp.bulk_array([command.encode()] + arguments), protocol)
+    if command == "MULTI" and reply == resp.OK:
+        pin["multi"] = True
+    return reply
+
+def close_peer_connections():
+    """Closes the calling thread's peer connections (called when its client disconnects)."""
+    _PEER_CONNECTIONS.pin = None
+    connections = getattr(_PEER_CONNECTIONS, "connections", {})
+    for peer, reader, _ in connections.values():
+        try:
+            reader.close()
+            peer.close()
+        except OSError:
+            pass
+    connections.clear()
+
+def _drop_foreign_keys(data_store: dict, data_lock):
+    """After fork, every worker keeps only the keys hashing into its own slot range."""
+    with data_lock:
+        for key in list(data_store.keys()):
+            if worker_for_key(key) != WORKER_INDEX:
+                del data_store[key]
+
+def _serve_peers(path: str, handle_connection):
+    """Accepts forwarded-command connections from the other workers."""
+    if os.path.exists(path):
+        os.unlink(path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+
+    while True:
+        connection, _ = listener.accept()
+        threading.Thread(target=handle_connection, args=(connection, path), daemon=True).start()
+
+def run_workers(port: int, worker_count: int, serve, data_store: dict, data_lock, handle_connection):
+    """
+    Forks `worker_count` worker processes and supervises them.
+    `serve(port)` is the regular accept loop; each worker calls it after setting up
+    its partition and its peer listener.
+    """
+    global WORKER_COUNT, WORKER_INDEX, WORKER_SOCKET_PATHS
+
+    WORKER_COUNT = worker_count
+    WORKER_SOCKET_PATHS = [worker_socket_path(port, i) for i in range(worker_count)]
+
+    children = []
+    for index in range(worker_count):
+        pid = os.fork()
+        if pid == 0:
+            # --- Worker process ---
+            WORKER_INDEX = index
+            _drop_foreign_keys(data_store, data_lock)
+            threading.Thread(
+                target=_serve_peers,
+                args=(WORKER_SOCKET_PATHS[index], handle_connection),
+                daemon=True,
+            ).start()
+            print(f"Workers: Worker {index} (pid {os.getpid()}) serving slots "
+                  f"{index * CLUSTER_SLOTS // worker_count}-{(index + 1) * CLUSTER_SLOTS // worker_count - 1}")
+            serve(port)
+            os._exit(0)
+        children.append(pid)
+
+    # --- Supervisor process: forward termination signals and reap workers ---
+    def _terminate(signum, frame):
+        for child in children:
+            try:
+                os.kill(child, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, _terminate)
+    signal.signal(signal.SIGINT, _terminate)
+
+    for _ in children:
+        pid, status = os.wait()
+        print(f"Workers: Worker pid {pid} exited with status {status}")
+
+    for path in WORKER_SOCKET_PATHS:
+        if os.path.exists(path):
+            os.unlink(path)
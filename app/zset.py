@@ -0,0 +1,131 @@
+# app/zset.py
+
+# Sorted set storage. A SortedSet is the member -> score dict the rest of the server
+# already works with, plus an ordered index of its (score, member) pairs, so rank and
+# score-range lookups (ZRANK, ZRANGE, GEOSEARCH) no longer sort the whole set each time.
+#
+# The index is a list of sorted chunks (the layout of the sortedcontainers package):
+# an insert or delete only shifts one chunk of at most 2 * CHUNK_SIZE pairs, and a
+# lookup is a bisect over the chunk maximums followed by a bisect inside one chunk.
+#
+# Every change to a sorted set gives it a new `version`, drawn from one counter shared by
+# all sorted sets, so a version never repeats even when a key is deleted and recreated.
+# Cached results (GEOSEARCH) remember the version they were computed from.
+
+from bisect import bisect_left, insort
+import itertools
+
+_VERSIONS = itertools.count(1)
+
+CHUNK_SIZE = 512
+
+class ScoreIndex:
+    """(score, member) pairs in ascending order."""
+
+    def __init__(self, pairs=()):
+        pairs = sorted(pairs)
+        self._chunks = [pairs[i:i + CHUNK_SIZE] for i in range(0, len(pairs), CHUNK_SIZE)]
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+        self._len = len(pairs)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield from chunk
+
+    def add(self, pair: tuple):
+        if not self._chunks:
+            self._chunks.append([pair])
+            self._maxes.append(pair)
+        else:
+            i = bisect_left(self._maxes, pair)
+            if i == len(self._maxes):
+                # Past the current maximum: append to the last chunk
+                i -= 1
+                self._chunks[i].append(pair)
+                self._maxes[i] = pair
+            else:
+                insort(self._chunks[i], pair)
+
+            chunk = self._chunks[i]
+            if len(chunk) > 2 * CHUNK_SIZE:
+                self._chunks[i:i + 1] = [chunk[:CHUNK_SIZE], chunk[CHUNK_SIZE:]]
+                self._maxes[i:i + 1] = [chunk[CHUNK_SIZE - 1], chunk[-1]]
+        self._len += 1
+
+    def remove(self, pair: tuple):
+        """Removes a pair that is known to be in the index."""
+        i = bisect_left(self._maxes, pair)
+        chunk = self._chunks[i]
+        del chunk[bisect_left(chunk, pair)]
+        if chunk:
+            self._maxes[i] = chunk[-1]
+        else:
+            del self._chunks[i]
+            del self._maxes[i]
+        self._len -= 1
+
+    def rank(self, pair: tuple) -> int:
+        """0-based position of a pair that is in the index."""
+        i = bisect_left(self._maxes, pair)
+        position = sum(len(chunk) for chunk in self._chunks[:i])
+        return position + bisect_left(self._chunks[i], pair)
+
+    def slice(self, start: int, stop: int) -> list:
+        """Pairs at positions start (inclusive) to stop (exclusive), both within bounds."""
+        result = []
+        for chunk in self._chunks:
+            if start >= len(chunk):
+                start -= len(chunk)
+                stop -= len(chunk)
+                continue
+            result.extend(chunk[start:stop])
+            stop -= len(chunk)
+            if stop <= 0:
+                break
+            start = 0
+        return result
+
+    def score_range(self, min_score: float, max_score: float):
+        """Yields the pairs with min_score <= score < max_score."""
+        # (score,) sorts before every (score, member) pair with the same score
+        low = (min_score,)
+        i = bisect_left(self._maxes, low)
+        if i == len(self._chunks):
+            return
+        j = bisect_left(self._chunks[i], low)
+        for chunk in self._chunks[i:]:
+            for k in range(j, len(chunk)):
+                pair = chunk[k]
+                if pair[0] >= max_score:
+                    return
+                yield pair
+            j = 0
+
+class SortedSet(dict):
+    """
+    member -> score, with `index` and `version` kept in step by item assignment and
+    deletion (the only ways the data store modifies a sorted set).
+    """
+
+    def __init__(self, members=()):
+        super().__init__(members)
+        self.index = ScoreIndex((score, member) for member, score in self.items())
+        self.version = next(_VERSIONS)
+
+    def __setitem__(self, member: bytes, score: float):
+        old_score = self.get(member)
+        if old_score is not None:
+            if old_score == score:
+                return
+            self.index.remove((old_score, member))
+        super().__setitem__(member, score)
+        self.index.add((score, member))
+        self.version = next(_VERSIONS)
+
+    def __delitem__(self, member: bytes):
+        self.index.remove((self[member], member))
+        super().__delitem__(member)
+        self.version = next(_VERSIONS)
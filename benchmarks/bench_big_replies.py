@@ -0,0 +1,44 @@
+# benchmarks/bench_big_replies.py
+
+# Reply writer (user-033): time for the server to produce LRANGE 0 -1 of a 100k-element
+# list and XRANGE - + of a 100k-entry stream. Replies are received raw, not parsed, so
+# the client's parsing does not hide the server's serialization.
+#
+#   python -m benchmarks.bench_big_replies
+
+from benchmarks.common import argument_parser, best_of, encode, report, server
+
+ENTRIES = 100000
+BATCH = 1000
+
+def _resp2_size(reply) -> int:
+    """Bytes of `reply` (as parsed by Client.read) written in RESP2."""
+    if isinstance(reply, list):
+        return len(b"*%d\r\n" % len(reply)) + sum(_resp2_size(element) for element in reply)
+    return len(b"$%d\r\n" % len(reply)) + len(reply) + 2
+
+def _receive(client, command: bytes, size: int):
+    client.socket.sendall(command)
+    received = 0
+    while received < size:
+        received += len(client.socket.recv(1 << 20))
+
+def main():
+    options = argument_parser("LRANGE and XRANGE of 100k elements").parse_args()
+    with server(options.root) as node:
+        client = node.client()
+        for start in range(0, ENTRIES, BATCH):
+            client.call("RPUSH", "list", *[b"element-%d" % i for i in range(start, start + BATCH)])
+            client.pipeline([encode("XADD", "stream", "*", "field", b"value-%d" % i)
+                             for i in range(start, start + BATCH)])
+
+        for label, arguments in (("LRANGE 0 -1", ("LRANGE", "list", 0, -1)),
+                                 ("XRANGE - +", ("XRANGE", "stream", "-", "+"))):
+            size = _resp2_size(client.call(*arguments))
+            # The raw socket is read from here on; the buffered reader must be empty
+            command = encode(*arguments)
+            seconds = best_of(lambda: _receive(client, command, size))
+            report(f"{label} of {ENTRIES // 1000}k ({size // 1024} KiB)", seconds * 1000, "ms")
+
+if __name__ == "__main__":
+    main()
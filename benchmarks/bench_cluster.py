@@ -0,0 +1,35 @@
+# benchmarks/bench_cluster.py
+
+# Cluster mode (user-027): the cost of the per-command slot check. Pipelined GET/SET on a
+# standalone server, on a single node owning every slot, and on a node that owns none of
+# the keys and answers -MOVED.
+#
+#   python -m benchmarks.bench_cluster
+
+from benchmarks.common import argument_parser, best_of, encode, free_port, report, server, Client
+
+COMMANDS = 20000
+
+def _throughput(port: int) -> float:
+    client = Client(port)
+    commands = [encode("SET", f"{{user{i % 100}}}:key", "v") if i % 2 else encode("GET", f"{{user{i % 100}}}:key")
+                for i in range(COMMANDS)]
+    return COMMANDS / best_of(lambda: client.pipeline(commands))
+
+def main():
+    options = argument_parser("Slot check cost of cluster mode").parse_args()
+    with server(options.root) as standalone:
+        report("standalone", _throughput(standalone.port), "ops/s")
+
+    port = free_port()
+    with server(options.root, "--cluster-enabled", "yes", "--cluster-nodes", f"127.0.0.1:{port}:0-16383",
+                port=port) as node:
+        report("cluster, every slot local", _throughput(node.port), "ops/s")
+
+    port = free_port()
+    nodes = f"127.0.0.1:{port}:0-0 127.0.0.1:{free_port()}:1-16383"
+    with server(options.root, "--cluster-enabled", "yes", "--cluster-nodes", nodes, port=port) as node:
+        report("cluster, every key -MOVED", _throughput(node.port), "ops/s")
+
+if __name__ == "__main__":
+    main()
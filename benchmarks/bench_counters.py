@@ -0,0 +1,34 @@
+# benchmarks/bench_counters.py
+
+# Integer-encoded strings (user-031): INCR throughput on a few hot counters and the
+# resident memory of many counters, values below and above the shared 0-9999 pool.
+# Commands go one round trip at a time, since trees before user-032 cannot pipeline.
+#
+#   python -m benchmarks.bench_counters [--counters 200000]
+
+import time
+
+from benchmarks.common import argument_parser, report, server
+
+INCRS = 20000
+
+def main():
+    parser = argument_parser("INCR throughput and memory of integer counters")
+    parser.add_argument("--counters", type=int, default=200000)
+    options = parser.parse_args()
+
+    with server(options.root) as node:
+        client = node.client()
+        start = time.perf_counter()
+        for i in range(INCRS):
+            client.call("INCR", f"hot:{i % 10}")
+        report("INCR", INCRS / (time.perf_counter() - start), "ops/s")
+
+        for label, offset in (("small (0-9999)", 0), ("large (>= 10^9)", 10 ** 9)):
+            before = node.rss_kib()
+            for i in range(options.counters):
+                client.call("SET", f"{label[0]}:{i}", offset + i % 10000)
+            report(f"memory per {label} counter", (node.rss_kib() - before) * 1024 / options.counters, "bytes")
+
+if __name__ == "__main__":
+    main()
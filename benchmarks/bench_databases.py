@@ -0,0 +1,57 @@
+# benchmarks/bench_databases.py
+
+# Logical databases (user-049): pipelined SET/GET throughput in database 0 and, after
+# SELECT, in database 3, to show what resolving keys through the selected database costs;
+# then SWAPDB with a large and an empty database, which should take the same time since
+# only two slots are swapped. On a tree without SELECT only the database 0 numbers are
+# reported.
+#
+#   python -m benchmarks.bench_databases [--keys 200000]
+
+import time
+
+from benchmarks.common import argument_parser, best_of, encode, report, server
+
+OPERATIONS = 20000
+PIPELINE = 100
+
+def _set_get_throughput(client) -> float:
+    commands = [encode("SET", f"key:{i}", "v") if i % 2 else encode("GET", f"key:{i - 1}") for i in range(PIPELINE)]
+
+    def run():
+        for _ in range(OPERATIONS // PIPELINE):
+            client.pipeline(commands)
+
+    return OPERATIONS / best_of(run)
+
+def _fill(client, count: int):
+    for first in range(0, count, 1000):
+        client.pipeline([encode("SET", f"big:{i}", "v") for i in range(first, min(first + 1000, count))])
+
+def _swapdb_us(client, first: int, second: int) -> float:
+    samples = []
+    for _ in range(200):
+        start = time.perf_counter()
+        client.call("SWAPDB", first, second)
+        samples.append(time.perf_counter() - start)
+    return sorted(samples)[len(samples) // 2] * 1e6
+
+def main():
+    parser = argument_parser("SET/GET throughput per database and SWAPDB cost")
+    parser.add_argument("--keys", type=int, default=200000)
+    options = parser.parse_args()
+    with server(options.root) as node:
+        client = node.client()
+        report("db 0: pipelined SET/GET", _set_get_throughput(client), "ops/s")
+        if client.call("SELECT", 3) != "OK":
+            print("SELECT is not supported by this tree")
+            return
+        report("db 3: pipelined SET/GET", _set_get_throughput(client), "ops/s")
+        report("SWAPDB of two empty databases, median", _swapdb_us(client, 5, 6), "us")
+        client.call("SELECT", 1)
+        _fill(client, options.keys)
+        report(f"SWAPDB of {options.keys} keys with an empty database, median", _swapdb_us(client, 1, 2), "us")
+        report("SET/GET after the swaps", _set_get_throughput(client), "ops/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# benchmarks/bench_eviction.py
+
+# maxmemory eviction (user-044): a cache workload, GET then SET on a miss, over 20k keys with
+# Zipf(1) popularity and 100-byte values, with no limit and with maxmemory 600kb (room for
+# about 10% of the keys) under each allkeys policy. A 1gb limit, never reached, shows the cost
+# of the per-key accounting alone. Reports hit ratio, throughput and the evicted_keys counter.
+#
+#   python -m benchmarks.bench_eviction [--lookups 60000]
+
+import bisect
+import itertools
+import random
+import time
+
+from benchmarks.common import argument_parser, report, server
+
+KEYS = 20000
+VALUE = b"v" * 100
+MAXMEMORY = "600kb"
+
+def main():
+    parser = argument_parser("hit ratio of a Zipfian cache workload per eviction policy")
+    parser.add_argument("--lookups", type=int, default=60000)
+    options = parser.parse_args()
+    generator = random.Random(7)
+    cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(KEYS)))
+    ranks = list(range(KEYS))
+    generator.shuffle(ranks)
+    lookups = [f"key:{ranks[min(bisect.bisect(cumulative, generator.random() * cumulative[-1]), KEYS - 1)]}"
+               for _ in range(options.lookups)]
+
+    runs = [(None, None), ("1gb", "allkeys-lru")] + [(MAXMEMORY, policy) for policy in ("allkeys-lru", "allkeys-lfu", "allkeys-random")]
+    for maxmemory, policy in runs:
+        with server(options.root) as node:
+            client = node.client()
+            if maxmemory:
+                client.call("CONFIG", "SET", "maxmemory", maxmemory)
+                client.call("CONFIG", "SET", "maxmemory-policy", policy)
+            hits = 0
+            start = time.perf_counter()
+            for key in lookups:
+                if client.call("GET", key) is not None:
+                    hits += 1
+                else:
+                    client.call("SET", key, VALUE)
+            elapsed = time.perf_counter() - start
+            stats = client.call("INFO", "stats").decode()
+            evicted = next((line.split(":")[1] for line in stats.split("\r\n") if line.startswith("evicted_keys:")), "0")
+            label = f"{maxmemory} {policy}" if maxmemory else "no limit"
+            report(f"{label}: hit ratio", 100 * hits / len(lookups), "%")
+            report(f"{label}: commands", (2 * len(lookups) - hits) / elapsed, "ops/s")
+            report(f"{label}: evicted keys", int(evicted), "")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# benchmarks/bench_fanout.py
+
+# PUBLISH fanout (user-037): publishes of 1 KB messages to 1000 subscribers of one channel,
+# one of which never reads (a 4 KB receive buffer that fills up). The other subscribers are
+# drained by a thread. A server that writes to subscribers synchronously blocks the
+# publisher once the stalled socket is full; the publisher gives up after 20 s.
+#
+#   python -m benchmarks.bench_fanout [--publishes 4000]
+
+import selectors
+import socket
+import threading
+import time
+
+from benchmarks.common import argument_parser, encode, report, server
+
+SUBSCRIBERS = 1000
+TIMEOUT = 20
+
+def _drain(selector, stop: threading.Event):
+    while not stop.is_set():
+        for key, _ in selector.select(0.1):
+            try:
+                key.fileobj.recv(1 << 20)
+            except (BlockingIOError, ConnectionError):
+                pass
+
+def main():
+    parser = argument_parser("PUBLISH to 1000 subscribers, one of them stalled")
+    parser.add_argument("--publishes", type=int, default=4000)
+    options = parser.parse_args()
+
+    with server(options.root) as node:
+        selector = selectors.DefaultSelector()
+        readers = []
+        for _ in range(SUBSCRIBERS - 1):
+            subscriber = socket.create_connection(("127.0.0.1", node.port))
+            subscriber.sendall(encode("SUBSCRIBE", "channel"))
+            readers.append(subscriber)
+        stalled = socket.socket()
+        stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        stalled.connect(("127.0.0.1", node.port))
+        stalled.sendall(encode("SUBSCRIBE", "channel"))
+        time.sleep(1)
+        for subscriber in readers:
+            subscriber.setblocking(False)
+            selector.register(subscriber, selectors.EVENT_READ)
+        stop = threading.Event()
+        threading.Thread(target=_drain, args=(selector, stop), daemon=True).start()
+
+        publisher = node.client()
+        publisher.socket.settimeout(TIMEOUT)
+        payload = b"x" * 1024
+        done = 0
+        start = time.perf_counter()
+        try:
+            for done in range(1, options.publishes + 1):
+                publisher.call("PUBLISH", "channel", payload)
+        except socket.timeout:
+            print(f"publisher blocked after {done - 1} publishes")
+        else:
+            report(f"{options.publishes} publishes to {SUBSCRIBERS} subscribers",
+                   options.publishes / (time.perf_counter() - start), "publishes/s")
+        stop.set()
+
+if __name__ == "__main__":
+    main()
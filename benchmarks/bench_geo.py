@@ -0,0 +1,43 @@
+# benchmarks/bench_geo.py
+
+# GEOSEARCH (user-041): load 1M random points with pipelined GEOADD, then time GEOSEARCH
+# BYRADIUS from random centers at 1, 10, 100 and 1000 km. Trees that scan every member
+# take seconds per query, so lower --queries for them.
+#
+#   python -m benchmarks.bench_geo [--points 1000000] [--queries 20]
+
+import random
+import time
+
+from benchmarks.common import argument_parser, encode, report, server
+
+BATCH = 2000
+
+def main():
+    parser = argument_parser("GEOSEARCH BYRADIUS on a 1M-point key")
+    parser.add_argument("--points", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=20)
+    options = parser.parse_args()
+    random.seed(3)
+
+    with server(options.root) as node:
+        client = node.client()
+        start = time.perf_counter()
+        for first in range(0, options.points, BATCH):
+            client.pipeline([
+                encode("GEOADD", "points", "%.6f" % random.uniform(-180, 180), "%.6f" % random.uniform(-85, 85), i)
+                for i in range(first, min(options.points, first + BATCH))])
+        report(f"GEOADD of {options.points} points", time.perf_counter() - start, "s")
+
+        for radius in (1, 10, 100, 1000):
+            timings, hits = [], 0
+            for _ in range(options.queries):
+                longitude, latitude = random.uniform(-180, 180), random.uniform(-80, 80)
+                start = time.perf_counter()
+                hits += len(client.call("GEOSEARCH", "points", "FROMLONLAT", longitude, latitude, "BYRADIUS", radius, "km"))
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            report(f"GEOSEARCH {radius} km p50 (avg {hits / options.queries:.0f} hits)", timings[len(timings) // 2] * 1000, "ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# benchmarks/bench_geo_cache.py
+
+# GEOSEARCH result cache (user-043): 200k store locations around 50 cities and 1000 distinct
+# "BYRADIUS 5|10|25 km COUNT 20 WITHDIST" queries with Zipf(1.1) popularity, run with the
+# cache off, with 1 MB, and with 1 MB / 100 KB while a GEOADD to the key lands every 1000
+# queries.
+#
+#   python -m benchmarks.bench_geo_cache [--queries 10000]
+
+import bisect
+import itertools
+import random
+import time
+
+from benchmarks.common import argument_parser, report, server
+
+LOCATIONS = 200000
+DISTINCT_QUERIES = 1000
+
+def _info_stats(client) -> dict:
+    text = client.call("INFO", "stats").decode()
+    return dict(line.split(":", 1) for line in text.split("\r\n") if ":" in line)
+
+def main():
+    parser = argument_parser("GEOSEARCH cache with a Zipfian query mix")
+    parser.add_argument("--queries", type=int, default=10000)
+    options = parser.parse_args()
+    generator = random.Random(4)
+    cities = [(generator.uniform(-120, 140), generator.uniform(-40, 60)) for _ in range(50)]
+
+    with server(options.root) as node:
+        client = node.client()
+        for first in range(0, LOCATIONS, 5000):
+            arguments = []
+            for i in range(first, first + 5000):
+                longitude, latitude = generator.choice(cities)
+                arguments += ["%.6f" % (longitude + generator.gauss(0, 0.3)),
+                              "%.6f" % (latitude + generator.gauss(0, 0.3)), f"store:{i}"]
+            client.call("GEOADD", "stores", *arguments)
+
+        queries = []
+        for _ in range(DISTINCT_QUERIES):
+            longitude, latitude = generator.choice(cities)
+            queries.append(("GEOSEARCH", "stores", "FROMLONLAT", "%.4f" % (longitude + generator.gauss(0, 0.2)),
+                            "%.4f" % (latitude + generator.gauss(0, 0.2)), "BYRADIUS", generator.choice([5, 10, 25]),
+                            "km", "COUNT", 20, "WITHDIST"))
+        cumulative = list(itertools.accumulate(1 / (rank + 1) ** 1.1 for rank in range(DISTINCT_QUERIES)))
+
+        for cache, write_every in ((0, 0), (1 << 20, 0), (1 << 20, 1000), (100 << 10, 1000)):
+            client.call("CONFIG", "SET", "geo-cache-max-memory", 0)  # Start empty
+            client.call("CONFIG", "SET", "geo-cache-max-memory", cache)
+            before = _info_stats(client)
+            timings = []
+            start = time.perf_counter()
+            for n in range(options.queries):
+                if write_every and n % write_every == write_every - 1:
+                    client.call("GEOADD", "stores", "10.0", "10.0", f"new:{n}")
+                query = queries[bisect.bisect(cumulative, generator.random() * cumulative[-1])]
+                query_start = time.perf_counter()
+                client.call(*query)
+                timings.append(time.perf_counter() - query_start)
+            elapsed = time.perf_counter() - start
+            after = _info_stats(client)
+            hits = int(after["geo_cache_hits"]) - int(before["geo_cache_hits"])
+            timings.sort()
+            label = f"cache {cache // 1024} KB" + (f", GEOADD every {write_every}" if write_every else "")
+            report(f"{label}: queries", options.queries / elapsed, "queries/s")
+            report(f"{label}: p50", timings[len(timings) // 2] * 1000, "ms")
+            report(f"{label}: hit rate", 100 * hits / options.queries, "%")
+
+if __name__ == "__main__":
+    main()
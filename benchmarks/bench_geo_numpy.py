@@ -0,0 +1,59 @@
+# benchmarks/bench_geo_numpy.py
+
+# NumPy geo kernels (user-042): GEOADD of 100k members (one per command, pipelined, and
+# 1000 per command) and GEOSEARCH BYRADIUS on 1M points, whose candidates are filtered as
+# arrays when the server can import NumPy. Run it once as is and once with --numpy pointing
+# at a directory that has NumPy, if it is not installed.
+#
+#   python -m benchmarks.bench_geo_numpy [--numpy /path/to/site-packages]
+
+import os
+import random
+import time
+
+from benchmarks.common import argument_parser, encode, report, server
+
+SEARCHES = 40
+
+def _points(count: int, seed: int) -> list[tuple]:
+    generator = random.Random(seed)
+    return [("%.6f" % generator.uniform(-180, 180), "%.6f" % generator.uniform(-85, 85), i) for i in range(count)]
+
+def _load(client, key: str, points: list[tuple], per_command: int) -> float:
+    start = time.perf_counter()
+    if per_command == 1:
+        for first in range(0, len(points), 2000):
+            client.pipeline([encode("GEOADD", key, *point) for point in points[first:first + 2000]])
+    else:
+        for first in range(0, len(points), per_command):
+            client.call("GEOADD", key, *[part for point in points[first:first + per_command] for part in point])
+    return time.perf_counter() - start
+
+def main():
+    parser = argument_parser("GEOADD and GEOSEARCH with and without NumPy")
+    parser.add_argument("--numpy", help="directory added to the server's PYTHONPATH")
+    options = parser.parse_args()
+    env = None
+    if options.numpy:
+        env = dict(os.environ, PYTHONPATH=options.numpy)
+
+    with server(options.root, env=env) as node:
+        client = node.client()
+        points = _points(100000, 1)
+        report("GEOADD 100k, 1 member per command", _load(client, "single", points, 1), "s")
+        report("GEOADD 100k, 1000 members per command", _load(client, "bulk", points, 1000), "s")
+
+        _load(client, "points", _points(1000000, 2), 10000)
+        generator = random.Random(9)
+        for radius in (100, 500, 1000):
+            timings = []
+            for _ in range(SEARCHES):
+                longitude, latitude = generator.uniform(-180, 180), generator.uniform(-60, 60)
+                start = time.perf_counter()
+                client.call("GEOSEARCH", "points", "FROMLONLAT", longitude, latitude, "BYRADIUS", radius, "km")
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            report(f"GEOSEARCH 1M points, {radius} km p50", timings[SEARCHES // 2] * 1000, "ms")
+
+if __name__ == "__main__":
+    main()
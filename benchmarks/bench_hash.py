@@ -0,0 +1,38 @@
+# benchmarks/bench_hash.py
+
+# Hashes (user-028): memory and speed of small hashes kept in the compact flat-list
+# (listpack) encoding against the dict (hashtable) encoding, forced with
+# CONFIG SET hash-max-listpack-entries 0.
+#
+#   python -m benchmarks.bench_hash
+
+from benchmarks.common import argument_parser, best_of, encode, report, server
+
+HASHES = 50000
+FIELDS = 10
+BATCH = 1000
+
+def _measure(root: str, listpack_entries: int):
+    with server(root) as node:
+        client = node.client()
+        client.call("CONFIG", "SET", "hash-max-listpack-entries", listpack_entries)
+        before = node.rss_kib()
+        fields = [part for i in range(FIELDS) for part in (f"field{i}", f"value{i}")]
+        for start in range(0, HASHES, BATCH):
+            client.pipeline([encode("HSET", f"user:{i}", *fields) for i in range(start, start + BATCH)])
+        encoding = client.call("OBJECT", "ENCODING", "user:0").decode()
+        kib = node.rss_kib() - before
+
+        reads = [encode("HGET", f"user:{i}", f"field{i % FIELDS}") for i in range(0, HASHES, 5)]
+        writes = [encode("HINCRBY", f"user:{i}", "visits", 1) for i in range(0, HASHES, 5)]
+        report(f"{encoding}: memory per hash", kib * 1024 / HASHES, "bytes")
+        report(f"{encoding}: HGET", len(reads) / best_of(lambda: client.pipeline(reads)), "ops/s")
+        report(f"{encoding}: HINCRBY", len(writes) / best_of(lambda: client.pipeline(writes)), "ops/s")
+
+def main():
+    options = argument_parser("Small hashes: listpack against hashtable").parse_args()
+    _measure(options.root, 128)
+    _measure(options.root, 0)
+
+if __name__ == "__main__":
+    main()
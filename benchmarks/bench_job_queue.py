@@ -0,0 +1,58 @@
+# benchmarks/bench_job_queue.py
+
+# Blocking list pops (user-039): a job queue with 1 producer RPUSHing timestamped jobs and
+# 100 consumers in BLPOP. Reports jobs/s and the latency from push to pop.
+#
+#   python -m benchmarks.bench_job_queue [--jobs 20000] [--batch 1]
+
+import threading
+import time
+
+from benchmarks.common import argument_parser, report, server
+
+CONSUMERS = 100
+
+def main():
+    parser = argument_parser("1 producer and 100 BLPOP consumers")
+    parser.add_argument("--jobs", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=1, help="jobs per RPUSH")
+    options = parser.parse_args()
+
+    with server(options.root) as node:
+        latencies = []
+        lock = threading.Lock()
+        finished = threading.Event()
+
+        def consumer():
+            client = node.client()
+            while not finished.is_set():
+                reply = client.call("BLPOP", "jobs", 1)
+                if reply is None:
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - float(reply[1]))
+                    if len(latencies) == options.jobs:
+                        finished.set()
+
+        threads = [threading.Thread(target=consumer, daemon=True) for _ in range(CONSUMERS)]
+        for thread in threads:
+            thread.start()
+        time.sleep(1)  # Every consumer blocked
+
+        producer = node.client()
+        start = time.perf_counter()
+        for sent in range(0, options.jobs, options.batch):
+            count = min(options.batch, options.jobs - sent)
+            producer.call("RPUSH", "jobs", *[repr(time.perf_counter()) for _ in range(count)])
+        finished.wait(120)
+        elapsed = time.perf_counter() - start
+        for thread in threads:
+            thread.join()
+
+        latencies.sort()
+        report(f"{len(latencies)} jobs, {options.batch} per RPUSH", len(latencies) / elapsed, "jobs/s")
+        report("push to pop latency p50", latencies[len(latencies) // 2] * 1000, "ms")
+        report("push to pop latency p99", latencies[int(len(latencies) * 0.99)] * 1000, "ms")
+
+if __name__ == "__main__":
+    main()
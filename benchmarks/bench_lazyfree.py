@@ -0,0 +1,71 @@
+# benchmarks/bench_lazyfree.py
+
+# Lazy freeing (user-045): one client runs GET in a loop while another deletes a large key
+# (an 8M-element list or a 1M-field hash) with DEL, UNLINK, FLUSHALL SYNC or FLUSHALL ASYNC.
+# Reports how long the deleting command took and the GET latency in the 500 ms after it.
+#
+#   python -m benchmarks.bench_lazyfree [--list 8000000] [--hash 1000000]
+
+import threading
+import time
+
+from benchmarks.common import argument_parser, encode, report, server
+
+BATCH = 5000
+
+def _fill(client, kind: str, size: int):
+    commands = []
+    for first in range(0, size, BATCH):
+        if kind == "list":
+            commands.append(encode("RPUSH", "big", *range(first, first + BATCH)))
+        else:
+            commands.append(encode("HSET", "big", *[part for i in range(first, first + BATCH) for part in (b"field:%d" % i, b"v")]))
+        if len(commands) == 20:
+            client.pipeline(commands)
+            commands = []
+    if commands:
+        client.pipeline(commands)
+
+def _delete_under_load(node, kind: str, size: int, command: tuple):
+    client = node.client()
+    _fill(client, kind, size)
+    client.call("SET", "probe", "x")
+    latencies = []
+    stop = threading.Event()
+
+    def prober():
+        probe = node.client()
+        while not stop.is_set():
+            start = time.perf_counter()
+            probe.call("GET", "probe")
+            latencies.append((start, time.perf_counter() - start))
+
+    thread = threading.Thread(target=prober)
+    thread.start()
+    time.sleep(0.5)
+    start = time.perf_counter()
+    client.call(*command)
+    command_ms = (time.perf_counter() - start) * 1000
+    time.sleep(1)
+    stop.set()
+    thread.join()
+    window = sorted(latency for sent, latency in latencies if start - 0.01 <= sent < start + 0.5)
+    label = f"{kind} {size // 1000}k, {' '.join(map(str, command[:2 if command[0] == 'FLUSHALL' else 1]))}"
+    report(f"{label}: command", command_ms, "ms")
+    report(f"{label}: GET p99", window[int(0.99 * (len(window) - 1))] * 1000, "ms")
+    report(f"{label}: GET max", window[-1] * 1000, "ms")
+
+def main():
+    parser = argument_parser("GET latency while deleting a large key")
+    parser.add_argument("--list", type=int, default=8000000)
+    parser.add_argument("--hash", type=int, default=1000000)
+    options = parser.parse_args()
+    for kind, size, commands in (("list", options.list, [("DEL", "big"), ("UNLINK", "big"),
+                                                         ("FLUSHALL", "SYNC"), ("FLUSHALL", "ASYNC")]),
+                                 ("hash", options.hash, [("DEL", "big"), ("UNLINK", "big")])):
+        for command in commands:
+            with server(options.root) as node:
+                _delete_under_load(node, kind, size, command)
+
+if __name__ == "__main__":
+    main()
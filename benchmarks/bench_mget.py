@@ -0,0 +1,38 @@
+# benchmarks/bench_mget.py
+
+# MGET / MSET (user-030): fetching 100 keys with one MGET against 100 GETs, one round trip
+# each and pipelined, and writing them with one MSET against 100 SETs.
+#
+#   python -m benchmarks.bench_mget
+
+from benchmarks.common import argument_parser, best_of, encode, report, server
+
+KEYS = 100
+ROUNDS = 200
+
+def main():
+    options = argument_parser("MGET/MSET of 100 keys against 100 GETs/SETs").parse_args()
+    keys = [f"key:{i}" for i in range(KEYS)]
+    pairs = [part for key in keys for part in (key, "v" * 32)]
+    with server(options.root) as node:
+        client = node.client()
+        client.call("MSET", *pairs)
+
+        def gets():
+            for _ in range(ROUNDS):
+                for key in keys:
+                    client.call("GET", key)
+
+        pipelined = [encode("GET", key) for key in keys]
+        sets = [encode("SET", key, "v" * 32) for key in keys]
+        mget = encode("MGET", *keys)
+        mset = encode("MSET", *pairs)
+        per_batch = 1e6 / ROUNDS
+        report(f"{KEYS} GETs, one round trip each", best_of(gets, 3) * per_batch, "us/batch")
+        report(f"{KEYS} GETs, pipelined", best_of(lambda: [client.pipeline(pipelined) for _ in range(ROUNDS)]) * per_batch, "us/batch")
+        report(f"MGET of {KEYS} keys", best_of(lambda: [client.pipeline([mget]) for _ in range(ROUNDS)]) * per_batch, "us/batch")
+        report(f"{KEYS} SETs, pipelined", best_of(lambda: [client.pipeline(sets) for _ in range(ROUNDS)]) * per_batch, "us/batch")
+        report(f"MSET of {KEYS} keys", best_of(lambda: [client.pipeline([mset]) for _ in range(ROUNDS)]) * per_batch, "us/batch")
+
+if __name__ == "__main__":
+    main()
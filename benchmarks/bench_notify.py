@@ -0,0 +1,53 @@
+# benchmarks/bench_notify.py
+
+# Keyspace notifications (user-048): pipelined SET throughput with notify-keyspace-events
+# off, on (KEA) with no subscriber, with a subscriber on an unrelated channel, and with a
+# __key*__:* pattern subscriber that receives two messages per SET. Trees without
+# notifications only run the first (--disabled-only).
+#
+#   python -m benchmarks.bench_notify [--disabled-only]
+
+import threading
+
+from benchmarks.common import argument_parser, best_of, encode, report, server
+
+SETS = 20000
+
+def main():
+    parser = argument_parser("SET throughput with keyspace notifications")
+    parser.add_argument("--disabled-only", action="store_true", help="the tree has no notifications")
+    options = parser.parse_args()
+    sets = [encode("SET", f"key:{i % 1000}", "v") for i in range(SETS)]
+
+    with server(options.root) as node:
+        client = node.client()
+        throughput = lambda: SETS / best_of(lambda: client.pipeline(sets))
+        report("notifications off", throughput(), "SET/s")
+        if options.disabled_only:
+            return
+
+        client.call("CONFIG", "SET", "notify-keyspace-events", "KEA")
+        report("KEA, no subscriber", throughput(), "SET/s")
+
+        unrelated = node.client()
+        unrelated.call("SUBSCRIBE", "unrelated")
+        report("KEA, one unrelated subscriber", throughput(), "SET/s")
+
+        received = [0]
+        subscriber = node.client()
+        subscriber.call("PSUBSCRIBE", "__key*__:*")
+
+        def drain():
+            while True:
+                try:
+                    subscriber.read()
+                except (OSError, ValueError):
+                    return
+                received[0] += 1
+
+        threading.Thread(target=drain, daemon=True).start()
+        report("KEA, __key*__:* subscriber", throughput(), "SET/s")
+        report("messages received per SET", received[0] / (5 * SETS), "")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# benchmarks/bench_patterns.py
+
+# Pattern subscriptions (user-036): matching one channel against 10k patterns with the
+# prefix trie against a scan of every compiled pattern, in process, and the PUBLISH round
+# trip with 0 and 10k patterns subscribed. Patterns with a literal prefix (user:N:*) are
+# what the trie is for; patterns starting with a wildcard (*:N) all sit at its root and
+# are all evaluated, like the scan.
+#
+#   python -m benchmarks.bench_patterns
+
+import time
+
+from app.patterns import PatternIndex, compile_glob
+from benchmarks.common import argument_parser, report, server
+
+PATTERNS = 10000
+SUBSCRIBERS = 10
+PUBLISHES = 2000
+
+def _match_us(patterns: list[bytes], channel: bytes) -> tuple[float, float]:
+    index = PatternIndex()
+    for pattern in patterns:
+        index.add(pattern)
+    compiled = [(pattern, compile_glob(pattern)) for pattern in patterns]
+    assert sorted(index.match(channel)) == sorted(p for p, regex in compiled if regex.match(channel))
+    rounds = 200
+    start = time.perf_counter()
+    for _ in range(rounds):
+        [pattern for pattern, regex in compiled if regex.match(channel)]
+    scan = (time.perf_counter() - start) / rounds * 1e6
+    start = time.perf_counter()
+    for _ in range(rounds):
+        index.match(channel)
+    return scan, (time.perf_counter() - start) / rounds * 1e6
+
+def _publish_us(node, patterns: list[bytes]) -> float:
+    subscribers = []
+    share = len(patterns) // SUBSCRIBERS
+    for k in range(SUBSCRIBERS if patterns else 0):
+        subscriber = node.client()
+        subscriber.send("PSUBSCRIBE", *patterns[k * share:(k + 1) * share])
+        for _ in range(share):
+            subscriber.read()
+        subscribers.append(subscriber)
+    publisher = node.client()
+    start = time.perf_counter()
+    for i in range(PUBLISHES):
+        publisher.call("PUBLISH", f"user:{i}:events", "x")
+    elapsed = (time.perf_counter() - start) / PUBLISHES * 1e6
+    for client in subscribers + [publisher]:
+        client.close()
+    return elapsed
+
+def main():
+    options = argument_parser("PUBLISH with 10k pattern subscriptions").parse_args()
+    prefixed = [b"user:%d:*" % i for i in range(PATTERNS)]
+    leading = [b"*:%d" % i for i in range(PATTERNS)]
+    for label, patterns in (("user:N:*", prefixed), ("*:N", leading)):
+        scan, trie = _match_us(patterns, b"user:42:events")
+        report(f"match 1 channel, 10k {label}: scan", scan, "us")
+        report(f"match 1 channel, 10k {label}: trie", trie, "us")
+
+    with server(options.root) as node:
+        report("PUBLISH round trip, no patterns", _publish_us(node, []), "us")
+        report("PUBLISH round trip, 10k user:N:* patterns", _publish_us(node, prefixed), "us")
+
+if __name__ == "__main__":
+    main()
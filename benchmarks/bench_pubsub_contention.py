@@ -0,0 +1,71 @@
+# benchmarks/bench_pubsub_contention.py
+
+# Pub/sub and blocking lists under mixed load (user-038): for a fixed time, 4 publishers
+# each PUBLISH 100-byte messages to a channel with 50 subscribers while 4 pairs of clients
+# run RPUSH + BLPOP loops. Counts how many of each complete.
+#
+#   python -m benchmarks.bench_pubsub_contention [--seconds 8]
+
+import selectors
+import socket
+import threading
+import time
+
+from benchmarks.common import argument_parser, encode, server
+
+CHANNELS = 4
+SUBSCRIBERS_PER_CHANNEL = 50
+LISTS = 4
+
+def main():
+    parser = argument_parser("mixed PUBLISH and RPUSH/BLPOP load")
+    parser.add_argument("--seconds", type=float, default=8)
+    options = parser.parse_args()
+
+    with server(options.root) as node:
+        selector = selectors.DefaultSelector()
+        for channel in range(CHANNELS):
+            for _ in range(SUBSCRIBERS_PER_CHANNEL):
+                subscriber = socket.create_connection(("127.0.0.1", node.port))
+                subscriber.sendall(encode("SUBSCRIBE", f"channel:{channel}"))
+                subscriber.setblocking(False)
+                selector.register(subscriber, selectors.EVENT_READ)
+        time.sleep(0.5)
+        stop = threading.Event()
+        counts = {"publish": 0, "blpop": 0}
+
+        def drain():
+            while not stop.is_set():
+                for key, _ in selector.select(0.1):
+                    try:
+                        key.fileobj.recv(1 << 20)
+                    except BlockingIOError:
+                        pass
+
+        def publisher(channel: int):
+            client = node.client()
+            while not stop.is_set():
+                client.call("PUBLISH", f"channel:{channel}", "m" * 100)
+                counts["publish"] += 1
+
+        def list_loop(index: int):
+            pusher, popper = node.client(), node.client()
+            while not stop.is_set():
+                pusher.call("RPUSH", f"list:{index}", "x")
+                popper.call("BLPOP", f"list:{index}", 1)
+                counts["blpop"] += 1
+
+        threads = [threading.Thread(target=drain, daemon=True)]
+        threads += [threading.Thread(target=publisher, args=(i,), daemon=True) for i in range(CHANNELS)]
+        threads += [threading.Thread(target=list_loop, args=(i,), daemon=True) for i in range(LISTS)]
+        for thread in threads:
+            thread.start()
+        time.sleep(options.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()  # Before the server goes away under them
+        print(f"{options.seconds:g} s: {counts['publish']} PUBLISH to {SUBSCRIBERS_PER_CHANNEL} subscribers each, "
+              f"{counts['blpop']} RPUSH+BLPOP pairs")
+
+if __name__ == "__main__":
+    main()
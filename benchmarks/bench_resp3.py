@@ -0,0 +1,52 @@
+# benchmarks/bench_resp3.py
+
+# RESP3 (user-034): what a client spends turning ZRANGE 0 -1 WITHSCORES of 10k members into
+# (member, score) pairs. In RESP2 the reply is a flat array of bulk strings and the client
+# converts every other one to a float; in RESP3 it is [member, double] pairs. The time the
+# server takes to produce each reply is measured too, receiving it raw.
+#
+#   python -m benchmarks.bench_resp3
+
+from benchmarks.common import argument_parser, best_of, encode, report, server
+
+MEMBERS = 10000
+
+def _pairs_resp2(reply) -> list:
+    return [(reply[i], float(reply[i + 1])) for i in range(0, len(reply), 2)]
+
+def _pairs_resp3(reply) -> list:
+    return [(member, score) for member, score in reply]
+
+def _reply_size(reply, protocol: int) -> int:
+    """Bytes of the parsed ZRANGE WITHSCORES reply on the wire."""
+    bulk = lambda value: len(b"$%d\r\n" % len(value)) + len(value) + 2
+    if protocol == 2:
+        return len(b"*%d\r\n" % len(reply)) + sum(bulk(value) for value in reply)
+    return len(b"*%d\r\n" % len(reply)) + sum(
+        4 + bulk(member) + len(b",%s\r\n" % str(score).encode()) for member, score in reply)
+
+def _receive(client, command: bytes, size: int):
+    client.socket.sendall(command)
+    received = 0
+    while received < size:
+        received += len(client.socket.recv(1 << 20))
+
+def main():
+    options = argument_parser("client cost of ZRANGE WITHSCORES in RESP2 and RESP3").parse_args()
+    with server(options.root) as node:
+        client = node.client()
+        client.pipeline([encode("ZADD", "zset", f"{i}.5", f"member-{i}") for i in range(MEMBERS)])
+        for protocol, to_pairs in ((2, _pairs_resp2), (3, _pairs_resp3)):
+            client.call("HELLO", protocol)
+            reply = client.call("ZRANGE", "zset", 0, -1, "WITHSCORES")
+            assert to_pairs(reply)[-1] == (b"member-%d" % (MEMBERS - 1), MEMBERS - 0.5)
+            total = best_of(lambda: to_pairs(client.call("ZRANGE", "zset", 0, -1, "WITHSCORES")))
+            convert = best_of(lambda: to_pairs(reply))
+            command, size = encode("ZRANGE", "zset", 0, -1, "WITHSCORES"), _reply_size(reply, protocol)
+            produce = best_of(lambda: _receive(client, command, size))
+            report(f"RESP{protocol}: ZRANGE WITHSCORES to pairs", total * 1000, "ms")
+            report(f"RESP{protocol}: conversion to pairs only", convert * 1000, "ms")
+            report(f"RESP{protocol}: server reply, received raw", produce * 1000, "ms")
+
+if __name__ == "__main__":
+    main()
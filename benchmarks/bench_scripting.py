@@ -0,0 +1,57 @@
+# benchmarks/bench_scripting.py
+
+# Scripting (user-047): 10 INCRs per batch done by one EVALSHA, by 10 sequential calls and by
+# 10 pipelined calls, one client. Also a script whose loop goes through the checked
+# operators and methods (sequence multiplication, replace and join), against the same
+# work as plain commands.
+#
+#   python -m benchmarks.bench_scripting [--batches 3000]
+
+import time
+
+from benchmarks.common import argument_parser, encode, report, server
+
+KEYS = [f"counter:{i}" for i in range(10)]
+INCR_SCRIPT = "\n".join(f"redis.call('INCR', KEYS[{i}])" for i in range(10)) + "\nreturn 1"
+STRING_SCRIPT = """
+parts = []
+for i in range(100):
+    parts.append(ARGV[0].replace(b'a', b'b') * 2)
+return len(b','.join(parts))
+"""
+
+def _batches(function, count: int) -> tuple[float, float]:
+    """Batches per second and p50 latency in microseconds."""
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return count / sum(timings), timings[count // 2] * 1e6
+
+def main():
+    parser = argument_parser("EVALSHA against sequential and pipelined commands")
+    parser.add_argument("--batches", type=int, default=3000)
+    options = parser.parse_args()
+
+    with server(options.root) as node:
+        client = node.client()
+        sha = client.call("SCRIPT", "LOAD", INCR_SCRIPT)
+        assert client.call("EVALSHA", sha, len(KEYS), *KEYS) == 1
+        pipelined = [encode("INCR", key) for key in KEYS]
+        for label, function in (
+                ("EVALSHA of 10 INCRs", lambda: client.call("EVALSHA", sha, len(KEYS), *KEYS)),
+                ("10 sequential INCRs", lambda: [client.call("INCR", key) for key in KEYS]),
+                ("10 pipelined INCRs", lambda: client.pipeline(pipelined))):
+            rate, p50 = _batches(function, options.batches)
+            report(f"{label}: batches", rate, "/s")
+            report(f"{label}: p50", p50, "us")
+
+        sha = client.call("SCRIPT", "LOAD", STRING_SCRIPT)
+        assert client.call("EVALSHA", sha, 0, "abc" * 10) == 100 * 60 + 99
+        rate, p50 = _batches(lambda: client.call("EVALSHA", sha, 0, "abc" * 10), options.batches // 3)
+        report("EVALSHA of 100 replace/*/join steps: p50", p50, "us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# benchmarks/bench_set.py
+
+# Sets (user-029): memory of integer sets in the intset encoding (a sorted array('q'))
+# against the hashtable encoding, forced with CONFIG SET set-max-intset-entries 0, and
+# the speed of SISMEMBER and of SINTER / SINTERCARD on two sets.
+#
+#   python -m benchmarks.bench_set
+
+from benchmarks.common import argument_parser, best_of, encode, report, server
+
+SETS = 20000
+MEMBERS = 100
+BATCH = 500
+
+def _measure(root: str, intset_entries: int):
+    with server(root) as node:
+        client = node.client()
+        client.call("CONFIG", "SET", "set-max-intset-entries", intset_entries)
+        before = node.rss_kib()
+        members = list(range(MEMBERS))
+        for start in range(0, SETS, BATCH):
+            client.pipeline([encode("SADD", f"set:{i}", *members) for i in range(start, start + BATCH)])
+        encoding = client.call("OBJECT", "ENCODING", "set:0").decode()
+        kib = node.rss_kib() - before
+
+        client.call("CONFIG", "SET", "set-max-intset-entries", max(intset_entries, 10000) if intset_entries else 0)
+        client.call("SADD", "a", *range(0, 20000, 2))   # 10k even numbers
+        client.call("SADD", "b", *range(0, 30000, 3))   # 10k multiples of 3
+        lookups = [encode("SISMEMBER", f"set:{i}", i % (2 * MEMBERS)) for i in range(0, SETS, 2)]
+        report(f"{encoding}: memory per {MEMBERS}-member set", kib * 1024 / SETS, "bytes")
+        report(f"{encoding}: SISMEMBER", len(lookups) / best_of(lambda: client.pipeline(lookups)), "ops/s")
+        report(f"{encoding}: SINTER of two 10k sets", best_of(lambda: client.call("SINTER", "a", "b")) * 1000, "ms")
+        report(f"{encoding}: SINTERCARD of two 10k sets",
+               best_of(lambda: client.call("SINTERCARD", 2, "a", "b")) * 1000, "ms")
+
+def main():
+    options = argument_parser("Integer sets: intset against hashtable").parse_args()
+    _measure(options.root, 512)
+    _measure(options.root, 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# benchmarks/bench_sorted_set_stream.py
+
+# Sorted sets and streams in the keyspace (user-050): pipelined ZSCORE (hits and misses),
+# XADD and GEOPOS over 1000 keys, the commands whose lookup went from two dict probes to
+# one. Run it against the tree before the change and this one:
+#
+#   python -m benchmarks.bench_sorted_set_stream [--root /tmp/before]
+
+from benchmarks.common import argument_parser, best_of, encode, report, server, Client
+
+OPERATIONS = 20000
+PIPELINE = 100
+KEYS = 1000
+
+def _throughput(client: Client, command) -> float:
+    batches = [[command(first + i) for i in range(PIPELINE)] for first in range(0, OPERATIONS, PIPELINE)]
+
+    def run():
+        for batch in batches:
+            client.pipeline(batch)
+
+    return OPERATIONS / best_of(run)
+
+def main():
+    parser = argument_parser("ZSCORE, XADD and GEOPOS throughput")
+    options = parser.parse_args()
+    with server(options.root) as node:
+        client = node.client()
+        for i in range(0, KEYS, PIPELINE):
+            client.pipeline([encode("ZADD", f"z:{k}", 1, f"m:{k}") for k in range(i, i + PIPELINE)]
+                            + [encode("GEOADD", f"g:{k}", "13.36", "38.11", f"m:{k}") for k in range(i, i + PIPELINE)])
+        report("ZSCORE hit", _throughput(client, lambda i: encode("ZSCORE", f"z:{i % KEYS}", f"m:{i % KEYS}")), "ops/s")
+        report("ZSCORE missing member", _throughput(client, lambda i: encode("ZSCORE", f"z:{i % KEYS}", "none")), "ops/s")
+        report("XADD", _throughput(client, lambda i: encode("XADD", f"s:{i % KEYS}", "*", "f", "v")), "ops/s")
+        report("GEOPOS", _throughput(client, lambda i: encode("GEOPOS", f"g:{i % KEYS}", f"m:{i % KEYS}")), "ops/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_streams.py
+
+# Streams (user-040): entries delivered and acknowledged per second with 1 and 16 consumers
+# of one group (XREADGROUP COUNT 10 BLOCK, then XACK of each batch) while one producer
+# XADDs, and the cost of XREAD of the tail of a 100k-entry stream. Trees without consumer
+# groups only run the XREAD part (--no-groups).
+#
+#   python -m benchmarks.bench_streams [--entries 20000] [--no-groups]
+
+import threading
+import time
+
+from benchmarks.common import argument_parser, encode, report, server
+
+TAIL_ENTRIES = 100000
+BATCH = 100
+
+def _group_throughput(node, consumers: int, entries: int) -> float:
+    admin = node.client()
+    admin.call("XGROUP", "CREATE", f"jobs:{consumers}", "group", "$", "MKSTREAM")
+    stream = f"jobs:{consumers}"
+    delivered = [0]
+    lock = threading.Lock()
+    finished = threading.Event()
+
+    def consumer(index: int):
+        client = node.client()
+        while not finished.is_set():
+            reply = client.call("XREADGROUP", "GROUP", "group", f"consumer:{index}", "COUNT", 10,
+                                "BLOCK", 100, "STREAMS", stream, ">")
+            if not reply:
+                continue
+            ids = [entry[0] for entry in reply[0][1]]
+            client.call("XACK", stream, "group", *ids)
+            with lock:
+                delivered[0] += len(ids)
+                if delivered[0] >= entries:
+                    finished.set()
+
+    threads = [threading.Thread(target=consumer, args=(i,), daemon=True) for i in range(consumers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+    producer = node.client()
+    start = time.perf_counter()
+    for sent in range(0, entries, BATCH):
+        producer.pipeline([encode("XADD", stream, "*", "n", sent + i) for i in range(BATCH)])
+    finished.wait(120)
+    elapsed = time.perf_counter() - start
+    for thread in threads:
+        thread.join()
+    assert admin.call("XPENDING", stream, "group")[0] == 0
+    return delivered[0] / elapsed
+
+def main():
+    parser = argument_parser("consumer group throughput and XREAD of a stream tail")
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--no-groups", action="store_true", help="the tree has no consumer groups")
+    options = parser.parse_args()
+
+    with server(options.root) as node:
+        if not options.no_groups:
+            for consumers in (1, 16):
+                report(f"{consumers} consumer(s) in one group", _group_throughput(node, consumers, options.entries),
+                       "entries/s")
+
+        client = node.client()
+        for sent in range(0, TAIL_ENTRIES, 1000):
+            client.pipeline([encode("XADD", "tail", "*", "n", 1) for _ in range(1000)])
+        before_last = client.call("XRANGE", "tail", "-", "+")[-2][0]
+        start = time.perf_counter()
+        for _ in range(200):
+            client.call("XREAD", "STREAMS", "tail", before_last)
+        report(f"XREAD of the tail of a {TAIL_ENTRIES // 1000}k-entry stream", (time.perf_counter() - start) / 200 * 1000, "ms")
+
+if __name__ == "__main__":
+    main()
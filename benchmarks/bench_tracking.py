@@ -0,0 +1,83 @@
+# benchmarks/bench_tracking.py
+
+# Client-side caching (user-035): a reader that reads 1000 hot keys per round while a writer
+# changes 1% of them between rounds. Without tracking every read is a GET; with CLIENT
+# TRACKING ON the reader keeps a local cache and only GETs keys it was told are stale.
+# Also the server cost of tracking on a pipelined SET/GET mix.
+#
+#   python -m benchmarks.bench_tracking
+
+import time
+
+from benchmarks.common import argument_parser, encode, report, server
+
+KEYS = 1000
+ROUNDS = 20
+WRITES_PER_ROUND = 10
+PAIRS = 20000
+
+def _read_reply(client, cache: dict):
+    """The next reply, applying any invalidation push that comes before it."""
+    while client.reader.peek(1)[:1] == b">":
+        kind, keys = client.read()
+        if kind == b"invalidate":
+            if keys is None:
+                cache.clear()  # FLUSHALL
+            for key in keys or ():
+                cache.pop(key, None)
+    return client.read()
+
+def _reads(node, tracking: bool) -> tuple[float, int]:
+    reader, writer = node.client(), node.client()
+    cache = {}
+    if tracking:
+        reader.call("HELLO", 3)
+        reader.call("CLIENT", "TRACKING", "ON")
+    keys = [b"hot:%d" % i for i in range(KEYS)]
+    gets = 0
+    start = time.perf_counter()
+    for round in range(ROUNDS):
+        for i in range(WRITES_PER_ROUND):
+            writer.call("SET", keys[(round * WRITES_PER_ROUND + i) * 7 % KEYS], round)
+        # Its next command runs after the invalidations of the SETs were sent
+        writer.call("PING")
+        if tracking:
+            reader.send("PING")
+            _read_reply(reader, cache)
+        for key in keys:
+            if key not in cache:
+                reader.send("GET", key)
+                gets += 1
+                value = _read_reply(reader, cache)
+                if tracking:
+                    cache[key] = value
+    reader.close()
+    writer.close()
+    return time.perf_counter() - start, gets
+
+def _pipelined_pairs(client) -> float:
+    payload = [encode("SET", f"k{i % 1000}", "v") + encode("GET", f"k{i % 1000}") for i in range(PAIRS)]
+    start = time.perf_counter()
+    client.socket.sendall(b"".join(payload))
+    for _ in range(2 * PAIRS):
+        client.read()
+    return time.perf_counter() - start
+
+def main():
+    options = argument_parser("read load with and without client-side caching").parse_args()
+    with server(options.root) as node:
+        client = node.client()
+        client.pipeline([encode("SET", b"hot:%d" % i, "v") for i in range(KEYS)])
+        for tracking in (False, True):
+            label = "tracking, local cache" if tracking else "no tracking"
+            seconds, gets = _reads(node, tracking)
+            report(f"{label}: {ROUNDS}x{KEYS} reads", seconds * 1000, "ms")
+            report(f"{label}: GETs sent to the server", gets, "")
+
+        report("SET+GET x20k pipelined, no tracking", _pipelined_pairs(client) * 1000, "ms")
+        client.call("HELLO", 3)
+        client.call("CLIENT", "TRACKING", "ON", "NOLOOP")
+        report("SET+GET x20k pipelined, tracking NOLOOP", _pipelined_pairs(client) * 1000, "ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# benchmarks/bench_values.py
+
+# Bytes-native data path (user-032): SET+GET round trips of 1 KB to 1 MB values, checking
+# each value comes back byte for byte (they are not valid UTF-8).
+#
+#   python -m benchmarks.bench_values
+
+import time
+
+from benchmarks.common import argument_parser, report, server
+
+SIZES = (1024, 16 * 1024, 256 * 1024, 1024 * 1024)
+
+def main():
+    options = argument_parser("SET+GET throughput of 1 KB-1 MB binary values").parse_args()
+    for size in SIZES:
+        value = bytes(range(256)) * (size // 256)
+        rounds = max(20, 2000 * 1024 // size)
+        # A fresh server per size, so a tree that cannot take a value does not skip the rest
+        with server(options.root) as node:
+            client = node.client()
+            label = f"{size // 1024} KB SET+GET"
+            try:
+                start = time.perf_counter()
+                for _ in range(rounds):
+                    client.call("SET", "key", value)
+                    if client.call("GET", "key") != value:
+                        raise ValueError("value changed")
+                seconds = time.perf_counter() - start
+            except (OSError, ValueError) as e:
+                print(f"{label:<48} failed: {e}")
+                continue
+            report(label, 2 * rounds * size / seconds / 1e6, "MB/s")
+
+if __name__ == "__main__":
+    main()
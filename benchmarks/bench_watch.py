@@ -0,0 +1,81 @@
+# benchmarks/bench_watch.py
+
+# WATCH (user-046): 4 clients each increment one shared counter 300 times with GET + SET,
+# either as WATCH/MULTI/EXEC retried on conflict or under a SETNX lock key, and the time
+# of an EXEC of 100 queued INCRs. Also the cost of WATCH on plain writes: pipelined SETs
+# with no watcher and with another client watching 1000 of the written keys. Trees without
+# WATCH only run the plain SETs (--no-watch).
+#
+#   python -m benchmarks.bench_watch [--no-watch]
+
+import threading
+import time
+
+from benchmarks.common import argument_parser, best_of, encode, report, server
+
+CLIENTS = 4
+INCREMENTS = 300
+SETS = 20000
+
+def _concurrently(function) -> tuple[float, int]:
+    retries = [0]
+    threads = [threading.Thread(target=function, args=(retries,)) for _ in range(CLIENTS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, retries[0]
+
+def main():
+    parser = argument_parser("optimistic transactions with WATCH")
+    parser.add_argument("--no-watch", action="store_true", help="the tree has no WATCH")
+    options = parser.parse_args()
+
+    with server(options.root) as node:
+        client = node.client()
+        if not options.no_watch:
+            def compare_and_set(retries):
+                own = node.client()
+                for _ in range(INCREMENTS):
+                    while True:
+                        own.call("WATCH", "counter")
+                        value = int(own.call("GET", "counter") or 0)
+                        own.call("MULTI")
+                        own.call("SET", "counter", value + 1)
+                        if own.call("EXEC") is not None:
+                            break
+                        retries[0] += 1
+
+            def lock_key(retries):
+                own = node.client()
+                for _ in range(INCREMENTS):
+                    while own.call("SETNX", "lock", 1) != 1:
+                        retries[0] += 1
+                    value = int(own.call("GET", "locked-counter") or 0)
+                    own.call("SET", "locked-counter", value + 1)
+                    own.call("DEL", "lock")
+
+            for label, function, key in (("WATCH/MULTI/EXEC", compare_and_set, "counter"),
+                                         ("SETNX lock key", lock_key, "locked-counter")):
+                seconds, retries = _concurrently(function)
+                assert int(client.call("GET", key)) == CLIENTS * INCREMENTS
+                report(f"{label}: increments", CLIENTS * INCREMENTS / seconds, "ops/s")
+                report(f"{label}: retries", retries, "")
+
+            incrs = [encode("INCR", "queued")] * 100
+            def queued_exec():
+                client.call("MULTI")
+                client.pipeline(incrs)
+                client.call("EXEC")
+            report("MULTI + 100 INCR + EXEC", best_of(queued_exec, 20) * 1000, "ms")
+
+        sets = [encode("SET", f"key:{i % 1000}", i) for i in range(SETS)]
+        report("pipelined SETs, no watcher", SETS / best_of(lambda: client.pipeline(sets)), "ops/s")
+        if not options.no_watch:
+            watcher = node.client()
+            watcher.call("WATCH", *[f"key:{i}" for i in range(1000)])
+            report("pipelined SETs, 1000 keys watched", SETS / best_of(lambda: client.pipeline(sets)), "ops/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/bench_workers.py
+
+# --workers N (user-026): SET/GET throughput of several client processes against one
+# process and against N workers, and the round-trip cost of commands forwarded to the
+# worker owning their key. Parallel speedup needs as many cores as workers; with fewer the
+# numbers show the forwarding overhead instead.
+#
+#   python -m benchmarks.bench_workers [--workers 4] [--clients 8]
+
+import multiprocessing
+import os
+import time
+
+from benchmarks.common import argument_parser, encode, report, server, Client
+
+OPERATIONS = 20000
+PIPELINE = 50
+
+def _client_process(port: int, index: int, results):
+    client = Client(port)
+    commands = [encode("SET", f"key:{index}:{i}", "v") if i % 2 else encode("GET", f"key:{index}:{i - 1}")
+                for i in range(PIPELINE)]
+    start = time.perf_counter()
+    for _ in range(OPERATIONS // PIPELINE):
+        client.pipeline(commands)
+    results.put(time.perf_counter() - start)
+
+def _throughput(port: int, clients: int) -> float:
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_client_process, args=(port, index, results)) for index in range(clients)]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return clients * OPERATIONS / (time.perf_counter() - start)
+
+def _latency_us(port: int) -> float:
+    client = Client(port)
+    keys = [f"latency:{i}" for i in range(1000)]
+    for key in keys:
+        client.call("SET", key, "v")
+    start = time.perf_counter()
+    for key in keys:
+        client.call("GET", key)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+def main():
+    parser = argument_parser("SET/GET throughput and forwarding cost with --workers N")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=8)
+    options = parser.parse_args()
+    print(f"{os.cpu_count()} CPU(s), {options.clients} client processes")
+
+    with server(options.root) as single:
+        report("single process: SET/GET throughput", _throughput(single.port, options.clients), "ops/s")
+        report("single process: GET round trip", _latency_us(single.port), "us")
+    with server(options.root, "--workers", str(options.workers)) as workers:
+        time.sleep(0.5)  # Every worker listening
+        report(f"{options.workers} workers: SET/GET throughput", _throughput(workers.port, options.clients), "ops/s")
+        report(f"{options.workers} workers: GET round trip (mostly forwarded)", _latency_us(workers.port), "us")
+
+if __name__ == "__main__":
+    main()
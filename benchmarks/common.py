@@ -0,0 +1,139 @@
+# benchmarks/common.py
+
+# Helpers shared by the benchmark scripts: a server started as a subprocess, a RESP client
+# that can pipeline, and timing. Every script takes --root, the checkout whose server is
+# started (this one by default), so the same script can measure a tree before and after a
+# change:
+#
+#   git worktree add /tmp/before <commit>^
+#   python -m benchmarks.bench_reply_writer --root /tmp/before
+#   python -m benchmarks.bench_reply_writer
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def argument_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--root", default=ROOT, help="checkout whose server is benchmarked")
+    return parser
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+class Server:
+    def __init__(self, process: subprocess.Popen, port: int):
+        self.process = process
+        self.port = port
+
+    def client(self) -> "Client":
+        return Client(self.port)
+
+    def rss_kib(self) -> int:
+        """Resident memory of the server process."""
+        with open(f"/proc/{self.process.pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+        return 0
+
+@contextmanager
+def server(root: str, *arguments, env: dict | None = None, port: int | None = None):
+    """Runs `python -m app.main` from `root` on `port` (or a free one), in an empty directory."""
+    port = port or free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "app.main", "--port", str(port), "--dir", directory, *arguments],
+            cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 10
+            while True:
+                try:
+                    socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline or process.poll() is not None:
+                        raise RuntimeError("server did not start")
+                    time.sleep(0.05)
+            yield Server(process, port)
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+def encode(*arguments) -> bytes:
+    parts = [b"*%d\r\n" % len(arguments)]
+    for argument in arguments:
+        if not isinstance(argument, bytes):
+            argument = str(argument).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(argument), argument))
+    return b"".join(parts)
+
+class Client:
+    """A minimal RESP client: call() runs one command, pipeline() many in one write."""
+
+    def __init__(self, port: int):
+        self.socket = socket.create_connection(("127.0.0.1", port))
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.socket.makefile("rb")
+
+    def call(self, *arguments):
+        self.socket.sendall(encode(*arguments))
+        return self.read()
+
+    def send(self, *arguments):
+        self.socket.sendall(encode(*arguments))
+
+    def pipeline(self, commands: list[bytes]) -> list:
+        """Sends already encoded commands at once and reads all their replies."""
+        self.socket.sendall(b"".join(commands))
+        return [self.read() for _ in commands]
+
+    def read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        prefix, body = line[:1], line[1:-2]
+        if prefix in (b"+", b"-"):
+            return body.decode()
+        if prefix == b":":
+            return int(body)
+        if prefix == b"_":
+            return None
+        if prefix == b",":
+            return float(body)
+        if prefix == b"#":
+            return body == b"t"
+        if prefix in (b"$", b"=", b"!"):
+            length = int(body)
+            return None if length < 0 else self.reader.read(length + 2)[:-2]
+        if prefix in (b"*", b">", b"~"):
+            count = int(body)
+            return None if count < 0 else [self.read() for _ in range(count)]
+        if prefix == b"%":
+            return {self.read(): self.read() for _ in range(int(body))}
+        raise ValueError(line)
+
+    def close(self):
+        self.reader.close()
+        self.socket.close()
+
+def best_of(function, repeat: int = 5) -> float:
+    """The fastest of `repeat` runs of function(), in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def report(label: str, value: float, unit: str):
+    print(f"{label:<48} {value:>12.1f} {unit}")
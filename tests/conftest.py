@@ -0,0 +1,131 @@
+# tests/conftest.py
+
+# The tests drive real server processes (python -m app.main) over TCP, since workers,
+# replication and connection handling only exist across processes and sockets.
+
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+def _encode(*arguments) -> bytes:
+    parts = [b"*%d\r\n" % len(arguments)]
+    for argument in arguments:
+        if not isinstance(argument, bytes):
+            argument = str(argument).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(argument), argument))
+    return b"".join(parts)
+
+class ReplyError(Exception):
+    pass
+
+class Client:
+    """A minimal RESP2/RESP3 client: call() sends one command and returns its decoded reply."""
+
+    def __init__(self, port: int):
+        self.socket = socket.create_connection(("127.0.0.1", port), timeout=10)
+        self.reader = self.socket.makefile("rb")
+
+    def send(self, *arguments):
+        self.socket.sendall(_encode(*arguments))
+
+    def call(self, *arguments):
+        self.send(*arguments)
+        return self.read()
+
+    def read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b"+":
+            return body.decode()
+        if prefix == b"-":
+            return ReplyError(body.decode())
+        if prefix == b":":
+            return int(body)
+        if prefix == b"_":
+            return None
+        if prefix in (b"$", b"="):
+            length = int(body)
+            return None if length < 0 else self.reader.read(length + 2)[:-2]
+        if prefix in (b"*", b">", b"~"):
+            count = int(body)
+            return None if count < 0 else [self.read() for _ in range(count)]
+        if prefix == b"%":
+            return {self.read(): self.read() for _ in range(int(body))}
+        if prefix == b",":
+            return float(body)
+        raise ValueError(line)
+
+    def close(self):
+        self.reader.close()
+        self.socket.close()
+
+    def reset(self):
+        """Drops the connection without a clean close (RST instead of FIN)."""
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        self.close()
+
+class Server:
+    def __init__(self, directory, *extra_arguments):
+        self.port = free_port()
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "app.main", "--port", str(self.port), "--dir", str(directory), *extra_arguments],
+            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or self.process.poll() is not None:
+                    self.stop()
+                    raise RuntimeError("server did not start")
+                time.sleep(0.05)
+        self.clients = []
+
+    def client(self) -> Client:
+        client = Client(self.port)
+        self.clients.append(client)
+        return client
+
+    def stop(self):
+        for client in getattr(self, "clients", []):
+            client.close()
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+@pytest.fixture
+def start_server(tmp_path):
+    """start_server(*arguments) -> a running Server, stopped after the test."""
+    servers = []
+
+    def start(*extra_arguments) -> Server:
+        server = Server(tmp_path, *extra_arguments)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in reversed(servers):
+        server.stop()
+
+def wait_for(condition, timeout: float = 5.0):
+    """Polls `condition` until it returns something truthy; returns that value."""
+    deadline = time.monotonic() + timeout
+    while True:
+        value = condition()
+        if value or time.monotonic() > deadline:
+            return value
+        time.sleep(0.05)
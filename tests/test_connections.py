@@ -0,0 +1,35 @@
+# tests/test_connections.py
+
+from tests.conftest import wait_for
+
+def _subscribers(client, channel: str) -> int:
+    return client.call("PUBSUB", "NUMSUB", channel)[1]
+
+def test_protocol_error_releases_the_connection_state(start_server):
+    server = start_server()
+    subscriber, tracked, observer = server.client(), server.client(), server.client()
+    assert subscriber.call("SUBSCRIBE", "news") == [b"subscribe", b"news", 1]
+    assert tracked.call("CLIENT", "TRACKING", "ON") == "OK"
+    tracked.call("GET", "key")
+
+    for client in (subscriber, tracked):
+        client.socket.sendall(b"*1\r\n$abc\r\n")
+        assert "Protocol error" in str(client.read())
+
+    assert wait_for(lambda: _subscribers(observer, "news") == 0)
+    assert observer.call("PUBLISH", "news", "hello") == 0
+    assert observer.call("SET", "key", "value") == "OK"  # No invalidation left to send
+
+def test_reset_subscriber_is_forgotten(start_server):
+    server = start_server()
+    subscribers, observer = [server.client() for _ in range(3)], server.client()
+    for subscriber in subscribers:
+        subscriber.call("SUBSCRIBE", "news")
+        subscriber.call("PSUBSCRIBE", "n*")
+    assert observer.call("PUBLISH", "news", "hello") == 6
+
+    # Closing with SO_LINGER 0 sends a RST: the server's recv() raises instead of
+    # returning b""
+    subscribers[0].reset()
+    assert wait_for(lambda: _subscribers(observer, "news") == 2)
+    assert observer.call("PUBLISH", "news", "hello") == 4
@@ -0,0 +1,43 @@
+# tests/test_incrbyfloat.py
+
+import pytest
+
+from tests.conftest import ReplyError
+
+@pytest.mark.parametrize("start, increment, expected", [
+    (b"0", b"0.00001", b"0.00001"),
+    (b"0", b"1e17", b"100000000000000000"),
+    (b"10.5", b"0.1", b"10.6"),
+    (b"5", b"-5", b"0"),
+    (b"3", b"1.5e2", b"153"),
+    (b"1e5", b"1", b"100001"),
+    (b"0", b"-0.000000001", b"-0.000000001"),
+])
+def test_replies_in_fixed_point(start_server, start, increment, expected):
+    client = start_server().client()
+    client.call("SET", "n", start)
+    assert client.call("INCRBYFLOAT", "n", increment) == expected
+    assert client.call("GET", "n") == expected
+
+@pytest.mark.parametrize("increment", [b"1_0", b" 1", b"1 ", b"1\n", b"", b"nan", b"-nan", b"abc"])
+def test_rejects_invalid_increments(start_server, increment):
+    client = start_server().client()
+    client.call("SET", "n", "1")
+    reply = client.call("INCRBYFLOAT", "n", increment)
+    assert isinstance(reply, ReplyError) and "not a valid float" in str(reply)
+    assert client.call("GET", "n") == b"1"
+
+@pytest.mark.parametrize("value", [b"1_0", b" 1", b"nan"])
+def test_rejects_invalid_stored_values(start_server, value):
+    client = start_server().client()
+    client.call("SET", "n", value)
+    reply = client.call("INCRBYFLOAT", "n", "1")
+    assert isinstance(reply, ReplyError) and "not a valid float" in str(reply)
+
+@pytest.mark.parametrize("start, increment", [(b"1", b"inf"), (b"1", b"-infinity"), (b"1.7e308", b"1.7e308")])
+def test_rejects_infinite_results(start_server, start, increment):
+    client = start_server().client()
+    client.call("SET", "n", start)
+    reply = client.call("INCRBYFLOAT", "n", increment)
+    assert isinstance(reply, ReplyError) and "increment would produce NaN or Infinity" in str(reply)
+    assert client.call("GET", "n") == start
@@ -0,0 +1,42 @@
+# tests/test_info_keyspace.py
+
+import re
+import time
+
+def _expires(client) -> dict[int, int]:
+    """Database index -> the expires count INFO keyspace reports."""
+    info = client.call("INFO", "keyspace").decode()
+    return {int(index): int(expires) for index, expires in re.findall(r"db(\d+):keys=\d+,expires=(\d+)", info)}
+
+def test_expires_follows_every_way_an_expiry_changes(start_server):
+    client = start_server().client()
+    client.call("SET", "plain", "v")
+    client.call("SET", "a", "v", "EX", 100)
+    client.call("SET", "b", "v", "PX", 100000)
+    client.call("SET", "short", "v", "PX", 50)
+    assert _expires(client) == {0: 3}
+
+    client.call("SET", "a", "overwritten")  # Without KEEPTTL the expiry is dropped
+    client.call("GETEX", "plain", "EX", 100)
+    client.call("GETEX", "b", "PERSIST")
+    assert _expires(client) == {0: 2}
+
+    time.sleep(0.1)
+    assert client.call("GET", "short") is None  # Expired lazily
+    assert _expires(client) == {0: 1}
+
+    client.call("MOVE", "plain", 1)
+    assert _expires(client) == {0: 0, 1: 1}
+    client.call("SWAPDB", 0, 1)
+    assert _expires(client) == {0: 1, 1: 0}
+
+    dump = client.call("DUMP", "plain")
+    client.call("RESTORE", "restored", 100000, dump)
+    client.call("SET", "c", "v", "EX", 100)
+    assert _expires(client) == {0: 3, 1: 0}
+    assert client.call("DEL", "plain", "restored") == 2
+    assert _expires(client) == {0: 1, 1: 0}
+
+    client.call("FLUSHDB")
+    client.call("SET", "d", "v", "EX", 100)
+    assert _expires(client) == {0: 1, 1: 0}
@@ -0,0 +1,47 @@
+# tests/test_notify.py
+
+import time
+
+def _events(subscriber, count: int) -> list[tuple[bytes, bytes]]:
+    """The next `count` keyspace events, as (key, event)."""
+    events = []
+    for _ in range(count):
+        kind, _, channel, event = subscriber.read()
+        assert kind == b"pmessage"
+        events.append((channel.split(b":", 1)[1], event))
+    return events
+
+def _subscribe(server, flags: str):
+    client = server.client()
+    assert client.call("CONFIG", "SET", "notify-keyspace-events", flags) == "OK"
+    subscriber = server.client()
+    subscriber.call("PSUBSCRIBE", "__keyspace@0__:*")
+    return client, subscriber
+
+def test_blocking_pops_notify_list_events(start_server):
+    server = start_server()
+    client, subscriber = _subscribe(server, "Kl")
+    client.call("RPUSH", "list", "a", "b", "c", "d")
+    assert _events(subscriber, 1) == [(b"list", b"rpush")]
+
+    client.call("BLPOP", "list", 0)
+    client.call("BRPOP", "list", 0)
+    client.call("BLMOVE", "list", "target", "LEFT", "RIGHT", 0)
+    assert _events(subscriber, 4) == [(b"list", b"lpop"), (b"list", b"rpop"),
+                                      (b"list", b"lpop"), (b"target", b"rpush")]
+
+def test_served_blocking_pops_notify_list_events(start_server):
+    server = start_server()
+    client, subscriber = _subscribe(server, "Klg")
+    popper, mover = server.client(), server.client()
+    popper.send("BRPOP", "queue", 0)
+    mover.send("BLMOVE", "source", "target", "RIGHT", "LEFT", 0)
+    time.sleep(0.2)  # Both block
+
+    client.call("LPUSH", "queue", "x")
+    assert popper.read() == [b"queue", b"x"]
+    assert _events(subscriber, 3) == [(b"queue", b"lpush"), (b"queue", b"rpop"), (b"queue", b"del")]
+
+    client.call("RPUSH", "source", "1", "2")
+    assert mover.read() == b"2"
+    assert _events(subscriber, 3) == [(b"source", b"rpush"), (b"source", b"rpop"), (b"target", b"lpush")]
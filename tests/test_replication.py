@@ -0,0 +1,59 @@
+# tests/test_replication.py
+
+import time
+
+from tests.conftest import wait_for
+
+def _start_pair(start_server):
+    master = start_server()
+    replica = start_server("--replicaof", f"127.0.0.1 {master.port}")
+    client = master.client()
+    assert wait_for(lambda: client.call("WAIT", 1, 100) == 1)
+    return master, replica
+
+def _lists(client, *keys):
+    return [client.call("LRANGE", key, 0, -1) for key in keys]
+
+def test_blocking_pops_replicate_what_they_popped(start_server):
+    master, replica = _start_pair(start_server)
+    client, replica_client = master.client(), replica.client()
+
+    client.call("RPUSH", "list", "a", "b", "c", "d", "e", "f", "g")
+    assert client.call("BLPOP", "list", 0) == [b"list", b"a"]
+    assert client.call("BRPOP", "list", 0) == [b"list", b"g"]
+    assert client.call("BLMPOP", 0, 1, "list", "LEFT", "COUNT", 2) == [b"list", [b"b", b"c"]]
+    assert client.call("BLMOVE", "list", "target", "RIGHT", "LEFT", 0) == b"f"
+
+    expected = [[b"d", b"e"], [b"f"]]
+    assert _lists(client, "list", "target") == expected
+    assert wait_for(lambda: _lists(replica_client, "list", "target") == expected)
+
+def test_served_blocking_pops_replicate_what_they_popped(start_server):
+    master, replica = _start_pair(start_server)
+    client, replica_client = master.client(), replica.client()
+    popper, mover = master.client(), master.client()
+
+    popper.send("BRPOP", "queue", 0)
+    mover.send("BLMOVE", "source", "target", "LEFT", "RIGHT", 0)
+    time.sleep(0.2)  # Both block
+    client.call("RPUSH", "queue", "x", "y", "z")
+    client.call("RPUSH", "source", "1", "2")
+    assert popper.read() == [b"queue", b"z"]
+    assert mover.read() == b"1"
+
+    expected = [[b"x", b"y"], [b"2"], [b"1"]]
+    assert _lists(client, "queue", "source", "target") == expected
+    assert wait_for(lambda: _lists(replica_client, "queue", "source", "target") == expected)
+
+def test_emptied_lists_are_deleted_on_the_replica(start_server):
+    master, replica = _start_pair(start_server)
+    client, replica_client = master.client(), replica.client()
+    waiter = master.client()
+
+    waiter.send("BLPOP", "queue", 0)
+    time.sleep(0.2)
+    client.call("LPUSH", "queue", "only")
+    assert waiter.read() == [b"queue", b"only"]
+    client.call("SET", "marker", "1")
+    assert wait_for(lambda: replica_client.call("GET", "marker") == b"1")
+    assert replica_client.call("TYPE", "queue") == b"none"
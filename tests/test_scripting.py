@@ -0,0 +1,29 @@
+# tests/test_scripting.py
+
+import pytest
+
+from tests.conftest import ReplyError
+
+def _eval(client, source: str, *arguments):
+    return client.call("EVAL", source, 0, *arguments)
+
+@pytest.mark.parametrize("source", [
+    # 1 MiB of "x", each replaced by 1 KiB: 1 GiB, over the 512 MiB cap
+    "s = 'x' * 1048576; return len(s.replace('x', 'y' * 1024))",
+    "s = b'x' * 1048576; return len(s.replace(b'', b'y' * 1024))",
+    "s = 'x' * 1048576; return len(''.join([s] * 1024))",
+    "parts = ['x' * 1048576] * 1024; return len('ab'.join(parts))",
+    "a = [0] * 1048576; a.extend(a); return len(a)",
+])
+def test_methods_that_build_huge_values_are_capped(start_server, source):
+    client = start_server().client()
+    reply = _eval(client, source)
+    assert isinstance(reply, ReplyError) and "value too large" in str(reply)
+    assert client.call("PING") == "PONG"
+
+def test_methods_below_the_caps_still_work(start_server):
+    client = start_server().client()
+    assert _eval(client, "return 'a-b-c'.replace('-', '+', 1)") == b"a+b-c"
+    assert _eval(client, "return b'aaa'.replace(b'a', b'bb')") == b"bbbbbb"
+    assert _eval(client, "return ','.join(['x', 'y'])") == b"x,y"
+    assert _eval(client, "a = [1]; a.extend(range(3)); return a") == [1, 0, 1, 2]
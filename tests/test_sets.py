@@ -0,0 +1,23 @@
+# tests/test_sets.py
+
+import pytest
+
+@pytest.mark.parametrize("intset_entries", [512, 0])
+def test_intersection_of_integer_sets(start_server, intset_entries):
+    client = start_server().client()
+    client.call("CONFIG", "SET", "set-max-intset-entries", intset_entries)
+    client.call("SADD", "a", *range(0, 40, 2))
+    client.call("SADD", "b", *range(0, 40, 3))
+    client.call("SADD", "c", *range(-6, 40, 6))
+
+    assert sorted(client.call("SINTER", "a", "b"), key=int) == [b"%d" % n for n in range(0, 40, 6)]
+    assert client.call("SINTERCARD", 2, "a", "b") == 7
+    assert client.call("SINTERCARD", 2, "a", "b", "LIMIT", 3) == 3
+    assert client.call("SINTERCARD", 3, "a", "b", "c") == 7
+    assert client.call("SINTERSTORE", "d", "a", "b", "missing") == 0
+
+def test_intersection_of_intset_and_hashtable(start_server):
+    client = start_server().client()
+    client.call("SADD", "numbers", 1, 2, 3)
+    client.call("SADD", "mixed", 2, 3, "x")
+    assert sorted(client.call("SINTER", "numbers", "mixed")) == [b"2", b"3"]
@@ -0,0 +1,98 @@
+# tests/test_workers.py
+
+from app.slots import CLUSTER_SLOTS, key_hash_slot
+
+from tests.conftest import ReplyError
+
+WORKERS = 2
+
+def _keys_of_each_worker(count: int = 3) -> list[list[bytes]]:
+    """`count` keys owned by each worker, as --workers 2 splits the slots."""
+    keys = [[] for _ in range(WORKERS)]
+    index = 0
+    while min(len(owned) for owned in keys) < count:
+        key = b"key:%d" % index
+        owned = keys[key_hash_slot(key) * WORKERS // CLUSTER_SLOTS]
+        if len(owned) < count:
+            owned.append(key)
+        index += 1
+    return keys
+
+def test_single_key_commands_reach_the_owner(start_server):
+    server = start_server("--workers", str(WORKERS))
+    keys = [key for owned in _keys_of_each_worker() for key in owned]
+    writer, reader = server.client(), server.client()
+    for key in keys:
+        assert writer.call("SET", key, b"v-" + key) == "OK"
+    for key in keys:
+        assert reader.call("GET", key) == b"v-" + key
+
+def test_keyspace_commands_cover_every_worker(start_server):
+    server = start_server("--workers", str(WORKERS))
+    keys = [key for owned in _keys_of_each_worker() for key in owned]
+    client = server.client()
+    for key in keys:
+        client.call("SET", key, "v")
+
+    assert client.call("DBSIZE") == len(keys)
+    assert sorted(client.call("KEYS", "*")) == sorted(keys)
+    assert client.call("FLUSHALL") == "OK"
+    assert client.call("DBSIZE") == 0
+    assert [client.call("GET", key) for key in keys] == [None] * len(keys)
+
+def test_multi_key_commands_are_split_per_worker(start_server):
+    server = start_server("--workers", str(WORKERS))
+    first, second = _keys_of_each_worker(2)
+    keys = [first[0], second[0], first[1], second[1]]
+    client = server.client()
+
+    arguments = [part for key in keys for part in (key, b"v-" + key)]
+    assert client.call("MSET", *arguments) == "OK"
+    assert client.call("MGET", *keys, b"missing") == [b"v-" + key for key in keys] + [None]
+    assert client.call("DEL", *keys[:2]) == 2
+    assert client.call("UNLINK", *keys) == 2
+    # Commands that must see all their keys at once still refuse to span workers
+    assert isinstance(client.call("SINTERSTORE", first[0], second[0]), ReplyError)
+
+def test_publish_reaches_subscribers_of_every_worker(start_server):
+    server = start_server("--workers", str(WORKERS))
+    # Connections are spread over the workers by the kernel: with enough of them, the
+    # subscribers sit on both
+    subscribers = [server.client() for _ in range(8)]
+    for subscriber in subscribers:
+        assert subscriber.call("SUBSCRIBE", "news") == [b"subscribe", b"news", 1]
+
+    assert server.client().call("PUBLISH", "news", "hello") == len(subscribers)
+    for subscriber in subscribers:
+        assert subscriber.read() == [b"message", b"news", b"hello"]
+
+def test_exec_fails_when_a_watched_key_changes(start_server):
+    server = start_server("--workers", str(WORKERS))
+    for owned in _keys_of_each_worker(4):
+        for key in owned:
+            # Connections land on either worker, so every key is watched both from its
+            # owner and from the other worker across the test
+            watcher, writer = server.client(), server.client()
+            assert watcher.call("WATCH", key) == "OK"
+            assert writer.call("SET", key, "changed") == "OK"
+            assert watcher.call("MULTI") == "OK"
+            assert watcher.call("SET", key, "from-transaction") == "QUEUED"
+            assert watcher.call("EXEC") is None
+            assert writer.call("GET", key) == b"changed"
+
+            assert watcher.call("WATCH", key) == "OK"
+            assert watcher.call("MULTI") == "OK"
+            assert watcher.call("SET", key, "from-transaction") == "QUEUED"
+            assert watcher.call("EXEC") == ["OK"]
+            assert writer.call("GET", key) == b"from-transaction"
+
+def test_transaction_keys_must_belong_to_one_worker(start_server):
+    server = start_server("--workers", str(WORKERS))
+    first, second = _keys_of_each_worker(1)
+    client = server.client()
+    assert client.call("WATCH", first[0]) == "OK"
+    assert client.call("MULTI") == "OK"
+    assert client.call("SET", first[0], "1") == "QUEUED"
+    client.call("SET", second[0], "1")  # Refused by whichever worker runs the transaction
+    assert isinstance(client.call("EXEC"), ReplyError)
+    assert client.call("MGET", first[0], second[0]) == [None, None]